@@ -493,6 +493,57 @@ TRACKING_RATE_LIMITS = {
     'auth': (5, 300),
 }
 
+# Tor exit / VPN / proxy lists for the IP reputation index (tracker/ip_reputation.py).
+# Files: tor_exit_nodes.txt, vpn_ranges.txt, proxies.txt — reloaded on change.
+# There are no built-in ranges; without the files only request data sets flags.
+IP_REPUTATION_DIR = config('IP_REPUTATION_DIR', default=str(BASE_DIR / 'ip_reputation'))
+
+# Write-behind ingest: track_event buffers payloads and returns 202; the
+# drain_tracking_buffer task inserts them in batches. Uses a Redis stream when
+# REDIS_URL is set, otherwise append-only segment files in TRACKING_BUFFER_DIR.
+TRACKING_WRITE_BEHIND = config('TRACKING_WRITE_BEHIND', default=False, cast=bool)
+TRACKING_BUFFER_BACKEND = 'redis' if REDIS_URL else 'file'
+TRACKING_BUFFER_DIR = config('TRACKING_BUFFER_DIR', default=str(BASE_DIR / 'tracking_buffer'))
+TRACKING_BUFFER_STREAM = 'tracker:ingest'
+TRACKING_BUFFER_DRAIN_INTERVAL = config('TRACKING_BUFFER_DRAIN_INTERVAL', default=2.0, cast=float)
+
+# UserSession counters are buffered in Redis (tracker/session_counters.py) and
+# written in bulk by flush_session_counters this often. Without Redis they are
+# applied per event with F() expressions and the task is a no-op.
+SESSION_COUNTER_FLUSH_INTERVAL = config('SESSION_COUNTER_FLUSH_INTERVAL', default=30.0, cast=float)
+
+# Case exports stream straight to the client; past EXPORT_BACKGROUND_ROWS rows
+# (or on request) they run as the export_case_data task and are written to
+# default storage under EXPORT_STORAGE_DIR.
+EXPORT_BACKGROUND_ROWS = config('EXPORT_BACKGROUND_ROWS', default=250000, cast=int)
+EXPORT_STORAGE_DIR = config('EXPORT_STORAGE_DIR', default='exports')
+
+# Cold tier: archive_cold_events moves TrackingEvents older than
+# TRACKING_ARCHIVE_AFTER_DAYS into Parquet files (case/month partitions) under
+# TRACKING_ARCHIVE_URI — a local path or s3://bucket/prefix. Unset = disabled.
+# Needs pyarrow.
+TRACKING_ARCHIVE_URI = config('TRACKING_ARCHIVE_URI', default='')
+TRACKING_ARCHIVE_AFTER_DAYS = config('TRACKING_ARCHIVE_AFTER_DAYS', default=180, cast=int)
+
+# Detection metrics (tracker/metrics.py) served in Prometheus format at
+# /api/tracker/metrics/ — bearer METRICS_TOKEN, or staff sessions when unset.
+# METRICS_AGGREGATE (needs REDIS_URL) merges the snapshots every web / Celery
+# process publishes at most every METRICS_PUSH_INTERVAL seconds; a process
+# silent for METRICS_PROCESS_TTL seconds drops out.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_AGGREGATE = config('METRICS_AGGREGATE', default=False, cast=bool)
+METRICS_PUSH_INTERVAL = config('METRICS_PUSH_INTERVAL', default=15.0, cast=float)
+METRICS_PROCESS_TTL = config('METRICS_PROCESS_TTL', default=3600, cast=int)
+
+# Shared Redis client for the tracker (tracker/redis_pool.py): one pool of at
+# most REDIS_MAX_CONNECTIONS per process. After REDIS_BREAKER_FAILURES
+# consecutive connection errors / timeouts the circuit opens and callers use
+# the Django cache for REDIS_BREAKER_RESET seconds before Redis is retried.
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', default=50, cast=int)
+REDIS_SOCKET_TIMEOUT = config('REDIS_SOCKET_TIMEOUT', default=1.0, cast=float)
+REDIS_BREAKER_FAILURES = config('REDIS_BREAKER_FAILURES', default=3, cast=int)
+REDIS_BREAKER_RESET = config('REDIS_BREAKER_RESET', default=30.0, cast=float)
+
 try:
     from celery.schedules import crontab
     CELERY_BEAT_SCHEDULE = {
@@ -522,6 +573,18 @@ try:
             'schedule': crontab(hour=4, minute=0),  # 4 AM daily
             'options': {'queue': 'batch'},
         },
+        # Dashboard rollups: re-aggregate the open hour(s) into CaseHourlyRollup.
+        'update-hourly-rollups': {
+            'task': 'tracker.tasks.update_hourly_rollups',
+            'schedule': crontab(minute='*/5'),      # Every 5 minutes
+            'options': {'queue': 'batch'},
+        },
+        # Write the buffered UserSession counters in one bulk_update.
+        'flush-session-counters': {
+            'task': 'tracker.tasks.flush_session_counters',
+            'schedule': SESSION_COUNTER_FLUSH_INTERVAL,  # Seconds
+            'options': {'queue': 'batch'},
+        },
         # Celery health ping — shows up in flower / monitoring.
         'health-check': {
             'task': 'tracker.tasks.health_check',
@@ -529,5 +592,19 @@ try:
             'options': {'queue': 'batch'},
         },
     }
+    if TRACKING_ARCHIVE_URI:
+        # Move cold TrackingEvents into the Parquet archive.
+        CELERY_BEAT_SCHEDULE['archive-cold-events'] = {
+            'task': 'tracker.tasks.archive_cold_events',
+            'schedule': crontab(hour=2, minute=30),  # 2:30 AM daily
+            'options': {'queue': 'batch'},
+        }
+    if TRACKING_WRITE_BEHIND:
+        # Flush buffered tracker events into the database.
+        CELERY_BEAT_SCHEDULE['drain-tracking-buffer'] = {
+            'task': 'tracker.tasks.drain_tracking_buffer',
+            'schedule': TRACKING_BUFFER_DRAIN_INTERVAL,  # Seconds
+            'options': {'queue': 'realtime'},
+        }
 except ImportError:
     CELERY_BEAT_SCHEDULE = {}
\ No newline at end of file
@@ -9,6 +9,7 @@ from datetime import timedelta
 from django.contrib.auth import get_user_model
 from cases.models import Case
 from accounts.models import AccountRequest
+from tracker.presence import get_presence
 
 # Try to import models that might not exist yet
 try:
@@ -229,17 +230,19 @@ class RealtimeActivityView(APIView):
     
     def get(self, request):
         activities = []
-        active_users = 0
+        user = request.user
+        
+        # Get user's cases
+        if user.is_staff:
+            cases = Case.objects.all()
+        else:
+            cases = Case.objects.filter(user=user)
+        
+        # Visitors with an event in the last 5 minutes (tracker presence, kept
+        # at ingest; session rows only get last_activity on the counter flush)
+        active_users = sum(get_presence().count_many(cases.values_list('id', flat=True)).values())
         
         if TRACKING_ENABLED:
-            user = request.user
-            
-            # Get user's cases
-            if user.is_staff:
-                cases = Case.objects.all()
-            else:
-                cases = Case.objects.filter(user=user)
-            
             # Get activity from last 5 minutes
             recent_time = timezone.now() - timedelta(minutes=5)
             
@@ -257,24 +260,6 @@ class RealtimeActivityView(APIView):
                     'location': log.city,
                     'risk': log.suspicious_score
                 })
-            
-            # Count unique active users
-            active_users = recent_visitors.values('fingerprint').distinct().count()
-        else:
-            # Return mock data for development
-            import random
-            active_users = random.randint(0, 10)
-            if active_users > 0:
-                activities = [
-                    {
-                        'id': '1',
-                        'type': 'realtime',
-                        'description': 'Visitor from Milwaukee viewing case page',
-                        'time': timezone.now() - timedelta(minutes=1),
-                        'location': 'Milwaukee',
-                        'risk': 0.1
-                    }
-                ]
         
         return Response({
             'results': activities,
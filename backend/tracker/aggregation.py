@@ -0,0 +1,337 @@
+# backend/tracker/aggregation.py
+"""
+Single-pass aggregation planner for the dashboard helpers.
+
+get_visitor_trend, get_suspicious_trend, get_peak_hours, the weekday loop in
+analyze_temporal_patterns and the dashboard stats each asked the database for
+one number or one series at a time, mostly the same filtered COUNT / SUM over
+the same table with a different window or GROUP BY.
+
+plan_metrics() takes every metric a view needs for a case, as named Metric
+specs, and compiles them per source table:
+
+  * additive aggregates (SUM, non-distinct COUNT) of every window and every
+    grouping share ONE grouped query at the finest grain requested (local
+    day x hour of day, or hour bucket); each metric's window becomes a
+    conditional aggregate (`filter=`), and day / hour-of-day / weekday series
+    and totals are folded back out of the grouped rows in Python
+  * other aggregates (distinct counts, averages) share one query per grouping
+  * HyperLogLog unions and histograms over the rollups share one projection
+    of the rollup rows, each column NULLed outside the widest window that
+    needs it
+
+so a whole dashboard costs one or two queries per table.  Results come back as
+plain numbers / dicts / lists keyed by metric name; the helpers in views.py
+reshape them into their existing response formats.
+"""
+
+import copy
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import BinaryField, Case, Count, F, JSONField, Q, Sum, Value, When
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncDate, TruncHour
+from django.utils import timezone
+
+from .hll import merge_sketches
+from .models import Alert, CaseHourlyRollup, SuspiciousActivity, TrackingEvent, UserSession
+from .rollups import floor_hour
+
+logger = logging.getLogger(__name__)
+
+# source name -> (model, timestamp field)
+SOURCES = {
+    'rollups': (CaseHourlyRollup, 'hour'),
+    'events': (TrackingEvent, 'timestamp'),
+    'sessions': (UserSession, 'created_at'),
+    'activities': (SuspiciousActivity, 'created_at'),
+    'alerts': (Alert, 'created_at'),
+}
+
+DIMENSIONS = (None, 'day', 'hour', 'weekday', 'bucket')
+
+
+class Visitors:
+    """Distinct visitors: HyperLogLog union of the rollup sketches."""
+    column = 'visitor_sketch'
+    output_field = BinaryField
+
+
+class Histogram:
+    """Top values of a rollup histogram (referrers)."""
+    output_field = JSONField
+
+    def __init__(self, column, limit=10):
+        self.column = column
+        self.limit = limit
+
+
+class Metric:
+    """
+    One requested number or series.
+
+    source:    key of SOURCES
+    aggregate: a Django aggregate (Sum('events'), Count('id', filter=...)), or
+               Visitors() / Histogram(...) on the rollups
+    by:        None (a single value), 'day' (local date), 'hour' (local hour
+               of day), 'weekday' (Django week_day, 1=Sunday) or 'bucket'
+               (UTC hour bucket)
+    hours:     window ending now; days: window of whole local days ending
+               today (series are zero-filled over it)
+    """
+
+    __slots__ = ('source', 'aggregate', 'by', 'hours', 'days')
+
+    def __init__(self, source, aggregate, by=None, hours=None, days=None):
+        if source not in SOURCES:
+            raise ValueError(f"Unknown metric source: {source}")
+        if by not in DIMENSIONS:
+            raise ValueError(f"Unknown metric dimension: {by}")
+        self.source = source
+        self.aggregate = aggregate
+        self.by = by
+        self.hours = hours
+        self.days = days
+
+    @property
+    def is_row_metric(self):
+        return isinstance(self.aggregate, (Visitors, Histogram))
+
+    @property
+    def is_additive(self):
+        """Partial results can be summed across groups (SUM, non-distinct COUNT)."""
+        aggregate = self.aggregate
+        if isinstance(aggregate, Sum):
+            return True
+        return isinstance(aggregate, Count) and not aggregate.distinct
+
+    def since(self, now):
+        if self.days:
+            first_day = timezone.localdate(now) - timedelta(days=self.days - 1)
+            return timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+        if self.hours:
+            return now - timedelta(hours=self.hours)
+        return None
+
+
+def _django_week_day(day):
+    """date -> Django week_day (1=Sunday .. 7=Saturday)."""
+    return day.isoweekday() % 7 + 1
+
+
+class _Plan:
+    """Compiled metrics for one case; run() returns {name: value}."""
+
+    def __init__(self, case, metrics, now):
+        self.case = case
+        self.metrics = metrics
+        self.now = now
+        self.results = {}
+
+    # ── helpers ──────────────────────────────────────────────────────────────
+
+    def _window_start(self, metric):
+        if metric.by == 'bucket' and metric.hours:
+            # exactly `hours` whole buckets, the current one included
+            return floor_hour(self.now) - timedelta(hours=metric.hours - 1)
+        since = metric.since(self.now)
+        if since is not None and metric.source == 'rollups' and not metric.days:
+            since = floor_hour(since)
+        return since
+
+    def _base(self, source, metrics):
+        model, time_field = SOURCES[source]
+        qs = model.objects.filter(case=self.case).order_by()
+        starts = [self._window_start(m) for m in metrics]
+        if starts and all(s is not None for s in starts):
+            qs = qs.filter(**{f'{time_field}__gte': min(starts)})
+        return qs, time_field
+
+    def _windowed(self, metric, time_field):
+        """The metric's aggregate restricted to its window via `filter=`."""
+        aggregate = metric.aggregate
+        since = self._window_start(metric)
+        if since is None:
+            return aggregate
+        aggregate = copy.copy(aggregate)
+        window = Q(**{f'{time_field}__gte': since})
+        aggregate.filter = window & aggregate.filter if aggregate.filter else window
+        return aggregate
+
+    def _empty_series(self, metric):
+        if metric.by == 'hour':
+            return {hour: 0 for hour in range(24)}
+        if metric.by == 'weekday':
+            return {day: 0 for day in range(1, 8)}
+        if metric.by == 'day' and metric.days:
+            first_day = self._window_start(metric).date()
+            return {first_day + timedelta(days=i): 0 for i in range(metric.days)}
+        if metric.by == 'bucket' and metric.hours:
+            last = floor_hour(self.now)
+            return {last - timedelta(hours=i): 0 for i in range(metric.hours - 1, -1, -1)}
+        return {}
+
+    # ── compilation ──────────────────────────────────────────────────────────
+
+    def run(self):
+        by_source = defaultdict(list)
+        for name, metric in self.metrics.items():
+            by_source[metric.source].append((name, metric))
+
+        for source, named in by_source.items():
+            rows, additive = [], []
+            grouped = defaultdict(list)
+            for name, metric in named:
+                if metric.is_row_metric:
+                    rows.append((name, metric))
+                elif metric.by and metric.is_additive:
+                    additive.append((name, metric))
+                else:
+                    grouped[metric.by].append((name, metric))
+            if additive and None in grouped:
+                # additive totals ride along in the grouped query (sum of all groups)
+                totals = grouped.pop(None)
+                additive.extend((n, m) for n, m in totals if m.is_additive)
+                rest = [(n, m) for n, m in totals if not m.is_additive]
+                if rest:
+                    grouped[None] = rest
+            if rows:
+                self._run_rows(source, rows)
+            if additive:
+                self._run_additive(source, additive)
+            for by, group in grouped.items():
+                if by is None:
+                    self._run_totals(source, group)
+                else:
+                    self._run_grouped(source, by, group)
+        return self.results
+
+    def _run_totals(self, source, named):
+        qs, time_field = self._base(source, [m for _n, m in named])
+        values = qs.aggregate(**{name: self._windowed(m, time_field) for name, m in named})
+        for name, _metric in named:
+            self.results[name] = values[name] or 0
+
+    def _run_grouped(self, source, by, named):
+        """Non-additive aggregates, one GROUP BY on the requested dimension."""
+        qs, time_field = self._base(source, [m for _n, m in named])
+        key = {
+            'day': TruncDate(time_field),
+            'hour': ExtractHour(time_field),
+            'weekday': ExtractWeekDay(time_field),
+            'bucket': TruncHour(time_field),
+        }[by]
+        series = {name: self._empty_series(m) for name, m in named}
+        for row in qs.annotate(_key=key).values('_key').annotate(
+            **{name: self._windowed(m, time_field) for name, m in named}
+        ):
+            for name, _metric in named:
+                series[name][row['_key']] = row[name] or 0
+        self.results.update(series)
+
+    def _run_additive(self, source, named):
+        """
+        Every additive series of the source in one GROUP BY at the finest grain
+        needed: hour buckets, or (local day, hour of day).
+        """
+        qs, time_field = self._base(source, [m for _n, m in named])
+        dims = {m.by for _n, m in named}
+        if 'bucket' in dims:
+            qs = qs.annotate(_bucket=TruncHour(time_field)).values('_bucket')
+        else:
+            keys = {}
+            if dims & {'day', 'weekday'}:
+                keys['_day'] = TruncDate(time_field)
+            if 'hour' in dims:
+                keys['_hour'] = ExtractHour(time_field)
+            qs = qs.annotate(**keys).values(*keys)
+
+        series = {name: self._empty_series(m) for name, m in named}
+        for row in qs.annotate(**{name: self._windowed(m, time_field) for name, m in named}):
+            if '_bucket' in row:
+                local = timezone.localtime(row['_bucket'])
+                parts = {'bucket': row['_bucket'], 'day': local.date(), 'hour': local.hour}
+            else:
+                parts = {'day': row.get('_day'), 'hour': row.get('_hour')}
+            if parts['day'] is not None:
+                parts['weekday'] = _django_week_day(parts['day'])
+            parts[None] = None
+            for name, metric in named:
+                value = row[name]
+                if value:
+                    key = parts[metric.by]
+                    series[name][key] = series[name].get(key, 0) + value
+        for name, metric in named:
+            self.results[name] = series[name].get(None, 0) if metric.by is None else series[name]
+
+    def _run_rows(self, source, named):
+        """HyperLogLog unions and histograms from one projection of the rollup rows."""
+        if source != 'rollups':
+            raise ValueError("Visitors() / Histogram() metrics read the rollups")
+        qs, time_field = self._base(source, [m for _n, m in named])
+
+        # one column per rollup field, NULL outside the widest window using it
+        columns = {}
+        for _name, metric in named:
+            column = metric.aggregate.column
+            since = self._window_start(metric)
+            if column not in columns:
+                columns[column] = (since, metric.aggregate.output_field)
+            else:
+                widest = columns[column][0]
+                columns[column] = (
+                    None if widest is None or since is None else min(widest, since),
+                    metric.aggregate.output_field,
+                )
+        projection = {}
+        for column, (since, output_field) in columns.items():
+            if since is None:
+                projection[f'_{column}'] = F(column)
+            else:
+                projection[f'_{column}'] = Case(
+                    When(**{f'{time_field}__gte': since}, then=column),
+                    default=Value(None), output_field=output_field(),
+                )
+
+        sketches = defaultdict(lambda: defaultdict(list))
+        histograms = defaultdict(Counter)
+        starts = {name: self._window_start(m) for name, m in named}
+        for row in qs.annotate(**projection).values(time_field, *projection):
+            hour = row[time_field]
+            day = None
+            for name, metric in named:
+                since = starts[name]
+                if since is not None and hour < since:
+                    continue
+                value = row[f'_{metric.aggregate.column}']
+                if not value:
+                    continue
+                if isinstance(metric.aggregate, Histogram):
+                    histograms[name].update(value)
+                elif metric.by == 'day':
+                    day = day or timezone.localtime(hour).date()
+                    sketches[name][day].append(value)
+                else:
+                    sketches[name][None].append(value)
+
+        for name, metric in named:
+            if isinstance(metric.aggregate, Histogram):
+                self.results[name] = histograms[name].most_common(metric.aggregate.limit)
+            elif metric.by == 'day':
+                series = self._empty_series(metric)
+                for day, blobs in sketches[name].items():
+                    series[day] = merge_sketches(blobs).count()
+                self.results[name] = series
+            else:
+                self.results[name] = merge_sketches(sketches[name][None]).count()
+
+
+def plan_metrics(case, metrics, now=None):
+    """
+    Compute named Metric specs for a case in as few queries as possible.
+    Returns {name: value}: a number for ungrouped metrics, {key: value} for
+    grouped ones (zero-filled where the window is known) and [(value, count)]
+    for histograms.
+    """
+    return _Plan(case, metrics, now or timezone.now()).run()
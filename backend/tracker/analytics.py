@@ -0,0 +1,248 @@
+# backend/tracker/analytics.py
+"""
+Cached dashboard analytics service.
+
+The same dashboard numbers used to be computed in four places, each with its
+own queries and caching rules: DashboardAnalytics (cached 5 minutes per
+case), a second DashboardAnalytics in tracker/utils (unused), the helpers
+behind the views.py widget endpoints (not cached) and the get_*_widget
+helpers in dashboard_views.py (cached 2 minutes per case *and user*, as one
+blob).
+
+Every dashboard metric is now declared once in METRICS: the function that
+computes it and how long a result stays fresh.  AnalyticsService reads them
+through the cache:
+
+  * get_many() fetches all of a page's widgets with one cache round trip
+  * a fresh entry is returned as is
+  * a stale entry (past `ttl`, still within `stale`) is returned at once and
+    refreshed in the background (refresh_analytics_metric task),
+    stale-while-revalidate
+  * on a miss, one caller computes (single-flight, a cache.add() lock) and
+    the others wait briefly for its result instead of running the same
+    aggregate concurrently
+"""
+
+import hashlib
+import logging
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'analytics:v1'
+LOCK_TTL = 60               # seconds a recomputation may hold the lock
+MISS_WAIT_SECONDS = 3.0     # how long a miss waits for another worker's result
+MISS_POLL_SECONDS = 0.05
+
+
+class MetricSpec:
+    """
+    A registered metric: `compute` is the dotted path of a function taking
+    (case, **params); results are fresh for `ttl` seconds and served stale,
+    while being refreshed, for `stale` seconds more.
+    """
+
+    __slots__ = ('compute', 'ttl', 'stale', '_func')
+
+    def __init__(self, compute, ttl, stale=None):
+        self.compute = compute
+        self.ttl = ttl
+        self.stale = stale if stale is not None else ttl * 4
+        self._func = None
+
+    @property
+    def func(self):
+        if self._func is None:
+            self._func = import_string(self.compute)
+        return self._func
+
+
+METRICS = {
+    # dashboard overview (dashboard_views.dashboard_overview)
+    'overview_stats': MetricSpec('tracker.dashboard_analytics.get_overview_stats', ttl=300),
+    'visitor_metrics': MetricSpec('tracker.dashboard_views.get_visitor_metrics_widget', ttl=60),
+    'suspicious_activity': MetricSpec('tracker.dashboard_views.get_suspicious_activity_widget', ttl=30),
+    'geographic_map': MetricSpec('tracker.dashboard_views.get_geographic_map_widget', ttl=600),
+    'activity_timeline': MetricSpec('tracker.dashboard_views.get_activity_timeline_widget', ttl=60),
+    'engagement_metrics': MetricSpec('tracker.dashboard_views.get_engagement_metrics_widget', ttl=300),
+    'alerts_panel': MetricSpec('tracker.dashboard_views.get_alerts_panel_widget', ttl=15, stale=30),
+    'device_breakdown': MetricSpec('tracker.dashboard_views.get_device_breakdown_widget', ttl=600),
+    'referrer_sources': MetricSpec('tracker.dashboard_views.get_referrer_sources_widget', ttl=600),
+    'realtime_metrics': MetricSpec('tracker.dashboard_views.get_realtime_metrics', ttl=5, stale=10),
+    'family_analytics': MetricSpec('tracker.dashboard_views.get_family_analytics', ttl=300),
+
+    # legacy overview / patterns (views.py)
+    'case_summary': MetricSpec('tracker.views.get_case_summary', ttl=300),
+    'temporal_patterns': MetricSpec('tracker.views.analyze_temporal_patterns', ttl=600),
+    'navigation_patterns': MetricSpec('tracker.views.analyze_navigation_patterns', ttl=600),
+    'interaction_patterns': MetricSpec('tracker.views.analyze_interaction_patterns', ttl=600),
+}
+
+
+def _case_id(case):
+    return getattr(case, 'pk', case)
+
+
+def _cache_key(case_id, name, params):
+    key = f'{CACHE_PREFIX}:{case_id}:{name}'
+    if params:
+        encoded = '&'.join(f'{k}={params[k]}' for k in sorted(params))
+        key += ':' + hashlib.md5(encoded.encode()).hexdigest()[:12]
+    return key
+
+
+def _lock_key(key):
+    return key + ':lock'
+
+
+def _release_lock(key, token):
+    """
+    Drop a recomputation lock only while it is still ours: a compute that
+    outlived LOCK_TTL must not delete the lock a second worker has taken since.
+    """
+    lock = _lock_key(key)
+    try:
+        if token is not None and cache.get(lock) == token:
+            cache.delete(lock)
+    except Exception as e:
+        logger.debug(f"analytics: could not release {lock}: {e}")
+
+
+class AnalyticsService:
+    """Read-through cache in front of the METRICS registry."""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else METRICS
+
+    def spec(self, name):
+        try:
+            return self.metrics[name]
+        except KeyError:
+            raise ValueError(f"Unknown analytics metric: {name}")
+
+    # ── reads ────────────────────────────────────────────────────────────────
+
+    def get(self, case, name, **params):
+        """One metric for a case (computed on a miss)."""
+        return self.get_many(case, [(name, params)])[name]
+
+    def get_many(self, case, names, errors=None):
+        """
+        Several metrics with one cache round trip. `names` holds metric names
+        or (name, params) pairs; returns {name: value}.
+
+        A metric that fails to compute raises, unless an `errors` dict is
+        given: then the failure is recorded there as {name: message} and the
+        name is left out of the result.
+        """
+        requests = [(n, {}) if isinstance(n, str) else (n[0], dict(n[1] or {})) for n in names]
+        keys = {name: _cache_key(_case_id(case), name, params) for name, params in requests}
+        try:
+            entries = cache.get_many(list(keys.values()))
+        except Exception as e:
+            logger.debug(f"analytics: cache read failed: {e}")
+            entries = {}
+
+        now = time.time()
+        results = {}
+        for name, params in requests:
+            key = keys[name]
+            entry = entries.get(key)
+            try:
+                if entry is None:
+                    results[name] = self._fill(case, name, params, key)
+                    continue
+                if entry['fresh_until'] <= now:
+                    self._revalidate(case, name, params, key)
+                results[name] = entry['value']
+            except Exception as e:
+                if errors is None:
+                    raise
+                logger.warning(f"analytics: {name} failed for case {_case_id(case)}: {e}")
+                errors[name] = f"{type(e).__name__}: {e}"
+        return results
+
+    def invalidate(self, case, *names, **params):
+        """Drop cached values (all registered metrics when no names are given)."""
+        case_id = _case_id(case)
+        cache.delete_many([_cache_key(case_id, name, params) for name in (names or self.metrics)])
+
+    # ── computation ──────────────────────────────────────────────────────────
+
+    def compute(self, case, name, params=None):
+        """Run the metric and store it (no lock handling)."""
+        spec = self.spec(name)
+        params = params or {}
+        # a failed aggregate must not poison the caller's transaction
+        with transaction.atomic():
+            value = spec.func(case, **params)
+        entry = {
+            'value': value,
+            'fresh_until': time.time() + spec.ttl,
+            'computed_at': timezone.now().isoformat(),
+        }
+        try:
+            cache.set(_cache_key(_case_id(case), name, params), entry, spec.ttl + spec.stale)
+        except Exception as e:
+            logger.debug(f"analytics: cache write failed for {name}: {e}")
+        return value
+
+    def _fill(self, case, name, params, key):
+        """Miss: compute once (single-flight); concurrent callers wait for it."""
+        token = uuid.uuid4().hex
+        if cache.add(_lock_key(key), token, LOCK_TTL):
+            try:
+                return self.compute(case, name, params)
+            finally:
+                _release_lock(key, token)
+
+        deadline = time.monotonic() + MISS_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(MISS_POLL_SECONDS)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        # the other worker is slow or died: compute it ourselves
+        return self.compute(case, name, params)
+
+    def _revalidate(self, case, name, params, key):
+        """Stale hit: refresh in the background unless someone already is."""
+        token = uuid.uuid4().hex
+        if not cache.add(_lock_key(key), token, LOCK_TTL):
+            return
+        try:
+            from .tasks import refresh_analytics_metric
+            refresh_analytics_metric.delay(_case_id(case), name, params, token)
+        except Exception as e:
+            logger.debug(f"analytics: could not queue refresh of {name}, refreshing inline: {e}")
+            try:
+                self.compute(case, name, params)
+            finally:
+                _release_lock(key, token)
+
+    def refresh(self, case_id, name, params=None, token=None):
+        """
+        Task entry point: recompute a metric and release the refresh lock
+        taken with `token` (left to expire when no token is given).
+        """
+        from cases.models import Case
+
+        key = _cache_key(case_id, name, params or {})
+        try:
+            case = Case.objects.get(pk=case_id)
+            return self.compute(case, name, params)
+        finally:
+            _release_lock(key, token)
+
+
+_service = AnalyticsService()
+
+
+def get_analytics():
+    return _service
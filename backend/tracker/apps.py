@@ -13,6 +13,8 @@ class TrackerConfig(AppConfig):
 
     def ready(self):
         """Initialize the ML detection system when Django starts."""
+        import tracker.signals  # noqa: F401
+
         import os
         # Skip during test collection, migrations, and other non-server commands
         # to keep startup fast.
@@ -0,0 +1,381 @@
+# backend/tracker/archive.py
+"""
+Cold-tier archive for TrackingEvent.
+
+Events are wide (user agent, event_data JSON, geo) and were never removed.
+Only cleanup_old_analyses pruned anything, and it covers low-severity
+SuspiciousActivity rows.  archive_events() moves events older than
+TRACKING_ARCHIVE_AFTER_DAYS out of the hot table into Parquet files:
+
+    <TRACKING_ARCHIVE_URI>/case=<id>/month=<YYYY-MM>/part-<uuid>.parquet
+
+Each file is hive-partitioned by case and month.  Every concrete column is
+kept, so an archived row round-trips.  JSON fields are stored as JSON text,
+and each file is written in row groups of the chunk size.  The URI is a local
+path or anything pyarrow.fs understands (s3://bucket/prefix, gs://...).
+
+For each (case, month) partition, rows are read with keyset pagination on
+(timestamp, id).  The rows are deleted only after their part file is closed,
+and in at most ARCHIVE_PART_ROWS ids at a time.  A crash therefore leaves
+either nothing archived or rows that are both archived and still hot.  Never
+lost.  The next run skips ids already in the partition's part files and only
+deletes them, so a row is never archived twice; readers that combine both
+tiers skip archived ids that are still hot.  Events linked as evidence to a
+SuspiciousActivity (related_events) stay hot.
+
+scan_archive() is the read path.  It applies the partition filters first:
+whole case/month directories are skipped.  The timestamp / fingerprint
+predicates then go down to the Parquet row-group statistics, and only the
+requested columns are read.  Exports, train_ml and long-range visitor
+histories (get_user_profile) read the archive after the hot table when their
+range starts before archive_cutoff() — nothing newer is ever archived.
+
+pyarrow is optional: without it archiving is disabled and readers see no
+archived rows.
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CHUNK = 5000            # rows per DB page / Parquet row group
+ARCHIVE_PART_ROWS = 250_000     # rows per part file (bounds the pending-delete ids)
+
+
+class ArchiveUnavailable(RuntimeError):
+    pass
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset  # noqa: F401
+        import pyarrow.fs  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return pyarrow
+    except ImportError as e:
+        raise ArchiveUnavailable(f"pyarrow not installed ({e}); pip install pyarrow") from e
+
+
+def archive_enabled():
+    if not getattr(settings, 'TRACKING_ARCHIVE_URI', ''):
+        return False
+    try:
+        require_pyarrow()
+        return True
+    except ArchiveUnavailable:
+        return False
+
+
+def archive_cutoff(now=None):
+    """Events older than this are archived; newer ones are always hot."""
+    return (now or timezone.now()) - timedelta(days=settings.TRACKING_ARCHIVE_AFTER_DAYS)
+
+
+def reaches_archive(since):
+    """True when a read starting at `since` (None = all time) may need archived rows."""
+    return archive_enabled() and (since is None or since < archive_cutoff())
+
+
+def _filesystem():
+    pa = require_pyarrow()
+    uri = settings.TRACKING_ARCHIVE_URI
+    if '://' not in uri:
+        local = pa.fs.LocalFileSystem()
+        local.create_dir(uri, recursive=True)
+        return local, uri.rstrip('/')
+    fs, root = pa.fs.FileSystem.from_uri(uri)
+    return fs, root.rstrip('/')
+
+
+# ============================================
+# SCHEMA
+# ============================================
+
+def _columns():
+    from .models import TrackingEvent
+    return [field for field in TrackingEvent._meta.concrete_fields]
+
+
+def _arrow_type(field):
+    pa = require_pyarrow()
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    return pa.string()      # char / text / UUID / IP / JSON text
+
+
+def archive_schema():
+    pa = require_pyarrow()
+    return pa.schema([pa.field(field.attname, _arrow_type(field)) for field in _columns()])
+
+
+def _encoder(field):
+    """Per-column converter to the Arrow value (None: stored as is)."""
+    if isinstance(field, models.JSONField):
+        return lambda value: None if value is None else json.dumps(value, default=str)
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.UUIDField):
+        return lambda value: None if value is None else str(value)
+    return None
+
+
+def _decode(name, value, json_columns):
+    if value is not None and name in json_columns:
+        return json.loads(value)
+    return value
+
+
+# ============================================
+# WRITE (tiering job)
+# ============================================
+
+def _partitions(cutoff, case_id=None):
+    """(case_id, month start) pairs holding archivable events, oldest first."""
+    from django.db.models.functions import TruncMonth
+    from .models import TrackingEvent
+
+    qs = TrackingEvent.objects.filter(timestamp__lt=cutoff)
+    if case_id is not None:
+        qs = qs.filter(case_id=case_id)
+    return list(
+        qs.annotate(month=TruncMonth('timestamp', tzinfo=dt_timezone.utc))
+        .values_list('case_id', 'month').distinct().order_by('month', 'case_id')
+    )
+
+
+def _month_bounds(month):
+    start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+class _PartWriter:
+    """One part file of a partition; rows land in row groups of a chunk."""
+
+    def __init__(self, fs, directory, schema):
+        pa = require_pyarrow()
+        self.fs = fs
+        self.path = f'{directory}/part-{uuid.uuid4().hex}.parquet'
+        self.tmp_path = self.path + '.tmp'
+        fs.create_dir(directory, recursive=True)
+        self._sink = fs.open_output_stream(self.tmp_path)
+        self._writer = pa.parquet.ParquetWriter(self._sink, schema, compression='zstd')
+        self.schema = schema
+        self.ids = []
+
+    def write(self, columns, rows):
+        pa = require_pyarrow()
+        arrays = []
+        for field, values in zip(columns, zip(*rows)):
+            encode = _encoder(field)
+            if encode is not None:
+                values = [encode(value) for value in values]
+            arrays.append(pa.array(values, type=self.schema.field(field.attname).type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.ids.extend(row[0] for row in rows)
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+        self.fs.move(self.tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self._writer.close()
+            self._sink.close()
+            self.fs.delete_file(self.tmp_path)
+        except Exception as e:
+            logger.debug(f"archive: could not remove {self.tmp_path}: {e}")
+
+
+def _partition_ids(case_label, month_label):
+    """Ids already written to one partition (str), e.g. by a run that crashed before deleting."""
+    pa = require_pyarrow()
+    ds = pa.dataset
+    expression = (ds.field('case') == case_label) & (ds.field('month') == month_label)
+    return {
+        str(value)
+        for batch in _dataset().to_batches(columns=['id'], filter=expression)
+        for value in batch.column(0).to_pylist()
+    }
+
+
+def _delete_archived(ids, chunk_size):
+    from .models import TrackingEvent
+
+    deleted = 0
+    for start in range(0, len(ids), chunk_size):
+        # The rows are moved, not deleted: no delete signals, no cascade
+        # collection (evidence-linked events were never archived), so a plain
+        # DELETE ... WHERE id IN (...) instead of QuerySet.delete() loading
+        # every instance
+        qs = TrackingEvent.objects.filter(pk__in=ids[start:start + chunk_size])
+        with transaction.atomic():
+            deleted += qs._raw_delete(qs.db)
+    return deleted
+
+
+def archive_events(case_id=None, chunk_size=ARCHIVE_CHUNK, part_rows=ARCHIVE_PART_ROWS, dry_run=False):
+    """
+    Move events older than TRACKING_ARCHIVE_AFTER_DAYS into the Parquet
+    archive. Returns {'partitions': n, 'archived': rows, 'deleted': rows,
+    'files': n}.
+    """
+    from .models import TrackingEvent
+
+    cutoff = archive_cutoff()
+    partitions = _partitions(cutoff, case_id)
+    stats = {'partitions': len(partitions), 'archived': 0, 'deleted': 0, 'files': 0}
+    if dry_run or not partitions:
+        return stats
+
+    fs, root = _filesystem()
+    schema = archive_schema()
+    columns = _columns()
+    names = [field.attname for field in columns]
+    assert names[0] == 'id'
+
+    for partition_case, month in partitions:
+        start, end = _month_bounds(month)
+        case_label = str(partition_case) if partition_case is not None else 'none'
+        directory = f'{root}/case={case_label}/month={start:%Y-%m}'
+        already_archived = _partition_ids(case_label, f'{start:%Y-%m}')
+        stale = []  # archived by an earlier run, still hot: delete only
+        base = TrackingEvent.objects.filter(timestamp__gte=start, timestamp__lt=min(end, cutoff))
+        if partition_case is not None:
+            base = base.filter(case_id=partition_case)
+        else:
+            base = base.filter(case__isnull=True)
+        base = base.filter(suspiciousactivity__isnull=True).order_by('timestamp', 'id')
+
+        part = None
+        last = None
+        try:
+            while True:
+                page = base
+                if last is not None:
+                    page = page.filter(Q(timestamp__gt=last[0]) | Q(timestamp=last[0], id__gt=last[1]))
+                rows = list(page.values_list(*names)[:chunk_size])
+                if not rows:
+                    break
+                last = (rows[-1][names.index('timestamp')], rows[-1][0])
+                if already_archived:
+                    stale.extend(row[0] for row in rows if str(row[0]) in already_archived)
+                    rows = [row for row in rows if str(row[0]) not in already_archived]
+                    if not rows:
+                        continue
+                if part is None:
+                    part = _PartWriter(fs, directory, schema)
+                part.write(columns, rows)
+                stats['archived'] += len(rows)
+                if len(part.ids) >= part_rows:
+                    part.close()
+                    stats['files'] += 1
+                    stats['deleted'] += _delete_archived(part.ids, chunk_size)
+                    part = None
+            if part is not None:
+                part.close()
+                stats['files'] += 1
+                stats['deleted'] += _delete_archived(part.ids, chunk_size)
+                part = None
+            stats['deleted'] += _delete_archived(stale, chunk_size)
+        finally:
+            if part is not None:
+                part.abort()
+        logger.debug(f"archive: case {partition_case} {start:%Y-%m} done ({stats['archived']} rows so far)")
+    return stats
+
+
+# ============================================
+# READ
+# ============================================
+
+def _dataset():
+    pa = require_pyarrow()
+    fs, root = _filesystem()
+    partitioning = pa.dataset.partitioning(
+        pa.schema([('case', pa.string()), ('month', pa.string())]), flavor='hive',
+    )
+    # the current schema, so files written before a column was added read
+    # it as null instead of failing the scan
+    schema = archive_schema().append(pa.field('case', pa.string())).append(pa.field('month', pa.string()))
+    return pa.dataset.dataset(
+        root, schema=schema, filesystem=fs, format='parquet', partitioning=partitioning,
+        exclude_invalid_files=True, ignore_prefixes=['.', '_'],
+    )
+
+
+def scan_archive(case_id=None, since=None, until=None, fingerprint_hash=None,
+                 columns=None, batch_size=ARCHIVE_CHUNK):
+    """
+    Archived events matching the filters as dicts of model attnames
+    (JSON fields decoded). Nothing is yielded when the archive is disabled.
+    """
+    if not archive_enabled():
+        return
+    pa = require_pyarrow()
+    ds = pa.dataset
+    try:
+        dataset = _dataset()
+    except Exception as e:
+        logger.debug(f"archive: no dataset to scan: {e}")
+        return
+
+    expression = None
+
+    def _and(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if case_id is not None:
+        _and(ds.field('case') == str(case_id))
+    if since is not None:
+        _and(ds.field('month') >= f'{since.astimezone(dt_timezone.utc):%Y-%m}')
+        _and(ds.field('timestamp') >= pa.scalar(since, type=pa.timestamp('us', tz='UTC')))
+    if until is not None:
+        _and(ds.field('month') <= f'{until.astimezone(dt_timezone.utc):%Y-%m}')
+        _and(ds.field('timestamp') <= pa.scalar(until, type=pa.timestamp('us', tz='UTC')))
+    if fingerprint_hash:
+        _and(ds.field('fingerprint_hash') == fingerprint_hash)
+
+    json_columns = {f.attname for f in _columns() if isinstance(f, models.JSONField)}
+    columns = list(columns) if columns else [f.attname for f in _columns()]
+    for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+        data = batch.to_pydict()
+        for values in zip(*(data[name] for name in columns)):
+            yield {name: _decode(name, value, json_columns) for name, value in zip(columns, values)}
+
+
+def archived_rows(case_id=None, since=None, until=None, fingerprint_hash=None, columns=None):
+    """scan_archive() for readers that must not fail because of the archive."""
+    try:
+        yield from scan_archive(case_id, since, until, fingerprint_hash, columns)
+    except Exception as e:
+        logger.warning(f"archive: scan failed: {e}")
+
+
+def parse_datetime_bound(value):
+    """Export date_from / date_to (ISO date or datetime string) -> aware datetime."""
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(str(value))
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
@@ -0,0 +1,376 @@
+# backend/tracker/cardinality.py
+"""
+Distinct-visitor counts per case and UTC day, backed by HyperLogLog.
+
+Nearly every dashboard metric used to be
+`values('fingerprint_hash').distinct().count()` over a case's events: total
+visitors, visitors_7d / 30d, this_week / last_week in family_analytics,
+DashboardAnalytics._get_unique_visitors.  Each one scanned the case's index.
+
+VisitorCardinality keeps one sketch per (case, day):
+
+  * with REDIS_URL set, a native Redis HyperLogLog (PFADD at ingest, PFCOUNT
+    over any set of day keys for the union)
+  * otherwise a tracker.hll sketch in the Django cache
+
+Ingest adds every saved event's fingerprint to its day (record_visitors()).
+The first read of a day also unions in that day's distinct fingerprints from
+the database, and from the Parquet archive for days before archive_cutoff(),
+once, so days that predate the service (or were evicted) are complete; HLL
+unions are idempotent, so seeding after ingest never double-counts.  A count over N days touches N sketches, whatever the traffic.
+
+Rolling windows (count_window / count_since) use the day sketches for the
+whole UTC days inside the window and read the distinct fingerprints of the
+partial days at either edge from the database, so "last 7 days" means the
+last 7 * 24 hours, not 8 calendar days.
+
+A process-local cache (locmem, dummy) cannot hold the sketches: every ingest
+process would count only its own events.  Without Redis and a shared cache,
+counts are exact distinct queries instead.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .hll import HyperLogLog, merge_sketches
+
+logger = logging.getLogger(__name__)
+
+DAY_SKETCH_TTL = 400 * 86400
+SEED_CHUNK = 5000
+
+
+def _day_key(case_id, day):
+    return f'hll:visitors:{case_id}:{day:%Y%m%d}'
+
+
+def _seeded_key(case_id, day):
+    return _day_key(case_id, day) + ':seeded'
+
+
+def _first_day_key(case_id):
+    return f'hll:visitors:{case_id}:first'
+
+
+def utc_day(dt):
+    return dt.astimezone(dt_timezone.utc).date()
+
+
+def day_start(day):
+    return datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc)
+
+
+def day_range(start_day, end_day):
+    """Inclusive list of dates from start_day to end_day."""
+    return [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+
+
+def _runs(days):
+    """Sorted days -> [(first, last)] runs of consecutive days."""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+def _day_fingerprints(case_id, days):
+    """
+    (day, fingerprint) for every distinct visitor of the case on the given UTC
+    days (seed source): one grouped query per run of consecutive days, plus
+    the archived events for runs older than archive_cutoff().  Pairs may
+    repeat; unions are idempotent.
+    """
+    from .archive import archived_rows, reaches_archive
+    from .models import TrackingEvent
+
+    for first, last in _runs(days):
+        start = day_start(first)
+        end = day_start(last) + timedelta(days=1)
+        yield from (
+            TrackingEvent.objects.filter(case_id=case_id, timestamp__gte=start, timestamp__lt=end)
+            .exclude(fingerprint_hash='')
+            .annotate(day=TruncDate('timestamp', tzinfo=dt_timezone.utc))
+            .order_by()
+            .values_list('day', 'fingerprint_hash')
+            .distinct()
+            .iterator(chunk_size=SEED_CHUNK)
+        )
+        if reaches_archive(start):
+            for row in archived_rows(case_id=case_id, since=start, until=end,
+                                     columns=['timestamp', 'fingerprint_hash']):
+                if row['fingerprint_hash'] and row['timestamp'] < end:
+                    yield utc_day(row['timestamp']), row['fingerprint_hash']
+
+
+def _range_fingerprints(case_id, start, end):
+    """Distinct fingerprints of the case's events with start <= timestamp < end."""
+    from .archive import archived_rows, reaches_archive
+    from .models import TrackingEvent
+
+    fingerprints = set(
+        TrackingEvent.objects.filter(case_id=case_id, timestamp__gte=start, timestamp__lt=end)
+        .exclude(fingerprint_hash='')
+        .order_by()
+        .values_list('fingerprint_hash', flat=True)
+        .distinct()
+        .iterator(chunk_size=SEED_CHUNK)
+    )
+    if reaches_archive(start):
+        for row in archived_rows(case_id=case_id, since=start, until=end,
+                                 columns=['timestamp', 'fingerprint_hash']):
+            if row['fingerprint_hash'] and row['timestamp'] < end:
+                fingerprints.add(row['fingerprint_hash'])
+    return fingerprints
+
+
+def _exact_count(case_id, ranges):
+    """
+    Exact distinct visitors over [(start, end)] ranges (no shared sketch
+    store); end None is open-ended.
+    """
+    from .archive import reaches_archive
+    from .models import TrackingEvent
+
+    if len(ranges) == 1 and not reaches_archive(ranges[0][0]):
+        start, end = ranges[0]
+        events = TrackingEvent.objects.filter(case_id=case_id, timestamp__gte=start)
+        if end is not None:
+            events = events.filter(timestamp__lt=end)
+        return (
+            events
+            .exclude(fingerprint_hash='')
+            .values('fingerprint_hash')
+            .distinct()
+            .count()
+        )
+    fingerprints = set()
+    for start, end in ranges:
+        fingerprints |= _range_fingerprints(case_id, start, end or timezone.now() + timedelta(days=1))
+    return len(fingerprints)
+
+
+def _cache_is_shared():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+class VisitorCardinality:
+    """Per-(case, day) distinct-visitor sketches."""
+
+    def _redis(self):
+        from .redis_pool import get_redis
+        return get_redis()
+
+    # ── write path (ingest) ──────────────────────────────────────────────────
+
+    def record(self, events):
+        """Add just-saved events' fingerprints to their (case, day) sketches."""
+        by_key = defaultdict(set)
+        for event in events:
+            if getattr(event, 'case_id', None) and getattr(event, 'fingerprint_hash', ''):
+                by_key[_day_key(event.case_id, utc_day(event.timestamp))].add(event.fingerprint_hash)
+        if not by_key:
+            return
+
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, fingerprints in by_key.items():
+                    pipe.pfadd(key, *fingerprints)
+                    pipe.expire(key, DAY_SKETCH_TTL)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.debug(f"cardinality: Redis PFADD failed, using Django cache: {e}")
+
+        records = cache.get_many(list(by_key))
+        for key, fingerprints in by_key.items():
+            record = records.get(key) or {'seeded': False, 'registers': b''}
+            sketch = HyperLogLog.from_bytes(record['registers']).update(fingerprints)
+            records[key] = {'seeded': record['seeded'], 'registers': sketch.to_bytes()}
+        cache.set_many(records, DAY_SKETCH_TTL)
+
+    def reset(self, case_id, days):
+        """Drop the sketches for these days (they are re-seeded on the next read)."""
+        keys = [_day_key(case_id, day) for day in days]
+        seeded = [_seeded_key(case_id, day) for day in days]
+        client = self._redis()
+        if client is not None:
+            try:
+                client.delete(*keys, *seeded)
+            except Exception as e:
+                logger.debug(f"cardinality: Redis delete failed: {e}")
+        cache.delete_many([*keys, _first_day_key(case_id)])
+
+    # ── read path ────────────────────────────────────────────────────────────
+
+    def count(self, case_id, days):
+        """Distinct visitors over the union of the given UTC days."""
+        return self._count(case_id, sorted(set(days)), [])
+
+    def count_between(self, case_id, start_day, end_day=None):
+        """Distinct visitors from start_day through end_day (default: today), inclusive."""
+        end_day = end_day or utc_day(timezone.now())
+        if start_day > end_day:
+            return 0
+        return self.count(case_id, day_range(start_day, end_day))
+
+    def count_window(self, case_id, since, until=None):
+        """Distinct visitors with since <= timestamp < until (default: now)."""
+        if until is not None and until <= since:
+            return 0
+        if self._exact():
+            return _exact_count(case_id, [(since, until)])
+
+        first_full = utc_day(since)
+        if since > day_start(first_full):
+            first_full += timedelta(days=1)
+        if until is None:
+            last_full = utc_day(timezone.now())       # today holds nothing after now
+        else:
+            last_full = utc_day(until) - timedelta(days=1)
+
+        if first_full > last_full:
+            return self._count(case_id, [], [(since, until or timezone.now())])
+        edges = []
+        if since < day_start(first_full):
+            edges.append((since, day_start(first_full)))
+        tail_start = day_start(last_full) + timedelta(days=1)
+        if until is not None and tail_start < until:
+            edges.append((tail_start, until))
+        return self._count(case_id, day_range(first_full, last_full), edges)
+
+    def count_since(self, case_id, since):
+        """Distinct visitors in the rolling window `since` .. now."""
+        return self.count_window(case_id, since)
+
+    def count_all(self, case_id):
+        """Distinct visitors over every day the case has been tracked."""
+        first = self._first_day(case_id)
+        if first is None:
+            return 0
+        return self.count_between(case_id, first)
+
+    def _first_day(self, case_id):
+        """UTC day of the case's first event (cached; reset() clears it)."""
+        from cases.models import Case
+        from .archive import archive_enabled
+        from .models import TrackingEvent
+
+        key = _first_day_key(case_id)
+        first_day = cache.get(key)
+        if first_day is not None:
+            return first_day
+        first = TrackingEvent.objects.filter(case_id=case_id).aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return None
+        if archive_enabled():
+            # older events may only be in the archive; none predate the case
+            created = Case.objects.filter(pk=case_id).values_list('created_at', flat=True).first()
+            first = min(first, created or first)
+        first_day = utc_day(first)
+        cache.set(key, first_day, DAY_SKETCH_TTL)
+        return first_day
+
+    def _exact(self):
+        """True when neither Redis nor a shared cache can hold the sketches."""
+        return self._redis() is None and not _cache_is_shared()
+
+    def _count(self, case_id, days, edges):
+        """Union of whole UTC day sketches and exact [(start, end)] edge ranges."""
+        if not days and not edges:
+            return 0
+        if self._exact():
+            ranges = [(day_start(first), day_start(last) + timedelta(days=1)) for first, last in _runs(days)]
+            return _exact_count(case_id, ranges + edges)
+
+        client = self._redis()
+        extra = set()
+        for start, end in edges:
+            extra |= _range_fingerprints(case_id, start, end)
+        if client is not None:
+            try:
+                return self._count_redis(client, case_id, days, extra)
+            except Exception as e:
+                logger.debug(f"cardinality: Redis count failed, using Django cache: {e}")
+        return self._count_cache(case_id, days, extra)
+
+    def _count_redis(self, client, case_id, days, extra=()):
+        keys = [_day_key(case_id, day) for day in days]
+        seeded = client.mget([_seeded_key(case_id, day) for day in days])
+        unseeded = [day for day, flag in zip(days, seeded) if not flag]
+        if unseeded:
+            chunks = defaultdict(list)
+            for day, fingerprint in _day_fingerprints(case_id, unseeded):
+                chunk = chunks[day]
+                chunk.append(fingerprint)
+                if len(chunk) >= SEED_CHUNK:
+                    client.pfadd(_day_key(case_id, day), *chunk)
+                    chunk.clear()
+            pipe = client.pipeline(transaction=False)
+            for day in unseeded:
+                key = _day_key(case_id, day)
+                if chunks.get(day):
+                    pipe.pfadd(key, *chunks[day])
+                pipe.expire(key, DAY_SKETCH_TTL)
+                pipe.set(_seeded_key(case_id, day), 1, ex=DAY_SKETCH_TTL)
+            pipe.execute()
+        if not extra:
+            return client.pfcount(*keys) if keys else 0
+        # edge fingerprints go into a scratch sketch so PFCOUNT takes the union
+        scratch = f'hll:visitors:{case_id}:scratch:{uuid.uuid4().hex}'
+        try:
+            client.pfadd(scratch, *extra)
+            client.expire(scratch, 60)
+            return client.pfcount(*keys, scratch)
+        finally:
+            client.delete(scratch)
+
+    def _count_cache(self, case_id, days, extra=()):
+        keys = {day: _day_key(case_id, day) for day in days}
+        records = cache.get_many(list(keys.values()))
+        unseeded = [day for day, key in keys.items() if not (records.get(key) or {}).get('seeded')]
+        if unseeded:
+            sketches = {
+                day: HyperLogLog.from_bytes((records.get(keys[day]) or {}).get('registers', b''))
+                for day in unseeded
+            }
+            for day, fingerprint in _day_fingerprints(case_id, unseeded):
+                sketches[day].add(fingerprint)
+            seeded = {
+                keys[day]: {'seeded': True, 'registers': sketch.to_bytes()}
+                for day, sketch in sketches.items()
+            }
+            records.update(seeded)
+            cache.set_many(seeded, DAY_SKETCH_TTL)
+        registers = [records[key]['registers'] for key in keys.values() if records.get(key)]
+        if extra:
+            registers.append(HyperLogLog().update(extra).to_bytes())
+        return merge_sketches(registers).count()
+
+
+_cardinality = VisitorCardinality()
+
+
+def get_visitor_cardinality():
+    return _cardinality
+
+
+def record_visitors(events):
+    """Ingest hook: add saved events to the per-day visitor sketches."""
+    try:
+        _cardinality.record(events)
+    except Exception as e:
+        logger.debug(f"cardinality: record failed: {e}")
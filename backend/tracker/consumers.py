@@ -2,9 +2,18 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
 from django.core.cache import cache
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from .presence import active_visitors
+from .realtime import ADMIN_GROUP, ALL_CASES, LiveCounters, merge_bucket, empty_bucket
+
+# Live counters are kept in memory from the `metrics.delta` frames published
+# by tracker.realtime; stats requests never touch the database.
+CASE_WINDOW_MINUTES = 5
+ADMIN_WINDOW_MINUTES = 60
 
 class TrackingConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for real-time tracking updates"""
@@ -15,6 +24,7 @@ class TrackingConsumer(AsyncWebsocketConsumer):
         self.user_fingerprint = None
         self.is_admin = False
         self.subscriptions = set()
+        self.counters = LiveCounters(CASE_WINDOW_MINUTES)
         
     async def connect(self):
         """Handle WebSocket connection"""
@@ -37,6 +47,7 @@ class TrackingConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             self.subscriptions.add(f'case_{self.case_id}')
+            await sync_to_async(self.counters.seed)(self.case_id)
         
         # Admins join the admin monitoring group
         if self.is_admin:
@@ -141,6 +152,27 @@ class TrackingConsumer(AsyncWebsocketConsumer):
             'timestamp': event.get('timestamp', datetime.now().isoformat())
         }))
     
+    async def metrics_delta(self, event):
+        """Fold a realtime frame into the live counters and forward it"""
+        if event.get('scope') != str(self.case_id):
+            return  # admin-wide frames reach admins through this group too
+        self.counters.apply(event['buckets'])
+        delta = empty_bucket()
+        for bucket in event['buckets'].values():
+            merge_bucket(delta, bucket)
+        await self.send(text_data=json.dumps({
+            'type': 'metrics_delta',
+            'delta': {
+                'events': delta['events'],
+                'page_views': delta['page_views'],
+                'interactions': delta['interactions'],
+                'suspicious_events': delta['suspicious'],
+                'visitors': len(delta['visitors']),
+            },
+            'stats': await self.get_current_stats(),
+            'timestamp': datetime.now().isoformat()
+        }))
+    
     async def visitor_update(self, event):
         """Send visitor statistics update"""
         await self.send(text_data=json.dumps({
@@ -205,26 +237,13 @@ class TrackingConsumer(AsyncWebsocketConsumer):
         """Check if user is admin"""
         return self.user.is_staff or self.user.is_superuser
     
-    @database_sync_to_async
-    def get_current_stats(self):
-        """Get current statistics from database"""
-        from .models import TrackingEvent, UserSession
-        from django.utils import timezone
-        
-        now = timezone.now()
-        last_5_min = now - timedelta(minutes=5)
-        
+    async def get_current_stats(self):
+        """Get current statistics for the case from the live counters"""
+        window = self.counters.window(CASE_WINDOW_MINUTES)
         return {
-            'active_users': UserSession.objects.filter(
-                last_activity__gte=last_5_min
-            ).count(),
-            'events_last_5min': TrackingEvent.objects.filter(
-                timestamp__gte=last_5_min
-            ).count(),
-            'suspicious_count': TrackingEvent.objects.filter(
-                timestamp__gte=last_5_min,
-                is_suspicious=True
-            ).count()
+            'active_users': await sync_to_async(active_visitors)(self.case_id),
+            'events_last_5min': window['events'],
+            'suspicious_count': window['suspicious'],
         }
 
 
@@ -233,6 +252,7 @@ class AdminMonitoringConsumer(AsyncWebsocketConsumer):
     
     async def connect(self):
         self.user = self.scope.get('user')
+        self.counters = LiveCounters(ADMIN_WINDOW_MINUTES)
         
         # Only allow admin users
         if not self.user or not self.user.is_authenticated:
@@ -246,9 +266,10 @@ class AdminMonitoringConsumer(AsyncWebsocketConsumer):
         
         # Join admin monitoring group
         await self.channel_layer.group_add(
-            'admin_monitoring',
+            ADMIN_GROUP,
             self.channel_name
         )
+        await sync_to_async(self.counters.seed)(ALL_CASES)
         
         await self.accept()
         
@@ -260,10 +281,15 @@ class AdminMonitoringConsumer(AsyncWebsocketConsumer):
     
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
-            'admin_monitoring',
+            ADMIN_GROUP,
             self.channel_name
         )
     
+    async def metrics_delta(self, event):
+        """Fold an all-cases realtime frame into the live counters"""
+        if event.get('scope') == ALL_CASES:
+            self.counters.apply(event['buckets'])
+    
     async def monitoring_loop(self):
         """Send periodic monitoring updates"""
         while self.channel_name:
@@ -282,45 +308,22 @@ class AdminMonitoringConsumer(AsyncWebsocketConsumer):
     def is_user_admin(self):
         return self.user.is_staff or self.user.is_superuser
     
-    @database_sync_to_async
-    def get_monitoring_stats(self):
-        """Get comprehensive monitoring statistics"""
-        from .models import TrackingEvent, UserSession, SuspiciousActivity, Alert
-        from django.utils import timezone
-        from django.db.models import Count, Q
-        
-        now = timezone.now()
-        last_5_min = now - timedelta(minutes=5)
-        last_hour = now - timedelta(hours=1)
+    async def get_monitoring_stats(self):
+        """Get comprehensive monitoring statistics from the live counters"""
+        last_5_min = self.counters.window(5)
+        last_hour = self.counters.window(ADMIN_WINDOW_MINUTES)
         
         return {
-            'active_users': UserSession.objects.filter(
-                last_activity__gte=last_5_min
-            ).count(),
-            'total_events_hour': TrackingEvent.objects.filter(
-                timestamp__gte=last_hour
-            ).count(),
-            'suspicious_users': SuspiciousActivity.objects.filter(
-                created_at__gte=last_hour
-            ).values('fingerprint_hash').distinct().count(),
-            'critical_alerts': Alert.objects.filter(
-                created_at__gte=last_hour,
-                priority='critical',
-                resolved=False
-            ).count(),
-            'top_pages': list(TrackingEvent.objects.filter(
-                timestamp__gte=last_hour
-            ).values('page_url').annotate(
-                count=Count('id')
-            ).order_by('-count')[:5]),
-            'vpn_users': UserSession.objects.filter(
-                last_activity__gte=last_5_min,
-                is_vpn=True
-            ).count(),
-            'tor_users': UserSession.objects.filter(
-                last_activity__gte=last_5_min,
-                is_tor=True
-            ).count()
+            'active_users': len(last_5_min['visitors']),
+            'total_events_hour': last_hour['events'],
+            'suspicious_users': len(last_hour['suspicious_users']),
+            'critical_alerts': last_hour['critical_alerts'],
+            'top_pages': [
+                {'page_url': page_url, 'count': count}
+                for page_url, count in last_hour['pages'].most_common(5)
+            ],
+            'vpn_users': len(last_5_min['vpn']),
+            'tor_users': len(last_5_min['tor'])
         }
     
     async def send_initial_data(self):
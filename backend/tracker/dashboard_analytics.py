@@ -3,18 +3,54 @@
 
 from django.db.models import Count, Sum, Avg, Q, F, Max, Min
 from django.utils import timezone
-from django.core.cache import cache
 from datetime import datetime, timedelta
 import json
 import hashlib
 from collections import defaultdict, Counter
 from typing import Dict, List, Any, Optional, Tuple
 
+from . import rollups
+from .aggregation import Metric, Visitors, plan_metrics
+from .cardinality import get_visitor_cardinality
+from .presence import active_visitors
+
 
 class DashboardAnalytics:
     """
     Analytics engine for dashboard metrics and insights
     """
+
+    # Rollup metrics of the overview, compiled together by plan_metrics()
+    ROLLUP_METRICS = {
+        'total_events': Metric('rollups', Sum('events')),
+        'events_24h': Metric('rollups', Sum('events'), hours=24),
+        'events_7d': Metric('rollups', Sum('events'), hours=24 * 7),
+        'suspicious_events_24h': Metric('rollups', Sum('suspicious_events'), hours=24),
+        'unique_visitors_24h': Metric('rollups', Visitors(), hours=24),
+        'visitors_trend': Metric('rollups', Visitors(), by='day', days=7),
+        'suspicious_trend': Metric('rollups', Sum('suspicious_activities'), by='day', days=7),
+        'engagement_trend': Metric('rollups', Sum('engagement_events'), by='day', days=7),
+        'peak_hours': Metric('rollups', Sum('events'), by='hour', hours=24 * 7),
+        'peak_days': Metric('rollups', Sum('events'), by='weekday', hours=24 * 30),
+    }
+
+    # Counts behind the risk score / factors (one query per table)
+    RISK_METRICS = {
+        'suspicious_activities': Metric('activities', Count('id')),
+        'suspicious_users': Metric('activities', Count('fingerprint_hash', distinct=True)),
+        'high_risk_users': Metric(
+            'activities', Count('fingerprint_hash', distinct=True, filter=Q(severity_level__gte=4))
+        ),
+        'high_severity': Metric('activities', Count('id', filter=Q(severity_level__gte=4))),
+        'critical_severity': Metric('activities', Count('id', filter=Q(severity_level=5))),
+        'data_scraping': Metric('activities', Count('id', filter=Q(activity_type='data_scraping'))),
+        'rapid_visits': Metric('activities', Count('id', filter=Q(activity_type='rapid_visits'))),
+        'vpn_users': Metric('events', Count('fingerprint_hash', distinct=True, filter=Q(is_vpn=True))),
+        'unusual_hour_users': Metric(
+            'events', Count('fingerprint_hash', distinct=True, filter=Q(is_unusual_hour=True))
+        ),
+        'critical_alerts': Metric('alerts', Count('id', filter=Q(priority='critical', resolved=False))),
+    }
     
     def __init__(self, case_id: str):
         self.case_id = case_id
@@ -23,40 +59,43 @@ class DashboardAnalytics:
     def get_cache_key(self, metric_name: str) -> str:
         """Generate cache key for metrics"""
         return f"analytics_{self.case_id}_{metric_name}"
+
+    def _planned(self, case, metrics, name):
+        """A ROLLUP_METRICS value, computed on its own without a shared plan."""
+        if metrics is None or name not in metrics:
+            metrics = plan_metrics(case, {name: self.ROLLUP_METRICS[name]})
+        return metrics[name]
     
-    def get_overview_stats(self) -> Dict[str, Any]:
+    def get_overview_stats(self, case=None) -> Dict[str, Any]:
         """
-        Get comprehensive overview statistics for dashboard
+        Get comprehensive overview statistics for dashboard.
+        Not cached here: read it through tracker.analytics ('overview_stats').
         """
         from cases.models import Case
-        from .models import TrackingEvent, UserSession, SuspiciousActivity, Alert
         
-        cache_key = self.get_cache_key('overview_stats')
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-        
-        try:
-            case = Case.objects.get(id=self.case_id)
-        except Case.DoesNotExist:
-            return {}
+        if case is None:
+            try:
+                case = Case.objects.get(id=self.case_id)
+            except Case.DoesNotExist:
+                return {}
         
         now = timezone.now()
-        last_24h = now - timedelta(hours=24)
         last_7d = now - timedelta(days=7)
         last_30d = now - timedelta(days=30)
+        metrics = plan_metrics(case, self.ROLLUP_METRICS, now=now)
+        risk_counts = plan_metrics(case, self.RISK_METRICS, now=now)
         
         stats = {
             # Core Metrics
             'total_visitors': self._get_total_visitors(case),
-            'unique_visitors_24h': self._get_unique_visitors(case, last_24h),
+            'unique_visitors_24h': metrics['unique_visitors_24h'],
             'unique_visitors_7d': self._get_unique_visitors(case, last_7d),
             'unique_visitors_30d': self._get_unique_visitors(case, last_30d),
             
             # Activity Metrics
-            'total_events': TrackingEvent.objects.filter(case=case).count(),
-            'events_24h': TrackingEvent.objects.filter(case=case, timestamp__gte=last_24h).count(),
-            'events_7d': TrackingEvent.objects.filter(case=case, timestamp__gte=last_7d).count(),
+            'total_events': metrics['total_events'],
+            'events_24h': metrics['events_24h'],
+            'events_7d': metrics['events_7d'],
             
             # Engagement Metrics
             'avg_session_duration': self._get_avg_session_duration(case),
@@ -65,19 +104,15 @@ class DashboardAnalytics:
             'return_visitor_rate': self._calculate_return_visitor_rate(case),
             
             # Suspicious Activity
-            'suspicious_users_total': self._get_suspicious_users_count(case),
-            'suspicious_events_24h': self._get_suspicious_events(case, last_24h),
-            'high_risk_users': self._get_high_risk_users_count(case),
-            'critical_alerts': Alert.objects.filter(
-                case=case, 
-                priority='critical', 
-                resolved=False
-            ).count(),
+            'suspicious_users_total': risk_counts['suspicious_users'],
+            'suspicious_events_24h': metrics['suspicious_events_24h'],
+            'high_risk_users': risk_counts['high_risk_users'],
+            'critical_alerts': risk_counts['critical_alerts'],
             
             # Trends
-            'visitor_trend': self._calculate_trend('visitors', case),
-            'suspicious_trend': self._calculate_trend('suspicious', case),
-            'engagement_trend': self._calculate_trend('engagement', case),
+            'visitor_trend': self._calculate_trend('visitors', case, metrics),
+            'suspicious_trend': self._calculate_trend('suspicious', case, metrics),
+            'engagement_trend': self._calculate_trend('engagement', case, metrics),
             
             # Geographic Distribution
             'top_countries': self._get_top_countries(case, limit=5),
@@ -89,17 +124,17 @@ class DashboardAnalytics:
             'os_breakdown': self._get_os_breakdown(case),
             
             # Risk Assessment
-            'risk_score': self._calculate_overall_risk_score(case),
-            'risk_level': self._get_risk_level(case),
-            'risk_factors': self._identify_risk_factors(case),
+            'risk_score': self._calculate_overall_risk_score(case, risk_counts),
+            'risk_level': self._get_risk_level(case, risk_counts),
+            'risk_factors': self._identify_risk_factors(case, risk_counts),
             
             # Performance Metrics
             'avg_page_load_time': self._get_avg_page_load_time(case),
             'error_rate': self._calculate_error_rate(case),
             
             # Time-based Analysis
-            'peak_hours': self._get_peak_hours(case),
-            'peak_days': self._get_peak_days(case),
+            'peak_hours': self._get_peak_hours(case, metrics),
+            'peak_days': self._get_peak_days(case, metrics),
             'unusual_activity_times': self._get_unusual_activity_times(case),
             
             # Updated timestamp
@@ -107,23 +142,18 @@ class DashboardAnalytics:
             'data_freshness': 'live'  # or 'cached'
         }
         
-        # Cache the results
-        cache.set(cache_key, stats, self.cache_timeout)
-        
         return stats
     
     def _get_total_visitors(self, case) -> int:
         """Get total unique visitors"""
-        from .models import UserSession
-        return UserSession.objects.filter(case=case).values('fingerprint_hash').distinct().count()
+        return get_visitor_cardinality().count_all(case.id)
     
     def _get_unique_visitors(self, case, since: datetime) -> int:
         """Get unique visitors since a specific time"""
-        from .models import UserSession
-        return UserSession.objects.filter(
-            case=case,
-            created_at__gte=since
-        ).values('fingerprint_hash').distinct().count()
+        if timezone.now() - since <= timedelta(days=1):
+            # Sliding 24h window: hour granularity from the rollups
+            return rollups.distinct_visitors(case, since=since)
+        return get_visitor_cardinality().count_since(case.id, since)
     
     def _get_avg_session_duration(self, case) -> float:
         """Calculate average session duration in seconds"""
@@ -174,112 +204,12 @@ class DashboardAnalytics:
         
         return round((return_visitors / total_visitors) * 100, 2)
     
-    def _get_suspicious_users_count(self, case) -> int:
-        """Get count of unique suspicious users"""
-        from .models import SuspiciousActivity
-        return SuspiciousActivity.objects.filter(
-            case=case
-        ).values('fingerprint_hash').distinct().count()
-    
-    def _get_suspicious_events(self, case, since: datetime) -> int:
-        """Get count of suspicious events since a specific time"""
-        from .models import TrackingEvent
-        return TrackingEvent.objects.filter(
-            case=case,
-            timestamp__gte=since,
-            is_suspicious=True
-        ).count()
-    
-    def _get_high_risk_users_count(self, case) -> int:
-        """Get count of high risk users (severity >= 4)"""
-        from .models import SuspiciousActivity
-        return SuspiciousActivity.objects.filter(
-            case=case,
-            severity_level__gte=4
-        ).values('fingerprint_hash').distinct().count()
-    
-    def _calculate_trend(self, metric_type: str, case) -> Dict[str, Any]:
+    def _calculate_trend(self, metric_type: str, case, metrics=None) -> Dict[str, Any]:
         """Calculate trend for a specific metric"""
-        from .models import UserSession, TrackingEvent, SuspiciousActivity
-        
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        yesterday_start = today_start - timedelta(days=1)
-        last_week_start = today_start - timedelta(days=7)
-        
-        if metric_type == 'visitors':
-            today_count = UserSession.objects.filter(
-                case=case,
-                created_at__gte=today_start
-            ).values('fingerprint_hash').distinct().count()
-
-            yesterday_count = UserSession.objects.filter(
-                case=case,
-                created_at__gte=yesterday_start,
-                created_at__lt=today_start
-            ).values('fingerprint_hash').distinct().count()
-
-            # Daily counts for last 7 days
-            daily_counts = []
-            for i in range(7):
-                day_start = today_start - timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                count = UserSession.objects.filter(
-                    case=case,
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).values('fingerprint_hash').distinct().count()
-                daily_counts.append(count)
-            
-        elif metric_type == 'suspicious':
-            today_count = SuspiciousActivity.objects.filter(
-                case=case,
-                created_at__gte=today_start
-            ).count()
-            
-            yesterday_count = SuspiciousActivity.objects.filter(
-                case=case,
-                created_at__gte=yesterday_start,
-                created_at__lt=today_start
-            ).count()
-            
-            # Daily counts for last 7 days
-            daily_counts = []
-            for i in range(7):
-                day_start = today_start - timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                count = SuspiciousActivity.objects.filter(
-                    case=case,
-                    created_at__gte=day_start,
-                    created_at__lt=day_end
-                ).count()
-                daily_counts.append(count)
-            
-        else:  # engagement
-            today_count = TrackingEvent.objects.filter(
-                case=case,
-                timestamp__gte=today_start,
-                event_type__in=['click', 'form_submit', 'download']
-            ).count()
-            
-            yesterday_count = TrackingEvent.objects.filter(
-                case=case,
-                timestamp__gte=yesterday_start,
-                timestamp__lt=today_start,
-                event_type__in=['click', 'form_submit', 'download']
-            ).count()
-            
-            daily_counts = []
-            for i in range(7):
-                day_start = today_start - timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                count = TrackingEvent.objects.filter(
-                    case=case,
-                    timestamp__gte=day_start,
-                    timestamp__lt=day_end,
-                    event_type__in=['click', 'form_submit', 'download']
-                ).count()
-                daily_counts.append(count)
+        # Last 7 days from the hourly rollups, newest first (index 0 = today)
+        name = f'{metric_type}_trend' if metric_type in ('visitors', 'suspicious') else 'engagement_trend'
+        daily_counts = list(self._planned(case, metrics, name).values())[::-1]
+        today_count, yesterday_count = daily_counts[0], daily_counts[1]
         
         # Calculate percentage change
         if yesterday_count > 0:
@@ -440,63 +370,52 @@ class DashboardAnalytics:
         
         return result
     
-    def _calculate_overall_risk_score(self, case) -> float:
+    def _risk_counts(self, case, counts=None) -> Dict[str, int]:
+        """RISK_METRICS for the case (planned once per overview)."""
+        return counts if counts is not None else plan_metrics(case, self.RISK_METRICS)
+    
+    def _calculate_overall_risk_score(self, case, counts=None) -> float:
         """Calculate overall risk score for the case (0-100)"""
-        from .models import SuspiciousActivity, TrackingEvent
+        counts = self._risk_counts(case, counts)
         
         risk_score = 0.0
         max_score = 100.0
         
         # Factor 1: Suspicious activity count (max 30 points)
-        suspicious_count = SuspiciousActivity.objects.filter(case=case).count()
+        suspicious_count = counts['suspicious_activities']
         if suspicious_count > 0:
             risk_score += min(30, suspicious_count * 2)
         
         # Factor 2: High severity activities (max 25 points)
-        high_severity = SuspiciousActivity.objects.filter(
-            case=case,
-            severity_level__gte=4
-        ).count()
+        high_severity = counts['high_severity']
         if high_severity > 0:
             risk_score += min(25, high_severity * 5)
         
         # Factor 3: Critical severity activities (max 20 points)
-        critical_severity = SuspiciousActivity.objects.filter(
-            case=case,
-            severity_level=5
-        ).count()
+        critical_severity = counts['critical_severity']
         if critical_severity > 0:
             risk_score += min(20, critical_severity * 10)
         
         # Factor 4: VPN/Proxy usage (max 10 points)
-        vpn_usage = TrackingEvent.objects.filter(
-            case=case,
-            is_vpn=True
-        ).values('fingerprint_hash').distinct().count()
+        vpn_usage = counts['vpn_users']
         if vpn_usage > 0:
             risk_score += min(10, vpn_usage * 2)
 
         # Factor 5: Unusual hour activity (max 10 points)
-        unusual_hour = TrackingEvent.objects.filter(
-            case=case,
-            is_unusual_hour=True
-        ).values('fingerprint_hash').distinct().count()
+        unusual_hour = counts['unusual_hour_users']
         if unusual_hour > 0:
             risk_score += min(10, unusual_hour)
         
         # Factor 6: Data scraping patterns (max 5 points)
-        scraping_patterns = SuspiciousActivity.objects.filter(
-            case=case,
-            activity_type='data_scraping'
-        ).count()
+        scraping_patterns = counts['data_scraping']
         if scraping_patterns > 0:
             risk_score += min(5, scraping_patterns)
         
         return min(risk_score, max_score)
     
-    def _get_risk_level(self, case) -> str:
+    def _get_risk_level(self, case, counts=None) -> str:
         """Get risk level based on risk score"""
-        risk_score = self._calculate_overall_risk_score(case)
+        risk_score = self._calculate_overall_risk_score(case, counts)
         
         if risk_score >= 75:
             return 'CRITICAL'
@@ -509,18 +428,14 @@ class DashboardAnalytics:
         else:
             return 'MINIMAL'
     
-    def _identify_risk_factors(self, case) -> List[Dict[str, Any]]:
+    def _identify_risk_factors(self, case, counts=None) -> List[Dict[str, Any]]:
         """Identify and list risk factors"""
-        from .models import SuspiciousActivity, TrackingEvent, Alert
+        counts = self._risk_counts(case, counts)
         
         risk_factors = []
         
         # Check for critical alerts
-        critical_alerts = Alert.objects.filter(
-            case=case,
-            priority='critical',
-            resolved=False
-        ).count()
+        critical_alerts = counts['critical_alerts']
         if critical_alerts > 0:
             risk_factors.append({
                 'factor': 'Critical Alerts',
@@ -530,10 +445,7 @@ class DashboardAnalytics:
             })
         
         # Check for high severity suspicious activities
-        high_severity = SuspiciousActivity.objects.filter(
-            case=case,
-            severity_level__gte=4
-        ).count()
+        high_severity = counts['high_severity']
         if high_severity > 0:
             risk_factors.append({
                 'factor': 'High Severity Activities',
@@ -543,10 +455,7 @@ class DashboardAnalytics:
             })
         
         # Check for VPN/Proxy usage
-        vpn_users = TrackingEvent.objects.filter(
-            case=case,
-            is_vpn=True
-        ).values('fingerprint_hash').distinct().count()
+        vpn_users = counts['vpn_users']
         if vpn_users > 0:
             risk_factors.append({
                 'factor': 'VPN/Proxy Usage',
@@ -556,10 +465,7 @@ class DashboardAnalytics:
             })
 
         # Check for unusual hour activity
-        unusual_hour_users = TrackingEvent.objects.filter(
-            case=case,
-            is_unusual_hour=True
-        ).values('fingerprint_hash').distinct().count()
+        unusual_hour_users = counts['unusual_hour_users']
         if unusual_hour_users > 5:
             risk_factors.append({
                 'factor': 'Unusual Hour Activity',
@@ -569,10 +475,7 @@ class DashboardAnalytics:
             })
         
         # Check for rapid visits
-        rapid_visits = SuspiciousActivity.objects.filter(
-            case=case,
-            activity_type='rapid_visits'
-        ).count()
+        rapid_visits = counts['rapid_visits']
         if rapid_visits > 0:
             risk_factors.append({
                 'factor': 'Rapid Visit Patterns',
@@ -582,10 +485,7 @@ class DashboardAnalytics:
             })
         
         # Check for data scraping
-        scraping = SuspiciousActivity.objects.filter(
-            case=case,
-            activity_type='data_scraping'
-        ).count()
+        scraping = counts['data_scraping']
         if scraping > 0:
             risk_factors.append({
                 'factor': 'Data Scraping',
@@ -610,22 +510,14 @@ class DashboardAnalytics:
         # This would typically come from error tracking
         return 0.5  # percentage
     
-    def _get_peak_hours(self, case) -> List[Dict[str, Any]]:
+    def _get_peak_hours(self, case, metrics=None) -> List[Dict[str, Any]]:
         """Get peak activity hours"""
-        from .models import TrackingEvent
-        
-        # Get hourly distribution for last 7 days
-        last_7d = timezone.now() - timedelta(days=7)
-        
-        hourly_counts = defaultdict(int)
-        events = TrackingEvent.objects.filter(
-            case=case,
-            timestamp__gte=last_7d
-        ).values('timestamp')
-        
-        for event in events:
-            hour = event['timestamp'].hour
-            hourly_counts[hour] += 1
+        # Hourly distribution for last 7 days
+        hourly_counts = {
+            hour: count
+            for hour, count in self._planned(case, metrics, 'peak_hours').items()
+            if count
+        }
         
         # Sort by count and get top 5
         sorted_hours = sorted(hourly_counts.items(), key=lambda x: x[1], reverse=True)[:5]
@@ -641,25 +533,18 @@ class DashboardAnalytics:
         
         return result
     
-    def _get_peak_days(self, case) -> List[Dict[str, Any]]:
+    def _get_peak_days(self, case, metrics=None) -> List[Dict[str, Any]]:
         """Get peak activity days of week"""
-        from .models import TrackingEvent
-        
-        # Get daily distribution for last 30 days
-        last_30d = timezone.now() - timedelta(days=30)
-        
-        daily_counts = defaultdict(int)
-        events = TrackingEvent.objects.filter(
-            case=case,
-            timestamp__gte=last_30d
-        ).values('timestamp')
+        # Daily distribution for last 30 days;
+        # Django week_day (1=Sunday) -> Python weekday (0=Monday)
+        daily_counts = {
+            (week_day - 2) % 7: count
+            for week_day, count in self._planned(case, metrics, 'peak_days').items()
+            if count
+        }
         
         days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         
-        for event in events:
-            day = event['timestamp'].weekday()
-            daily_counts[day] += 1
-        
         result = []
         for day_num in range(7):
             count = daily_counts.get(day_num, 0)
@@ -697,7 +582,8 @@ class DashboardAnalytics:
     
     def get_real_time_metrics(self) -> Dict[str, Any]:
         """Get real-time metrics for live dashboard updates"""
-        from .models import TrackingEvent, UserSession, Alert
+        from cases.models import Case
+        from .models import TrackingEvent, Alert
         
         now = timezone.now()
         last_5min = now - timedelta(minutes=5)
@@ -709,10 +595,7 @@ class DashboardAnalytics:
             return {}
         
         return {
-            'active_users_now': UserSession.objects.filter(
-                case=case,
-                last_activity__gte=last_5min
-            ).count(),
+            'active_users_now': active_visitors(case),
             
             'events_last_minute': TrackingEvent.objects.filter(
                 case=case,
@@ -794,4 +677,9 @@ class DashboardAnalytics:
                 sum(len(pages) for pages in sessions_flow.values()) / len(sessions_flow) 
                 if sessions_flow else 0, 2
             )
-        }
\ No newline at end of file
+        }
+
+
+def get_overview_stats(case) -> Dict[str, Any]:
+    """Overview stats for a case (analytics registry entry point)."""
+    return DashboardAnalytics(str(case.id)).get_overview_stats(case)
@@ -5,19 +5,17 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from django.core.cache import cache
 from django.db.models import Count, Sum, Avg, Q, F, Max
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
 
 from .models import (
-    TrackingEvent, UserSession, SuspiciousActivity,
+    TrackingEvent, SuspiciousActivity,
     DeviceFingerprint, Alert
 )
 from cases.models import Case
@@ -25,13 +23,25 @@ from .serializers import (
     CaseSerializer, SuspiciousActivitySerializer,
     AlertSerializer, DashboardStatsSerializer
 )
-from .dashboard_analytics import DashboardAnalytics
+from . import rollups
+from .aggregation import Metric, plan_metrics
+from .analytics import get_analytics
+from .cardinality import get_visitor_cardinality
+from .presence import active_visitors
+from .export import EchoBuffer, gzip_chunks, streaming_file_response
+from .suspects import iter_suspects, top_suspects
 
 
 # ============================================
 # DASHBOARD OVERVIEW WIDGETS
 # ============================================
 
+# tracker.analytics metrics rendered as the overview's widgets
+OVERVIEW_WIDGETS = (
+    'visitor_metrics', 'suspicious_activity', 'geographic_map', 'activity_timeline',
+    'engagement_metrics', 'alerts_panel', 'device_breakdown', 'referrer_sources',
+)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_overview(request, case_slug):
@@ -56,37 +66,13 @@ def dashboard_overview(request, case_slug):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Use caching for performance
-        cache_key = f'dashboard_overview_{case_slug}_{request.user.id}'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data and not request.GET.get('refresh') and '_widget_errors' not in cached_data:
-            return Response(cached_data)
-        
+        # Every widget is one registered metric: a single cache read on a
+        # warm dashboard; a failing widget is reported, not fatal
+        analytics = get_analytics()
+        if request.GET.get('refresh'):
+            analytics.invalidate(case, 'overview_stats', *OVERVIEW_WIDGETS)
         widget_errors = {}
-
-        def _safe(fn, *args, default=None):
-            """Call fn safely inside a DB savepoint so a failed query
-            doesn't abort the outer transaction and cascade to all
-            subsequent widgets."""
-            name = getattr(fn, '__name__', str(fn))
-            sid = transaction.savepoint()
-            try:
-                result = fn(*args)
-                transaction.savepoint_commit(sid)
-                return result
-            except Exception as exc:
-                import traceback, logging
-                transaction.savepoint_rollback(sid)
-                tb = traceback.format_exc()
-                logging.getLogger(__name__).warning(
-                    f"dashboard_overview widget {name} failed: {exc}\n{tb}"
-                )
-                widget_errors[name] = f"{type(exc).__name__}: {exc}"
-                return default if default is not None else {}
-
-        # Initialize analytics
-        analytics = DashboardAnalytics(str(case.id))
+        values = analytics.get_many(case, ('overview_stats',) + OVERVIEW_WIDGETS, errors=widget_errors)
 
         # Case info — fall back to minimal dict if serializer fails
         try:
@@ -94,28 +80,15 @@ def dashboard_overview(request, case_slug):
         except Exception:
             case_data = {'id': str(case.id), 'subdomain': case.subdomain}
 
-        # Get all dashboard data — each widget isolated so one crash doesn't blank everything
         data = {
             'case': case_data,
-            'stats': _safe(analytics.get_overview_stats),
-            'widgets': {
-                'visitor_metrics':    _safe(get_visitor_metrics_widget, case),
-                'suspicious_activity': _safe(get_suspicious_activity_widget, case),
-                'geographic_map':     _safe(get_geographic_map_widget, case),
-                'activity_timeline':  _safe(get_activity_timeline_widget, case),
-                'engagement_metrics': _safe(get_engagement_metrics_widget, case),
-                'alerts_panel':       _safe(get_alerts_panel_widget, case),
-                'device_breakdown':   _safe(get_device_breakdown_widget, case),
-                'referrer_sources':   _safe(get_referrer_sources_widget, case),
-            },
+            'stats': values.get('overview_stats', {}),
+            'widgets': {name: values.get(name, {}) for name in OVERVIEW_WIDGETS},
             'last_updated': timezone.now().isoformat(),
             # Included when any widget threw an exception — use to diagnose blank dashboards
             '_widget_errors': widget_errors if widget_errors else None,
         }
         
-        # Cache for 2 minutes
-        cache.set(cache_key, data, 120)
-        
         return Response(data)
         
     except Case.DoesNotExist:
@@ -139,7 +112,7 @@ def visitor_metrics_widget(request, case_slug):
     """
     try:
         case = Case.objects.get(subdomain=case_slug)
-        data = get_visitor_metrics_widget(case)
+        data = get_analytics().get(case, 'visitor_metrics')
         return Response(data)
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
@@ -152,7 +125,6 @@ def get_visitor_metrics_widget(case):
     """
     now = timezone.now()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday_start = today_start - timedelta(days=1)
     last_week = now - timedelta(days=7)
     last_month = now - timedelta(days=30)
 
@@ -168,47 +140,24 @@ def get_visitor_metrics_widget(case):
         .count()
     )
 
-    today_visitors = (
-        events.filter(timestamp__gte=today_start)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
-    yesterday_visitors = (
-        events.filter(timestamp__gte=yesterday_start, timestamp__lt=today_start)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
-    week_total = (
-        events.filter(timestamp__gte=last_week)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
-    month_total = (
-        events.filter(timestamp__gte=last_month)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
-    all_time_total = (
-        events.exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
+    # Distinct visitors per UTC day come from the HLL day sketches
+    visitor_counts = get_visitor_cardinality()
+    today = today_start.date()
+    today_visitors = visitor_counts.count(case.id, [today])
+    yesterday_visitors = visitor_counts.count(case.id, [today - timedelta(days=1)])
+    week_total = visitor_counts.count_since(case.id, last_week)
+    month_total = visitor_counts.count_since(case.id, last_month)
+    all_time_total = visitor_counts.count_all(case.id)
 
     if yesterday_visitors > 0:
         change_pct = round(((today_visitors - yesterday_visitors) / yesterday_visitors) * 100, 1)
     else:
         change_pct = 100 if today_visitors > 0 else 0
 
-    # Hourly trend for today (24 bars)
-    hourly_data = []
-    for i in range(24):
-        h_start = today_start + timedelta(hours=i)
-        h_end   = h_start + timedelta(hours=1)
-        cnt = (
-            events.filter(timestamp__gte=h_start, timestamp__lt=h_end)
-            .exclude(fingerprint_hash='')
-            .values('fingerprint_hash').distinct().count()
-        )
-        hourly_data.append(cnt)
+    # Hourly trend for today (24 bars) from the hourly rollups
+    hourly_data = [0] * 24
+    for hour, visitors in rollups.rollups_for(case, since=today_start).values_list('hour', 'visitors'):
+        hourly_data[hour.astimezone(dt_timezone.utc).hour] = visitors
 
     return {
         'active_now':         active_now,
@@ -233,7 +182,7 @@ def suspicious_activity_widget(request, case_slug):
     """
     try:
         case = Case.objects.get(subdomain=case_slug)
-        data = get_suspicious_activity_widget(case)
+        data = get_analytics().get(case, 'suspicious_activity')
         return Response(data)
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
@@ -251,13 +200,16 @@ def get_suspicious_activity_widget(case):
         created_at__gte=last_24h
     ).select_related('session')
     
-    # Group by severity
-    severity_breakdown = {
-        'critical': recent_activities.filter(severity_level=5).count(),
-        'high': recent_activities.filter(severity_level=4).count(),
-        'medium': recent_activities.filter(severity_level=3).count(),
-        'low': recent_activities.filter(severity_level__lte=2).count(),
-    }
+    # Severity breakdown and window totals in one planned query
+    counts = plan_metrics(case, {
+        'critical': Metric('activities', Count('id', filter=Q(severity_level=5)), hours=24),
+        'high': Metric('activities', Count('id', filter=Q(severity_level=4)), hours=24),
+        'medium': Metric('activities', Count('id', filter=Q(severity_level=3)), hours=24),
+        'low': Metric('activities', Count('id', filter=Q(severity_level__lte=2)), hours=24),
+        'total_24h': Metric('activities', Count('id'), hours=24),
+        'total_7d': Metric('activities', Count('id'), hours=24 * 7),
+    }, now=now)
+    severity_breakdown = {level: counts[level] for level in ('critical', 'high', 'medium', 'low')}
     
     # Top suspicious users
     top_users = SuspiciousActivity.objects.filter(
@@ -292,11 +244,8 @@ def get_suspicious_activity_widget(case):
         })
     
     return {
-        'total_24h': recent_activities.count(),
-        'total_7d': SuspiciousActivity.objects.filter(
-            case=case,
-            created_at__gte=last_7d
-        ).count(),
+        'total_24h': counts['total_24h'],
+        'total_7d': counts['total_7d'],
         'severity_breakdown': severity_breakdown,
         'critical_count': severity_breakdown['critical'],
         'high_risk_users': len(top_users),
@@ -316,7 +265,7 @@ def geographic_map_widget(request, case_slug):
     """
     try:
         case = Case.objects.get(subdomain=case_slug)
-        data = get_geographic_map_widget(case)
+        data = get_analytics().get(case, 'geographic_map')
         return Response(data)
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
@@ -406,7 +355,8 @@ def activity_timeline_widget(request, case_slug):
         # Get time range from query params
         hours = int(request.GET.get('hours', 24))
         
-        data = get_activity_timeline_widget(case, hours)
+        params = {'hours': hours} if hours != 24 else {}
+        data = get_analytics().get(case, 'activity_timeline', **params)
         return Response(data)
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
@@ -462,22 +412,18 @@ def get_activity_timeline_widget(case, hours=24):
     # Sort by timestamp
     timeline.sort(key=lambda x: x['timestamp'], reverse=True)
     
-    # Group by hour for chart
+    # Group by hour for chart (one planned pass over the window)
+    counts = plan_metrics(case, {
+        'events': Metric('events', Count('id'), by='bucket', hours=hours),
+        'suspicious': Metric('events', Count('id', filter=Q(is_suspicious=True)), by='bucket', hours=hours),
+        'visitors': Metric('events', Count('fingerprint_hash', distinct=True), by='bucket', hours=hours),
+    }, now=now)
     hourly_breakdown = {}
-    for i in range(hours):
-        hour_start = now - timedelta(hours=i+1)
-        hour_end = now - timedelta(hours=i)
-        
-        hour_events = TrackingEvent.objects.filter(
-            case=case,
-            timestamp__gte=hour_start,
-            timestamp__lt=hour_end
-        )
-        
-        hourly_breakdown[hour_start.hour] = {
-            'events': hour_events.count(),
-            'visitors': hour_events.values('fingerprint_hash').distinct().count(),
-            'suspicious': hour_events.filter(is_suspicious=True).count()
+    for bucket, events_count in counts['events'].items():
+        hourly_breakdown[bucket.astimezone(dt_timezone.utc).hour] = {
+            'events': events_count,
+            'visitors': counts['visitors'].get(bucket, 0),
+            'suspicious': counts['suspicious'].get(bucket, 0),
         }
     
     return {
@@ -501,7 +447,7 @@ def engagement_metrics_widget(request, case_slug):
     """
     try:
         case = Case.objects.get(subdomain=case_slug)
-        data = get_engagement_metrics_widget(case)
+        data = get_analytics().get(case, 'engagement_metrics')
         return Response(data)
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
@@ -516,28 +462,37 @@ def get_engagement_metrics_widget(case):
     last_7d = now - timedelta(days=7)
 
     events = TrackingEvent.objects.filter(case=case, timestamp__gte=last_7d)
-    total_events = events.count()
+    week = 24 * 7
+    counts = plan_metrics(case, {
+        'total_events': Metric('events', Count('id'), hours=week),
+        'avg_time_on_page': Metric('events', Avg('time_on_page', filter=Q(time_on_page__gt=0)), hours=week),
+        'avg_scroll': Metric('events', Avg('scroll_depth'), hours=week),
+        'interactive': Metric(
+            'events',
+            Count('id', filter=Q(event_type__in=['click', 'form_submit', 'comment', 'share', 'copy'])),
+            hours=week,
+        ),
+        'unique_fps': Metric('events', Count('fingerprint_hash', distinct=True, filter=~Q(fingerprint_hash='')), hours=week),
+        'total_sessions': Metric('sessions', Count('id'), hours=week),
+        'avg_session_duration': Metric('sessions', Avg('total_duration'), hours=week),
+        'avg_pages': Metric('sessions', Avg('page_views'), hours=week),
+        'bounced': Metric('sessions', Count('id', filter=Q(page_views__lte=1)), hours=week),
+        'engaged': Metric(
+            'sessions', Count('id', filter=Q(page_views__gte=3) | Q(total_duration__gte=60)), hours=week
+        ),
+    }, now=now)
+    total_events = counts['total_events']
 
     # Avg time on page from events directly
-    avg_time_on_page = events.filter(
-        time_on_page__isnull=False, time_on_page__gt=0
-    ).aggregate(avg=Avg('time_on_page'))['avg'] or 0
-
-    avg_scroll = events.filter(
-        scroll_depth__isnull=False
-    ).aggregate(avg=Avg('scroll_depth'))['avg'] or 0
+    avg_time_on_page = counts['avg_time_on_page'] or 0
+    avg_scroll = counts['avg_scroll'] or 0
 
     # Interaction rate: clicks/forms/shares / total events
-    interactive = events.filter(
-        event_type__in=['click', 'form_submit', 'comment', 'share', 'copy']
-    ).count()
+    interactive = counts['interactive']
     interaction_rate = (interactive / total_events * 100) if total_events else 0
 
     # Return visitor rate: fingerprints seen on more than one calendar day
-    unique_fps = (
-        events.exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
+    unique_fps = counts['unique_fps']
     return_visitors = (
         events.exclude(fingerprint_hash='')
         .values('fingerprint_hash')
@@ -548,18 +503,15 @@ def get_engagement_metrics_widget(case):
     return_rate = (return_visitors / unique_fps * 100) if unique_fps else 0
 
     # Supplement with UserSession data if it has records
-    sessions = UserSession.objects.filter(case=case, created_at__gte=last_7d)
-    total_sessions = sessions.count()
-    avg_session_duration = sessions.aggregate(avg=Avg('total_duration'))['avg'] or avg_time_on_page
-    avg_pages = sessions.aggregate(avg=Avg('page_views'))['avg'] or 1
+    total_sessions = counts['total_sessions']
+    avg_session_duration = counts['avg_session_duration'] or avg_time_on_page
+    avg_pages = counts['avg_pages'] or 1
 
     bounce_rate = 0
     engagement_rate = 0
     if total_sessions > 0:
-        bounced = sessions.filter(page_views__lte=1).count()
-        bounce_rate = (bounced / total_sessions) * 100
-        engaged = sessions.filter(Q(page_views__gte=3) | Q(total_duration__gte=60)).count()
-        engagement_rate = (engaged / total_sessions) * 100
+        bounce_rate = (counts['bounced'] / total_sessions) * 100
+        engagement_rate = (counts['engaged'] / total_sessions) * 100
 
     metrics = {
         'avg_session_duration':   round(avg_session_duration or 0),
@@ -641,7 +593,7 @@ def alerts_panel_widget(request, case_slug):
     """
     try:
         case = Case.objects.get(subdomain=case_slug)
-        data = get_alerts_panel_widget(case)
+        data = get_analytics().get(case, 'alerts_panel')
         return Response(data)
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
@@ -652,14 +604,17 @@ def get_alerts_panel_widget(case):
     # Base queryset — keep unsliced so we can filter/count freely
     base_qs = Alert.objects.filter(case=case, resolved=False)
 
-    # Count by priority before slicing
-    priority_counts = {
-        'critical': base_qs.filter(priority='critical').count(),
-        'high':     base_qs.filter(priority='high').count(),
-        'medium':   base_qs.filter(priority='medium').count(),
-        'low':      base_qs.filter(priority='low').count(),
-    }
-    total_unresolved = base_qs.count()
+    # Count by priority before slicing (one planned query)
+    priorities = ('critical', 'high', 'medium', 'low')
+    counts = plan_metrics(case, {
+        'total': Metric('alerts', Count('id', filter=Q(resolved=False))),
+        **{
+            priority: Metric('alerts', Count('id', filter=Q(resolved=False, priority=priority)))
+            for priority in priorities
+        },
+    })
+    priority_counts = {priority: counts[priority] for priority in priorities}
+    total_unresolved = counts['total']
 
     # Now slice for the serialized list
     alerts = base_qs.order_by('-priority', '-created_at')[:10]
@@ -810,10 +765,7 @@ def realtime_activity_stream(request, case_slug):
         
         return Response({
             'stream': stream,
-            'active_users': UserSession.objects.filter(
-                case=case,
-                last_activity__gte=since
-            ).count(),
+            'active_users': active_visitors(case),
             'timestamp': timezone.now().isoformat()
         })
         
@@ -830,212 +782,81 @@ def realtime_metrics(request, case_slug):
     """
     try:
         case = Case.objects.get(subdomain=case_slug)
-        now = timezone.now()
-        
-        # Last 5 minutes metrics
-        last_5min = now - timedelta(minutes=5)
-        recent_events = TrackingEvent.objects.filter(
-            case=case,
-            timestamp__gte=last_5min
-        )
-        
-        metrics = {
-            'active_users': UserSession.objects.filter(
-                case=case,
-                last_activity__gte=last_5min
-            ).count(),
-            'events_per_minute': recent_events.count() / 5,
-            'page_views': recent_events.filter(event_type='page_view').count(),
-            'interactions': recent_events.filter(
-                event_type__in=['click', 'form_submit', 'scroll']
-            ).count(),
-            'suspicious_events': recent_events.filter(is_suspicious=True).count(),
-            'new_alerts': Alert.objects.filter(
-                case=case,
-                created_at__gte=last_5min,
-                resolved=False
-            ).count(),
-        }
-        
-        return Response(metrics)
+        return Response(get_analytics().get(case, 'realtime_metrics'))
         
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=404)
 
 
+def get_realtime_metrics(case):
+    """Helper function to get the last five minutes' metrics"""
+    now = timezone.now()
+    
+    # Last 5 minutes metrics
+    last_5min = now - timedelta(minutes=5)
+    recent_events = TrackingEvent.objects.filter(
+        case=case,
+        timestamp__gte=last_5min
+    )
+    
+    return {
+        'active_users': active_visitors(case),
+        'events_per_minute': recent_events.count() / 5,
+        'page_views': recent_events.filter(event_type='page_view').count(),
+        'interactions': recent_events.filter(
+            event_type__in=['click', 'form_submit', 'scroll']
+        ).count(),
+        'suspicious_events': recent_events.filter(is_suspicious=True).count(),
+        'new_alerts': Alert.objects.filter(
+            case=case,
+            created_at__gte=last_5min,
+            resolved=False
+        ).count(),
+    }
+
+
 # ============================================
 # SUSPECTS / HONEYPOT SCORING
 # ============================================
 
 def _compute_suspects(case):
     """
-    Score every unique visitor for this case and return a ranked list.
-
-    Signals and weights
-    ───────────────────
-    honeypot_triggered   +60  clicked a hidden trap — highest indicator
-    tor_detected         +20  using Tor anonymiser
-    vpn_detected         +15  using VPN / proxy
-    multiple_ips (3+)    +20  same fingerprint, 3+ different IPs
-    multiple_ips (2)     +10  same fingerprint, 2 different IPs
-    unusual_hour         +10  visited between 2–5 AM
-    high_visit_count 10+ +20  10 or more total visits
-    high_visit_count 5+  +15  5–9 total visits
-    return_visitor  3+   +10  3–4 total visits
-    suspicious_patterns  +5   per flagged SuspiciousActivity record (max 25)
-    high_severity act.   +15  at least one severity-4/5 activity
+    Ranked suspect list for a case, read from the materialized CaseSuspect
+    table (scoring signals and weights: tracker.suspects.score_suspect).
     """
-    from django.db.models import Min
+    return [_suspect_row(suspect) for suspect in top_suspects(case)]
 
-    # ── Aggregate per fingerprint from TrackingEvent ─────────────────────────
-    fp_stats = list(
-        TrackingEvent.objects.filter(case=case)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash')
-        .annotate(
-            visit_count=Count('id'),
-            unique_ips=Count('ip_address', distinct=True),
-            unusual_hour_count=Count('id', filter=Q(is_unusual_hour=True)),
-            vpn_count=Count('id', filter=Q(is_vpn=True)),
-            tor_count=Count('id', filter=Q(is_tor=True)),
-            honeypot_hits=Count('id', filter=Q(event_type='honeypot_triggered')),
-            first_seen=Min('timestamp'),
-            last_seen=Max('timestamp'),
-        )
-    )
 
-    # ── Aggregate per fingerprint from SuspiciousActivity ────────────────────
-    sa_by_fp = {
-        row['fingerprint_hash']: row
-        for row in (
-            SuspiciousActivity.objects.filter(case=case)
-            .values('fingerprint_hash')
-            .annotate(
-                total_sa=Count('id'),
-                max_severity=Max('severity_level'),
-                hp_sa=Count('id', filter=Q(activity_type='honeypot_triggered')),
-            )
-        )
-    }
-
-    # ── Latest event per fingerprint for IP/location/device context ──────────
-    latest = {
-        row['fingerprint_hash']: row
-        for row in (
-            TrackingEvent.objects.filter(case=case)
-            .exclude(fingerprint_hash='')
-            .order_by('fingerprint_hash', '-timestamp')
-            .distinct('fingerprint_hash')
-            .values(
-                'fingerprint_hash', 'ip_address', 'ip_country',
-                'ip_city', 'browser', 'os', 'device_type',
-            )
-        )
+def _suspect_row(suspect):
+    honeypot_hits = suspect.honeypot_events + suspect.honeypot_activities
+    fp = suspect.fingerprint_hash
+    return {
+        'fingerprint':         fp,
+        'fingerprint_short':   fp[:14] + '…',
+        'score':               suspect.score,
+        'risk':                suspect.risk,
+        'honeypot_triggered':  honeypot_hits > 0,
+        'honeypot_count':      honeypot_hits,
+        'signals':             suspect.signals,
+        'visit_count':         suspect.visit_count,
+        'unique_ips':          suspect.unique_ips,
+        'latest_ip':           suspect.latest_ip or '',
+        'latest_country':      suspect.latest_country,
+        'latest_region':       suspect.latest_region,
+        'latest_city':         suspect.latest_city,
+        'latest_lat':          suspect.latest_lat,
+        'latest_lon':          suspect.latest_lon,
+        'latest_postal':       suspect.latest_postal,
+        'latest_isp':          suspect.latest_isp,
+        'browser':             suspect.browser,
+        'os':                  suspect.os,
+        'device_type':         suspect.device_type,
+        'first_seen':          suspect.first_seen.isoformat() if suspect.first_seen else None,
+        'last_seen':           suspect.last_seen.isoformat() if suspect.last_seen else None,
+        'last_seen_ago':       get_time_ago(suspect.last_seen) if suspect.last_seen else '—',
+        'flagged_for_leo':     honeypot_hits > 0 or suspect.score >= 70,
     }
 
-    suspects = []
-
-    for fp_data in fp_stats:
-        fp = fp_data['fingerprint_hash']
-        sa = sa_by_fp.get(fp, {})
-        latest_ev = latest.get(fp, {})
-
-        score = 0
-        signals = []
-
-        honeypot_hits = fp_data['honeypot_hits'] + sa.get('hp_sa', 0)
-        if honeypot_hits > 0:
-            score += 60
-            signals.append({
-                'type': 'honeypot_triggered',
-                'label': f'Accessed hidden trap link ({honeypot_hits}×)',
-                'weight': 60,
-            })
-
-        if fp_data['tor_count'] > 0:
-            score += 20
-            signals.append({'type': 'tor_detected', 'label': 'Tor anonymiser detected', 'weight': 20})
-
-        if fp_data['vpn_count'] > 0:
-            score += 15
-            signals.append({'type': 'vpn_detected', 'label': 'VPN / proxy detected', 'weight': 15})
-
-        if fp_data['unique_ips'] >= 3:
-            score += 20
-            signals.append({'type': 'multiple_ips', 'label': f'{fp_data["unique_ips"]} different IP addresses', 'weight': 20})
-        elif fp_data['unique_ips'] == 2:
-            score += 10
-            signals.append({'type': 'multiple_ips', 'label': '2 different IP addresses', 'weight': 10})
-
-        if fp_data['unusual_hour_count'] > 0:
-            score += 10
-            signals.append({'type': 'unusual_hour', 'label': f'Visited during 2–5 AM ({fp_data["unusual_hour_count"]}×)', 'weight': 10})
-
-        vc = fp_data['visit_count']
-        if vc >= 10:
-            score += 20
-            signals.append({'type': 'high_visit_count', 'label': f'{vc} total visits', 'weight': 20})
-        elif vc >= 5:
-            score += 15
-            signals.append({'type': 'return_visitor', 'label': f'{vc} visits (frequent returner)', 'weight': 15})
-        elif vc >= 3:
-            score += 10
-            signals.append({'type': 'return_visitor', 'label': f'{vc} visits', 'weight': 10})
-
-        sa_count = sa.get('total_sa', 0)
-        if sa_count > 0:
-            pts = min(25, sa_count * 5)
-            score += pts
-            signals.append({'type': 'suspicious_patterns', 'label': f'{sa_count} flagged behaviour patterns', 'weight': pts})
-
-        if sa.get('max_severity', 0) >= 4:
-            score += 15
-            signals.append({'type': 'high_severity', 'label': f'Severity-{sa["max_severity"]} activity on record', 'weight': 15})
-
-        score = min(100, score)
-
-        if score < 15:
-            continue  # Skip visitors with almost no signals
-
-        if score >= 70 or honeypot_hits > 0:
-            risk = 'critical'
-        elif score >= 50:
-            risk = 'high'
-        elif score >= 30:
-            risk = 'medium'
-        else:
-            risk = 'low'
-
-        suspects.append({
-            'fingerprint':         fp,
-            'fingerprint_short':   fp[:14] + '…',
-            'score':               score,
-            'risk':                risk,
-            'honeypot_triggered':  honeypot_hits > 0,
-            'honeypot_count':      honeypot_hits,
-            'signals':             sorted(signals, key=lambda s: s['weight'], reverse=True),
-            'visit_count':         fp_data['visit_count'],
-            'unique_ips':          fp_data['unique_ips'],
-            'latest_ip':           latest_ev.get('ip_address', ''),
-            'latest_country':      latest_ev.get('ip_country', ''),
-            'latest_region':       latest_ev.get('ip_region', ''),
-            'latest_city':         latest_ev.get('ip_city', ''),
-            'latest_lat':          latest_ev.get('ip_latitude'),
-            'latest_lon':          latest_ev.get('ip_longitude'),
-            'latest_postal':       latest_ev.get('ip_postal', ''),
-            'latest_isp':          latest_ev.get('isp', ''),
-            'browser':             latest_ev.get('browser', ''),
-            'os':                  latest_ev.get('os', ''),
-            'device_type':         latest_ev.get('device_type', ''),
-            'first_seen':          fp_data['first_seen'].isoformat() if fp_data['first_seen'] else None,
-            'last_seen':           fp_data['last_seen'].isoformat() if fp_data['last_seen'] else None,
-            'last_seen_ago':       get_time_ago(fp_data['last_seen']) if fp_data['last_seen'] else '—',
-            'flagged_for_leo':     honeypot_hits > 0 or score >= 70,
-        })
-
-    suspects.sort(key=lambda s: (s['score'], s['honeypot_triggered']), reverse=True)
-    return suspects[:50]
-
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -1070,11 +891,10 @@ def get_suspects(request, case_slug):
 @permission_classes([IsAuthenticated])
 def export_suspects(request, case_slug):
     """
-    Export suspect list as CSV for law enforcement.
-    GET /api/tracker/dashboard/<case_slug>/suspects/export/
+    Export the full suspect list as CSV for law enforcement (streamed).
+    GET /api/tracker/dashboard/<case_slug>/suspects/export/?compress=gzip
     """
     import csv as csv_module
-    from django.http import HttpResponse as DjangoHttpResponse
 
     try:
         try:
@@ -1084,48 +904,45 @@ def export_suspects(request, case_slug):
             if not case:
                 raise Case.DoesNotExist
 
-        suspects = _compute_suspects(case)
-
-        response = DjangoHttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = (
-            f'attachment; filename="suspects-{case_slug}-{timezone.now().strftime("%Y%m%d")}.csv"'
-        )
-
-        writer = csv_module.writer(response)
-        writer.writerow([
-            'Rank', 'Suspicion Score', 'Risk Level', 'Honeypot Triggered',
-            'Fingerprint (partial)', 'Visit Count', 'Unique IPs',
-            'Latest IP', 'Country', 'State/Region', 'City', 'Postal', 'Lat', 'Lon', 'ISP',
-            'Browser', 'OS', 'Device',
-            'First Seen (UTC)', 'Last Seen (UTC)', 'Key Signals',
-        ])
-
-        for i, s in enumerate(suspects, 1):
-            writer.writerow([
-                i,
-                s['score'],
-                s['risk'].upper(),
-                'YES — HIGH PRIORITY' if s['honeypot_triggered'] else 'No',
-                s['fingerprint_short'],
-                s['visit_count'],
-                s['unique_ips'],
-                s['latest_ip'],
-                s['latest_country'],
-                s.get('latest_region', ''),
-                s['latest_city'],
-                s.get('latest_postal', ''),
-                s.get('latest_lat', ''),
-                s.get('latest_lon', ''),
-                s.get('latest_isp', ''),
-                s['browser'],
-                s['os'],
-                s['device_type'],
-                s['first_seen'],
-                s['last_seen'],
-                ' | '.join(sig['label'] for sig in s['signals']),
+        def rows():
+            writer = csv_module.writer(EchoBuffer())
+            yield writer.writerow([
+                'Rank', 'Suspicion Score', 'Risk Level', 'Honeypot Triggered',
+                'Fingerprint (partial)', 'Visit Count', 'Unique IPs',
+                'Latest IP', 'Country', 'State/Region', 'City', 'Postal', 'Lat', 'Lon', 'ISP',
+                'Browser', 'OS', 'Device',
+                'First Seen (UTC)', 'Last Seen (UTC)', 'Key Signals',
             ])
-
-        return response
+            for i, suspect in enumerate(iter_suspects(case), 1):
+                s = _suspect_row(suspect)
+                yield writer.writerow([
+                    i,
+                    s['score'],
+                    s['risk'].upper(),
+                    'YES — HIGH PRIORITY' if s['honeypot_triggered'] else 'No',
+                    s['fingerprint_short'],
+                    s['visit_count'],
+                    s['unique_ips'],
+                    s['latest_ip'],
+                    s['latest_country'],
+                    s.get('latest_region', ''),
+                    s['latest_city'],
+                    s.get('latest_postal', ''),
+                    s.get('latest_lat', ''),
+                    s.get('latest_lon', ''),
+                    s.get('latest_isp', ''),
+                    s['browser'],
+                    s['os'],
+                    s['device_type'],
+                    s['first_seen'],
+                    s['last_seen'],
+                    ' | '.join(sig['label'] for sig in s['signals']),
+                ])
+
+        filename = f'suspects-{case_slug}-{timezone.now().strftime("%Y%m%d")}.csv'
+        if request.GET.get('compress') == 'gzip':
+            return streaming_file_response(gzip_chunks(rows()), filename + '.gz', 'application/gzip')
+        return streaming_file_response((line.encode('utf-8') for line in rows()), filename, 'text/csv')
 
     except Case.DoesNotExist:
         return Response({'error': 'Case not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -1190,8 +1007,6 @@ def family_analytics(request, case_slug):
     Returns visitor momentum data only — no forensic, suspicious, or IP details.
     GET /api/tracker/family-analytics/<case_slug>/?days=30
     """
-    from django.db.models.functions import TruncDate
-
     try:
         case = Case.objects.get(subdomain=case_slug)
     except Case.DoesNotExist:
@@ -1202,38 +1017,32 @@ def family_analytics(request, case_slug):
         return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
 
     days = max(1, min(int(request.GET.get('days', 30)), 365))
+    return Response(get_analytics().get(case, 'family_analytics', days=days))
+
+
+def get_family_analytics(case, days=30):
+    """Helper function to get the family analytics payload"""
     now = timezone.now()
     since = now - timedelta(days=days)
     week_ago = now - timedelta(days=7)
     two_weeks_ago = now - timedelta(days=14)
 
-    all_events = TrackingEvent.objects.filter(case=case)
-    period_events = all_events.filter(timestamp__gte=since)
-
+    # Distinct visitors come from the per-day HLL sketches, everything else
+    # from the hourly rollups
     # ── KPI metrics ──────────────────────────────────────────────────────────
-    total_visits = (
-        all_events.exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
-    this_week = (
-        all_events.filter(timestamp__gte=week_ago)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
-    last_week = (
-        all_events.filter(timestamp__gte=two_weeks_ago, timestamp__lt=week_ago)
-        .exclude(fingerprint_hash='')
-        .values('fingerprint_hash').distinct().count()
-    )
+    visitor_counts = get_visitor_cardinality()
+    total_visits = visitor_counts.count_all(case.id)
+    this_week = visitor_counts.count_since(case.id, week_ago)
+    last_week = visitor_counts.count_window(case.id, two_weeks_ago, week_ago)
     week_change_pct = (
         round(((this_week - last_week) / last_week) * 100)
         if last_week > 0 else (100 if this_week > 0 else 0)
     )
 
+    period_totals = rollups.rollup_totals(case, since=since)
     avg_secs = (
-        period_events
-        .filter(time_on_page__isnull=False, time_on_page__gt=0)
-        .aggregate(avg=Avg('time_on_page'))['avg'] or 0
+        period_totals['time_on_page_total'] / period_totals['time_on_page_samples']
+        if period_totals['time_on_page_samples'] else 0
     )
     avg_secs = round(avg_secs)
     avg_formatted = (
@@ -1243,34 +1052,25 @@ def family_analytics(request, case_slug):
 
     # ── Visits over time (daily) ──────────────────────────────────────────────
     visits_over_time = [
-        {'date': str(row['date']), 'visits': row['visits']}
-        for row in (
-            period_events
-            .annotate(date=TruncDate('timestamp'))
-            .values('date')
-            .annotate(visits=Count('fingerprint_hash', distinct=True))
-            .order_by('date')
-        )
+        {'date': str(day['date']), 'visits': day['visitors']}
+        for day in rollups.daily_series(case, days)
+        if day['events']
     ]
 
     # ── Top states ───────────────────────────────────────────────────────────
+    # Distinct visitors per region from the per-day breakdown sketches
     top_states = [
-        {'state': row['ip_region'], 'visitors': row['visitors']}
-        for row in (
-            period_events
-            .exclude(ip_region__in=['', None])
-            .values('ip_region')
-            .annotate(visitors=Count('fingerprint_hash', distinct=True))
-            .order_by('-visitors')[:10]
-        )
-    ]
+        {'state': region, 'visitors': visitors}
+        for region, visitors in rollups.visitor_breakdown(case, 'region', since=since, limit=11)
+        if region
+    ][:10]
 
     # ── Traffic sources ───────────────────────────────────────────────────────
-    # Aggregate referrer counts at DB level, then classify in Python
+    # Referrer histogram from the rollups, classified in Python
     source_counts = {'social': 0, 'search': 0, 'direct': 0, 'other': 0}
-    for row in period_events.values('referrer_url').annotate(n=Count('id')):
-        bucket = _classify_referrer(row['referrer_url'])
-        source_counts[bucket] += row['n']
+    for referrer_url, n in rollups.merged_histogram(case, 'referrers', since=since, limit=None):
+        bucket = _classify_referrer(referrer_url)
+        source_counts[bucket] += n
 
     total_refs = sum(source_counts.values()) or 1
     traffic_sources = [
@@ -1291,7 +1091,7 @@ def family_analytics(request, case_slug):
     top_source = max(traffic_sources, key=lambda x: x['value'])
     top_state = top_states[0] if top_states else None
 
-    return Response({
+    return {
         'case_name': (
             case.case_title or
             f"{case.first_name or ''} {case.last_name or ''}".strip() or
@@ -1311,7 +1111,7 @@ def family_analytics(request, case_slug):
         'visits_over_time': visits_over_time,
         'traffic_sources': traffic_sources,
         'top_states':      top_states,
-    })
+    }
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1491,7 +1291,6 @@ def get_ml_status(request):
     GET /api/tracker/ml/status/
     Never raises — all sections are individually try/excepted.
     """
-    import json
     import socket
     import logging
     from pathlib import Path
@@ -1505,6 +1304,7 @@ def get_ml_status(request):
         'training': {'label_counts': {}, 'total_labels': 0},
         'celery': {},
         'database': {},
+        'caches': {},
     }
 
     try:
@@ -1519,18 +1319,33 @@ def get_ml_status(request):
 
         # ── Model files ──────────────────────────────────────────────────────
         try:
-            model_dir = Path(getattr(django_settings, 'MEDIA_ROOT', '/tmp')) / 'ml_models'
-            for name, filename in {
-                'isolation_forest': 'isolation_forest.joblib',
-                'gradient_boosting': 'gradient_boosting.joblib',
-                'random_forest':     'random_forest.joblib',
-                'scaler':            'scaler.joblib',
-            }.items():
-                path = model_dir / filename
-                result['ml_models'][name] = {
-                    'exists': path.exists(),
-                    'size_kb': round(path.stat().st_size / 1024, 1) if path.exists() else None,
-                }
+            from .ml_registry import ARTIFACTS, get_model_registry, model_root
+            from .models import MLModel
+
+            model_dir = model_root()
+            active = {
+                row.model_type: row
+                for row in MLModel.objects.filter(is_active=True)
+            }
+            for name, (model_type, _attr, _alg) in ARTIFACTS.items():
+                row = active.get(model_type)
+                if row is not None:
+                    exists = bool(row.model_file_path) and Path(row.model_file_path).exists()
+                    result['ml_models'][name] = {
+                        'exists': exists,
+                        'size_kb': round(row.model_size / 1024, 1) if row.model_size else None,
+                        'version': row.version,
+                        'trained_at': row.training_date.isoformat() if row.training_date else None,
+                    }
+                else:
+                    # Pre-registry flat layout
+                    path = model_dir / f'{name}.joblib'
+                    result['ml_models'][name] = {
+                        'exists': path.exists(),
+                        'size_kb': round(path.stat().st_size / 1024, 1) if path.exists() else None,
+                        'version': 'legacy' if path.exists() else None,
+                    }
+            result['ml_models']['registry'] = get_model_registry().status()
 
             meta_path = model_dir / 'training_meta.json'
             if meta_path.exists():
@@ -1571,6 +1386,17 @@ def get_ml_status(request):
         except Exception as exc:
             result['database'] = {'error': str(exc)[:200]}
 
+        # ── In-process lookup caches (per worker) ────────────────────────────
+        try:
+            from .user_agent import user_agent_cache_stats
+            from .geo import geo_stats
+            result['caches'] = {
+                'user_agent': user_agent_cache_stats(),
+                'geo': geo_stats(),
+            }
+        except Exception as exc:
+            result['caches'] = {'error': str(exc)[:200]}
+
         # ── Redis / Celery — simple socket ping, no blocking inspect ─────────
         try:
             redis_url = getattr(django_settings, 'REDIS_URL', '') or ''
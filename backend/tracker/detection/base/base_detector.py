@@ -88,7 +88,7 @@ class BaseDetector(ABC):
     def get_user_history(self, fingerprint_hash: str, case_id: str, 
                         hours: int = 24) -> List[Dict[str, Any]]:
         """
-        Get user history from cache or database
+        Get user history from the shared history window (see tracker/history.py)
         
         Args:
             fingerprint_hash: User's fingerprint hash
@@ -98,22 +98,8 @@ class BaseDetector(ABC):
         Returns:
             List of historical events
         """
-        cache_key = f'history:{fingerprint_hash}:{case_id}:{hours}h'
-        
-        # Try cache first
-        cached_history = self.services.get_cached_data(cache_key)
-        if cached_history:
-            return cached_history
-        
-        # Fetch from database
-        history = self.services.database.get_user_history(
-            fingerprint_hash, case_id, hours
-        )
-        
-        # Cache for future use
-        self.services.cache_data(cache_key, history, ttl=600)
-        
-        return history
+        from ...history import HistoryProvider
+        return HistoryProvider().get(fingerprint_hash, case_id, hours)
     
     def create_result(self, triggered: bool = False, score: float = 0.0,
                      severity: int = 0, details: Dict = None) -> Dict[str, Any]:
@@ -281,36 +267,39 @@ class ServiceContainer:
 
 
 class MetricsService:
-    """Service for recording metrics"""
+    """
+    Service for recording metrics
     
-    def __init__(self):
-        self.detections = []
-        self.alerts = []
+    Backed by the fixed-memory registry in tracker.metrics (counters,
+    histograms, rolling rates) instead of per-event lists, so a long-lived
+    process no longer grows with every detection.
+    """
+    
+    def __init__(self, registry=None):
+        from ...metrics import get_metrics
+        self.registry = registry or get_metrics()
     
     def record_detection(self, detector: str, score: float, severity: int):
         """Record a detection event"""
-        self.detections.append({
-            'detector': detector,
-            'score': score,
-            'severity': severity,
-            'timestamp': datetime.now().isoformat()
-        })
+        self.registry.record_detection(detector, score, severity)
     
     def record_alert(self, alert_type: str, priority: str):
         """Record an alert"""
-        self.alerts.append({
-            'type': alert_type,
-            'priority': priority,
-            'timestamp': datetime.now().isoformat()
-        })
+        self.registry.record_alert(alert_type, priority)
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get current statistics"""
+        scores = self.registry.histogram('tracker_detection_score')
         return {
-            'total_detections': len(self.detections),
-            'total_alerts': len(self.alerts),
-            'avg_score': sum(d['score'] for d in self.detections) / len(self.detections) if self.detections else 0,
-            'high_severity_count': sum(1 for d in self.detections if d['severity'] >= 4)
+            'total_detections': self.registry.counter('tracker_detections_total'),
+            'total_alerts': self.registry.counter('tracker_alerts_total'),
+            'avg_score': scores.sum / scores.count if scores.count else 0,
+            'high_severity_count': sum(
+                self.registry.counter('tracker_detections_total', severity=level) for level in (4, 5)
+            ),
+            'detections_per_minute': self.registry.rate('tracker_detections_per_second', 60) * 60,
+            'alerts_per_minute': self.registry.rate('tracker_alerts_per_second', 60) * 60,
+            'score_p95': scores.quantile(0.95),
         }
 
 
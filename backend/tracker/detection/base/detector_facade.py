@@ -6,10 +6,12 @@ Main interface that coordinates all detection modules
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 
 from .base_detector import ServiceContainer
+from .execution_engine import DetectorExecutionEngine, call_detector
+from ...history import HistoryProvider
+from ..graph import DETECTOR_SELECTION
 from .criminal_indicators import CriminalIndicatorDetector
 from .evasion_detector import EvasionDetector
 from .temporal_analyzer import TemporalAnalyzer
@@ -54,6 +56,11 @@ class CriminalDetectionSystem:
         self.parallel_execution = self.config.get('parallel_execution', True)
         self.max_workers = self.config.get('max_workers', 10)
         
+        # Long-lived executor (process pool / event loop are created on first use)
+        self.engine = DetectorExecutionEngine.from_config(
+            {'process_workers': self.max_workers, **self.config}
+        )
+        
         logger.info("Criminal Detection System initialized")
     
     def _initialize_detectors(self) -> None:
@@ -108,17 +115,14 @@ class CriminalDetectionSystem:
         if not self._validate_event(event):
             return self._create_error_result("Invalid event format")
         
-        # Get user history
-        history = self._get_user_history(event)
+        # Get user history: one provider per run, shared by every detector
+        history = self._get_user_history(event, HistoryProvider())
         
         # Determine which detectors to run
         detectors_to_run = self._select_detectors(event, comprehensive)
         
         # Run detections
-        if self.parallel_execution:
-            results = self._run_parallel_detection(event, history, detectors_to_run)
-        else:
-            results = self._run_sequential_detection(event, history, detectors_to_run)
+        results = self.engine.run(detectors_to_run, event, history, call=self._run_single_detector)
         
         # Aggregate results
         aggregated = self._aggregate_results(results)
@@ -157,17 +161,14 @@ class CriminalDetectionSystem:
         """
         results = []
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(self.analyze_event, event): event 
-                      for event in events}
-            
-            for future in as_completed(futures):
-                try:
-                    result = future.result(timeout=30)
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Batch analysis error: {e}")
-                    results.append(self._create_error_result(str(e)))
+        # Events run one after another; each fans its detectors out through the
+        # shared engine instead of nesting a thread pool per event
+        for event in events:
+            try:
+                results.append(self.analyze_event(event))
+            except Exception as e:
+                logger.error(f"Batch analysis error: {e}")
+                results.append(self._create_error_result(str(e)))
         
         return results
     
@@ -183,9 +184,7 @@ class CriminalDetectionSystem:
             Comprehensive user profile
         """
         # Get extended history
-        history = self.services.database.get_user_history(
-            fingerprint_hash, case_id, hours=720  # 30 days
-        )
+        history = HistoryProvider().get(fingerprint_hash, case_id, hours=720)  # 30 days
         
         if not history:
             return {'error': 'No history found for user'}
@@ -235,6 +234,7 @@ class CriminalDetectionSystem:
         """
         return {
             'metrics': self.services.metrics.get_statistics(),
+            'detector_latency': self.engine.stats(),
             'active_detectors': list(self.detectors.keys()),
             'cache_status': self._get_cache_status(),
             'alert_statistics': self.alert_manager.get_alert_statistics('all'),
@@ -254,9 +254,9 @@ class CriminalDetectionSystem:
         
         return True
     
-    def _get_user_history(self, event: Any) -> List[Dict[str, Any]]:
+    def _get_user_history(self, event: Any, provider: HistoryProvider) -> List[Dict[str, Any]]:
         """Get user history for context"""
-        return self.services.database.get_user_history(
+        return provider.get(
             event.fingerprint_hash,
             event.case_id if hasattr(event, 'case_id') else 'unknown',
             hours=48
@@ -267,87 +267,19 @@ class CriminalDetectionSystem:
         if comprehensive:
             return self.detectors
         
-        # Smart selection based on event type
-        selected = {}
-        
-        # Always run core detectors for criminal cases
-        selected['criminal'] = self.detectors['criminal']
-        selected['evasion'] = self.detectors['evasion']
-        
-        # Add specific detectors based on event type
+        # Smart selection: rules declared in detection/graph.py
         event_type = event.event_type.lower()
-        
-        if 'search' in event_type:
-            selected['content'] = self.detectors['content']
-        
-        if 'mouse' in event_type or 'typing' in event_type:
-            selected['biometric'] = self.detectors['biometric']
-        
-        if event.is_tor or event.is_vpn:
-            selected['network'] = self.detectors['network']
-        
-        if 'login' in event_type or 'session' in event_type:
-            selected['session'] = self.detectors['session']
-        
-        # Add behavioral analysis for extended sessions
-        if hasattr(event, 'time_on_page') and event.time_on_page > 60:
-            selected['behavioral'] = self.detectors['behavioral']
-            selected['psychological'] = self.detectors['psychological']
-        
-        return selected
-    
-    def _run_parallel_detection(self, event: Any, history: List[Dict], 
-                               detectors: Dict[str, Any]) -> Dict[str, Any]:
-        """Run detectors in parallel"""
-        results = {}
-        
-        with ThreadPoolExecutor(max_workers=min(len(detectors), self.max_workers)) as executor:
-            futures = {}
-            
-            for name, detector in detectors.items():
-                future = executor.submit(self._run_single_detector, detector, event, history)
-                futures[future] = name
-            
-            for future in as_completed(futures):
-                name = futures[future]
-                try:
-                    result = future.result(timeout=10)
-                    results[name] = result
-                except Exception as e:
-                    logger.error(f"Detector {name} failed: {e}")
-                    results[name] = {'triggered': False, 'error': str(e)}
-        
-        return results
-    
-    def _run_sequential_detection(self, event: Any, history: List[Dict], 
-                                 detectors: Dict[str, Any]) -> Dict[str, Any]:
-        """Run detectors sequentially"""
-        results = {}
-        
-        for name, detector in detectors.items():
-            try:
-                results[name] = self._run_single_detector(detector, event, history)
-            except Exception as e:
-                logger.error(f"Detector {name} failed: {e}")
-                results[name] = {'triggered': False, 'error': str(e)}
-        
-        return results
+        return {
+            rule.detector: self.detectors[rule.detector]
+            for rule in DETECTOR_SELECTION
+            if rule.applies(event, event_type)
+        }
     
     def _run_single_detector(self, detector: Any, event: Any, 
                            history: List[Dict]) -> Dict[str, Any]:
         """Run a single detector"""
         # Different detectors have different method signatures
-        detector_name = detector.__class__.__name__
-        
-        if hasattr(detector, 'analyze'):
-            return detector.analyze(event, history)
-        elif hasattr(detector, 'check_honey_trap_interaction'):
-            return detector.check_honey_trap_interaction(event)
-        elif hasattr(detector, 'analyze_criminal_behavior'):
-            return detector.analyze_criminal_behavior(event)
-        else:
-            # Fallback for detectors with custom methods
-            return {'triggered': False, 'error': 'Incompatible detector interface'}
+        return call_detector(detector, event, history)
     
     def _aggregate_results(self, results: Dict[str, Any]) -> Dict[str, Any]:
         """Aggregate results from all detectors"""
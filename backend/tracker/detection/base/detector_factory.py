@@ -3,11 +3,12 @@ Detector Factory
 Factory pattern for creating and configuring detector instances
 """
 
-from typing import Dict, Any, Optional, Type
+from typing import Dict, Any, List, Optional, Type
 import logging
 import redis
 from django.core.cache import cache
 
+from ...redis_pool import get_redis_service
 from .base_detector import ServiceContainer, DatabaseService, MetricsService
 from .detector_facade import CriminalDetectionSystem
 
@@ -19,7 +20,7 @@ class DetectorFactory:
     
     @staticmethod
     def create_detection_system(
-        redis_host: str = 'localhost',
+        redis_host: Optional[str] = None,
         redis_port: int = 6379,
         redis_db: int = 0,
         use_django_cache: bool = True,
@@ -30,7 +31,8 @@ class DetectorFactory:
         Create a fully configured Criminal Detection System
         
         Args:
-            redis_host: Redis server host
+            redis_host: Redis server host (None: the shared pooled client
+                        from REDIS_URL, see tracker.redis_pool)
             redis_port: Redis server port
             redis_db: Redis database number
             use_django_cache: Whether to use Django's cache
@@ -83,7 +85,7 @@ class DetectorFactory:
     
     @staticmethod
     def _create_service_container(
-        redis_host: str,
+        redis_host: Optional[str],
         redis_port: int,
         redis_db: int,
         use_django_cache: bool,
@@ -91,21 +93,25 @@ class DetectorFactory:
     ) -> ServiceContainer:
         """Create and configure service container"""
         
-        # Initialize Redis client
+        # Initialize Redis client: the process-wide pool unless a dedicated
+        # server was asked for
         redis_client = None
-        try:
-            redis_client = redis.Redis(
-                host=redis_host,
-                port=redis_port,
-                db=redis_db,
-                decode_responses=True
-            )
-            # Test connection
-            redis_client.ping()
-            logger.info("Redis connection established")
-        except Exception as e:
-            logger.warning(f"Redis not available: {e}")
-            redis_client = None
+        if redis_host is None:
+            redis_client = get_redis_service().client()
+        else:
+            try:
+                redis_client = redis.Redis(
+                    host=redis_host,
+                    port=redis_port,
+                    db=redis_db,
+                    decode_responses=True
+                )
+                # Test connection
+                redis_client.ping()
+                logger.info("Redis connection established")
+            except Exception as e:
+                logger.warning(f"Redis not available: {e}")
+                redis_client = None
         
         # Initialize cache service
         cache_service = cache if use_django_cache else None
@@ -130,10 +136,11 @@ class DetectorFactory:
     def _create_database_service() -> DatabaseService:
         """Create default database service"""
         try:
-            # Try to import Django models
-            from .models import TrackingEvent
+            # Django models are only there inside a configured project
+            from django.apps import apps
+            apps.get_model('tracker', 'TrackingEvent')
             return DjangoDatabaseService()
-        except ImportError:
+        except (ImportError, LookupError):
             logger.warning("Django models not available, using dummy database service")
             return DummyDatabaseService()
 
@@ -143,47 +150,13 @@ class DjangoDatabaseService(DatabaseService):
     
     def get_user_history(self, fingerprint_hash: str, case_id: str, 
                          hours: int) -> List[Dict[str, Any]]:
-        """Get user history from Django database"""
-        from django.utils import timezone
-        from datetime import timedelta
-        from .models import TrackingEvent
-        
-        cutoff_time = timezone.now() - timedelta(hours=hours)
-        
-        events = TrackingEvent.objects.filter(
-            fingerprint_hash=fingerprint_hash,
-            case_id=case_id,
-            timestamp__gte=cutoff_time
-        ).order_by('-timestamp')[:500]
-        
-        history = []
-        for event in events:
-            history.append({
-                'id': str(event.id),
-                'timestamp': event.timestamp.isoformat(),
-                'event_type': event.event_type,
-                'page_url': event.page_url,
-                'ip_address': event.ip_address,
-                'is_vpn': event.is_vpn,
-                'is_tor': event.is_tor,
-                'is_proxy': event.is_proxy,
-                'device_type': event.device_type,
-                'browser': event.browser,
-                'os': event.os,
-                'city': event.ip_city,
-                'country': event.ip_country,
-                'time_on_page': event.time_on_page,
-                'scroll_depth': event.scroll_depth,
-                'user_agent': event.user_agent,
-                'referrer_url': event.referrer_url,
-                'event_data': event.event_data,
-            })
-        
-        return history
+        """Get user history from Django database (shared columnar window)"""
+        from ...history import HistoryProvider
+        return HistoryProvider().get(fingerprint_hash, case_id, hours)
     
     def save_detection(self, detection: Dict[str, Any]) -> None:
         """Save detection to Django database"""
-        from .models import SuspiciousActivity
+        from ...models import SuspiciousActivity
         
         SuspiciousActivity.objects.create(
             fingerprint_hash=detection.get('fingerprint_hash'),
@@ -196,7 +169,7 @@ class DjangoDatabaseService(DatabaseService):
     
     def save_alert(self, alert: Dict[str, Any]) -> None:
         """Save alert to Django database"""
-        from .models import Alert
+        from ...models import Alert
         
         Alert.objects.create(
             alert_type=alert.get('type'),
@@ -247,6 +220,10 @@ class ConfigurationManager:
         config = {
             'parallel_execution': True,
             'max_workers': 10,
+            'execution_mode': 'inline',
+            'detector_modes': {},
+            'detector_budgets': {},
+            'detector_budget': 10.0,
             'thresholds': {},
             'risk_weights': {},
             'cache_ttl': 600,
@@ -267,6 +244,9 @@ class ConfigurationManager:
         env_overrides = {
             'parallel_execution': os.environ.get('DETECTOR_PARALLEL', 'true').lower() == 'true',
             'max_workers': int(os.environ.get('DETECTOR_MAX_WORKERS', '10')),
+            'execution_mode': os.environ.get('DETECTOR_EXECUTION_MODE'),
+            'detector_budget': (float(os.environ['DETECTOR_BUDGET'])
+                                if os.environ.get('DETECTOR_BUDGET') else None),
             'cache_ttl': int(os.environ.get('DETECTOR_CACHE_TTL', '600'))
         }
         
@@ -294,6 +274,12 @@ class ConfigurationManager:
         if config['max_workers'] < 1:
             raise ValueError("max_workers must be at least 1")
         
+        from .execution_engine import MODES
+        modes = [config.get('execution_mode', 'inline'), *config.get('detector_modes', {}).values()]
+        for mode in modes:
+            if mode not in MODES:
+                raise ValueError(f"execution mode must be one of {', '.join(MODES)}, got {mode}")
+        
         return True
 
 
@@ -305,6 +291,12 @@ def create_default_system() -> CriminalDetectionSystem:
     return DetectorFactory.create_detection_system(config=config)
 
 
+def create_worker_detectors(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Detectors for one execution-engine worker process (built once per worker)"""
+    worker_config = {**config, 'execution_mode': 'inline', 'detector_modes': {}}
+    return DetectorFactory.create_detection_system(config=worker_config).detectors
+
+
 def create_test_system() -> CriminalDetectionSystem:
     """Create detection system for testing (no external dependencies)"""
     config = {
@@ -313,8 +305,6 @@ def create_test_system() -> CriminalDetectionSystem:
     }
     
     return DetectorFactory.create_detection_system(
-        redis_host='localhost',
-        redis_port=6379,
         use_django_cache=False,
         database_service=DummyDatabaseService(),
         config=config
@@ -0,0 +1,331 @@
+"""
+Detector Execution Engine
+Long-lived executor the detection facade runs its detectors through
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ...metrics import Histogram as LatencyHistogram, record_detector_run
+
+logger = logging.getLogger(__name__)
+
+INLINE = 'inline'
+PROCESS = 'process'
+ASYNC = 'async'
+MODES = (INLINE, PROCESS, ASYNC)
+
+DEFAULT_BUDGET = 10.0   # seconds per detector
+
+
+def call_detector(detector: Any, event: Any, history: List[Dict]) -> Dict[str, Any]:
+    """Run one detector through whichever entry point it implements"""
+    if hasattr(detector, 'analyze'):
+        return detector.analyze(event, history)
+    elif hasattr(detector, 'check_honey_trap_interaction'):
+        return detector.check_honey_trap_interaction(event)
+    elif hasattr(detector, 'analyze_criminal_behavior'):
+        return detector.analyze_criminal_behavior(event)
+    # Fallback for detectors with custom methods
+    return {'triggered': False, 'error': 'Incompatible detector interface'}
+
+
+# ============================================
+# PROCESS POOL WORKERS
+# Each worker builds its own detectors once (they hold Redis / cache clients
+# that do not pickle); tasks only carry the detector name, event and history.
+# ============================================
+
+_worker_detectors: Dict[str, Any] = {}
+
+
+def _init_worker(factory_path: str, config: Dict[str, Any]) -> None:
+    global _worker_detectors
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    # Never reuse a database connection inherited from the parent process
+    from django.db import connections
+    for conn in connections.all(initialized_only=True):
+        conn.connection = None
+    from django.utils.module_loading import import_string
+    _worker_detectors = import_string(factory_path)(config)
+
+
+def _run_in_worker(name: str, event: Any, history: List[Dict]):
+    started = time.perf_counter()
+    result = call_detector(_worker_detectors[name], event, history)
+    return result, time.perf_counter() - started
+
+
+class DetectorExecutionEngine:
+    """
+    Runs a set of detectors for one event and returns {name: result}.
+
+    Modes (per detector, `detector_modes` overriding `default_mode`):
+      inline  - in the calling thread; pure-Python detectors are fastest here
+                (threads only add GIL contention)
+      process - on a persistent multiprocessing pool for CPU-heavy detectors;
+                workers build their detectors once via `worker_factory`
+      async   - detectors exposing `async analyze_async(event, history)`, run
+                on one long-lived event loop thread (for I/O-bound work);
+                detectors without it run inline
+
+    Budgets: process and async runs are bounded by their detector budget. An
+    expired coroutine is cancelled; an expired process task retires its pool:
+    new work goes to a fresh pool, jobs other callers have in flight finish,
+    and workers still busy once every budget has passed are terminated.
+    Inline runs cannot be pre-empted; overruns are counted and logged.
+    """
+
+    def __init__(self, default_mode: str = INLINE, detector_modes: Dict[str, str] = None,
+                 budgets: Dict[str, float] = None, default_budget: float = DEFAULT_BUDGET,
+                 process_workers: int = None, worker_factory: str = None,
+                 worker_config: Dict[str, Any] = None):
+        if default_mode not in MODES:
+            raise ValueError(f"Unknown execution mode: {default_mode}")
+        for name, mode in (detector_modes or {}).items():
+            if mode not in MODES:
+                raise ValueError(f"Unknown execution mode for {name}: {mode}")
+        self.default_mode = default_mode
+        self.detector_modes = dict(detector_modes or {})
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
+        self.process_workers = process_workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+        self.worker_factory = worker_factory
+        self.worker_config = worker_config or {}
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._loop = None
+        self._loop_thread = None
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._outcomes: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'DetectorExecutionEngine':
+        default_mode = config.get('execution_mode', INLINE)
+        if config.get('parallel_execution') is False:
+            default_mode = INLINE
+        return cls(
+            default_mode=default_mode,
+            detector_modes=config.get('detector_modes'),
+            budgets=config.get('detector_budgets'),
+            default_budget=config.get('detector_budget', DEFAULT_BUDGET),
+            process_workers=config.get('process_workers'),
+            worker_factory=config.get(
+                'worker_factory', 'tracker.detection.base.detector_factory.create_worker_detectors'
+            ),
+            worker_config=config,
+        )
+
+    # ── public API ───────────────────────────────────────────────────────────
+
+    def mode_for(self, name: str, detector: Any) -> str:
+        mode = self.detector_modes.get(name, self.default_mode)
+        if mode == ASYNC and not hasattr(detector, 'analyze_async'):
+            return INLINE
+        if mode == PROCESS and not self.worker_factory:
+            return INLINE
+        return mode
+
+    def budget_for(self, name: str) -> float:
+        return self.budgets.get(name, self.default_budget)
+
+    def run(self, detectors: Dict[str, Any], event: Any, history: List[Dict],
+            call: Callable = call_detector) -> Dict[str, Dict[str, Any]]:
+        """Run `detectors` for one event; every name gets a result dict"""
+        by_mode = {INLINE: [], PROCESS: [], ASYNC: []}
+        for name, detector in detectors.items():
+            by_mode[self.mode_for(name, detector)].append((name, detector))
+
+        # Dispatch the off-thread work first so it overlaps the inline detectors
+        process_jobs = self._submit_process(by_mode[PROCESS], event, history)
+        async_jobs = self._submit_async(by_mode[ASYNC], event, history)
+
+        results = {}
+        for name, detector in by_mode[INLINE]:
+            results[name] = self._run_inline(name, detector, event, history, call)
+        results.update(self._collect_process(process_jobs, by_mode[PROCESS], event, history, call))
+        results.update(self._collect_async(async_jobs))
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-detector latency histogram and outcome counters"""
+        with self._lock:
+            return {
+                name: {
+                    'mode': self.detector_modes.get(name, self.default_mode),
+                    'budget': self.budget_for(name),
+                    'latency': histogram.snapshot(),
+                    **self._outcomes.get(name, {}),
+                }
+                for name, histogram in self._latency.items()
+            }
+
+    def close(self) -> None:
+        """Stop the process pool and the event loop thread"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            loop, self._loop = self._loop, None
+            thread, self._loop_thread = self._loop_thread, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=5)
+
+    # ── bookkeeping ──────────────────────────────────────────────────────────
+
+    def _record(self, name: str, seconds: Optional[float], outcome: str) -> None:
+        with self._lock:
+            histogram = self._latency.setdefault(name, LatencyHistogram())
+            if seconds is not None:     # timeouts have no completed latency
+                histogram.observe(seconds)
+            outcomes = self._outcomes.setdefault(name, {'ok': 0, 'errors': 0, 'timeouts': 0, 'over_budget': 0})
+            outcomes[outcome] += 1
+        # process-wide Prometheus series (tracker.metrics)
+        record_detector_run(name, seconds, outcome)
+
+    def _failed(self, name: str, error: Exception) -> Dict[str, Any]:
+        logger.error(f"Detector {name} failed: {error}")
+        return {'triggered': False, 'error': str(error) or error.__class__.__name__}
+
+    # ── inline ───────────────────────────────────────────────────────────────
+
+    def _run_inline(self, name, detector, event, history, call):
+        started = time.perf_counter()
+        try:
+            result = call(detector, event, history)
+        except Exception as e:
+            self._record(name, time.perf_counter() - started, 'errors')
+            return self._failed(name, e)
+        elapsed = time.perf_counter() - started
+        if elapsed > self.budget_for(name):
+            logger.warning(f"Detector {name} ran {elapsed:.2f}s inline (budget {self.budget_for(name)}s)")
+            self._record(name, elapsed, 'over_budget')
+        else:
+            self._record(name, elapsed, 'ok')
+        return result
+
+    # ── process pool ─────────────────────────────────────────────────────────
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(
+                    self.process_workers,
+                    initializer=_init_worker,
+                    initargs=(self.worker_factory, self.worker_config),
+                )
+            return self._pool
+
+    def _retire_pool(self, pool) -> None:
+        """Stop using a pool that holds an expired task without killing the jobs it shares"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        # close() lets queued and running jobs (other callers' included) finish
+        pool.close()
+        grace = max([self.default_budget, *self.budgets.values()])
+        threading.Thread(target=self._reap_pool, args=(pool, grace),
+                         name='detector-pool-reaper', daemon=True).start()
+
+    @staticmethod
+    def _reap_pool(pool, grace: float) -> None:
+        # Once every budget has passed no caller is waiting on the pool:
+        # terminate whatever is still running (the expired task itself)
+        joiner = threading.Thread(target=pool.join, daemon=True)
+        joiner.start()
+        joiner.join(grace)
+        if joiner.is_alive():
+            pool.terminate()
+
+    def _submit_process(self, detectors, event, history):
+        if not detectors:
+            return {}
+        try:
+            pool = self._get_pool()
+            submitted = time.perf_counter()
+            return {
+                name: (pool, pool.apply_async(_run_in_worker, (name, event, history)), submitted)
+                for name, _detector in detectors
+            }
+        except Exception as e:
+            logger.warning(f"Detector process pool unavailable, running inline: {e}")
+            return {}
+
+    def _collect_process(self, jobs, detectors, event, history, call):
+        results = {}
+        expired_pools = set()
+        for name, detector in detectors:
+            if name not in jobs:
+                # pool could not be used: fall back to the caller's thread
+                results[name] = self._run_inline(name, detector, event, history, call)
+                continue
+            pool, job, submitted = jobs[name]
+            remaining = self.budget_for(name) - (time.perf_counter() - submitted)
+            try:
+                result, seconds = job.get(timeout=max(remaining, 0))
+                results[name] = result
+                self._record(name, seconds, 'ok')
+            except multiprocessing.TimeoutError:
+                expired_pools.add(pool)
+                self._record(name, None, 'timeouts')
+                results[name] = self._failed(name, TimeoutError(f'exceeded {self.budget_for(name)}s budget'))
+            except Exception as e:
+                self._record(name, time.perf_counter() - submitted, 'errors')
+                results[name] = self._failed(name, e)
+        for pool in expired_pools:
+            self._retire_pool(pool)
+        return results
+
+    # ── asyncio ──────────────────────────────────────────────────────────────
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='detector-loop', daemon=True)
+                thread.start()
+                self._loop, self._loop_thread = loop, thread
+            return self._loop
+
+    async def _timed(self, name, detector, event, history):
+        started = time.perf_counter()
+        result = await asyncio.wait_for(detector.analyze_async(event, history), self.budget_for(name))
+        return result, time.perf_counter() - started
+
+    def _submit_async(self, detectors, event, history):
+        if not detectors:
+            return {}
+        loop = self._get_loop()
+        return {
+            name: asyncio.run_coroutine_threadsafe(self._timed(name, detector, event, history), loop)
+            for name, detector in detectors
+        }
+
+    def _collect_async(self, jobs):
+        results = {}
+        for name, future in jobs.items():
+            try:
+                # wait_for inside the coroutine enforces the budget and
+                # cancels it; the slack only covers scheduling
+                result, seconds = future.result(timeout=self.budget_for(name) + 1.0)
+                results[name] = result
+                self._record(name, seconds, 'ok')
+            except (asyncio.TimeoutError, TimeoutError):
+                future.cancel()
+                self._record(name, None, 'timeouts')
+                results[name] = self._failed(name, TimeoutError(f'exceeded {self.budget_for(name)}s budget'))
+            except Exception as e:
+                self._record(name, None, 'errors')
+                results[name] = self._failed(name, e)
+        return results
@@ -3,16 +3,16 @@ Core Criminal Detection System
 Main orchestrator for criminal behavior analysis
 """
 
-from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import redis
-import json
 import logging
 from django.utils import timezone
-from django.core.cache import cache
 
-from .models import TrackingEvent, UserSession, Alert, SuspiciousActivity
-from .constants import THRESHOLDS, RISK_WEIGHTS
+from ..models import TrackingEvent, Alert, SuspiciousActivity
+from ..history import HistoryProvider
+from ..redis_pool import get_redis, push_capped
+from ..feature_store import get_visitor_features
+from .graph import CRIMINAL_INDICATORS, EvaluationContext, GraphResult
+from .utils.constants import THRESHOLDS, RISK_WEIGHTS
 
 logger = logging.getLogger(__name__)
 
@@ -25,26 +25,23 @@ class EnhancedSuspiciousDetector:
     """
     
     def __init__(self):
-        # Initialize Redis connection for caching
-        try:
-            self.redis_client = redis.Redis(
-                host='localhost',
-                port=6379,
-                db=0,
-                decode_responses=True
-            )
-            self.redis_available = True
-        except:
-            self.redis_client = None
-            self.redis_available = False
-            logger.warning("Redis not available, using Django cache")
-        
+        # Redis comes from the shared pool (tracker.redis_pool); it is looked
+        # up per use so an open circuit sends callers to the Django cache.
+
         # Load configuration
         self.thresholds = THRESHOLDS
         self.risk_weights = RISK_WEIGHTS
         
         # Initialize sub-detectors (will be imported from other modules)
         self._init_detectors()
+
+    @property
+    def redis_client(self):
+        return get_redis()
+
+    @property
+    def redis_available(self) -> bool:
+        return self.redis_client is not None
     
     def _init_detectors(self):
         """Initialize all sub-detector modules"""
@@ -65,50 +62,20 @@ class EnhancedSuspiciousDetector:
         Returns a score between 0.0 and 10.0 (10 being most suspicious)
         """
         try:
-            # Get comprehensive user history
-            history = self.get_extended_user_history(event.fingerprint_hash, event.case_id)
-            session = event.session if hasattr(event, 'session') else None
-            
-            # Run all criminal-specific detection checks
-            criminal_indicators = {
-                # Critical behavioral patterns
-                'tor_usage': self.criminal_detector.check_tor_usage_criminal(event),
-                'evidence_tampering': self.criminal_detector.check_evidence_tampering(event, history),
-                'admin_probing': self.criminal_detector.check_admin_probing(event, history),
-                'victim_obsession': self.criminal_detector.check_victim_obsession(event, history),
-                'stalking_patterns': self.criminal_detector.check_stalking_patterns(event, history),
-                'witness_targeting': self.criminal_detector.check_witness_targeting(event, history),
-                
-                # High-risk patterns
-                'geographic_evasion': self.evasion_detector.check_geographic_evasion(event, history),
-                'identity_manipulation': self.evasion_detector.check_identity_manipulation(event, history),
-                'timeline_obsession': self.temporal_analyzer.check_timeline_obsession(event, history),
-                'advanced_evasion': self.evasion_detector.check_advanced_evasion(event, history),
-                
-                # Medium-risk patterns
-                'vpn_usage': self.evasion_detector.check_criminal_vpn_usage(event, history),
-                'device_switching': self.evasion_detector.check_device_manipulation(event, history),
-                'unusual_timing': self.temporal_analyzer.check_criminal_timing(event, history),
-                'rapid_visits': self.behavioral_detector.check_obsessive_visits(event, history),
-                
-                # Supporting indicators
-                'proxy_usage': self.evasion_detector.check_proxy_chains(event, history),
-                'behavioral_anomalies': self.behavioral_detector.check_criminal_behavioral_anomalies(event, history),
-            }
+            # Cheapest checks first, stopping once the score is pinned at 10.0
+            result = self.evaluate_indicators(event, short_circuit=True)
             
             # Calculate 10-point criminal suspicion score
-            score = self.calculate_criminal_score(criminal_indicators)
-            
-            # Enhanced pattern learning for criminal behavior
-            self.store_criminal_analysis(event.fingerprint_hash, score, criminal_indicators)
-            
-            # Create criminal activity record if warranted
-            if score >= 6.0:  # Medium-high threshold
-                self.create_criminal_activity_record(event, criminal_indicators, score)
+            score = self.calculate_criminal_score(result.indicators)
             
-            # Create critical alert for high-risk scores
-            if score >= 8.0:  # High threshold for law enforcement alert
-                self.create_law_enforcement_alert(event, criminal_indicators, score)
+            if result.short_circuited:
+                # The score is final, but the stored analysis, the activity
+                # record and the alert list every triggered indicator: the
+                # remaining checks (and the history they read) run off the
+                # request path
+                self._queue_recording(event)
+            else:
+                self.record_criminal_analysis(event, result.indicators, score)
             
             return score
             
@@ -116,6 +83,63 @@ class EnhancedSuspiciousDetector:
             logger.error(f"Error analyzing criminal behavior: {e}")
             return 0.0
     
+    def record_criminal_analysis(self, event: TrackingEvent, indicators: Optional[Dict[str, Dict]] = None,
+                                 score: Optional[float] = None) -> None:
+        """
+        Store the analysis and create the activity record / alert the score
+        warrants. Without `indicators`, every indicator is evaluated first.
+        """
+        if indicators is None:
+            indicators = self.evaluate_indicators(event).indicators
+            score = self.calculate_criminal_score(indicators)
+        
+        # Enhanced pattern learning for criminal behavior
+        self.store_criminal_analysis(event.fingerprint_hash, score, indicators)
+        
+        # Create criminal activity record if warranted
+        if score >= 6.0:  # Medium-high threshold
+            self.create_criminal_activity_record(event, indicators, score)
+        
+        # Create critical alert for high-risk scores
+        if score >= 8.0:  # High threshold for law enforcement alert
+            self.create_law_enforcement_alert(event, indicators, score)
+    
+    def _queue_recording(self, event: TrackingEvent) -> None:
+        """Record a short-circuited event in the background (inline if Celery is down)"""
+        try:
+            from ..tasks import record_criminal_analysis
+            record_criminal_analysis.delay(str(event.id))
+        except Exception as e:
+            logger.debug(f"Could not queue criminal analysis of {event.id}, recording inline: {e}")
+            self.record_criminal_analysis(event)
+    
+    def evaluate_indicators(self, event: TrackingEvent, short_circuit: bool = False) -> GraphResult:
+        """
+        Run the criminal indicator graph (detection/graph.py) for one event.
+        History and visitor features are only loaded when a check needs them.
+        With short_circuit, evaluation stops once the score is pinned at 10.0:
+        scores are non-negative, so further indicators cannot change it, but
+        the indicators are then partial (result.short_circuited).
+        """
+        provider = HistoryProvider()
+        context = EvaluationContext(
+            event,
+            # Comprehensive user history (one fetch shared by every check)
+            history_loader=lambda: self.get_extended_user_history(
+                event.fingerprint_hash, event.case_id, provider
+            ),
+            # Precomputed per-visitor counters (updated incrementally on ingest)
+            features_loader=lambda ctx: get_visitor_features(
+                event.fingerprint_hash, event.case_id, lambda: ctx.history
+            ),
+        )
+        is_final = self.score_is_final if short_circuit else None
+        return CRIMINAL_INDICATORS.evaluate(self, context, is_final)
+    
+    def score_is_final(self, indicators: Dict[str, Dict]) -> bool:
+        """True when more triggered indicators could not change the score"""
+        return self.calculate_criminal_score(indicators) >= 10.0
+    
     def calculate_criminal_score(self, indicators: Dict[str, Dict]) -> float:
         """Calculate 10-point criminal suspicion score"""
         total_score = 0.0
@@ -143,58 +167,11 @@ class EnhancedSuspiciousDetector:
         
         return round(final_score, 1)
     
-    def get_extended_user_history(self, fingerprint_hash: str, case_id: str) -> List[Dict[str, Any]]:
-        """Get extended user history for criminal behavior analysis"""
-        cache_key = f'criminal_history:{fingerprint_hash}:{case_id}'
-        
-        # Try cache first
-        if self.redis_available:
-            cached = self.redis_client.get(cache_key)
-            if cached:
-                return json.loads(cached)
-        else:
-            cached = cache.get(cache_key)
-            if cached:
-                return cached
-        
-        # Get extended history from database (48 hours for criminal cases)
-        history = []
-        recent_events = TrackingEvent.objects.filter(
-            fingerprint_hash=fingerprint_hash,
-            case_id=case_id,
-            timestamp__gte=timezone.now() - timedelta(hours=48)
-        ).order_by('-timestamp')[:200]  # More events for criminal analysis
-        
-        for event in recent_events:
-            history.append({
-                'id': str(event.id),
-                'timestamp': event.timestamp.isoformat(),
-                'event_type': event.event_type,
-                'page_url': event.page_url,
-                'ip_address': event.ip_address,
-                'is_vpn': event.is_vpn,
-                'is_tor': event.is_tor,
-                'is_proxy': event.is_proxy,
-                'device_type': event.device_type,
-                'browser': event.browser,
-                'os': event.os,
-                'city': event.ip_city,
-                'country': event.ip_country,
-                'time_on_page': event.time_on_page,
-                'scroll_depth': event.scroll_depth,
-                'user_agent': event.user_agent,
-                'referrer_url': event.referrer_url,
-                'event_data': event.event_data,
-                'timezone': getattr(event, 'timezone', None),
-            })
-        
-        # Cache for 10 minutes (shorter for criminal cases)
-        if self.redis_available:
-            self.redis_client.setex(cache_key, 600, json.dumps(history))
-        else:
-            cache.set(cache_key, history, 600)
-        
-        return history
+    def get_extended_user_history(self, fingerprint_hash: str, case_id: str,
+                                  history_provider: Optional[HistoryProvider] = None) -> List[Dict[str, Any]]:
+        """Get extended user history (48 hours) for criminal behavior analysis"""
+        provider = history_provider or HistoryProvider()
+        return provider.get(fingerprint_hash, case_id, hours=48)
     
     def store_criminal_analysis(self, fingerprint_hash: str, score: float, indicators: Dict) -> None:
         """Store enhanced analysis result for criminal pattern learning"""
@@ -210,14 +187,7 @@ class EnhancedSuspiciousDetector:
             'law_enforcement_flag': score >= 8.0,
         }
         
-        if self.redis_available:
-            self.redis_client.lpush(cache_key, json.dumps(result))
-            self.redis_client.ltrim(cache_key, 0, 199)  # Keep more history for criminal cases
-            self.redis_client.expire(cache_key, 172800)  # Expire after 48 hours
-        else:
-            history = cache.get(cache_key, [])
-            history.insert(0, result)
-            cache.set(cache_key, history[:200], 172800)
+        push_capped(cache_key, result, maxlen=200, ttl=172800)  # Keep more history for criminal cases
     
     def _calculate_threat_level(self, score: float, indicators: Dict) -> str:
         """Calculate threat level based on score and indicators"""
@@ -3,11 +3,13 @@ Behavioral Pattern Detection Module
 Detects nervous behavior, obsessive patterns, and psychological indicators
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
-from django.utils import timezone
+from datetime import datetime
+from typing import Dict, List, Any, Optional
 import logging
 
+from ...feature_store import VisitorFeatures
+from ...page_classifier import history_category
+
 logger = logging.getLogger(__name__)
 
 
@@ -151,30 +153,30 @@ class BehavioralPatternDetector:
         
         return result
     
-    def check_obsessive_visits(self, event, history: List[Dict]) -> Dict[str, Any]:
+    def check_obsessive_visits(self, event, history: List[Dict],
+                               features: Optional[VisitorFeatures] = None) -> Dict[str, Any]:
         """Enhanced rapid/obsessive visit detection"""
         result = {'triggered': False, 'score': 0.0, 'severity': 0, 'details': {}}
+        features = features or VisitorFeatures.from_history(history)
         
         # Count recent visits in shorter time window
-        time_window = timezone.now() - timedelta(seconds=self.thresholds['obsessive_visits_time'])
-        recent_visits = [h for h in history if datetime.fromisoformat(h['timestamp']) > time_window]
+        recent_visits, refresh_count, first_visit = features.recent(self.thresholds['obsessive_visits_time'])
         
         obsession_score = 0.0
         obsession_details = {}
         
-        if len(recent_visits) >= self.thresholds['obsessive_visits_count']:
-            obsession_score += min(len(recent_visits) * 0.2, 5.0)
-            obsession_details['rapid_visits'] = len(recent_visits)
+        if recent_visits >= self.thresholds['obsessive_visits_count']:
+            obsession_score += min(recent_visits * 0.2, 5.0)
+            obsession_details['rapid_visits'] = recent_visits
         
         # Check for compulsive page refreshing
-        refresh_count = sum(1 for h in recent_visits if h.get('event_type') == 'page_refresh')
         if refresh_count > 10:
             obsession_score += 2.0
             obsession_details['compulsive_refreshing'] = refresh_count
         
         # Check navigation speed
-        if len(recent_visits) > 1:
-            nav_speed = self._calculate_navigation_speed(recent_visits)
+        if recent_visits > 1:
+            nav_speed = self._calculate_navigation_speed(recent_visits, first_visit, features.last_seen)
             if nav_speed > self.thresholds['rapid_navigation_count']:
                 obsession_score += 2.0
                 obsession_details['navigation_speed'] = nav_speed
@@ -324,17 +326,15 @@ class BehavioralPatternDetector:
                 return True
         return False
     
-    def _calculate_navigation_speed(self, recent_visits: List[Dict]) -> float:
+    def _calculate_navigation_speed(self, visits: int, first_seen: float, last_seen: float) -> float:
         """Calculate pages per minute navigation speed"""
-        if len(recent_visits) < 2:
+        if visits < 2 or first_seen is None:
             return 0
         
-        first_time = datetime.fromisoformat(recent_visits[-1]['timestamp'])
-        last_time = datetime.fromisoformat(recent_visits[0]['timestamp'])
-        time_diff = (last_time - first_time).total_seconds() / 60  # minutes
+        time_diff = (last_seen - first_seen) / 60  # minutes
         
         if time_diff > 0:
-            return len(recent_visits) / time_diff
+            return visits / time_diff
         return 0
     
     def _detect_bot_behavior(self, event, history: List[Dict]) -> bool:
@@ -476,8 +476,7 @@ class BehavioralPatternDetector:
         planning_indicators = 0
         
         # Check for systematic page access
-        pages_accessed = [h.get('page_url', '') for h in history]
-        if self._is_systematic_access(pages_accessed):
+        if self._is_systematic_access([history_category(h) for h in history]):
             planning_indicators += 1
         
         # Check for note-taking pauses
@@ -492,14 +491,11 @@ class BehavioralPatternDetector:
         
         return planning_indicators >= self.thresholds['planning_indicators_threshold']
     
-    def _is_systematic_access(self, pages: List[str]) -> bool:
-        """Check if pages were accessed systematically"""
-        if len(pages) < 5:
+    def _is_systematic_access(self, categories: List[str]) -> bool:
+        """Check if page categories were accessed systematically"""
+        if len(categories) < 5:
             return False
         
-        # Look for pattern in page access
-        categories = [self._categorize_page(p) for p in pages]
-        
         # Check if accessing categories in order
         unique_categories = []
         for cat in categories:
@@ -509,22 +505,6 @@ class BehavioralPatternDetector:
         # Systematic if accessing different categories in sequence
         return len(unique_categories) >= self.thresholds['systematic_access_threshold']
     
-    def _categorize_page(self, url: str) -> str:
-        """Categorize page type from URL"""
-        url_lower = url.lower()
-        if 'photo' in url_lower or 'image' in url_lower:
-            return 'photos'
-        elif 'timeline' in url_lower:
-            return 'timeline'
-        elif 'evidence' in url_lower:
-            return 'evidence'
-        elif 'witness' in url_lower:
-            return 'witnesses'
-        elif 'news' in url_lower or 'update' in url_lower:
-            return 'news'
-        else:
-            return 'other'
-    
     def _divide_into_periods(self, history: List[Dict], num_periods: int) -> List[List[Dict]]:
         """Divide history into time periods"""
         if not history:
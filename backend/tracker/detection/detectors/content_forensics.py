@@ -8,6 +8,8 @@ from typing import Dict, List, Any
 import re
 import logging
 
+from ...page_classifier import history_category
+
 logger = logging.getLogger(__name__)
 
 
@@ -244,20 +246,14 @@ class ContentForensicsAnalyzer:
         if len(harvest_events) < 5:
             return False
         
-        # Check for systematic pattern
-        pages = [h.get('page_url', '') for h in harvest_events]
-        
         # Check if harvesting in order
-        return self._is_systematic_access(pages)
+        return self._is_systematic_access([history_category(h) for h in harvest_events])
     
-    def _is_systematic_access(self, pages: List[str]) -> bool:
-        """Check if pages were accessed systematically"""
-        if len(pages) < 5:
+    def _is_systematic_access(self, categories: List[str]) -> bool:
+        """Check if page categories were accessed systematically"""
+        if len(categories) < 5:
             return False
         
-        # Look for pattern in page access
-        categories = [self._categorize_page(p) for p in pages]
-        
         # Check if accessing categories in order
         unique_categories = []
         for cat in categories:
@@ -267,22 +263,6 @@ class ContentForensicsAnalyzer:
         # Systematic if accessing different categories in sequence
         return len(unique_categories) >= self.thresholds['systematic_access_threshold']
     
-    def _categorize_page(self, url: str) -> str:
-        """Categorize page type from URL"""
-        url_lower = url.lower()
-        if 'photo' in url_lower or 'image' in url_lower:
-            return 'photos'
-        elif 'timeline' in url_lower:
-            return 'timeline'
-        elif 'evidence' in url_lower:
-            return 'evidence'
-        elif 'witness' in url_lower:
-            return 'witnesses'
-        elif 'news' in url_lower or 'update' in url_lower:
-            return 'news'
-        else:
-            return 'other'
-    
     def _detect_search_progression(self, search_history: List[str]) -> bool:
         """Detect if searches show knowledge progression"""
         if len(search_history) < 3:
@@ -3,10 +3,12 @@ Criminal Indicator Detection Module
 Detects critical criminal behavior patterns
 """
 
-from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
 
+from ...feature_store import VisitorFeatures
+from ..utils.detector_utils import DetectorUtils
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,27 +44,24 @@ class CriminalIndicatorDetector:
         
         return result
     
-    def check_evidence_tampering(self, event, history: List[Dict]) -> Dict[str, Any]:
+    def check_evidence_tampering(self, event, history: List[Dict],
+                                 features: Optional[VisitorFeatures] = None) -> Dict[str, Any]:
         """Detect attempts to tamper with or manipulate evidence"""
         result = {'triggered': False, 'score': 0.0, 'severity': 0, 'details': {}}
+        features = features or VisitorFeatures.from_history(history)
         
         tampering_indicators = []
         
         # Check for evidence page manipulation
-        evidence_pages = [h for h in history if 'evidence' in h.get('page_url', '').lower()]
-        if len(evidence_pages) > 5:
-            # Check for suspicious interaction patterns
-            for page in evidence_pages[-10:]:  # Last 10 evidence page visits
-                if self._detect_tampering_behavior(page):
-                    tampering_indicators.append('evidence_manipulation')
+        if features.count('evidence') > 5 and features.count('evidence_tamper'):
+            tampering_indicators.append('evidence_manipulation')
         
         # Check for timeline modification attempts
-        timeline_events = [h for h in history if 'timeline' in h.get('page_url', '').lower()]
-        if self._detect_timeline_tampering(timeline_events):
+        if features.count('timeline') >= 3 and features.count('timeline_tamper') >= 3:
             tampering_indicators.append('timeline_tampering')
         
         # Check for photo/document manipulation attempts
-        if self._detect_media_tampering(event, history):
+        if features.count('media_tamper') >= 3:
             tampering_indicators.append('media_tampering')
         
         if tampering_indicators:
@@ -77,9 +76,11 @@ class CriminalIndicatorDetector:
         
         return result
     
-    def check_admin_probing(self, event, history: List[Dict]) -> Dict[str, Any]:
+    def check_admin_probing(self, event, history: List[Dict],
+                            features: Optional[VisitorFeatures] = None) -> Dict[str, Any]:
         """Detect admin access attempts"""
         result = {'triggered': False, 'score': 0.0, 'severity': 0, 'details': {}}
+        features = features or VisitorFeatures.from_history(history)
         
         admin_indicators = []
         admin_score = 0.0
@@ -93,8 +94,8 @@ class CriminalIndicatorDetector:
                 break
         
         # Check history
-        admin_attempts = [h for h in history if any(path in h.get('page_url', '').lower() for path in admin_paths)]
-        if len(admin_attempts) >= self.thresholds['admin_page_probing']:
+        admin_attempts = features.count('admin')
+        if admin_attempts >= self.thresholds['admin_page_probing']:
             admin_score = max(admin_score, 9.0)
             admin_indicators.append('repeated_admin_attempts')
         
@@ -104,24 +105,25 @@ class CriminalIndicatorDetector:
             result['severity'] = 5
             result['details'] = {
                 'admin_indicators': admin_indicators,
-                'attempts_count': len(admin_attempts)
+                'attempts_count': admin_attempts
             }
         
         return result
     
-    def check_victim_obsession(self, event, history: List[Dict]) -> Dict[str, Any]:
+    def check_victim_obsession(self, event, history: List[Dict],
+                               features: Optional[VisitorFeatures] = None) -> Dict[str, Any]:
         """Detect obsessive focus on victim information"""
         result = {'triggered': False, 'score': 0.0, 'severity': 0, 'details': {}}
+        features = features or VisitorFeatures.from_history(history)
         
         # Calculate victim-related page ratio
-        victim_pages = [h for h in history if self._is_victim_related_page(h.get('page_url', ''))]
-        victim_ratio = len(victim_pages) / len(history) if history else 0
+        victim_ratio = features.ratio('victim')
         
         # Check for victim photo obsession
-        photo_views = [h for h in history if 'photo' in h.get('page_url', '').lower() or 'image' in h.get('page_url', '').lower()]
+        photo_views = features.count('photo')
         
         # Check for victim name searches
-        victim_searches = self._count_victim_name_searches(history)
+        victim_searches = features.count('search')
         
         # Calculate obsession score
         obsession_score = 0.0
@@ -131,16 +133,16 @@ class CriminalIndicatorDetector:
             obsession_score += 6.0
             obsession_details['high_victim_focus'] = victim_ratio
         
-        if len(photo_views) > self.thresholds['victim_photo_downloads']:
+        if photo_views > self.thresholds['victim_photo_downloads']:
             obsession_score += 3.0
-            obsession_details['photo_obsession'] = len(photo_views)
+            obsession_details['photo_obsession'] = photo_views
         
         if victim_searches > self.thresholds['victim_name_searches']:
             obsession_score += 2.0
             obsession_details['name_searches'] = victim_searches
         
-        # Check for victim personal info collection
-        if self._detect_personal_info_collection(history):
+        # Check for victim personal info collection (downloads/copies weigh 3)
+        if features.count('personal_info') > 5:
             obsession_score += 4.0
             obsession_details['personal_info_collection'] = True
         
@@ -152,29 +154,31 @@ class CriminalIndicatorDetector:
         
         return result
     
-    def check_stalking_patterns(self, event, history: List[Dict]) -> Dict[str, Any]:
+    def check_stalking_patterns(self, event, history: List[Dict],
+                                features: Optional[VisitorFeatures] = None) -> Dict[str, Any]:
         """Detect stalking behavior patterns"""
         result = {'triggered': False, 'score': 0.0, 'severity': 0, 'details': {}}
+        features = features or VisitorFeatures.from_history(history)
         
         stalking_indicators = []
         stalking_score = 0.0
         
         # Check for night stalking pattern (11pm-4am)
-        night_visits = [h for h in history if self._is_night_stalking_hour(h.get('timestamp'))]
-        night_ratio = len(night_visits) / len(history) if history else 0
+        by_hour = features.count_by_hour_of_day()
+        night_visits = sum(n for hour, n in by_hour.items() if hour >= 23 or hour < 4)
+        night_ratio = night_visits / features.total if features.total else 0
         
         if night_ratio > self.thresholds['night_stalking_ratio']:
             stalking_indicators.append('night_stalking')
             stalking_score += 5.0
         
         # Check for location obsession
-        location_pages = [h for h in history if self._is_location_related(h.get('page_url', ''))]
-        if len(location_pages) > self.thresholds['location_obsession_count']:
+        if features.count('location') > self.thresholds['location_obsession_count']:
             stalking_indicators.append('location_obsession')
             stalking_score += 4.0
         
         # Check for family/friend targeting
-        if self._detect_family_targeting(history):
+        if features.count('family') > 5:
             stalking_indicators.append('family_targeting')
             stalking_score += 6.0
         
@@ -244,8 +248,7 @@ class CriminalIndicatorDetector:
         """Check if IP is a known Tor exit node"""
         if not ip_address:
             return False
-        # In production, would query Tor exit node database
-        return False
+        return DetectorUtils.is_tor_exit_node(ip_address)
     
     def _detect_tor_bridge(self, event) -> bool:
         """Detect Tor bridge usage"""
@@ -257,130 +260,6 @@ class CriminalIndicatorDetector:
         # Would check for obfuscated Tor patterns
         return False
     
-    def _detect_tampering_behavior(self, page_data: Dict) -> bool:
-        """Detect evidence tampering behavior"""
-        if not page_data:
-            return False
-        
-        event_type = page_data.get('event_type', '')
-        
-        # Check for form manipulation on evidence pages
-        if event_type in ['form_modify', 'console_open', 'debugger_detected']:
-            return True
-        
-        # Check for attempts to modify page content
-        event_data = page_data.get('event_data', {})
-        if isinstance(event_data, dict):
-            if event_data.get('content_editable_modified'):
-                return True
-            if event_data.get('dom_manipulation_detected'):
-                return True
-        
-        return False
-    
-    def _detect_timeline_tampering(self, timeline_events: List[Dict]) -> bool:
-        """Detect timeline tampering attempts"""
-        if len(timeline_events) < 3:
-            return False
-        
-        tampering_indicators = 0
-        
-        for event in timeline_events:
-            event_data = event.get('event_data', {})
-            if not isinstance(event_data, dict):
-                continue
-                
-            # Check for console usage on timeline pages
-            if event_data.get('console_opened'):
-                tampering_indicators += 1
-            
-            # Check for inspect element usage
-            if event_data.get('inspect_element'):
-                tampering_indicators += 1
-            
-            # Check for unusual interactions
-            if event.get('event_type') in ['right_click', 'select_text', 'copy']:
-                tampering_indicators += 1
-        
-        return tampering_indicators >= 3
-    
-    def _detect_media_tampering(self, event, history: List[Dict]) -> bool:
-        """Detect media tampering attempts"""
-        media_events = [h for h in history if 
-                       any(term in h.get('page_url', '').lower() for term in ['photo', 'image', 'video'])]
-        
-        tampering_score = 0
-        
-        for media_event in media_events:
-            event_data = media_event.get('event_data', {})
-            
-            if media_event.get('event_type') == 'download':
-                tampering_score += 1
-            
-            if isinstance(event_data, dict):
-                if event_data.get('right_click_on_image'):
-                    tampering_score += 1
-                if event_data.get('save_as_attempt'):
-                    tampering_score += 1
-        
-        return tampering_score >= 3
-    
-    def _is_victim_related_page(self, url: str) -> bool:
-        """Check if page is related to victim information"""
-        if not url:
-            return False
-        
-        victim_indicators = [
-            'victim', 'missing', 'disappeared', 'last_seen', 
-            'biography', 'personal', 'family', 'friends'
-        ]
-        
-        url_lower = url.lower()
-        return any(indicator in url_lower for indicator in victim_indicators)
-    
-    def _count_victim_name_searches(self, history: List[Dict]) -> int:
-        """Count searches for victim names"""
-        search_count = 0
-        for h in history:
-            event_data = h.get('event_data', {})
-            if isinstance(event_data, dict) and 'search' in str(event_data).lower():
-                search_count += 1
-        return search_count
-    
-    def _detect_personal_info_collection(self, history: List[Dict]) -> bool:
-        """Detect collection of personal information"""
-        personal_pages = ['profile', 'about', 'bio', 'personal', 'details', 'information']
-        
-        personal_access = 0
-        for h in history:
-            page_url = h.get('page_url', '').lower()
-            if any(term in page_url for term in personal_pages):
-                personal_access += 1
-                
-                # Extra weight for download/copy events
-                if h.get('event_type') in ['download', 'copy', 'screenshot']:
-                    personal_access += 2
-        
-        return personal_access > 5
-    
-    def _is_night_stalking_hour(self, timestamp_str: str) -> bool:
-        """Check if timestamp falls in stalking hours (11pm-4am)"""
-        try:
-            dt = datetime.fromisoformat(timestamp_str)
-            hour = dt.hour
-            return hour >= 23 or hour < 4
-        except:
-            return False
-    
-    def _is_location_related(self, url: str) -> bool:
-        """Check if page is location-related"""
-        if not url:
-            return False
-        
-        location_indicators = ['location', 'address', 'map', 'coordinates', 'place', 'where']
-        url_lower = url.lower()
-        return any(indicator in url_lower for indicator in location_indicators)
-    
     def _detect_family_targeting(self, history: List[Dict]) -> bool:
         """Detect targeting of family members"""
         family_related = [h for h in history if 'family' in h.get('page_url', '').lower()]
@@ -9,6 +9,8 @@ import hashlib
 import json
 import logging
 
+from ...redis_pool import push_capped
+
 logger = logging.getLogger(__name__)
 
 
@@ -430,10 +432,7 @@ class HoneytrapManager:
         logger.warning(f"HONEYTRAP TRIGGERED: {json.dumps(log_entry)}")
         
         # Store for analysis
-        if self.parent.redis_available:
-            key = f"honeytrap_triggers:{event.case_id}"
-            self.parent.redis_client.lpush(key, json.dumps(log_entry))
-            self.parent.redis_client.expire(key, 86400 * 30)  # Keep for 30 days
+        push_capped(f"honeytrap_triggers:{event.case_id}", log_entry, ttl=86400 * 30)  # Keep for 30 days
     
     def _calculate_trap_effectiveness(self, trap: Dict) -> float:
         """Calculate effectiveness score for a trap"""
@@ -4,9 +4,12 @@ Analyzes time-based patterns and behaviors
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
 
+from ...feature_store import VisitorFeatures
+from ...page_classifier import history_category
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,18 +65,20 @@ class TemporalAnalyzer:
         
         return result
     
-    def check_timeline_obsession(self, event, history: List[Dict]) -> Dict[str, Any]:
+    def check_timeline_obsession(self, event, history: List[Dict],
+                                 features: Optional[VisitorFeatures] = None) -> Dict[str, Any]:
         """Detect obsessive monitoring of case timeline"""
         result = {'triggered': False, 'score': 0.0, 'severity': 0, 'details': {}}
+        features = features or VisitorFeatures.from_history(history)
         
         # Count timeline page visits
-        timeline_visits = [h for h in history if 'timeline' in h.get('page_url', '').lower()]
+        timeline_visits = features.count('timeline')
         
-        if len(timeline_visits) > self.thresholds['timeline_obsession_count']:
-            obsession_score = min(len(timeline_visits) * 0.4, 8.0)
+        if timeline_visits > self.thresholds['timeline_obsession_count']:
+            obsession_score = min(timeline_visits * 0.4, 8.0)
             
             # Check for anniversary monitoring
-            anniversary_visits = self._check_anniversary_correlation(timeline_visits)
+            anniversary_visits = self._check_anniversary_correlation(features)
             if anniversary_visits:
                 obsession_score += 2.0
             
@@ -81,7 +86,7 @@ class TemporalAnalyzer:
             result['score'] = min(obsession_score, 10.0)
             result['severity'] = min(int(obsession_score / 2), 5)
             result['details'] = {
-                'timeline_visits': len(timeline_visits),
+                'timeline_visits': timeline_visits,
                 'anniversary_correlation': anniversary_visits,
                 'pattern_type': 'obsessive_monitoring'
             }
@@ -266,24 +271,10 @@ class TemporalAnalyzer:
         # Check if intensity is increasing
         return intensity_scores == sorted(intensity_scores)
     
-    def _check_anniversary_correlation(self, timeline_visits: List[Dict]) -> bool:
+    def _check_anniversary_correlation(self, features: VisitorFeatures) -> bool:
         """Check if visits correlate with case anniversaries"""
-        if not timeline_visits:
-            return False
-        
-        # Extract visit dates
-        visit_dates = []
-        for visit in timeline_visits:
-            timestamp = datetime.fromisoformat(visit['timestamp'])
-            visit_dates.append(timestamp.day)
-        
-        # Check for clustering around specific dates
-        date_counts = {}
-        for day in visit_dates:
-            date_counts[day] = date_counts.get(day, 0) + 1
-        
-        # Suspicious if multiple visits on same day of month
-        return any(count > 3 for count in date_counts.values())
+        # Suspicious if multiple timeline visits on same day of month
+        return any(count > 3 for count in features.count_by_day_of_month('timeline').values())
     
     def _is_case_anniversary(self, timestamp: datetime) -> bool:
         """Check if date is a case anniversary"""
@@ -382,7 +373,7 @@ class TemporalAnalyzer:
         total_time = 0
         
         for h in history:
-            page_type = self._categorize_page(h.get('page_url', ''))
+            page_type = history_category(h)
             time_spent = h.get('time_on_page', 0)
             
             if page_type not in focus_areas:
@@ -405,22 +396,6 @@ class TemporalAnalyzer:
             'focus_distribution': focus_areas
         }
     
-    def _categorize_page(self, url: str) -> str:
-        """Categorize page type from URL"""
-        url_lower = url.lower()
-        if 'photo' in url_lower or 'image' in url_lower:
-            return 'photos'
-        elif 'timeline' in url_lower:
-            return 'timeline'
-        elif 'evidence' in url_lower:
-            return 'evidence'
-        elif 'witness' in url_lower:
-            return 'witnesses'
-        elif 'news' in url_lower or 'update' in url_lower:
-            return 'news'
-        else:
-            return 'other'
-    
     def _divide_into_periods(self, history: List[Dict], num_periods: int) -> List[List[Dict]]:
         """Divide history into time periods"""
         if not history:
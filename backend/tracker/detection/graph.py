@@ -0,0 +1,218 @@
+"""
+Detector Graph
+Declarative detector nodes evaluated cheapest-first with early exit
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cost classes, cheapest first
+EVENT = 0       # fields of the event itself (plus in-memory indexes)
+FEATURES = 1    # precomputed per-visitor counters (feature_store)
+HISTORY = 2     # scans of the visitor's history window
+
+COST_NAMES = {EVENT: 'event', FEATURES: 'features', HISTORY: 'history'}
+
+
+@dataclass(frozen=True)
+class DetectorNode:
+    """
+    One indicator check.
+
+    detector / method: attribute of the owning system and the method on it
+    inputs:            positional arguments after the event, from
+                       ('history', 'features', 'loaded_history'), in the
+                       method's order. Checks that read features and take
+                       history only as their fallback get 'loaded_history':
+                       the window if something already loaded it, else []
+    cost:              EVENT, FEATURES or HISTORY
+    max_score:         highest score the check can return (orders nodes of
+                       one cost class: likelier to settle the outcome first)
+    """
+    name: str
+    detector: str
+    method: str
+    inputs: Tuple[str, ...] = ()
+    cost: int = EVENT
+    max_score: float = 10.0
+
+    def run(self, owner: Any, context: 'EvaluationContext') -> Dict[str, Any]:
+        check = getattr(getattr(owner, self.detector), self.method)
+        return check(context.event, *(getattr(context, name) for name in self.inputs))
+
+
+class EvaluationContext:
+    """Event plus lazily loaded history / features (loaded once, on first use)"""
+
+    def __init__(self, event: Any, history_loader: Callable[[], List[Dict]],
+                 features_loader: Callable[['EvaluationContext'], Any]):
+        self.event = event
+        self._history_loader = history_loader
+        self._features_loader = features_loader
+        self._history = None
+        self._features = None
+
+    @property
+    def history_loaded(self) -> bool:
+        return self._history is not None
+
+    @property
+    def history(self) -> List[Dict]:
+        if self._history is None:
+            self._history = self._history_loader()
+        return self._history
+
+    @property
+    def loaded_history(self) -> List[Dict]:
+        return self._history if self._history is not None else []
+
+    @property
+    def features(self) -> Any:
+        if self._features is None:
+            self._features = self._features_loader(self)
+        return self._features
+
+
+@dataclass
+class GraphResult:
+    indicators: Dict[str, Dict[str, Any]]
+    skipped: List[str] = field(default_factory=list)
+
+    @property
+    def short_circuited(self) -> bool:
+        return bool(self.skipped)
+
+
+class DetectorGraph:
+    """
+    Evaluates nodes cheapest-first. After each node `is_final(indicators)` is
+    asked whether the outcome can still change; once it cannot, the remaining
+    nodes are skipped. Indicators come back in declaration order.
+    """
+
+    def __init__(self, nodes: List[DetectorNode]):
+        names = [node.name for node in nodes]
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicate detector node names")
+        self.nodes = list(nodes)
+        self.order = sorted(self.nodes, key=lambda node: (node.cost, -node.max_score))
+
+    def evaluate(self, owner: Any, context: EvaluationContext,
+                 is_final: Optional[Callable[[Dict[str, Dict]], bool]] = None) -> GraphResult:
+        results = {}
+        skipped = []
+        for node in self.order:
+            if is_final is not None and results and is_final(results):
+                skipped.append(node.name)
+                continue
+            results[node.name] = node.run(owner, context)
+        indicators = {node.name: results[node.name] for node in self.nodes if node.name in results}
+        if skipped:
+            logger.debug(f"Detector graph settled early, skipped: {', '.join(skipped)}")
+        return GraphResult(indicators, skipped)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """Evaluation order, for diagnostics"""
+        return [
+            {'name': node.name, 'cost': COST_NAMES[node.cost], 'max_score': node.max_score,
+             'inputs': ['event', *node.inputs]}
+            for node in self.order
+        ]
+
+
+# ============================================
+# ENHANCED SUSPICIOUS DETECTOR
+# The 16 indicators of EnhancedSuspiciousDetector.analyze_criminal_behavior
+# ============================================
+
+CRIMINAL_INDICATORS = DetectorGraph([
+    # Critical behavioral patterns
+    DetectorNode('tor_usage', 'criminal_detector', 'check_tor_usage_criminal', (), EVENT, 10.0),
+    DetectorNode('evidence_tampering', 'criminal_detector', 'check_evidence_tampering',
+                 ('loaded_history', 'features'), FEATURES, 10.0),
+    DetectorNode('admin_probing', 'criminal_detector', 'check_admin_probing',
+                 ('loaded_history', 'features'), FEATURES, 9.0),
+    DetectorNode('victim_obsession', 'criminal_detector', 'check_victim_obsession',
+                 ('loaded_history', 'features'), FEATURES, 10.0),
+    DetectorNode('stalking_patterns', 'criminal_detector', 'check_stalking_patterns',
+                 ('history', 'features'), HISTORY, 10.0),
+    DetectorNode('witness_targeting', 'criminal_detector', 'check_witness_targeting',
+                 ('history',), HISTORY, 10.0),
+
+    # High-risk patterns
+    DetectorNode('geographic_evasion', 'evasion_detector', 'check_geographic_evasion',
+                 ('history',), HISTORY, 10.0),
+    DetectorNode('identity_manipulation', 'evasion_detector', 'check_identity_manipulation',
+                 ('history',), HISTORY, 10.0),
+    DetectorNode('timeline_obsession', 'temporal_analyzer', 'check_timeline_obsession',
+                 ('loaded_history', 'features'), FEATURES, 10.0),
+    DetectorNode('advanced_evasion', 'evasion_detector', 'check_advanced_evasion',
+                 ('history',), HISTORY, 10.0),
+
+    # Medium-risk patterns
+    DetectorNode('vpn_usage', 'evasion_detector', 'check_criminal_vpn_usage',
+                 ('history',), HISTORY, 10.0),
+    DetectorNode('device_switching', 'evasion_detector', 'check_device_manipulation',
+                 ('history',), HISTORY, 9.0),
+    DetectorNode('unusual_timing', 'temporal_analyzer', 'check_criminal_timing',
+                 ('history',), HISTORY, 10.0),
+    DetectorNode('rapid_visits', 'behavioral_detector', 'check_obsessive_visits',
+                 ('loaded_history', 'features'), FEATURES, 9.0),
+
+    # Supporting indicators
+    DetectorNode('proxy_usage', 'evasion_detector', 'check_proxy_chains',
+                 ('history',), HISTORY, 9.0),
+    DetectorNode('behavioral_anomalies', 'behavioral_detector', 'check_criminal_behavioral_anomalies',
+                 ('history',), HISTORY, 7.0),
+])
+
+
+# ============================================
+# DETECTION FACADE
+# Which detectors CriminalDetectionSystem runs for an event (smart selection)
+# ============================================
+
+@dataclass(frozen=True)
+class DetectorRule:
+    """
+    Selects one facade detector. Conditions that are set must all hold;
+    a rule without conditions always applies.
+
+    event_types:      substrings of the lower-cased event_type (any matches)
+    flags:            event attributes (any truthy)
+    min_time_on_page: time_on_page strictly above this, in seconds
+    """
+    detector: str
+    event_types: Tuple[str, ...] = ()
+    flags: Tuple[str, ...] = ()
+    min_time_on_page: Optional[float] = None
+
+    def applies(self, event: Any, event_type: str) -> bool:
+        if self.event_types and not any(term in event_type for term in self.event_types):
+            return False
+        if self.flags and not any(getattr(event, flag, False) for flag in self.flags):
+            return False
+        if self.min_time_on_page is not None:
+            if (getattr(event, 'time_on_page', None) or 0) <= self.min_time_on_page:
+                return False
+        return True
+
+
+DETECTOR_SELECTION = (
+    # Always run core detectors for criminal cases
+    DetectorRule('criminal'),
+    DetectorRule('evasion'),
+
+    # Specific detectors based on event type
+    DetectorRule('content', event_types=('search',)),
+    DetectorRule('biometric', event_types=('mouse', 'typing')),
+    DetectorRule('network', flags=('is_tor', 'is_vpn')),
+    DetectorRule('session', event_types=('login', 'session')),
+
+    # Behavioral analysis for extended sessions
+    DetectorRule('behavioral', min_time_on_page=60),
+    DetectorRule('psychological', min_time_on_page=60),
+)
@@ -352,18 +352,18 @@ class AlertManager:
         logger.info(f"Storing alert: {json.dumps(alert)}")
         
         # Store in Redis for quick access
-        if self.parent.redis_available:
-            key = f"alert:{alert['id']}"
-            self.parent.redis_client.setex(key, 86400 * 7, json.dumps(alert))  # Keep for 7 days
+        client = self.parent.redis_client
+        if client is not None:
+            client.setex(f"alert:{alert['id']}", 86400 * 7, json.dumps(alert))  # Keep for 7 days
     
     def _store_activity_record(self, record: Dict) -> None:
         """Store activity record in database"""
         # In production, would store in database
         logger.info(f"Storing activity record: {record['id']}")
         
-        if self.parent.redis_available:
-            key = f"activity:{record['id']}"
-            self.parent.redis_client.setex(key, 86400 * 30, json.dumps(record))  # Keep for 30 days
+        client = self.parent.redis_client
+        if client is not None:
+            client.setex(f"activity:{record['id']}", 86400 * 30, json.dumps(record))  # Keep for 30 days
     
     def _send_notifications(self, alert: Dict) -> None:
         """Send notifications based on alert priority"""
@@ -221,6 +221,52 @@ PAGE_CATEGORIES = {
     'admin': ['admin', 'login', 'dashboard', 'panel', 'backend'],
 }
 
+# URL keyword tables below are compiled into one matcher by
+# tracker/page_classifier.py. Keywords are lowercase substrings of the URL;
+# in the *_RULES tables the first matching category wins.
+
+# Page sections the detectors group a visitor's history by. Stored on
+# TrackingEvent.page_category at ingest; no match is 'other'.
+PAGE_CATEGORY_RULES = (
+    ('photos', ('photo', 'image')),
+    ('timeline', ('timeline',)),
+    ('evidence', ('evidence',)),
+    ('witnesses', ('witness',)),
+    ('news', ('news', 'update')),
+)
+
+# DetectorUtils.categorize_page_type. A URL ending in '/' is also 'home'.
+PAGE_TYPE_RULES = (
+    ('evidence', ('evidence', 'proof', 'document')),
+    ('timeline', ('timeline',)),
+    ('victim', ('victim', 'missing', 'person')),
+    ('witness', ('witness', 'testimony')),
+    ('news', ('news', 'update', 'press')),
+    ('media', ('photo', 'image', 'video', 'media')),
+    ('contact', ('contact', 'tip', 'report')),
+    ('admin', ('admin', 'login', 'dashboard')),
+    ('home', ('home', 'index')),
+)
+
+# Per-visitor feature counters (tracker/feature_store.py); a URL can count
+# towards several
+PAGE_COUNTERS = {
+    'evidence': ('evidence',),
+    'timeline': ('timeline',),
+    'victim': ('victim', 'missing', 'disappeared', 'last_seen',
+               'biography', 'personal', 'family', 'friends'),
+    'photo': ('photo', 'image'),
+    'media': ('photo', 'image', 'video'),
+    'admin': ('/admin', '/wp-admin', '/administrator', '/backend', '/panel'),
+    'location': ('location', 'address', 'map', 'coordinates', 'place', 'where'),
+    'family': ('family',),
+    'personal': ('profile', 'about', 'bio', 'personal', 'details', 'information'),
+}
+
+# Session page ratios of the ML feature vector (tracker/ml_analyzer.py)
+VICTIM_PAGE_KEYWORDS = ('victim', 'missing', 'disappeared', 'personal', 'family', 'photos')
+EVIDENCE_PAGE_KEYWORDS = ('evidence', 'timeline', 'investigation', 'report', 'witness')
+
 # ============================================================================
 # SUSPICIOUS PATTERNS
 # ============================================================================
@@ -288,13 +334,8 @@ KNOWN_VPN_PROVIDERS = [
     'TunnelBear', 'Hotspot Shield', 'Windscribe',
 ]
 
-TOR_EXIT_NODE_RANGES = [
-    '198.96.0.0/16',
-    '199.87.0.0/16',
-    '23.129.0.0/16',
-    '104.244.0.0/14',
-    '109.70.100.0/24',
-]
+# Tor exit / VPN / proxy address ranges are not built in: they come only from
+# the curated lists in IP_REPUTATION_DIR (tracker/ip_reputation.py).
 
 # ============================================================================
 # BEHAVIORAL INDICATORS
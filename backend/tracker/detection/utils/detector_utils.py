@@ -12,6 +12,8 @@ from collections import defaultdict
 import ipaddress
 import logging
 
+from ...page_classifier import page_type
+
 logger = logging.getLogger(__name__)
 
 
@@ -66,39 +68,19 @@ class DetectorUtils:
     
     @staticmethod
     def is_tor_exit_node(ip_address: str) -> bool:
-        """Check if IP is a known Tor exit node"""
+        """Check if IP is a known Tor exit node (shared IP reputation index)"""
         if not ip_address:
             return False
-        
-        # In production, would check against Tor exit node list
-        # This is a simplified check
-        tor_indicators = [
-            '198.96.',  # Known Tor hosting ranges
-            '199.87.',
-            '23.129.',
-        ]
-        
-        return any(ip_address.startswith(prefix) for prefix in tor_indicators)
+        from tracker.ip_reputation import get_ip_reputation
+        return get_ip_reputation().is_tor(ip_address)
     
     @staticmethod
     def detect_vpn_provider(ip_address: str) -> Optional[str]:
-        """Detect VPN provider from IP address"""
+        """Detect VPN provider from IP address (shared IP reputation index)"""
         if not ip_address:
             return None
-        
-        # Simplified VPN detection - in production would use IP intelligence API
-        vpn_ranges = {
-            'NordVPN': ['185.', '194.', '195.'],
-            'ExpressVPN': ['174.', '198.'],
-            'CyberGhost': ['89.', '91.'],
-            'ProtonVPN': ['185.159.', '185.242.'],
-        }
-        
-        for provider, ranges in vpn_ranges.items():
-            if any(ip_address.startswith(prefix) for prefix in ranges):
-                return provider
-        
-        return None
+        from tracker.ip_reputation import get_ip_reputation
+        return get_ip_reputation().vpn_provider(ip_address)
     
     @staticmethod
     def calculate_geographic_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -246,50 +228,8 @@ class DetectorUtils:
     
     @staticmethod
     def categorize_page_type(url: str) -> str:
-        """Categorize page type from URL"""
-        if not url:
-            return 'unknown'
-        
-        url_lower = url.lower()
-        
-        # Evidence pages
-        if any(term in url_lower for term in ['evidence', 'proof', 'document']):
-            return 'evidence'
-        
-        # Timeline pages
-        elif 'timeline' in url_lower:
-            return 'timeline'
-        
-        # Victim-related pages
-        elif any(term in url_lower for term in ['victim', 'missing', 'person']):
-            return 'victim'
-        
-        # Witness pages
-        elif any(term in url_lower for term in ['witness', 'testimony']):
-            return 'witness'
-        
-        # News/updates
-        elif any(term in url_lower for term in ['news', 'update', 'press']):
-            return 'news'
-        
-        # Photos/media
-        elif any(term in url_lower for term in ['photo', 'image', 'video', 'media']):
-            return 'media'
-        
-        # Contact pages
-        elif any(term in url_lower for term in ['contact', 'tip', 'report']):
-            return 'contact'
-        
-        # Admin pages
-        elif any(term in url_lower for term in ['admin', 'login', 'dashboard']):
-            return 'admin'
-        
-        # Home page
-        elif url_lower.endswith('/') or 'home' in url_lower or 'index' in url_lower:
-            return 'home'
-        
-        else:
-            return 'other'
+        """Categorize page type from URL (PAGE_TYPE_RULES)"""
+        return page_type(url)
     
     @staticmethod
     def generate_fingerprint(data: Dict[str, Any]) -> str:
@@ -3,7 +3,7 @@
 Simplified detection system that wraps the ML analyzer
 """
 from typing import Dict, Any
-from .ml_analyzer import CriminalMLAnalyzer
+from .ml_analyzer import get_ml_analyzer
 
 
 class SimpleDetectionSystem:
@@ -12,7 +12,7 @@ class SimpleDetectionSystem:
     """
     
     def __init__(self):
-        self.ml_analyzer = CriminalMLAnalyzer()
+        self.ml_analyzer = get_ml_analyzer()
     
     def analyze_event(self, event) -> Dict[str, Any]:
         """
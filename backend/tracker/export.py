@@ -0,0 +1,325 @@
+# backend/tracker/export.py
+"""
+Streaming case exports.
+
+build_export_data used to cut every section at 1000 rows and load full model
+instances into dicts, and convert_to_csv built the whole file in a StringIO
+before responding.  Nothing here materializes a section:
+
+  * each section is a .values() projection read through a server-side cursor
+    (.iterator(chunk_size=EXPORT_CHUNK)), so memory stays flat whatever the
+    date range; events moved to the cold archive (archive.py) follow the hot
+    rows
+  * the writers turn those rows into CSV, NDJSON or JSON text chunk by chunk,
+    optionally through an incremental gzip compressor
+  * stream_export() wraps the chunks in a StreamingHttpResponse;
+    write_export() writes them to a temporary file and saves that to
+    default_storage, for the background job (export_case_data task) used for
+    very large cases
+
+Section layout and keys are the ones export_data always returned.
+"""
+
+import csv
+import json
+import logging
+import tempfile
+import uuid
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .archive import archive_cutoff, archived_rows, parse_datetime_bound, reaches_archive
+from .models import SuspiciousActivity, TrackingEvent, UserSession
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK = 2000             # rows per cursor fetch / per yielded text chunk
+FORMATS = ('csv', 'ndjson', 'json')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+JOB_TTL = 24 * 3600
+
+
+@dataclass(frozen=True)
+class Section:
+    name: str
+    title: str
+    model: type
+    date_field: str
+    columns: tuple      # (CSV header, model field, JSON key)
+    archived: bool = False  # older rows may live in the Parquet archive
+
+    def fields(self):
+        return [field for _header, field, _key in self.columns]
+
+
+SECTIONS = (
+    Section('events', 'Events', TrackingEvent, 'timestamp', (
+        ('ID', 'id', 'id'),
+        ('Timestamp', 'timestamp', 'timestamp'),
+        ('Type', 'event_type', 'type'),
+        ('Page', 'page_url', 'page'),
+        ('IP', 'ip_address', 'ip'),
+        ('Suspicious', 'is_suspicious', 'suspicious'),
+    ), archived=True),
+    Section('sessions', 'Sessions', UserSession, 'created_at', (
+        ('ID', 'id', 'id'),
+        ('Session ID', 'session_id', 'session_id'),
+        ('Created', 'created_at', 'created'),
+        ('Duration', 'total_duration', 'duration'),
+        ('Page Views', 'page_views', 'page_views'),
+    )),
+    Section('suspicious_activities', 'Suspicious Activities', SuspiciousActivity, 'created_at', (
+        ('ID', 'id', 'id'),
+        ('Timestamp', 'created_at', 'timestamp'),
+        ('Type', 'activity_type', 'type'),
+        ('Severity', 'severity_level', 'severity'),
+        ('IP', 'ip_address', 'ip'),
+    )),
+)
+
+
+@dataclass
+class ExportRequest:
+    """What to export; built from the export_data POST body."""
+    case_id: int
+    format: str = 'csv'
+    include_suspicious: bool = True
+    date_from: str = None
+    date_to: str = None
+    compress: bool = False
+
+    @classmethod
+    def from_payload(cls, case, data):
+        fmt = str(data.get('type', 'csv')).lower()
+        if fmt not in FORMATS:
+            raise ValueError('Unsupported export type')
+        return cls(
+            case_id=case.pk,
+            format=fmt,
+            include_suspicious=bool(data.get('include_suspicious', True)),
+            date_from=data.get('date_from') or None,
+            date_to=data.get('date_to') or None,
+            compress=data.get('compress') in (True, 'gzip', 'true', '1'),
+        )
+
+    def sections(self):
+        return [s for s in SECTIONS if self.include_suspicious or s.name != 'suspicious_activities']
+
+    def filename(self, case_slug):
+        name = f'case_{case_slug}_export.{self.format}'
+        return name + '.gz' if self.compress else name
+
+    def content_type(self):
+        return 'application/gzip' if self.compress else CONTENT_TYPES[self.format]
+
+    def queryset(self, section):
+        filters = {'case_id': self.case_id}
+        if self.date_from:
+            filters[f'{section.date_field}__gte'] = self.date_from
+        if self.date_to:
+            filters[f'{section.date_field}__lte'] = self.date_to
+        return section.model.objects.filter(**filters).order_by(f'-{section.date_field}')
+
+    def estimated_rows(self):
+        return sum(self.queryset(section).count() for section in self.sections())
+
+
+# ============================================
+# ROWS
+# ============================================
+
+def _plain(value):
+    """JSON / CSV friendly scalar."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def iter_section(export, section, chunk_size=EXPORT_CHUNK):
+    """Rows of one section as {json key: value}, streamed from the cursor."""
+    keys = [key for _header, _field, key in section.columns]
+    rows = export.queryset(section).values_list(*section.fields())
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(keys, map(_plain, row)))
+
+    since = parse_datetime_bound(export.date_from)
+    if section.archived and reaches_archive(since):
+        fields = section.fields()
+        # rows still hot past the cutoff (evidence, interrupted runs) may also be archived
+        hot = {
+            str(pk) for pk in export.queryset(section)
+            .filter(**{f'{section.date_field}__lt': archive_cutoff()}).values_list('pk', flat=True)
+        }
+        for row in archived_rows(
+            case_id=export.case_id, since=since,
+            until=parse_datetime_bound(export.date_to), columns=fields,
+        ):
+            if str(row['id']) not in hot:
+                yield dict(zip(keys, (_plain(row[field]) for field in fields)))
+
+
+def _case_header(case):
+    return {
+        'id': str(case.id),
+        'name': case.case_title,
+        'victim_name': case.get_display_name(),
+    }
+
+
+# ============================================
+# WRITERS
+# ============================================
+
+class EchoBuffer:
+    """csv.writer target that hands back the formatted line."""
+
+    def write(self, value):
+        return value
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(export, case, chunk_size=EXPORT_CHUNK):
+    writer = csv.writer(EchoBuffer())
+    for section in export.sections():
+        yield writer.writerow([section.title]) + writer.writerow([h for h, _f, _k in section.columns])
+        for batch in _batched(iter_section(export, section, chunk_size), chunk_size):
+            yield ''.join(writer.writerow(list(row.values())) for row in batch)
+        yield writer.writerow([])
+
+
+def iter_ndjson(export, case, chunk_size=EXPORT_CHUNK):
+    """One object per line: the case first, then {'section': ..., **row}."""
+    yield json.dumps({'section': 'case', **_case_header(case)}) + '\n'
+    for section in export.sections():
+        for batch in _batched(iter_section(export, section, chunk_size), chunk_size):
+            yield ''.join(json.dumps({'section': section.name, **row}) + '\n' for row in batch)
+
+
+def iter_json(export, case, chunk_size=EXPORT_CHUNK):
+    """The document export_data's JsonResponse returned, written incrementally."""
+    yield '{"case": ' + json.dumps(_case_header(case))
+    names = {section.name for section in export.sections()}
+    for section in SECTIONS:
+        yield f', "{section.name}": ['
+        if section.name in names:
+            first = True
+            for batch in _batched(iter_section(export, section, chunk_size), chunk_size):
+                text = ', '.join(json.dumps(row) for row in batch)
+                yield text if first else ', ' + text
+                first = False
+        yield ']'
+    yield '}'
+
+
+WRITERS = {'csv': iter_csv, 'ndjson': iter_ndjson, 'json': iter_json}
+
+
+def gzip_chunks(chunks):
+    """Incrementally gzip a stream of text chunks."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(export, case, chunk_size=EXPORT_CHUNK):
+    """Encoded export body as a stream of bytes chunks."""
+    chunks = WRITERS[export.format](export, case, chunk_size)
+    if export.compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
+
+
+def streaming_file_response(chunks, filename, content_type):
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_export(export, case, case_slug):
+    return streaming_file_response(iter_export(export, case), export.filename(case_slug), export.content_type())
+
+
+# ============================================
+# BACKGROUND JOBS
+# ============================================
+
+def _job_key(job_id):
+    return f'export_job:v1:{job_id}'
+
+
+def get_export_job(job_id):
+    return cache.get(_job_key(job_id))
+
+
+def _set_job(job_id, **state):
+    job = cache.get(_job_key(job_id)) or {'job_id': job_id}
+    job.update(state, updated_at=timezone.now().isoformat())
+    cache.set(_job_key(job_id), job, JOB_TTL)
+    return job
+
+
+def start_export_job(export, case_slug):
+    """Queue export_case_data for `export`; returns the job state."""
+    from .tasks import export_case_data
+
+    job_id = uuid.uuid4().hex
+    job = _set_job(job_id, case_id=export.case_id, status='queued', filename=export.filename(case_slug))
+    try:
+        export_case_data.delay(job_id, asdict(export), case_slug)
+    except Exception as e:
+        _set_job(job_id, status='failed', error=f'could not queue export: {e}')
+        raise
+    return get_export_job(job_id) or job
+
+
+def write_export(job_id, export, case_slug):
+    """
+    Write the export to default_storage under EXPORT_STORAGE_DIR through a
+    temporary file (constant memory); records progress in the job state.
+    """
+    from cases.models import Case
+
+    _set_job(job_id, status='running')
+    try:
+        case = Case.objects.get(pk=export.case_id)
+        directory = settings.EXPORT_STORAGE_DIR.strip('/')
+        name = f'{directory}/case_{export.case_id}/{job_id}/{export.filename(case_slug)}'
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in iter_export(export, case):
+                tmp.write(chunk)
+            size = tmp.tell()
+            tmp.seek(0)
+            path = default_storage.save(name, File(tmp, name=name))
+        try:
+            url = default_storage.url(path)
+        except Exception:
+            url = None
+        return _set_job(job_id, status='complete', path=path, url=url, size=size)
+    except Exception as e:
+        logger.error(f"export job {job_id} failed: {e}")
+        _set_job(job_id, status='failed', error=str(e))
+        raise
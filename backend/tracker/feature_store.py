@@ -0,0 +1,578 @@
+# backend/tracker/feature_store.py
+"""
+Incremental per-visitor features for the rule detectors.
+
+check_victim_obsession, check_evidence_tampering, check_obsessive_visits,
+check_timeline_obsession (and the stalking / admin-probing rules) used to
+rescan the whole history list on every event to count evidence pages, victim
+pages, visits in the last 30 minutes and so on, so their cost grew with how
+active a visitor was.
+
+Each (case, fingerprint) now has one small feature record, updated O(1) per
+event by update_visitor_features():
+
+  * page / behaviour counters in 48 hourly slots (the same rolling window as
+    tracker.history), so ratios and counts match the history the rules saw
+  * fixed-size distinct-count sketches for IPs and user agents, also per
+    hourly slot, so they age out with the window
+  * one-minute buckets covering the rapid-visit window
+  * last-seen IP / device / user agent
+
+In Redis the record is a hash updated with HINCRBY / HSET, so concurrent
+ingest workers add to it instead of overwriting each other (see STORAGE).
+
+Detectors read a VisitorFeatures view of the record; its cost depends only
+on the window size, never on the number of events.  As with the history
+window, only records that already exist are updated on ingest — a missing
+record is built from the visitor's history on the next read.
+"""
+
+import hashlib
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .detection.utils.constants import PAGE_COUNTERS
+from .history import HISTORY_WINDOW_HOURS
+from .page_classifier import url_keywords
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CACHE_TTL = HISTORY_WINDOW_HOURS * 3600
+RECENT_WINDOW_MINUTES = 30   # THRESHOLDS['obsessive_visits_time'] / 60
+SKETCH_BITS = 64
+
+TAMPERING_EVENT_TYPES = {'form_modify', 'console_open', 'debugger_detected'}
+TIMELINE_TAMPER_EVENT_TYPES = {'right_click', 'select_text', 'copy'}
+COLLECTION_EVENT_TYPES = {'download', 'copy', 'screenshot'}
+
+
+def _cache_key(fingerprint_hash, case_id):
+    return f'features:v2:{fingerprint_hash}:{case_id}'
+
+
+def _sketch_index(value):
+    digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % SKETCH_BITS
+
+
+def _sketch_estimate(bits):
+    """Linear-counting estimate of the distinct values folded into `bits`."""
+    zeros = SKETCH_BITS - bin(bits).count('1')
+    if zeros == 0:
+        return round(SKETCH_BITS * math.log(SKETCH_BITS))
+    return round(-SKETCH_BITS * math.log(zeros / SKETCH_BITS))
+
+
+def _to_epoch(timestamp):
+    if not timestamp:
+        return 0.0
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return 0.0
+    return timestamp.timestamp()
+
+
+def _event_counts(page_url, event_type, event_data):
+    """Counter increments contributed by one event."""
+    found = url_keywords(page_url) if page_url else frozenset()
+    counts = {'events': 1}
+    for name, terms in PAGE_COUNTERS.items():
+        if not found.isdisjoint(terms):
+            counts[name] = 1
+
+    data = event_data if isinstance(event_data, dict) else {}
+    if data and 'search' in str(data).lower():
+        counts['search'] = 1
+    if event_type == 'page_refresh':
+        counts['refresh'] = 1
+
+    if 'evidence' in counts and (
+        event_type in TAMPERING_EVENT_TYPES
+        or data.get('content_editable_modified')
+        or data.get('dom_manipulation_detected')
+    ):
+        counts['evidence_tamper'] = 1
+
+    if 'timeline' in counts:
+        indicators = (
+            bool(data.get('console_opened'))
+            + bool(data.get('inspect_element'))
+            + (event_type in TIMELINE_TAMPER_EVENT_TYPES)
+        )
+        if indicators:
+            counts['timeline_tamper'] = indicators
+
+    if 'media' in counts:
+        indicators = (
+            (event_type == 'download')
+            + bool(data.get('right_click_on_image'))
+            + bool(data.get('save_as_attempt'))
+        )
+        if indicators:
+            counts['media_tamper'] = indicators
+
+    if 'personal' in counts:
+        counts['personal_info'] = 3 if event_type in COLLECTION_EVENT_TYPES else 1
+
+    return counts
+
+
+def _new_record():
+    return {
+        'last_seen': 0.0,
+        'last_ip': '',
+        'last_device': '',
+        'last_user_agent': '',
+        'hours': {},     # hour epoch (UTC) -> {counter: n, 'ip_bits' / 'ua_bits': sketch}
+        'minutes': {},   # minute epoch -> [visits, refreshes, first ts]
+    }
+
+
+def _apply(record, ts, page_url, event_type, event_data, ip_address, device, user_agent):
+    """Fold one event into a feature record (O(1) in the visitor's history)."""
+    counts = _event_counts(page_url, event_type, event_data)
+
+    hour = int(ts // 3600)
+    slot = record['hours'].setdefault(hour, {})
+    for name, n in counts.items():
+        slot[name] = slot.get(name, 0) + n
+    if ip_address:
+        slot['ip_bits'] = slot.get('ip_bits', 0) | (1 << _sketch_index(ip_address))
+    if user_agent:
+        slot['ua_bits'] = slot.get('ua_bits', 0) | (1 << _sketch_index(user_agent))
+
+    minute = int(ts // 60)
+    bucket = record['minutes'].setdefault(minute, [0, 0, ts])
+    bucket[0] += 1
+    bucket[1] += counts.get('refresh', 0)
+    bucket[2] = min(bucket[2], ts)
+
+    if ts >= record['last_seen']:
+        record['last_seen'] = ts
+        record['last_ip'] = ip_address or record['last_ip']
+        record['last_device'] = device or record['last_device']
+        record['last_user_agent'] = user_agent or record['last_user_agent']
+
+
+def _oldest_slots(now):
+    return int(now // 3600) - HISTORY_WINDOW_HOURS, int(now // 60) - RECENT_WINDOW_MINUTES
+
+
+def _prune(record, now):
+    """Drop slots (and their sketches) that have left the rolling windows."""
+    oldest_hour, oldest_minute = _oldest_slots(now)
+    record['hours'] = {h: c for h, c in record['hours'].items() if h >= oldest_hour}
+    record['minutes'] = {m: b for m, b in record['minutes'].items() if m >= oldest_minute}
+
+
+def _device_id(browser, os_name, device_type):
+    return f"{browser or ''}_{os_name or ''}_{device_type or ''}"
+
+
+class VisitorFeatures:
+    """Read-only view of one visitor's feature record."""
+
+    __slots__ = ('record', 'now')
+
+    def __init__(self, record, now=None):
+        self.record = record
+        self.now = now if now is not None else timezone.now().timestamp()
+
+    @classmethod
+    def from_history(cls, history):
+        """Build features from a history list (fallback / cold start)."""
+        now = timezone.now().timestamp()
+        record = _new_record()
+        for h in reversed(list(history)):
+            _apply(
+                record, _to_epoch(h.get('timestamp')), h.get('page_url'), h.get('event_type'),
+                h.get('event_data'), h.get('ip_address'),
+                _device_id(h.get('browser'), h.get('os'), h.get('device_type')),
+                h.get('user_agent'),
+            )
+        _prune(record, now)
+        return cls(record, now)
+
+    def _slots(self, hours):
+        oldest = int(self.now // 3600) - (hours or HISTORY_WINDOW_HOURS)
+        return ((h, c) for h, c in self.record['hours'].items() if h >= oldest)
+
+    def count(self, name, hours=None):
+        """Occurrences of counter `name` in the last `hours` (default: 48)."""
+        return sum(c.get(name, 0) for _h, c in self._slots(hours))
+
+    @property
+    def total(self):
+        return self.count('events')
+
+    def ratio(self, name):
+        total = self.total
+        return self.count(name) / total if total else 0
+
+    def count_by_hour_of_day(self, name='events'):
+        """{UTC hour of day: count} for counter `name`."""
+        by_hour = defaultdict(int)
+        for h, c in self._slots(None):
+            if c.get(name):
+                by_hour[h % 24] += c[name]
+        return by_hour
+
+    def count_by_day_of_month(self, name='events'):
+        by_day = defaultdict(int)
+        for h, c in self._slots(None):
+            if c.get(name):
+                by_day[datetime.fromtimestamp(h * 3600, dt_timezone.utc).day] += c[name]
+        return by_day
+
+    def recent(self, seconds):
+        """(visits, refreshes, first visit epoch) within the last `seconds`."""
+        cutoff = self.now - seconds
+        visits = refreshes = 0
+        first = None
+        for minute, (n, r, ts) in self.record['minutes'].items():
+            if (minute + 1) * 60 <= cutoff:
+                continue
+            visits += n
+            refreshes += r
+            first = ts if first is None else min(first, ts)
+        return visits, refreshes, first
+
+    @property
+    def last_seen(self):
+        return self.record['last_seen']
+
+    @property
+    def last_ip(self):
+        return self.record['last_ip']
+
+    @property
+    def last_device(self):
+        return self.record['last_device']
+
+    @property
+    def last_user_agent(self):
+        return self.record['last_user_agent']
+
+    def _sketch(self, name):
+        bits = 0
+        for _h, c in self._slots(None):
+            bits |= c.get(name, 0)
+        return bits
+
+    @property
+    def distinct_ips(self):
+        """Estimated distinct IPs in the 48-hour window."""
+        return _sketch_estimate(self._sketch('ip_bits'))
+
+    @property
+    def distinct_user_agents(self):
+        return _sketch_estimate(self._sketch('ua_bits'))
+
+
+# ============================================
+# STORAGE
+# Redis (shared pooled client) when available: one hash of counters per
+# visitor, updated with HINCRBY / HSET per hour and minute slot, so concurrent
+# ingest workers never overwrite each other.  A companion sorted set holds the
+# first timestamp of each minute bucket (ZADD LT) and the last time each IP /
+# device / user agent was seen (ZADD GT).  Fields that have left the windows
+# are deleted on read.
+#
+# Without Redis the whole record is kept in the Django cache and updated
+# read-modify-write.  That is only safe with one ingest process (locmem in
+# development); concurrent writers there can lose increments.
+# ============================================
+
+_SEEDED = 'seeded'
+_LAST_ATTRS = (('ip', 'last_ip'), ('dev', 'last_device'), ('ua', 'last_user_agent'))
+
+
+def _redis_client():
+    """Shared pooled client (tracker.redis_pool); None without Redis or while its circuit is open."""
+    from .redis_pool import get_redis
+    return get_redis()
+
+
+def _zset_key(key):
+    return f'{key}:t'
+
+
+def _str(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _event_writes(ts, page_url, event_type, event_data, ip_address, device, user_agent):
+    """(HINCRBY fields, HSET fields, ZADD LT members, ZADD GT members) for one event."""
+    counts = _event_counts(page_url, event_type, event_data)
+    hour, minute = int(ts // 3600), int(ts // 60)
+
+    incr = {f'h:{hour}:{name}': n for name, n in counts.items()}
+    incr[f'm:{minute}:n'] = 1
+    if counts.get('refresh'):
+        incr[f'm:{minute}:r'] = counts['refresh']
+
+    flags = {}
+    if ip_address:
+        flags[f'h:{hour}:ip:{_sketch_index(ip_address)}'] = 1
+    if user_agent:
+        flags[f'h:{hour}:ua:{_sketch_index(user_agent)}'] = 1
+
+    latest = {'seen': ts}
+    for prefix, value in (('ip', ip_address), ('dev', device), ('ua', user_agent)):
+        if value:
+            latest[f'{prefix}:{value}'] = ts
+    return incr, flags, {f'm:{minute}': ts}, latest
+
+
+def _record_to_redis(record):
+    """(hash mapping, zset mapping) holding `record`."""
+    fields = {_SEEDED: 1}
+    for hour, slot in record['hours'].items():
+        for name, value in slot.items():
+            if name.endswith('_bits'):
+                prefix = name[:-len('_bits')]
+                for bit in range(SKETCH_BITS):
+                    if value >> bit & 1:
+                        fields[f'h:{hour}:{prefix}:{bit}'] = 1
+            else:
+                fields[f'h:{hour}:{name}'] = value
+    members = {}
+    for minute, (n, r, first) in record['minutes'].items():
+        fields[f'm:{minute}:n'] = n
+        if r:
+            fields[f'm:{minute}:r'] = r
+        members[f'm:{minute}'] = first
+    if record['last_seen']:
+        members['seen'] = record['last_seen']
+        for prefix, attr in _LAST_ATTRS:
+            if record[attr]:
+                members[f'{prefix}:{record[attr]}'] = record['last_seen']
+    return fields, members
+
+
+def _record_from_redis(fields, members, now):
+    """
+    Rebuild the dict record from HGETALL / ZRANGE WITHSCORES output.  Returns
+    (record, stale hash fields, stale zset members).
+    """
+    oldest_hour, oldest_minute = _oldest_slots(now)
+    record = _new_record()
+    stale_fields, stale_members = [], []
+
+    for field, raw_value in fields.items():
+        if field == _SEEDED:
+            continue
+        kind, slot, name = field.split(':', 2)
+        slot = int(slot)
+        if kind == 'h':
+            if slot < oldest_hour:
+                stale_fields.append(field)
+                continue
+            counters = record['hours'].setdefault(slot, {})
+            prefix, _sep, bit = name.partition(':')
+            if bit:
+                bits_name = f'{prefix}_bits'
+                counters[bits_name] = counters.get(bits_name, 0) | (1 << int(bit))
+            else:
+                counters[name] = int(raw_value)
+        else:
+            if slot < oldest_minute:
+                stale_fields.append(field)
+                continue
+            bucket = record['minutes'].setdefault(slot, [0, 0, slot * 60])
+            bucket[0 if name == 'n' else 1] = int(raw_value)
+
+    latest = {}
+    for raw_member, score in members:
+        member = _str(raw_member)
+        prefix, _sep, value = member.partition(':')
+        if prefix == 'm':
+            minute = int(value)
+            if minute < oldest_minute:
+                stale_members.append(member)
+            elif minute in record['minutes']:
+                record['minutes'][minute][2] = score
+        elif prefix == 'seen':
+            record['last_seen'] = score
+        elif score < oldest_hour * 3600:
+            stale_members.append(member)
+        elif score >= latest.get(prefix, (-1, ''))[0]:
+            latest[prefix] = (score, value)
+    for prefix, attr in _LAST_ATTRS:
+        if prefix in latest:
+            record[attr] = latest[prefix][1]
+    return record, stale_fields, stale_members
+
+
+def _load_redis(client, key, now):
+    zkey = _zset_key(key)
+    pipe = client.pipeline(transaction=False)
+    pipe.hgetall(key)
+    pipe.zrange(zkey, 0, -1, withscores=True)
+    fields, members = pipe.execute()
+    fields = {_str(field): value for field, value in fields.items()}
+    if _SEEDED not in fields:
+        return None
+    record, stale_fields, stale_members = _record_from_redis(fields, members, now)
+    if stale_fields or stale_members:
+        try:
+            pipe = client.pipeline(transaction=False)
+            if stale_fields:
+                pipe.hdel(key, *stale_fields)
+            if stale_members:
+                pipe.zrem(zkey, *stale_members)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"features: Redis prune failed for {key}: {e}")
+    return record
+
+
+def _store_redis(client, key, record):
+    fields, members = _record_to_redis(record)
+    zkey = _zset_key(key)
+    pipe = client.pipeline()
+    pipe.delete(key, zkey)
+    pipe.hset(key, mapping=fields)
+    if members:
+        pipe.zadd(zkey, members)
+    pipe.expire(key, FEATURE_CACHE_TTL)
+    pipe.expire(zkey, FEATURE_CACHE_TTL)
+    pipe.execute()
+
+
+def _update_redis(client, by_key):
+    """Apply events to the records that exist, with atomic per-field commands."""
+    keys = list(by_key)
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hexists(key, _SEEDED)
+    seeded = [key for key, exists in zip(keys, pipe.execute()) if exists]
+    if not seeded:
+        return
+
+    pipe = client.pipeline(transaction=False)
+    for key in seeded:
+        zkey = _zset_key(key)
+        for event in by_key[key]:
+            incr, flags, firsts, latest = _event_writes(*_event_args(event))
+            for field, n in incr.items():
+                pipe.hincrby(key, field, n)
+            if flags:
+                pipe.hset(key, mapping=flags)
+            pipe.zadd(zkey, firsts, lt=True)
+            pipe.zadd(zkey, latest, gt=True)
+        pipe.expire(key, FEATURE_CACHE_TTL)
+        pipe.expire(zkey, FEATURE_CACHE_TTL)
+    pipe.execute()
+
+
+def _event_args(event):
+    return (
+        event.timestamp.timestamp(), event.page_url, event.event_type, event.event_data,
+        event.ip_address, _device_id(event.browser, event.os, event.device_type),
+        event.user_agent,
+    )
+
+
+def _load(key, now):
+    client = _redis_client()
+    if client is not None:
+        try:
+            return _load_redis(client, key, now)
+        except Exception as e:
+            logger.debug(f"features: Redis read failed for {key}: {e}")
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.debug(f"features: cache read failed for {key}: {e}")
+        return None
+
+
+def _store(key, record):
+    client = _redis_client()
+    if client is not None:
+        try:
+            _store_redis(client, key, record)
+            return
+        except Exception as e:
+            logger.debug(f"features: Redis write failed for {key}: {e}")
+    try:
+        cache.set(key, record, FEATURE_CACHE_TTL)
+    except Exception as e:
+        logger.debug(f"features: cache write failed for {key}: {e}")
+
+
+def _update_cached(by_key):
+    try:
+        records = cache.get_many(list(by_key))
+    except Exception as e:
+        logger.debug(f"features: cache read failed: {e}")
+        return
+    if not records:
+        return
+
+    now = timezone.now().timestamp()
+    for key, record in records.items():
+        for event in sorted(by_key[key], key=lambda e: e.timestamp):
+            try:
+                _apply(record, *_event_args(event))
+            except Exception as e:
+                logger.debug(f"features: could not apply event {getattr(event, 'id', '?')}: {e}")
+        _prune(record, now)
+
+    try:
+        cache.set_many(records, FEATURE_CACHE_TTL)
+    except Exception as e:
+        logger.debug(f"features: cache update failed: {e}")
+
+
+def get_visitor_features(fingerprint_hash, case_id, history=None):
+    """
+    Return VisitorFeatures for a visitor. A missing record is built once from
+    `history` (or the shared history window) and stored. `history` may be a
+    zero-argument callable, called only on a miss.
+    """
+    key = _cache_key(fingerprint_hash, case_id)
+    now = timezone.now().timestamp()
+    record = _load(key, now)
+    if record is not None:
+        return VisitorFeatures(record, now)
+
+    if callable(history):
+        history = history()
+    if history is None:
+        from .history import HistoryProvider
+        history = HistoryProvider().get(fingerprint_hash, case_id)
+    features = VisitorFeatures.from_history(history)
+    _store(key, features.record)
+    return features
+
+
+def update_visitor_features(events):
+    """
+    Fold just-saved TrackingEvents into their visitors' feature records (where
+    one exists). Two Redis round trips per batch (existence check, then the
+    increments); order within the batch does not matter.
+    """
+    by_key = defaultdict(list)
+    for event in events:
+        if getattr(event, 'fingerprint_hash', ''):
+            by_key[_cache_key(event.fingerprint_hash, event.case_id)].append(event)
+    if not by_key:
+        return
+
+    client = _redis_client()
+    if client is not None:
+        try:
+            _update_redis(client, by_key)
+            return
+        except Exception as e:
+            logger.debug(f"features: Redis update failed: {e}")
+    _update_cached(by_key)
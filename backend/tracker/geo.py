@@ -0,0 +1,254 @@
+# backend/tracker/geo.py
+"""
+GeoIP subsystem for the tracker.
+
+Lookup order for an IP:
+  1. in-process LRU (hot IPs never leave the worker)
+  2. Django cache            (shared across workers, key geo:<ip>, 24h)
+  3. local GeoLite2-City DB  (one memory-mapped reader per process)
+
+The remote ip-api.com fallback is never called on the request path. When the
+local DB cannot resolve an IP, an empty result is returned and the
+backfill_geo Celery task resolves it remotely, caches it and fills in the
+geo columns of the events that were stored without it.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+GEO_CACHE_TTL = 86400          # 24h
+GEO_PENDING_TTL = 300          # don't re-queue the same IP for 5 minutes
+GEO_LRU_SIZE = getattr(settings, 'GEOIP_LRU_SIZE', 10000)
+
+GEO_FIELDS = ('country', 'region', 'city', 'lat', 'lon', 'postal', 'isp')
+
+
+def empty_geo():
+    return {'country': '', 'region': '', 'city': '', 'lat': None, 'lon': None, 'postal': '', 'isp': ''}
+
+
+def _cache_key(ip_str):
+    return f'geo:{ip_str}'
+
+
+class _LRU:
+    """Small thread-safe bounded LRU (OrderedDict based)."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+_lru = _LRU(GEO_LRU_SIZE)
+
+_reader = None
+_reader_path = None
+_reader_lock = threading.Lock()
+
+
+def _get_reader():
+    """Open the GeoLite2-City database once per process (memory-mapped)."""
+    global _reader, _reader_path
+
+    geoip_path = getattr(settings, 'GEOIP_PATH', None)
+    if not geoip_path:
+        return None
+    db_path = os.path.join(str(geoip_path), 'GeoLite2-City.mmdb')
+
+    if _reader is not None and _reader_path == db_path:
+        return _reader
+
+    with _reader_lock:
+        if _reader is not None and _reader_path == db_path:
+            return _reader
+        if not os.path.exists(db_path):
+            return None
+        try:
+            import geoip2.database
+            try:
+                from maxminddb import MODE_MMAP
+                _reader = geoip2.database.Reader(db_path, mode=MODE_MMAP)
+            except ImportError:
+                _reader = geoip2.database.Reader(db_path)
+            _reader_path = db_path
+        except Exception as e:
+            logger.warning(f'GeoLite2 database could not be opened ({db_path}): {e}')
+            return None
+    return _reader
+
+
+def _is_private_ip(ip_str):
+    """Return True if IP is private/loopback — skip geo lookup for these."""
+    try:
+        from ipaddress import ip_address
+        addr = ip_address(ip_str)
+        return addr.is_private or addr.is_loopback
+    except Exception:
+        return False
+
+
+def _lookup_local(ip_str):
+    """Resolve against the local GeoLite2 DB. Returns a geo dict or None."""
+    reader = _get_reader()
+    if reader is None:
+        return None
+    try:
+        r = reader.city(ip_str)
+    except Exception as e:
+        logger.debug(f'GeoLite2 lookup failed for {ip_str}: {e}')
+        return None
+    return {
+        'country': r.country.iso_code or '',
+        'region':  r.subdivisions.most_specific.name or '',
+        'city':    r.city.name or '',
+        'lat':     r.location.latitude,
+        'lon':     r.location.longitude,
+        'postal':  r.postal.code or '',
+        'isp':     '',  # GeoLite2-City doesn't include ISP (needs ASN DB)
+    }
+
+
+def fetch_remote_geo(ip_str):
+    """
+    Blocking lookup against the ip-api.com free endpoint.
+    Only called from the backfill_geo task — never on the request path.
+    """
+    import json
+    import urllib.request
+
+    url = f'http://ip-api.com/json/{ip_str}?fields=status,countryCode,regionName,city,lat,lon,zip,isp'
+    req = urllib.request.Request(url, headers={'User-Agent': 'CaseClosure/1.0'})
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        geo = json.loads(resp.read().decode())
+    if geo.get('status') != 'success':
+        return None
+    return {
+        'country': geo.get('countryCode', ''),
+        'region':  geo.get('regionName', ''),
+        'city':    geo.get('city', ''),
+        'lat':     geo.get('lat'),
+        'lon':     geo.get('lon'),
+        'postal':  geo.get('zip', ''),
+        'isp':     geo.get('isp', ''),
+    }
+
+
+def remember_geo(ip_str, result):
+    """Store a resolved result in both cache tiers."""
+    _lru.set(ip_str, result)
+    cache.set(_cache_key(ip_str), result, GEO_CACHE_TTL)
+
+
+def _schedule_backfill(ip_str):
+    """Queue a remote lookup for an IP the local DB could not resolve."""
+    if not cache.add(f'geo:pending:{ip_str}', 1, GEO_PENDING_TTL):
+        return
+    try:
+        from django.db import transaction
+        from .tasks import backfill_geo
+        # After commit, so the task can see the events it has to backfill
+        transaction.on_commit(lambda: backfill_geo.apply_async(
+            args=[ip_str], queue='batch', ignore_result=True,
+        ))
+    except Exception as e:
+        logger.debug(f'Geo backfill dispatch skipped for {ip_str}: {e}')
+
+
+def lookup_geo_many(ips):
+    """
+    Resolve many IPs in one pass: LRU, then a single cache.get_many, then the
+    local DB for whatever is left.  Returns {ip: geo dict}.
+    """
+    results = {}
+    pending = []
+    for ip_str in set(filter(None, ips)):
+        if _is_private_ip(ip_str):
+            results[ip_str] = empty_geo()
+            continue
+        hit = _lru.get(ip_str)
+        if hit is not None:
+            results[ip_str] = hit
+        else:
+            pending.append(ip_str)
+
+    if not pending:
+        return results
+
+    cached = cache.get_many([_cache_key(ip) for ip in pending])
+    to_cache = {}
+    for ip_str in pending:
+        hit = cached.get(_cache_key(ip_str))
+        if hit is not None:
+            _lru.set(ip_str, hit)
+            results[ip_str] = hit
+            continue
+
+        local = _lookup_local(ip_str)
+        if local is not None:
+            _lru.set(ip_str, local)
+            to_cache[_cache_key(ip_str)] = local
+            results[ip_str] = local
+        else:
+            # Unresolved: answer empty now, resolve remotely in the background
+            results[ip_str] = empty_geo()
+            _schedule_backfill(ip_str)
+
+    if to_cache:
+        cache.set_many(to_cache, GEO_CACHE_TTL)
+    return results
+
+
+def lookup_geo(ip_str):
+    """Return geo dict with keys: country, region, city, lat, lon, postal, isp."""
+    if not ip_str:
+        return empty_geo()
+    return lookup_geo_many([ip_str]).get(ip_str) or empty_geo()
+
+
+def geo_stats():
+    """LRU counters, for diagnostics."""
+    total = _lru.hits + _lru.misses
+    return {
+        'size': len(_lru),
+        'maxsize': _lru.maxsize,
+        'hits': _lru.hits,
+        'misses': _lru.misses,
+        'hit_rate': round(_lru.hits / total, 4) if total else 0.0,
+        'reader_loaded': _reader is not None,
+    }
@@ -0,0 +1,355 @@
+# backend/tracker/history.py
+"""
+Shared per-visitor event history for the detection pipeline.
+
+Every detector used to fetch (and cache) its own copy of a visitor's recent
+events: EnhancedSuspiciousDetector.get_extended_user_history, the facade's
+DjangoDatabaseService and BaseDetector.get_user_history each ran the same
+48-hour query and stored a full JSON blob of model-instance dicts.
+
+HistoryProvider is the single path now:
+
+  * one provider per analysis run memoizes the window per
+    (fingerprint, case, hours), so all detectors in the run share one fetch
+  * the DB read is a .values_list() projection, stored as a compact
+    ColumnarHistory (one list per field) in the shared cache
+  * record_events() keeps the cached window current incrementally: the new
+    event is pushed onto the front and the window trimmed, instead of
+    re-querying 48 hours and rewriting the whole blob
+
+ColumnarHistory still behaves like the old list of row dicts (newest first),
+so detectors that iterate / index / slice `history` are unchanged.
+"""
+
+import json
+import logging
+from bisect import bisect_left
+from collections.abc import Sequence
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WINDOW_HOURS = 48
+HISTORY_MAX_EVENTS = getattr(settings, 'DETECTION_HISTORY_MAX_EVENTS', 200)
+HISTORY_CACHE_TTL = 600
+
+# history key -> TrackingEvent field (the .values_list() projection)
+HISTORY_FIELDS = {
+    'id': 'id',
+    'timestamp': 'timestamp',
+    'event_type': 'event_type',
+    'page_url': 'page_url',
+    'page_category': 'page_category',
+    'ip_address': 'ip_address',
+    'is_vpn': 'is_vpn',
+    'is_tor': 'is_tor',
+    'is_proxy': 'is_proxy',
+    'device_type': 'device_type',
+    'browser': 'browser',
+    'os': 'os',
+    'city': 'ip_city',
+    'country': 'ip_country',
+    'time_on_page': 'time_on_page',
+    'scroll_depth': 'scroll_depth',
+    'user_agent': 'user_agent',
+    'referrer_url': 'referrer_url',
+    'event_data': 'event_data',
+    'timezone': 'timezone',
+}
+COLUMNS = tuple(HISTORY_FIELDS)
+_TS = '_ts'  # epoch seconds, kept alongside the ISO timestamp for trimming
+NO_CASE = 'unknown'
+# Tail element of every stored Redis window, so a visitor with no events
+# still has a cached (empty) window instead of a miss
+_WINDOW_MARKER = '-'
+
+
+def _case_key(case_id):
+    """
+    Normalise a case id for the window: events saved without a case carry
+    case_id None, readers sometimes pass 'unknown' — both mean "no case".
+    """
+    if case_id is None or case_id == '' or case_id == NO_CASE:
+        return NO_CASE
+    return str(case_id)
+
+
+def _cache_key(fingerprint_hash, case_id):
+    return f'history:v4:{fingerprint_hash}:{_case_key(case_id)}'
+
+
+def _row_values(values):
+    """Model/projection values in COLUMNS order -> JSON-friendly values (+ epoch)."""
+    row = []
+    ts = None
+    for key, value in zip(COLUMNS, values):
+        if key == 'id':
+            value = str(value)
+        elif key == 'timestamp':
+            ts = value
+            value = value.isoformat() if value else None
+        row.append(value)
+    row.append(ts.timestamp() if ts else 0.0)
+    return row
+
+
+class ColumnarHistory(Sequence):
+    """
+    A visitor's recent events stored column-wise, newest first.
+
+    Indexing / iteration yields the legacy row dicts (built lazily, once);
+    column() gives direct access to one field without building rows.
+    """
+
+    __slots__ = ('columns', '_rows')
+
+    def __init__(self, columns=None):
+        self.columns = columns or {name: [] for name in COLUMNS + (_TS,)}
+        self._rows = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: iterables of values in COLUMNS order (+ epoch), newest first."""
+        history = cls()
+        names = COLUMNS + (_TS,)
+        for row in rows:
+            for name, value in zip(names, row):
+                history.columns[name].append(value)
+        return history
+
+    def __len__(self):
+        return len(self.columns[_TS])
+
+    def __getitem__(self, index):
+        return self.rows()[index]
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def rows(self):
+        if self._rows is None:
+            cols = [self.columns[name] for name in COLUMNS]
+            self._rows = [dict(zip(COLUMNS, values)) for values in zip(*cols)]
+        return self._rows
+
+    def column(self, name):
+        return self.columns[name]
+
+    def since(self, cutoff_epoch):
+        """Events newer than cutoff (a view sharing no state with self)."""
+        # _ts is descending; find the first index older than the cutoff
+        negated = [-t for t in self.columns[_TS]]
+        end = bisect_left(negated, -cutoff_epoch)
+        if end == len(self):
+            return self
+        return ColumnarHistory({name: values[:end] for name, values in self.columns.items()})
+
+    def push(self, row, max_events):
+        """Prepend one row (values in COLUMNS order + epoch) and trim to max_events."""
+        for name, value in zip(COLUMNS + (_TS,), row):
+            column = self.columns[name]
+            column.insert(0, value)
+            del column[max_events:]
+        self._rows = None
+
+
+# ============================================
+# CACHE BACKEND
+# Redis list of compact rows when REDIS_URL is set (LPUSHX + LTRIM per event,
+# so an update never rewrites the window); Django cache otherwise.
+# ============================================
+
+def _redis_client():
+    """Shared pooled client (tracker.redis_pool); None without Redis or while its circuit is open."""
+    from .redis_pool import get_redis
+    return get_redis()
+
+
+def _load_cached(key):
+    client = _redis_client()
+    if client is not None:
+        try:
+            raw = client.lrange(key, 0, -1)
+            if not raw:
+                return None
+            return ColumnarHistory.from_rows(
+                json.loads(r) for r in raw if r not in (_WINDOW_MARKER, _WINDOW_MARKER.encode())
+            )
+        except Exception as e:
+            logger.debug(f"history: Redis read failed for {key}: {e}")
+    columns = cache.get(key)
+    return ColumnarHistory(columns) if columns is not None else None
+
+
+def _store(key, history):
+    client = _redis_client()
+    if client is not None:
+        try:
+            names = COLUMNS + (_TS,)
+            rows = [json.dumps(list(values), default=str) for values in zip(*(history.columns[n] for n in names))]
+            pipe = client.pipeline()
+            pipe.delete(key)
+            # the marker makes the list exist even when the window is empty;
+            # LTRIM drops it once the window is full
+            pipe.rpush(key, *rows, _WINDOW_MARKER)
+            pipe.expire(key, HISTORY_CACHE_TTL)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.debug(f"history: Redis write failed for {key}: {e}")
+    cache.set(key, history.columns, HISTORY_CACHE_TTL)
+
+
+def _push_cached(updates, max_events):
+    """
+    updates: [(key, row)] oldest first. Only windows that are already cached
+    are extended (a miss is filled from the DB on the next read).
+    """
+    client = _redis_client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, row in updates:
+                pipe.lpushx(key, json.dumps(row, default=str))
+            for key in {key for key, _row in updates}:
+                pipe.ltrim(key, 0, max_events - 1)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.debug(f"history: Redis push failed: {e}")
+    cached = cache.get_many({key for key, _row in updates})
+    if not cached:
+        return
+    windows = {key: ColumnarHistory(columns) for key, columns in cached.items()}
+    for key, row in updates:
+        if key in windows:
+            windows[key].push(row, max_events)
+    cache.set_many({key: w.columns for key, w in windows.items()}, HISTORY_CACHE_TTL)
+
+
+# ============================================
+# PROVIDER
+# ============================================
+
+def _query(fingerprint_hash, case_id, hours, limit):
+    from .models import TrackingEvent
+
+    filters = {
+        'fingerprint_hash': fingerprint_hash,
+        'timestamp__gte': timezone.now() - timedelta(hours=hours),
+    }
+    case_key = _case_key(case_id)
+    if case_key == NO_CASE:
+        filters['case__isnull'] = True
+    else:
+        filters['case_id'] = case_key
+    rows = [
+        _row_values(values) for values in
+        TrackingEvent.objects.filter(**filters)
+        .order_by('-timestamp')
+        .values_list(*HISTORY_FIELDS.values())[:limit]
+    ]
+    if len(rows) < limit:
+        rows = _with_archived(rows, fingerprint_hash, case_id, filters['timestamp__gte'], limit)
+    return ColumnarHistory.from_rows(rows)
+
+
+def _with_archived(rows, fingerprint_hash, case_id, since, limit):
+    """Top up a short look-back with the visitor's archived events (archive.py)."""
+    from .archive import archived_rows, reaches_archive
+
+    if not reaches_archive(since):
+        return rows
+    fields = list(HISTORY_FIELDS.values())
+    case_key = _case_key(case_id)
+    hot = {row[0] for row in rows}  # an interrupted archive run leaves rows in both tiers
+    archived = [
+        _row_values([row[field] for field in fields])
+        for row in archived_rows(
+            # caseless events are archived under case=none
+            case_id='none' if case_key == NO_CASE else case_key,
+            since=since, fingerprint_hash=fingerprint_hash, columns=fields,
+        )
+        if str(row['id']) not in hot
+    ]
+    if not archived:
+        return rows
+    # newest first, as ColumnarHistory.since() expects
+    return sorted(rows + archived, key=lambda row: row[-1], reverse=True)[:limit]
+
+
+class HistoryProvider:
+    """
+    History source for one analysis run. Create one per run and hand it (or
+    the histories it returns) to every detector in that run.
+    """
+
+    def __init__(self, window_hours=HISTORY_WINDOW_HOURS, max_events=HISTORY_MAX_EVENTS):
+        self.window_hours = window_hours
+        self.max_events = max_events
+        self._memo = {}
+
+    def get(self, fingerprint_hash, case_id, hours=None, limit=None):
+        """
+        Return a ColumnarHistory (newest first) for the last `hours`.
+        Requests within the shared window are served from the cached window;
+        longer look-backs (profiles) go to the DB, topped up from the cold
+        archive past TRACKING_ARCHIVE_AFTER_DAYS, and are not cached.
+        """
+        hours = hours or self.window_hours
+        memo_key = (fingerprint_hash, _case_key(case_id), hours, limit)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        if hours <= self.window_hours and (limit is None or limit <= self.max_events):
+            window = self._window(fingerprint_hash, case_id)
+            history = window.since((timezone.now() - timedelta(hours=hours)).timestamp())
+            if limit is not None and len(history) > limit:
+                history = ColumnarHistory({n: v[:limit] for n, v in history.columns.items()})
+        else:
+            history = _query(fingerprint_hash, case_id, hours, limit or 500)
+
+        self._memo[memo_key] = history
+        return history
+
+    def _window(self, fingerprint_hash, case_id):
+        key = _cache_key(fingerprint_hash, case_id)
+        window = _load_cached(key)
+        if window is None:
+            window = _query(fingerprint_hash, case_id, self.window_hours, self.max_events)
+            _store(key, window)
+        return window
+
+
+def record_events(events):
+    """
+    Push just-saved TrackingEvents onto their visitors' cached windows (where
+    one is cached) so the next analysis sees them without re-querying.
+    One Redis pipeline / cache round trip for the whole list.
+    """
+    updates = []
+    for event in sorted(events, key=lambda e: e.timestamp):
+        if not getattr(event, 'fingerprint_hash', ''):
+            continue
+        try:
+            row = _row_values([getattr(event, field) for field in HISTORY_FIELDS.values()])
+        except Exception as e:
+            logger.debug(f"history: could not record event {getattr(event, 'id', '?')}: {e}")
+            continue
+        updates.append((_cache_key(event.fingerprint_hash, event.case_id), row))
+    if updates:
+        try:
+            _push_cached(updates, HISTORY_MAX_EVENTS)
+        except Exception as e:
+            logger.debug(f"history: cache update failed: {e}")
+
+
+def record_event(event):
+    record_events([event])
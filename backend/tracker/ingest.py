@@ -0,0 +1,317 @@
+# backend/tracker/ingest.py
+"""
+Batched ingest pipeline for tracker events.
+
+track_batch used to resolve the Case, get_or_create the session and INSERT the
+event one row at a time (3+ round trips per event).  ingest_batch() instead:
+
+  1. resolves every distinct caseId in the payload with ONE query
+  2. resolves every distinct sessionId with ONE query, bulk-creates the
+     missing sessions and bumps last_activity on the rest with ONE UPDATE
+  3. writes all events with a single bulk_create
+
+The request-level client info (IP / user agent) is identical for every event
+in a batch, so enrichment (UA parse + geo lookup) runs once per batch.
+"""
+
+import logging
+import uuid
+
+from django.db import InterfaceError, OperationalError, transaction
+from django.db.models import Case as CaseWhen, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from cases.models import Case
+from .cardinality import record_visitors
+from .feature_store import update_visitor_features
+from .history import record_events
+from .presence import record_presence
+from .realtime import publish_events
+from .suspects import record_suspect_events
+from .models import TrackingEvent, UserSession
+from .page_classifier import page_category
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the database itself is unavailable rather than one row being
+# bad: they abort the whole batch instead of being counted per event.
+TRANSIENT_DB_ERRORS = (OperationalError, InterfaceError)
+
+
+def _case_key(event_data):
+    """Return the raw case identifier for an event, or None for 'global'."""
+    case_id = event_data.get('caseId') or event_data.get('case_id', 'global')
+    if not case_id or case_id == 'global':
+        return None
+    return str(case_id)
+
+
+def resolve_cases(case_keys):
+    """
+    Resolve a set of case identifiers (numeric id or subdomain) in one query.
+    Returns {case_key: Case}; unknown keys are simply absent.
+    """
+    ids = {int(k) for k in case_keys if k.isdigit()}
+    slugs = {k for k in case_keys if not k.isdigit()}
+    if not ids and not slugs:
+        return {}
+
+    resolved = {}
+    for case in Case.objects.filter(Q(id__in=ids) | Q(subdomain__in=slugs)):
+        if case.id in ids:
+            resolved[str(case.id)] = case
+        if case.subdomain in slugs:
+            resolved[case.subdomain] = case
+    return resolved
+
+
+def resolve_sessions(session_specs, client_info):
+    """
+    Upsert sessions in bulk.
+
+    session_specs: {session_id: (fingerprint, case, last_seen)} — the first
+    event seen for a session supplies its defaults, matching get_or_create
+    semantics; last_seen is the newest event timestamp for the session.
+    Returns {session_id: UserSession}.
+    """
+    if not session_specs:
+        return {}
+
+    now = timezone.now()
+    session_ids = list(session_specs)
+    sessions = {
+        s.session_id: s
+        for s in UserSession.objects.filter(session_id__in=session_ids)
+    }
+
+    def seen(sid):
+        return session_specs[sid][2] or now
+
+    if sessions:
+        # Greatest: a drained (older) event never moves last_activity back
+        UserSession.objects.filter(session_id__in=list(sessions)).update(
+            last_activity=Greatest(F('last_activity'), CaseWhen(
+                *(When(session_id=sid, then=Value(seen(sid))) for sid in sessions),
+                default=F('last_activity'),
+            )),
+        )
+        for sid, s in sessions.items():
+            s.last_activity = max(s.last_activity, seen(sid))
+
+    missing = [sid for sid in session_ids if sid not in sessions]
+    if missing:
+        UserSession.objects.bulk_create(
+            [
+                UserSession(
+                    session_id=sid,
+                    case=session_specs[sid][1],
+                    fingerprint_hash=session_specs[sid][0] or '',
+                    ip_address=client_info['ip'],
+                    user_agent=client_info['user_agent'],
+                )
+                for sid in missing
+            ],
+            ignore_conflicts=True,
+        )
+        # last_activity is auto_now, so the insert stamps it with the wall clock;
+        # rows created by this call take their newest event's time instead
+        UserSession.objects.filter(session_id__in=missing, created_at__gte=now).update(
+            last_activity=CaseWhen(
+                *(When(session_id=sid, then=Value(seen(sid))) for sid in missing),
+                default=F('last_activity'),
+            ),
+        )
+        # Re-read so rows inserted concurrently by another request are picked up
+        # with their real primary keys.
+        sessions.update({
+            s.session_id: s
+            for s in UserSession.objects.filter(session_id__in=missing)
+        })
+
+    return sessions
+
+
+def build_tracking_event(event_data, client_info, enriched, case, session, now=None):
+    """
+    Build (but do not save) a TrackingEvent from a tracker payload.
+    Tor/VPN/proxy flags reported by the client are OR-ed with the server-side
+    IP reputation index (enrich_event_data puts the index verdict in enriched).
+    """
+    from .views import parse_local_timestamp
+
+    viewport = event_data.get('viewport')
+    viewport = viewport if isinstance(viewport, dict) else {}
+
+    return TrackingEvent(
+        case=case,
+        session=session,
+        session_identifier=session.session_id if session else '',
+        fingerprint_hash=event_data.get('fingerprint', ''),
+        event_type=event_data.get('eventType', 'page_view'),
+        event_data=event_data.get('eventData', {}),
+        page_url=event_data.get('url', ''),
+        page_category=page_category(event_data.get('url', '')),
+        page_title=event_data.get('pageTitle', ''),
+        referrer_url=event_data.get('referrer', ''),
+
+        ip_address=client_info['ip'],
+        ip_country=enriched.get('country', ''),
+        ip_region=enriched.get('region', ''),
+        ip_city=enriched.get('city', ''),
+        ip_latitude=enriched.get('lat'),
+        ip_longitude=enriched.get('lon'),
+        ip_postal=enriched.get('postal', ''),
+        isp=enriched.get('isp', ''),
+        is_vpn=bool(event_data.get('is_vpn', False) or enriched.get('is_vpn')),
+        is_proxy=bool(event_data.get('is_proxy', False) or enriched.get('is_proxy')),
+        is_tor=bool(event_data.get('is_tor', False) or enriched.get('is_tor')),
+
+        user_agent=client_info['user_agent'],
+        browser=enriched.get('browser', ''),
+        browser_version=enriched.get('browser_version', ''),
+        os=enriched.get('os', ''),
+        os_version=enriched.get('os_version', ''),
+        device_type=enriched.get('device_type', ''),
+
+        screen_width=event_data.get('screenWidth'),
+        screen_height=event_data.get('screenHeight'),
+        viewport_width=viewport.get('width'),
+        viewport_height=viewport.get('height'),
+
+        timestamp=now or timezone.now(),
+        timezone=event_data.get('timezone', ''),
+        local_timestamp=parse_local_timestamp(event_data.get('localTime')),
+        is_unusual_hour=event_data.get('isUnusualHour', False),
+
+        time_on_page=event_data.get('timeOnPage'),
+        scroll_depth=event_data.get('scrollDepth'),
+        clicks_count=event_data.get('clicksCount', 0),
+    )
+
+
+def ingest_batch(events, client_info, received_at=None, process=None):
+    """
+    Persist a list of tracker payloads and run after_events_saved() on them.
+
+    received_at: optional list of datetimes parallel to events (used by the
+    write-behind drainer so events keep the time they reached the API).
+    process: optional per-event callable handed to after_events_saved().
+    Returns (saved, errors, created_events).
+
+    Only rows that can never be saved (malformed payloads, rows the database
+    rejects) are counted as errors.  A failed case / session lookup, or the
+    database going away mid-insert, raises instead — nothing from the batch is
+    committed, so the caller can retry it as a whole.
+    """
+    from .views import enrich_event_data
+
+    if not events:
+        return 0, 0, []
+
+    now = timezone.now()
+    if received_at is None:
+        received_at = [now] * len(events)
+
+    errors = 0
+    valid = []
+    timestamps = []
+    for event_data, ts in zip(events, received_at):
+        if isinstance(event_data, dict):
+            valid.append(event_data)
+            timestamps.append(ts or now)
+        else:
+            errors += 1
+
+    # ── 1. Cases: one query ──────────────────────────────────────────────────
+    cases = resolve_cases({k for k in map(_case_key, valid) if k})
+
+    # ── 2. Sessions: one read, one bulk insert, one update ───────────────────
+    event_session_ids = []
+    session_specs = {}
+    for event_data, ts in zip(valid, timestamps):
+        # Events without a sessionId each get a fresh session (legacy behaviour)
+        sid = str(event_data.get('sessionId') or uuid.uuid4())
+        event_session_ids.append(sid)
+        if sid not in session_specs:
+            session_specs[sid] = (
+                event_data.get('fingerprint', ''),
+                cases.get(_case_key(event_data)),
+                ts,
+            )
+        elif ts > session_specs[sid][2]:
+            session_specs[sid] = (*session_specs[sid][:2], ts)
+
+    sessions = resolve_sessions(session_specs, client_info)
+
+    # ── 3. Enrichment: IP + UA are shared by the whole batch ─────────────────
+    enriched = enrich_event_data({}, client_info, None)
+
+    # ── 4. Events: one bulk_create ───────────────────────────────────────────
+    to_create = []
+    for event_data, sid, ts in zip(valid, event_session_ids, timestamps):
+        try:
+            to_create.append(build_tracking_event(
+                event_data, client_info, enriched,
+                cases.get(_case_key(event_data)), sessions.get(sid), ts,
+            ))
+        except Exception as e:
+            logger.warning(f"track_batch: failed to build event: {e}")
+            errors += 1
+
+    try:
+        with transaction.atomic():
+            created = TrackingEvent.objects.bulk_create(to_create)
+    except TRANSIENT_DB_ERRORS:
+        raise
+    except Exception as e:
+        # One bad row must not drop the whole batch — retry row by row so the
+        # saved/errors counts stay per-event.  Each row gets a savepoint inside
+        # one outer transaction, so a transient error rolls back every row.
+        logger.warning(f"track_batch: bulk insert failed, retrying per event: {e}")
+        created = []
+        row_errors = 0
+        with transaction.atomic():
+            for event in to_create:
+                try:
+                    with transaction.atomic():
+                        event.save(force_insert=True)
+                    created.append(event)
+                except TRANSIENT_DB_ERRORS:
+                    raise
+                except Exception as row_exc:
+                    logger.warning(f"track_batch: failed to save event: {row_exc}")
+                    row_errors += 1
+        errors += row_errors
+
+    after_events_saved(created, process)
+
+    return len(created), errors, created
+
+
+def after_events_saved(events, process=None):
+    """
+    Post-insert hooks shared by every ingest path: track_event, and
+    ingest_batch for track_batch and the write-behind drainer.
+
+    Keeps the detectors' cached history windows, feature records, the
+    distinct-visitor sketches, the suspect ranking and presence current, runs
+    `process(event)` (detection) on each event, then pushes the events to the
+    realtime dashboards, so the live counters see the detection result.
+    """
+    if not events:
+        return
+    record_events(events)
+    update_visitor_features(events)
+    record_visitors(events)
+    record_suspect_events(events)
+    record_presence(events)
+
+    if process is not None:
+        for event in events:
+            try:
+                process(event)
+            except Exception as e:
+                logger.error(f"ingest: post-processing failed for {event.id}: {e}")
+
+    publish_events(events)
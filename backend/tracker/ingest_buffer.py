@@ -0,0 +1,265 @@
+# backend/tracker/ingest_buffer.py
+"""
+Durable write-behind buffer for tracker events.
+
+When TRACKING_WRITE_BEHIND is enabled, track_event only validates the payload,
+appends it here and returns 202.  The drain_tracking_buffer Celery task reads
+records back in batches, bulk-inserts them through tracker.ingest and runs the
+usual detection / alerting on the new rows.
+
+Two backends:
+  * RedisStreamBuffer — XADD onto a stream, consumed through a consumer group
+    (XREADGROUP / XACK), so records survive worker crashes and are re-claimed
+    after TRACKING_BUFFER_CLAIM_IDLE_MS.  Used when REDIS_URL is set.  The
+    stream is never trimmed (acknowledged entries are XDELed); once it holds
+    TRACKING_BUFFER_MAXLEN entries append() raises BufferFull and track_event
+    inserts synchronously instead.
+  * FileLogBuffer — append-only JSON-lines segments on local disk.  The drainer
+    seals the active segment by renaming it and claims sealed segments by
+    renaming them again, so concurrent drainers never process the same file.
+
+Each record is {'payload': <tracker JSON>, 'client': <client_info>,
+'received_at': <ISO timestamp>}.
+
+read() returns (records, ack).  ack(pending) acknowledges every record except
+the indexes in `pending`, which stay in the buffer and are delivered again:
+Redis leaves them in the group's pending list for XAUTOCLAIM, the file
+buffer rewrites them into a fresh sealed segment.
+"""
+
+import glob
+import json
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """The write-behind buffer is at its cap; the caller must insert directly."""
+
+
+class RedisStreamBuffer:
+    """Write-behind buffer backed by a Redis stream + consumer group."""
+
+    GROUP = 'tracker-drainers'
+
+    def __init__(self, client, stream, maxlen, claim_idle_ms):
+        # the shared pooled client (tracker.redis_pool): while its circuit is
+        # open append() fails at once and track_event falls back to a direct insert
+        self.client = client
+        self.stream = stream
+        self.maxlen = maxlen
+        self.claim_idle_ms = claim_idle_ms
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_ready = False
+
+    def append(self, record):
+        # No MAXLEN trim: it would drop the oldest entries whether or not a
+        # drainer has persisted them.  The cap is checked instead (soft: two
+        # writers may both pass the check at the limit).
+        if self.maxlen and self.client.xlen(self.stream) >= self.maxlen:
+            raise BufferFull(f"{self.stream} holds {self.maxlen} undrained records")
+        self.client.xadd(self.stream, {'r': json.dumps(record, default=str)})
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.stream, self.GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def read(self, count):
+        """Return (records, ack) — call ack(pending) once the records are persisted."""
+        self._ensure_group()
+        entries = []
+
+        # Re-claim entries a crashed drainer read but never acknowledged
+        try:
+            claimed = self.client.xautoclaim(
+                self.stream, self.GROUP, self.consumer,
+                min_idle_time=self.claim_idle_ms, start_id='0-0', count=count,
+            )
+            entries.extend(claimed[1])
+        except Exception as e:
+            logger.debug(f"xautoclaim unavailable: {e}")
+
+        if len(entries) < count:
+            response = self.client.xreadgroup(
+                self.GROUP, self.consumer, {self.stream: '>'}, count=count - len(entries),
+            )
+            for _stream, messages in response or []:
+                entries.extend(messages)
+
+        ids = []
+        records = []
+        record_ids = []
+        for msg_id, fields in entries:
+            ids.append(msg_id)
+            if not fields:
+                continue  # deleted while pending (acknowledged by another drainer)
+            try:
+                records.append(json.loads(fields[b'r']))
+                record_ids.append(msg_id)
+            except Exception as e:
+                logger.warning(f"ingest buffer: dropping malformed record {msg_id}: {e}")
+
+        def ack(pending=()):
+            keep = {record_ids[i] for i in pending}
+            ids_done = [msg_id for msg_id in ids if msg_id not in keep]
+            if ids_done:
+                pipe = self.client.pipeline()
+                pipe.xack(self.stream, self.GROUP, *ids_done)
+                pipe.xdel(self.stream, *ids_done)
+                pipe.execute()
+
+        return records, ack
+
+    def size(self):
+        return self.client.xlen(self.stream)
+
+
+class FileLogBuffer:
+    """Write-behind buffer backed by append-only JSON-lines segment files."""
+
+    ACTIVE = 'active.log'
+    # Sealed segments are left alone for this long so a writer that opened the
+    # active file just before it was renamed can finish its append.
+    SETTLE_SECONDS = 2
+    # A claimed segment older than this belongs to a drainer that died.
+    STALE_CLAIM_SECONDS = 300
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def active_path(self):
+        return os.path.join(self.directory, self.ACTIVE)
+
+    def append(self, record):
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        # O_APPEND keeps concurrent single-write appends from interleaving
+        fd = os.open(self.active_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _seal_active(self):
+        try:
+            if os.path.getsize(self.active_path) == 0:
+                return
+            sealed = os.path.join(self.directory, f"{time.time_ns()}-{os.getpid()}.seg")
+            os.replace(self.active_path, sealed)
+        except FileNotFoundError:
+            pass
+
+    def _claim_segments(self, count):
+        now = time.time()
+        claimed = []
+        lines = 0
+
+        candidates = sorted(glob.glob(os.path.join(self.directory, '*.seg')))
+        candidates += sorted(
+            p for p in glob.glob(os.path.join(self.directory, '*.draining'))
+            if now - os.path.getmtime(p) > self.STALE_CLAIM_SECONDS
+        )
+
+        for path in candidates:
+            if lines >= count:
+                break
+            try:
+                if path.endswith('.seg') and now - os.path.getmtime(path) < self.SETTLE_SECONDS:
+                    continue
+                target = path[:-len('.seg')] + '.draining' if path.endswith('.seg') else path
+                # Rename is atomic: only one drainer wins a given segment
+                os.replace(path, target)
+                os.utime(target)
+            except FileNotFoundError:
+                continue
+            claimed.append(target)
+            with open(target, 'rb') as fh:
+                lines += sum(1 for _ in fh)
+        return claimed
+
+    def read(self, count):
+        """Return (records, ack) — call ack(pending) once the records are persisted."""
+        self._seal_active()
+        segments = self._claim_segments(count)
+
+        records = []
+        lines = []
+        for path in segments:
+            with open(path, 'r', encoding='utf-8') as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                        lines.append(line)
+                    except ValueError as e:
+                        logger.warning(f"ingest buffer: dropping malformed line in {path}: {e}")
+
+        def ack(pending=()):
+            if pending:
+                # Seal the unacknowledged records into a new segment before the
+                # claimed ones go, so a crash in between duplicates, never loses
+                retry = os.path.join(self.directory, f"{time.time_ns()}-{os.getpid()}-retry")
+                with open(retry + '.tmp', 'w', encoding='utf-8') as fh:
+                    fh.writelines(lines[i] + '\n' for i in sorted(set(pending)))
+                os.replace(retry + '.tmp', retry + '.seg')
+            for path in segments:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        return records, ack
+
+    def size(self):
+        total = 0
+        for path in glob.glob(os.path.join(self.directory, '*')):
+            with open(path, 'rb') as fh:
+                total += sum(1 for _ in fh)
+        return total
+
+
+_buffer = None
+
+
+def get_ingest_buffer():
+    """Return the process-wide buffer configured in settings."""
+    global _buffer
+    if _buffer is None:
+        backend = getattr(settings, 'TRACKING_BUFFER_BACKEND', 'file')
+        if backend == 'redis':
+            from .redis_pool import get_redis_service
+            _buffer = RedisStreamBuffer(
+                get_redis_service().client(),
+                getattr(settings, 'TRACKING_BUFFER_STREAM', 'tracker:ingest'),
+                getattr(settings, 'TRACKING_BUFFER_MAXLEN', 1_000_000),
+                getattr(settings, 'TRACKING_BUFFER_CLAIM_IDLE_MS', 60_000),
+            )
+        else:
+            _buffer = FileLogBuffer(
+                getattr(settings, 'TRACKING_BUFFER_DIR', os.path.join(settings.BASE_DIR, 'tracking_buffer'))
+            )
+    return _buffer
+
+
+def buffer_event(payload, client_info, received_at):
+    """Append one tracker payload to the write-behind buffer."""
+    get_ingest_buffer().append({
+        'payload': payload,
+        'client': client_info,
+        'received_at': received_at.isoformat(),
+    })
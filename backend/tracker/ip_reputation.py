@@ -0,0 +1,280 @@
+# backend/tracker/ip_reputation.py
+"""
+Compiled IP-intelligence index for Tor / VPN / proxy classification.
+
+Sources (one entry per line, '#' comments allowed) in IP_REPUTATION_DIR:
+  tor_exit_nodes.txt   IP or CIDR
+  vpn_ranges.txt       IP or CIDR, or an ASN ("AS9009"), followed by an
+                       optional provider label ("185.159.156.0/22 ProtonVPN")
+  proxies.txt          IP or CIDR, optional label
+
+There are no built-in ranges: guessed prefixes such as whole /8 blocks flag
+millions of ordinary visitors, and the verdicts are persisted on every
+TrackingEvent.  Without the files the index is empty and the Tor / VPN /
+proxy flags come only from the request data.
+
+Every category is compiled into disjoint, sorted integer ranges per address
+family (nested ranges resolve to the most specific label), so a lookup is a
+single bisect — O(log n) with no ipaddress objects built per request.
+The index is immutable; get_ip_reputation() rebuilds it on the first call
+after the source files change and swaps the module reference atomically, so
+readers never see a half-built index.
+"""
+
+import heapq
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SOURCE_FILES = {
+    'tor': 'tor_exit_nodes.txt',
+    'vpn': 'vpn_ranges.txt',
+    'proxy': 'proxies.txt',
+}
+
+CHECK_INTERVAL = 30  # seconds between source-file mtime checks
+
+
+def ip_to_int(ip_str):
+    """Return (family, int) for an IP string, or None if it is not an IP."""
+    if not ip_str:
+        return None
+    try:
+        if ':' in ip_str:
+            return 6, int(ipaddress.IPv6Address(ip_str.split('%', 1)[0]))
+        return 4, int.from_bytes(socket.inet_aton(ip_str), 'big')
+    except (OSError, ValueError):
+        return None
+
+
+def _parse_range(entry):
+    """'1.2.3.0/24' or '1.2.3.4' -> (family, start, end)."""
+    net = ipaddress.ip_network(entry, strict=False)
+    return net.version, int(net.network_address), int(net.broadcast_address)
+
+
+def _flatten(ranges):
+    """
+    Compile possibly-overlapping (start, end, label) ranges into disjoint
+    sorted (starts, ends, labels) lists where the narrowest range wins.
+    """
+    if not ranges:
+        return [], [], []
+
+    by_start = {}
+    points = set()
+    for start, end, label in ranges:
+        by_start.setdefault(start, []).append((start, end, label))
+        points.add(start)
+        points.add(end + 1)
+    points = sorted(points)
+
+    starts, ends, labels = [], [], []
+    heap = []  # (size, seq, end, label) — narrowest open range on top
+    seq = 0
+    for i, point in enumerate(points[:-1]):
+        for start, end, label in by_start.get(point, ()):
+            heapq.heappush(heap, (end - start, seq, end, label))
+            seq += 1
+        while heap and heap[0][2] < point:
+            heapq.heappop(heap)
+        if not heap:
+            continue
+        label = heap[0][3]
+        seg_end = points[i + 1] - 1
+        if ends and ends[-1] == point - 1 and labels[-1] == label:
+            ends[-1] = seg_end
+        else:
+            starts.append(point)
+            ends.append(seg_end)
+            labels.append(label)
+    return starts, ends, labels
+
+
+class _RangeTable:
+    """Disjoint sorted integer ranges for one category, per address family."""
+
+    __slots__ = ('tables', 'size')
+
+    def __init__(self, ranges):
+        per_family = {4: [], 6: []}
+        for family, start, end, label in ranges:
+            per_family[family].append((start, end, label))
+        self.tables = {family: _flatten(rs) for family, rs in per_family.items()}
+        self.size = sum(len(t[0]) for t in self.tables.values())
+
+    def lookup(self, family, value):
+        starts, ends, labels = self.tables[family]
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return labels[i]
+        return None
+
+
+class IPReputationIndex:
+    """Immutable Tor / VPN / proxy index. Build with IPReputationIndex.load()."""
+
+    def __init__(self, entries, vpn_asns=None, signature=None):
+        self.categories = {name: _RangeTable(ranges) for name, ranges in entries.items()}
+        self.vpn_asns = vpn_asns or {}
+        self.signature = signature
+
+    # ── construction ─────────────────────────────────────────────────────────
+
+    @classmethod
+    def load(cls, directory=None):
+        entries = {name: [] for name in SOURCE_FILES}
+        vpn_asns = {}
+        if directory:
+            for name, filename in SOURCE_FILES.items():
+                path = os.path.join(directory, filename)
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'r', encoding='utf-8') as fh:
+                    for lineno, line in enumerate(fh, 1):
+                        line = line.split('#', 1)[0].strip()
+                        if not line:
+                            continue
+                        parts = line.replace(',', ' ').split(None, 1)
+                        token = parts[0]
+                        label = parts[1].strip() if len(parts) > 1 else name
+                        if name == 'vpn' and token.upper().startswith('AS') and token[2:].isdigit():
+                            vpn_asns[int(token[2:])] = label
+                            continue
+                        try:
+                            entries[name].append((*_parse_range(token), label))
+                        except ValueError:
+                            logger.warning(f"ip_reputation: bad entry {path}:{lineno}: {token!r}")
+
+        return cls(entries, vpn_asns, signature=_source_signature(directory))
+
+    # ── lookups ──────────────────────────────────────────────────────────────
+
+    def _lookup(self, category, ip_str):
+        parsed = ip_to_int(ip_str)
+        if parsed is None:
+            return None
+        return self.categories[category].lookup(*parsed)
+
+    def is_tor(self, ip_str):
+        return self._lookup('tor', ip_str) is not None
+
+    def vpn_provider(self, ip_str):
+        label = self._lookup('vpn', ip_str)
+        if label is None and self.vpn_asns:
+            label = self.vpn_asns.get(_asn_for(ip_str))
+        return label
+
+    def is_vpn(self, ip_str):
+        return self.vpn_provider(ip_str) is not None
+
+    def is_proxy(self, ip_str):
+        return self._lookup('proxy', ip_str) is not None
+
+    def classify(self, ip_str):
+        """One parse, all categories: {'is_tor', 'is_vpn', 'is_proxy', 'vpn_provider'}."""
+        parsed = ip_to_int(ip_str)
+        if parsed is None:
+            return {'is_tor': False, 'is_vpn': False, 'is_proxy': False, 'vpn_provider': None}
+        provider = self.categories['vpn'].lookup(*parsed)
+        if provider is None and self.vpn_asns:
+            provider = self.vpn_asns.get(_asn_for(ip_str))
+        return {
+            'is_tor': self.categories['tor'].lookup(*parsed) is not None,
+            'is_vpn': provider is not None,
+            'is_proxy': self.categories['proxy'].lookup(*parsed) is not None,
+            'vpn_provider': provider,
+        }
+
+    def stats(self):
+        return {name: table.size for name, table in self.categories.items()} | {
+            'vpn_asns': len(self.vpn_asns),
+        }
+
+
+# ============================================
+# ASN LOOKUP (only used when vpn_ranges.txt lists ASNs)
+# ============================================
+
+_asn_reader = None
+_asn_reader_checked = False
+
+
+def _asn_for(ip_str):
+    global _asn_reader, _asn_reader_checked
+    if not _asn_reader_checked:
+        _asn_reader_checked = True
+        db_path = os.path.join(str(getattr(settings, 'GEOIP_PATH', '')), 'GeoLite2-ASN.mmdb')
+        if os.path.exists(db_path):
+            try:
+                import geoip2.database
+                _asn_reader = geoip2.database.Reader(db_path)
+            except Exception as e:
+                logger.warning(f"ip_reputation: could not open {db_path}: {e}")
+    if _asn_reader is None:
+        return None
+    try:
+        return _asn_reader.asn(ip_str).autonomous_system_number
+    except Exception:
+        return None
+
+
+# ============================================
+# PROCESS-WIDE INSTANCE
+# ============================================
+
+def _source_dir():
+    return getattr(settings, 'IP_REPUTATION_DIR', None)
+
+
+def _source_signature(directory):
+    if not directory:
+        return ()
+    signature = []
+    for filename in sorted(SOURCE_FILES.values()):
+        try:
+            st = os.stat(os.path.join(directory, filename))
+            signature.append((filename, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append((filename, None, None))
+    return tuple(signature)
+
+
+_index = None
+_last_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def get_ip_reputation():
+    """Return the current index, rebuilding it if the source files changed."""
+    global _index, _last_check
+
+    now = time.monotonic()
+    if _index is not None and now - _last_check < CHECK_INTERVAL:
+        return _index
+
+    # Only one thread rebuilds; the others keep using the current index
+    if not _reload_lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        _last_check = now
+        directory = _source_dir()
+        if _index is None or _index.signature != _source_signature(directory):
+            try:
+                index = IPReputationIndex.load(directory)
+            except Exception as e:
+                logger.error(f"ip_reputation: reload failed, keeping previous index: {e}")
+                index = _index or IPReputationIndex({name: [] for name in SOURCE_FILES})
+            _index = index  # atomic swap
+            logger.info(f"ip_reputation: index loaded {_index.stats()}")
+    finally:
+        _reload_lock.release()
+    return _index
@@ -0,0 +1,68 @@
+"""
+Management command: python manage.py archive_events
+
+Moves TrackingEvents older than TRACKING_ARCHIVE_AFTER_DAYS out of the hot
+table into the Parquet archive at TRACKING_ARCHIVE_URI (see
+tracker/archive.py).  The archive_cold_events beat task runs the same job
+nightly; use this for the first (large) backfill or a single case.
+
+Usage:
+  python manage.py archive_events                     # every case
+  python manage.py archive_events --case <case id>
+  python manage.py archive_events --dry-run           # list partitions only
+  python manage.py archive_events --chunk-size 10000
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Move cold TrackingEvents into the Parquet archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--case', dest='case_id', help='Only archive this case id')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows per DB page / Parquet row group (default 5000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the partitions that would be archived without moving anything',
+        )
+
+    def handle(self, *args, **options):
+        from tracker.archive import ArchiveUnavailable, require_pyarrow, archive_events
+
+        if not settings.TRACKING_ARCHIVE_URI:
+            raise CommandError("TRACKING_ARCHIVE_URI is not set")
+        try:
+            require_pyarrow()
+        except ArchiveUnavailable as exc:
+            raise CommandError(str(exc))
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        self.stdout.write(
+            f"Archiving events older than {settings.TRACKING_ARCHIVE_AFTER_DAYS} days "
+            f"to {settings.TRACKING_ARCHIVE_URI} ..."
+        )
+        t0 = time.perf_counter()
+        stats = archive_events(
+            case_id=options['case_id'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"  {stats['partitions']} case/month partition(s) to archive (dry run)")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"  {stats['archived']:,} events in {stats['files']} file(s) across "
+            f"{stats['partitions']} partition(s); {stats['deleted']:,} hot rows removed "
+            f"in {time.perf_counter() - t0:.1f}s"
+        ))
@@ -0,0 +1,144 @@
+"""
+Management command: python manage.py bench_hll
+
+Accuracy / latency benchmark for the per-day HyperLogLog visitor sketches
+(tracker.cardinality) against the exact
+`values('fingerprint_hash').distinct().count()` they replace.
+
+A synthetic case (subdomain "hll-bench") is filled with N events from a
+skewed pool of visitors spread over --days days; it is reused on later runs
+if it already holds at least N events.  For each window the exact COUNT
+DISTINCT, the cold sketch read (seeding every day from the database) and the
+warm sketch read are timed, and the relative error reported.
+
+Usage:
+  python manage.py bench_hll                          # 5,000,000 events
+  python manage.py bench_hll --events 500000 --visitors 50000
+  python manage.py bench_hll --cleanup                # delete the synthetic case
+"""
+
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+BENCH_SUBDOMAIN = 'hll-bench'
+INSERT_BATCH = 10_000
+
+
+class Command(BaseCommand):
+    help = "Benchmark HLL distinct-visitor counts against exact COUNT DISTINCT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5_000_000,
+                            help='Events in the synthetic case (default 5,000,000)')
+        parser.add_argument('--visitors', type=int, default=250_000,
+                            help='Size of the visitor pool (default 250,000)')
+        parser.add_argument('--days', type=int, default=90,
+                            help='Days the events are spread over (default 90)')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the synthetic case and exit')
+
+    def _bench_case(self):
+        from django.contrib.auth import get_user_model
+        from cases.models import Case
+
+        case = Case.objects.filter(subdomain=BENCH_SUBDOMAIN).first()
+        if case is None:
+            user, _ = get_user_model().objects.get_or_create(
+                username='hll-bench', defaults={'email': 'hll-bench@example.invalid'},
+            )
+            case = Case.objects.create(
+                user=user, subdomain=BENCH_SUBDOMAIN, case_title='HLL benchmark',
+                first_name='Bench', last_name='Case',
+            )
+        return case
+
+    def _populate(self, case, n, visitors, days):
+        from tracker.models import TrackingEvent
+
+        existing = TrackingEvent.objects.filter(case=case).count()
+        if existing >= n:
+            self.stdout.write(f"  Reusing {existing:,} synthetic events")
+            return
+        rng = random.Random(7)
+        now = timezone.now()
+        span = days * 86400
+        todo = n - existing
+        self.stdout.write(f"  Inserting {todo:,} synthetic events ...")
+        t0 = time.perf_counter()
+        while todo > 0:
+            batch = []
+            for _ in range(min(INSERT_BATCH, todo)):
+                # Skewed pool: a core of returning visitors plus a long tail
+                visitor = int(visitors * rng.random() ** 2)
+                batch.append(TrackingEvent(
+                    case=case,
+                    session_identifier=f's{visitor}',
+                    fingerprint_hash=f'bench{visitor:08d}',
+                    event_type='page_view',
+                    page_url='/',
+                    ip_address='203.0.113.1',
+                    user_agent='bench',
+                    timestamp=now - timedelta(seconds=rng.randint(0, span)),
+                ))
+            with transaction.atomic():
+                TrackingEvent.objects.bulk_create(batch, batch_size=INSERT_BATCH)
+            todo -= len(batch)
+        self.stdout.write(f"  ... done in {time.perf_counter() - t0:.1f}s")
+
+    def handle(self, *args, **options):
+        from tracker.cardinality import day_range, get_visitor_cardinality, utc_day
+        from tracker.models import TrackingEvent
+
+        if options['cleanup']:
+            from cases.models import Case
+            deleted = Case.objects.filter(subdomain=BENCH_SUBDOMAIN).delete()[0]
+            self.stdout.write(f"Deleted {deleted:,} rows")
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== HLL distinct-visitor benchmark ===\n"))
+        case = self._bench_case()
+        self._populate(case, options['events'], options['visitors'], options['days'])
+
+        counter = get_visitor_cardinality()
+        now = timezone.now()
+        today = utc_day(now)
+        windows = [('1 day', 1), ('7 days', 7), ('30 days', 30), ('all', options['days'] + 1)]
+        counter.reset(case.id, day_range(today - timedelta(days=options['days'] + 1), today))
+
+        self.stdout.write(
+            f"\n  {'window':<8} {'exact':>10} {'ms':>9}   {'sketch':>10} {'cold ms':>9} {'warm ms':>8} {'error':>7}"
+        )
+        for label, n_days in windows:
+            first_day = today - timedelta(days=n_days - 1)
+            since = datetime.combine(first_day, datetime.min.time(), tzinfo=dt_timezone.utc)
+
+            t0 = time.perf_counter()
+            exact = (
+                TrackingEvent.objects.filter(case=case, timestamp__gte=since)
+                .exclude(fingerprint_hash='')
+                .values('fingerprint_hash').distinct().count()
+            )
+            exact_ms = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            counter.count_between(case.id, first_day, today)
+            cold_ms = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            estimate = counter.count_between(case.id, first_day, today)
+            warm_ms = (time.perf_counter() - t0) * 1000
+
+            error = (estimate - exact) / exact * 100 if exact else 0.0
+            self.stdout.write(
+                f"  {label:<8} {exact:>10,} {exact_ms:>9.1f}   {estimate:>10,} {cold_ms:>9.1f} {warm_ms:>8.1f} {error:>+6.2f}%"
+            )
+
+        self.stdout.write(
+            "\n  cold = first read, seeds each day sketch from the database once;"
+            "\n  warm = every later read (ingest keeps the sketches current).\n"
+        )
@@ -0,0 +1,115 @@
+"""
+Management command: python manage.py bench_ingest
+
+Measures throughput (events/sec) of the batched ingest endpoint
+(tracker.views.track_batch) for different batch sizes.
+
+Every run happens inside a transaction that is rolled back, so the benchmark
+leaves no rows behind.  Geo lookups are served from the cache after the first
+request, so the numbers reflect database + ORM cost.
+
+Usage:
+  python manage.py bench_ingest                         # batches of 1, 50, 500
+  python manage.py bench_ingest --sizes 10 100 --events 5000
+  python manage.py bench_ingest --case my-case-subdomain
+"""
+
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = "Benchmark the batched tracker ingest path (events/sec per batch size)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1, 50, 500],
+            help='Batch sizes to benchmark (default: 1 50 500)',
+        )
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=2000,
+            help='Approximate number of events to ingest per batch size (default 2000)',
+        )
+        parser.add_argument(
+            '--case',
+            default='global',
+            help='caseId to attach events to (numeric id or subdomain, default "global")',
+        )
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=10,
+            help='Number of distinct sessionIds spread across each batch (default 10)',
+        )
+
+    def _payload(self, size, case_id, n_sessions):
+        session_ids = [f'bench-{uuid.uuid4()}' for _ in range(max(1, n_sessions))]
+        return {
+            'events': [
+                {
+                    'caseId': case_id,
+                    'sessionId': session_ids[i % len(session_ids)],
+                    'fingerprint': f'benchfp{i % len(session_ids):04d}',
+                    'eventType': 'page_view',
+                    'url': f'/case/{case_id}/page-{i % 20}',
+                    'pageTitle': 'Benchmark',
+                    'timeOnPage': 12,
+                    'scrollDepth': 50,
+                }
+                for i in range(size)
+            ],
+            'sessionMetadata': {},
+        }
+
+    def handle(self, *args, **options):
+        from tracker.views import track_batch
+
+        factory = RequestFactory()
+        total = options['events']
+        case_id = options['case']
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== Tracker batch ingest benchmark ===\n"))
+        self.stdout.write(f"  {'batch':>6}  {'requests':>8}  {'events':>7}  {'seconds':>8}  "
+                          f"{'events/sec':>10}  {'queries/req':>11}")
+
+        for size in options['sizes']:
+            n_requests = max(1, total // size)
+            saved = 0
+            queries = 0
+
+            with transaction.atomic():
+                start = time.perf_counter()
+                for _ in range(n_requests):
+                    body = json.dumps(self._payload(size, case_id, options['sessions']))
+                    request = factory.post(
+                        '/api/tracker/track/batch/',
+                        data=body,
+                        content_type='application/json',
+                        HTTP_USER_AGENT='Mozilla/5.0 (X11; Linux x86_64) Benchmark/1.0',
+                        REMOTE_ADDR='127.0.0.1',
+                    )
+                    with CaptureQueriesContext(connection) as ctx:
+                        response = track_batch(request)
+                    queries += len(ctx.captured_queries)
+                    saved += json.loads(response.content).get('saved', 0)
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            rate = saved / elapsed if elapsed else 0.0
+            self.stdout.write(
+                f"  {size:>6}  {n_requests:>8}  {saved:>7}  {elapsed:>8.3f}  "
+                f"{rate:>10.0f}  {queries / n_requests:>11.1f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS("\nDone (all rows rolled back).\n"))
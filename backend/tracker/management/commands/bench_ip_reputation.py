@@ -0,0 +1,100 @@
+"""
+Management command: python manage.py bench_ip_reputation
+
+Microbenchmark for the compiled IP reputation index (tracker/ip_reputation.py).
+Runs N random IPv4 lookups through IPReputationIndex.classify() and, for
+comparison, a sample through the old approach of building ip_network()
+objects for every range on every call.
+
+Usage:
+  python manage.py bench_ip_reputation                  # 1M lookups
+  python manage.py bench_ip_reputation --lookups 200000
+  python manage.py bench_ip_reputation --synthetic-ranges 50000
+"""
+
+import random
+import socket
+import struct
+import time
+from ipaddress import ip_address, ip_network
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Benchmark Tor/VPN/proxy lookups against the IP reputation index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=1_000_000,
+            help='Number of lookups against the compiled index (default 1,000,000)',
+        )
+        parser.add_argument(
+            '--legacy-sample',
+            type=int,
+            default=200,
+            help='Lookups to time with the per-call ip_network() scan (default 200)',
+        )
+        parser.add_argument(
+            '--synthetic-ranges',
+            type=int,
+            default=10_000,
+            help='Extra random /24 proxy ranges to add to the index (default 10,000)',
+        )
+
+    def handle(self, *args, **options):
+        from tracker.ip_reputation import IPReputationIndex, get_ip_reputation, _parse_range
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== IP reputation index benchmark ===\n"))
+
+        rng = random.Random(42)
+        base = get_ip_reputation()
+
+        # Rebuild with extra synthetic ranges so the index has a realistic size
+        entries = {name: [] for name in base.categories}
+        synthetic = []
+        for _ in range(options['synthetic_ranges']):
+            cidr = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.0/24"
+            synthetic.append(cidr)
+            entries['proxy'].append((*_parse_range(cidr), 'proxy'))
+        for name, table in base.categories.items():
+            for family, (starts, ends, labels) in table.tables.items():
+                entries[name].extend(zip([family] * len(starts), starts, ends, labels))
+
+        start = time.perf_counter()
+        index = IPReputationIndex(entries, base.vpn_asns)
+        build = time.perf_counter() - start
+        self.stdout.write(f"  index build:  {build * 1000:.1f} ms  {index.stats()}")
+
+        n = options['lookups']
+        ips = [socket.inet_ntoa(struct.pack('!I', rng.getrandbits(32))) for _ in range(min(n, 100_000))]
+
+        hits = 0
+        start = time.perf_counter()
+        for i in range(n):
+            r = index.classify(ips[i % len(ips)])
+            hits += r['is_tor'] or r['is_vpn'] or r['is_proxy']
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  index:        {n:>9,} lookups in {elapsed:.3f}s  "
+            f"({n / elapsed:,.0f}/s, {elapsed / n * 1e6:.2f} µs each, {hits:,} hits)"
+        )
+
+        # Legacy: ip_network() objects rebuilt for every range on every call
+        legacy_ranges = synthetic
+        sample = max(1, min(options['legacy_sample'], n))
+        start = time.perf_counter()
+        for i in range(sample):
+            ip_obj = ip_address(ips[i % len(ips)])
+            any(ip_obj in ip_network(r) for r in legacy_ranges)
+        legacy = time.perf_counter() - start
+        self.stdout.write(
+            f"  legacy scan:  {sample:>9,} lookups in {legacy:.3f}s  "
+            f"({sample / legacy:,.0f}/s, {legacy / sample * 1e6:.2f} µs each, "
+            f"{len(legacy_ranges):,} ranges)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"\nSpeed-up: {(legacy / sample) / (elapsed / n):,.0f}x\n"
+        ))
@@ -0,0 +1,114 @@
+"""
+Management command: python manage.py bench_ml_batch
+
+Throughput benchmark for CriminalMLAnalyzer batch scoring. Scores N synthetic
+sessions with analyze_sessions_batch() (one feature matrix, one model call)
+and, for comparison, a sample through the per-session path
+(extract_criminal_features + detect_criminal_anomalies + predict_criminal_behavior).
+The two paths are also checked for identical risk scores.
+
+Usage:
+  python manage.py bench_ml_batch                  # N=10,000
+  python manage.py bench_ml_batch --sessions 50000 --per-session-sample 2000
+"""
+
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+PAGES = ['/', '/about', '/victim/photos', '/timeline', '/evidence/report',
+         '/family', '/news', '/witness-statements', '/contact', '/missing-poster']
+
+
+def synthetic_sessions(n, seed=42):
+    rng = random.Random(seed)
+    now = timezone.now()
+    sessions = []
+    for _ in range(n):
+        ts = now - timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+        sessions.append({
+            'timestamp': ts,
+            'case_start_date': ts - timedelta(days=rng.randint(0, 400)),
+            'pages': rng.choices(PAGES, k=rng.randint(1, 12)),
+            'duration': rng.randint(0, 3600),
+            'clicks': rng.randint(0, 50),
+            'panic_clicks': rng.randint(0, 5),
+            'scroll_depths': [rng.randint(0, 100) for _ in range(rng.randint(1, 5))],
+            'is_vpn': rng.random() < 0.15,
+            'is_tor': rng.random() < 0.03,
+            'is_proxy': rng.random() < 0.05,
+            'device_changes': rng.randint(0, 4),
+            'repeat_visits': rng.randint(0, 30),
+            'victim_searches': rng.randint(0, 3),
+            'copy_events': rng.randint(0, 5),
+            'fingerprint_hash': f'fp{rng.randint(1, 500)}',
+        })
+    return sessions
+
+
+class Command(BaseCommand):
+    help = "Benchmark vectorized ML batch scoring against per-session scoring"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=10_000,
+            help='Sessions scored by the batch path (default 10,000)',
+        )
+        parser.add_argument(
+            '--per-session-sample',
+            type=int,
+            default=1_000,
+            help='Sessions timed through the per-session path (default 1,000)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from tracker.ml_analyzer import get_ml_analyzer
+            analyzer = get_ml_analyzer()
+        except ImportError as exc:
+            raise CommandError(f"ML analyzer unavailable: {exc}")
+
+        n = options['sessions']
+        sample = min(options['per_session_sample'], n)
+        sessions = synthetic_sessions(n)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== ML batch scoring benchmark ===\n"))
+        self.stdout.write(f"  Models loaded: {analyzer.registry.get().versions or 'none (rule-based)'}")
+
+        # Warm up both paths (registry load, imports)
+        analyzer.analyze_sessions_batch(sessions[:10])
+        analyzer.detect_criminal_anomalies(analyzer.extract_criminal_features(sessions[0]))
+
+        t0 = time.perf_counter()
+        batch_results = analyzer.analyze_sessions_batch(sessions)
+        batch_elapsed = time.perf_counter() - t0
+        batch_rate = n / batch_elapsed
+
+        t0 = time.perf_counter()
+        single_results = []
+        for session in sessions[:sample]:
+            features = analyzer.extract_criminal_features(session)
+            anomalies = analyzer.detect_criminal_anomalies(features)
+            analyzer.predict_criminal_behavior(features)
+            single_results.append(anomalies)
+        single_elapsed = time.perf_counter() - t0
+        single_rate = sample / single_elapsed
+
+        mismatches = sum(
+            1 for a, b in zip(batch_results, single_results)
+            if a['criminal_risk_score'] != b['criminal_risk_score'] or a['threat_level'] != b['threat_level']
+        )
+
+        self.stdout.write(f"  Per-session: {sample:>7,} sessions in {single_elapsed:7.3f}s  → {single_rate:>10,.0f} sessions/s")
+        self.stdout.write(f"  Batch:       {n:>7,} sessions in {batch_elapsed:7.3f}s  → {batch_rate:>10,.0f} sessions/s")
+        self.stdout.write(self.style.SUCCESS(f"\n  Speedup: {batch_rate / single_rate:,.1f}x"))
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"  {mismatches} of {sample} risk scores differ between paths"))
+        else:
+            self.stdout.write(f"  Risk scores identical on the {sample:,} overlapping sessions\n")
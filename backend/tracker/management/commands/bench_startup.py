@@ -0,0 +1,122 @@
+"""
+Management command: python manage.py bench_startup
+
+Measures what a fresh web worker pays at startup: wall time for
+django.setup() (which runs TrackerConfig.ready() and builds the detection
+system) and the peak RSS of the process afterwards.
+
+Each run happens in a clean subprocess, in two modes:
+  lazy   the current code — TensorFlow / scikit-learn are imported on first use
+  eager  replays the old startup: import the full sklearn / scipy / TensorFlow
+         stack and build + compile the Keras network before django.setup()
+
+Usage:
+  python manage.py bench_startup             # 3 runs per mode
+  python manage.py bench_startup --runs 5
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+
+WORKER_SCRIPT = r'''
+import json, resource, sys, time
+t0 = time.perf_counter()
+available = {}
+if sys.argv[1] == 'eager':
+    for mod in ('pandas', 'numpy', 'sklearn.ensemble', 'sklearn.preprocessing',
+                'sklearn.cluster', 'sklearn.decomposition', 'sklearn.feature_extraction.text',
+                'sklearn.metrics.pairwise', 'sklearn.neural_network', 'scipy.stats',
+                'scipy.spatial.distance', 'scipy.signal', 'joblib', 'tensorflow'):
+        try:
+            __import__(mod)
+            available[mod] = True
+        except ImportError:
+            available[mod] = False
+    if available.get('tensorflow'):
+        from tracker.ml_analyzer import CriminalMLAnalyzer
+        CriminalMLAnalyzer._build_deep_model()
+import django
+django.setup()
+from tracker.apps import get_detection_system
+loaded = get_detection_system() is not None
+elapsed = time.perf_counter() - t0
+print(json.dumps({
+    'seconds': elapsed,
+    'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'detection_loaded': loaded,
+    'tensorflow_imported': 'tensorflow' in sys.modules,
+    'sklearn_imported': 'sklearn' in sys.modules,
+    'available': available,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = "Benchmark web-worker startup time and RSS (lazy vs eager ML imports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=3,
+            help='Fresh worker processes per mode (default 3)',
+        )
+
+    def _run_worker(self, mode):
+        env = dict(os.environ)
+        proc = subprocess.run(
+            [sys.executable, '-c', WORKER_SCRIPT, mode],
+            capture_output=True, text=True, env=env, cwd=os.getcwd(),
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else 'worker failed')
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        runs = max(1, options['runs'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n=== Web worker startup benchmark ===\n"))
+
+        results = {}
+        for mode in ('eager', 'lazy'):
+            samples = []
+            for _ in range(runs):
+                try:
+                    samples.append(self._run_worker(mode))
+                except Exception as exc:
+                    self.stdout.write(self.style.ERROR(f"  {mode}: worker failed: {exc}"))
+                    break
+            if not samples:
+                continue
+            results[mode] = samples[-1]
+            results[mode]['seconds'] = statistics.median(s['seconds'] for s in samples)
+            results[mode]['maxrss_mb'] = statistics.median(s['maxrss_mb'] for s in samples)
+
+        for mode, r in results.items():
+            self.stdout.write(
+                f"  {mode:<6} startup {r['seconds'] * 1000:8.0f} ms   "
+                f"RSS {r['maxrss_mb']:7.1f} MB   "
+                f"sklearn={'yes' if r['sklearn_imported'] else 'no'}  "
+                f"tensorflow={'yes' if r['tensorflow_imported'] else 'no'}  "
+                f"detection={'loaded' if r['detection_loaded'] else 'unavailable'}"
+            )
+
+        if 'eager' in results:
+            missing = [m for m, ok in results['eager']['available'].items() if not ok]
+            if missing:
+                self.stdout.write(self.style.WARNING(
+                    f"\n  Not installed here (eager numbers understate the old cost): {', '.join(missing)}"
+                ))
+
+        if len(results) == 2:
+            eager, lazy = results['eager'], results['lazy']
+            self.stdout.write(self.style.SUCCESS(
+                f"\n  Saved per worker: {(eager['seconds'] - lazy['seconds']) * 1000:.0f} ms, "
+                f"{eager['maxrss_mb'] - lazy['maxrss_mb']:.1f} MB RSS\n"
+            ))
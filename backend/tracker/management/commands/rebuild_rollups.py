@@ -0,0 +1,81 @@
+"""
+Management command: python manage.py rebuild_rollups
+
+Rebuilds the dashboard rollups (CaseHourlyRollup) from raw TrackingEvents.
+The update_hourly_rollups beat task keeps them current and backfills an empty
+table a week per run; use this after a deploy to backfill everything at once,
+or to repair a range after events were deleted or re-imported.
+
+With the Parquet archive enabled (TRACKING_ARCHIVE_URI), hours before the
+archive cutoff (TRACKING_ARCHIVE_AFTER_DAYS) are skipped: their events are no
+longer in the hot table, so rebuilding them would erase archived traffic from
+the dashboards.  The range is clamped and the command says so.
+
+Usage:
+  python manage.py rebuild_rollups                 # last 30 days, all cases
+  python manage.py rebuild_rollups --days 365
+  python manage.py rebuild_rollups --all           # since the first event
+  python manage.py rebuild_rollups --case <case id>
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Rebuild hourly dashboard rollups from raw tracking events"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Days to rebuild, ending now (default 30)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild from the first tracked event',
+        )
+        parser.add_argument(
+            '--case',
+            action='append',
+            dest='cases',
+            help='Only rebuild this case id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        from tracker.models import TrackingEvent
+        from tracker.rollups import floor_hour, rebuild_rollups, rebuildable_since
+
+        end = floor_hour(timezone.now()) + timedelta(hours=1)
+        if options['all']:
+            first = (
+                TrackingEvent.objects.filter(case__isnull=False)
+                .order_by('timestamp').values_list('timestamp', flat=True).first()
+            )
+            if first is None:
+                self.stdout.write("No tracked events — nothing to rebuild.")
+                return
+            start = floor_hour(first)
+        else:
+            if options['days'] < 1:
+                raise CommandError("--days must be at least 1")
+            start = end - timedelta(days=options['days'])
+
+        hot_since = rebuildable_since()
+        if hot_since is not None and start < hot_since:
+            self.stdout.write(self.style.WARNING(
+                f"Hours before {hot_since:%Y-%m-%d %H:00} UTC may be archived; keeping their rollups."
+            ))
+            start = min(hot_since, end)
+
+        self.stdout.write(f"Rebuilding rollups {start:%Y-%m-%d %H:00} → {end:%Y-%m-%d %H:00} UTC ...")
+        t0 = time.perf_counter()
+        rows = rebuild_rollups(start, end, case_ids=options['cases'])
+        self.stdout.write(self.style.SUCCESS(
+            f"  {rows:,} rollup rows written in {time.perf_counter() - t0:.1f}s"
+        ))
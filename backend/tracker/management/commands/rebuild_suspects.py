@@ -0,0 +1,70 @@
+"""
+Management command: python manage.py rebuild_suspects
+
+Rebuilds the materialized suspect ranking (CaseSuspect) from raw
+TrackingEvents and SuspiciousActivity records.  Ingest and new activities keep
+it current incrementally; use this after a deploy to populate the table, after
+the scoring rules change, or to repair a case after events were deleted or
+re-imported.
+
+With the Parquet archive enabled (TRACKING_ARCHIVE_URI), events before the
+archive cutoff are read back from it, so a rebuild keeps archived visits in
+the counters.  Without pyarrow or the URI only the hot table is read.
+
+Usage:
+  python manage.py rebuild_suspects                    # every case with events
+  python manage.py rebuild_suspects --case <case id>   # repeatable
+  python manage.py rebuild_suspects --chunk-size 2000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized suspect ranking from raw tracking data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--case',
+            action='append',
+            dest='cases',
+            help='Only rebuild this case id (repeatable)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Events streamed / rows written per batch (default 5000)',
+        )
+
+    def handle(self, *args, **options):
+        from tracker.models import SuspiciousActivity, TrackingEvent
+        from tracker.suspects import rebuild_suspects
+
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        case_ids = options['cases']
+        if not case_ids:
+            case_ids = sorted(
+                set(TrackingEvent.objects.filter(case__isnull=False).order_by()
+                    .values_list('case_id', flat=True).distinct())
+                | set(SuspiciousActivity.objects.filter(case__isnull=False).order_by()
+                      .values_list('case_id', flat=True).distinct())
+            )
+        if not case_ids:
+            self.stdout.write("No tracked cases — nothing to rebuild.")
+            return
+
+        self.stdout.write(f"Rebuilding suspects for {len(case_ids)} case(s) ...")
+        t0 = time.perf_counter()
+        total = 0
+        for case_id in case_ids:
+            rows = rebuild_suspects(case_id, chunk_size=options['chunk_size'])
+            total += rows
+            self.stdout.write(f"  case {case_id}: {rows:,} suspects")
+        self.stdout.write(self.style.SUCCESS(
+            f"  {total:,} suspect rows written in {time.perf_counter() - t0:.1f}s"
+        ))
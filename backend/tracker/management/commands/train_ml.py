@@ -5,9 +5,15 @@ Trains the ML models using:
   1. ALL TrackingEvents  → IsolationForest (unsupervised, no labels needed)
   2. Labeled fingerprints (MLTrainingLabel) → GradientBoosting + RandomForest
 
-After training, models are saved to MEDIA_ROOT/ml_models/*.joblib and loaded
-by CriminalMLAnalyzer.load_models() on the next server restart (or immediately
-via the --reload flag).
+Events older than TRACKING_ARCHIVE_AFTER_DAYS are read from the Parquet
+archive (tracker/archive.py) when --days reaches past it.
+
+After training, the models are published as a new version through the model
+registry (tracker/ml_registry.py): artifacts go to
+MEDIA_ROOT/ml_models/<version>/*.joblib and an active MLModel row is created
+per model type. Running processes pick the new version up within a few
+seconds (the registry polls the active versions); --reload also loads it in
+this process, which checks the artifacts can be read back.
 
 Usage:
   python manage.py train_ml               # train with all available data
@@ -27,6 +33,38 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# .values() projection of the training events
+TRAINING_FIELDS = (
+    'timestamp', 'page_url', 'time_on_page', 'clicks_count',
+    'scroll_depth', 'is_vpn', 'is_tor', 'is_proxy',
+    'fingerprint_hash', 'ip_address', 'device_type', 'browser',
+    'is_unusual_hour', 'case__created_at',
+)
+
+
+def archived_training_events(since=None, fingerprint_hash=None, limit=None):
+    """Archived events (tracker/archive.py) in the TRAINING_FIELDS shape."""
+    from cases.models import Case
+    from tracker.archive import archived_rows, reaches_archive
+
+    if not reaches_archive(since):
+        return []
+    columns = [field for field in TRAINING_FIELDS if field != 'case__created_at'] + ['case_id']
+    case_started = {}
+    events = []
+    for row in archived_rows(since=since, fingerprint_hash=fingerprint_hash, columns=columns):
+        if limit is not None and len(events) >= limit:
+            break
+        case_id = row.pop('case_id')
+        if case_id not in case_started:
+            case_started[case_id] = (
+                Case.objects.filter(pk=case_id).values_list('created_at', flat=True).first()
+                if case_id is not None else None
+            )
+        row['case__created_at'] = case_started[case_id]
+        events.append(row)
+    return events
+
 
 class Command(BaseCommand):
     help = "Train / retrain ML models from TrackingEvents and investigator labels"
@@ -40,7 +78,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--reload',
             action='store_true',
-            help='Hot-reload the trained models in the current process after training',
+            help='Hot-reload the new model version in the current process after training',
         )
         parser.add_argument(
             '--days',
@@ -66,11 +104,13 @@ class Command(BaseCommand):
         # ── imports ──────────────────────────────────────────────────────────
         try:
             import numpy as np
-            import joblib
+            import joblib  # noqa: F401  (used by the registry to persist artifacts)
             from sklearn.ensemble import IsolationForest, GradientBoostingClassifier, RandomForestClassifier
             from sklearn.preprocessing import StandardScaler
             from sklearn.model_selection import train_test_split
-            from sklearn.metrics import classification_report
+            from sklearn.metrics import (
+                classification_report, accuracy_score, precision_score, recall_score, f1_score,
+            )
         except ImportError as exc:
             raise CommandError(
                 f"scikit-learn / joblib not installed: {exc}\n"
@@ -79,7 +119,8 @@ class Command(BaseCommand):
 
         try:
             from tracker.models import TrackingEvent, MLTrainingLabel
-            from tracker.ml_analyzer import CriminalMLAnalyzer
+            from tracker.ml_analyzer import CriminalMLAnalyzer, CRIMINAL_FEATURE_NAMES
+            from tracker.ml_registry import get_model_registry
         except ImportError as exc:
             raise CommandError(f"Import error: {exc}")
 
@@ -90,6 +131,13 @@ class Command(BaseCommand):
         self.stdout.write(f"Model directory: {model_dir}")
 
         ml_analyzer = CriminalMLAnalyzer()
+        registry = get_model_registry()
+
+        # Fitted estimators for this run: published together as one version
+        estimators = {}
+        scaler = None
+        feature_names = list(CRIMINAL_FEATURE_NAMES)
+        metrics = {}
 
         # ════════════════════════════════════════════════════════════════════
         # PHASE 1: Unsupervised — IsolationForest on all recent events
@@ -99,47 +147,38 @@ class Command(BaseCommand):
         cutoff = timezone.now() - timedelta(days=days)
         events_qs = TrackingEvent.objects.filter(
             timestamp__gte=cutoff
-        ).values(
-            'timestamp', 'page_url', 'time_on_page', 'clicks_count',
-            'scroll_depth', 'is_vpn', 'is_tor', 'is_proxy',
-            'fingerprint_hash', 'ip_address', 'device_type', 'browser',
-            'is_unusual_hour', 'case__created_at',
-        ).order_by('-timestamp')[:50_000]
+        ).values(*TRAINING_FIELDS).order_by('-timestamp')[:50_000]
 
         events_list = list(events_qs)
+        hot_events = len(events_list)
+        # Events past TRACKING_ARCHIVE_AFTER_DAYS live in the Parquet archive
+        if hot_events < 50_000:
+            events_list.extend(archived_training_events(since=cutoff, limit=50_000 - hot_events))
         total_events = len(events_list)
-        self.stdout.write(f"  Events loaded: {total_events}")
+        self.stdout.write(f"  Events loaded: {total_events} ({total_events - hot_events} archived)")
 
         if total_events < 10:
             self.stdout.write(
                 self.style.WARNING("  ⚠ Not enough events for IsolationForest (need ≥10). Skipping.")
             )
         else:
-            # Build feature matrix
-            X_unsup = []
-            for ev in events_list:
-                try:
-                    session_data = {
-                        'timestamp': ev['timestamp'],
-                        'case_start_date': ev['case__created_at'] or ev['timestamp'],
-                        'pages': [ev['page_url'] or ''],
-                        'duration': ev['time_on_page'] or 0,
-                        'clicks': ev['clicks_count'] or 0,
-                        'scroll_depths': [ev['scroll_depth'] or 0],
-                        'is_vpn': ev['is_vpn'] or False,
-                        'is_tor': ev['is_tor'] or False,
-                        'is_proxy': ev['is_proxy'] or False,
-                        'fingerprint_hash': ev['fingerprint_hash'] or '',
-                        'ip_address': ev['ip_address'] or '',
-                        'device_type': ev['device_type'] or '',
-                        'browser': ev['browser'] or '',
-                    }
-                    feats = ml_analyzer.extract_criminal_features(session_data)
-                    X_unsup.append(list(feats.values()))
-                except Exception:
-                    continue
-
-            X_unsup = np.array(X_unsup, dtype=float)
+            # Build feature matrix (one vectorized pass over all events)
+            sessions = [{
+                'timestamp': ev['timestamp'],
+                'case_start_date': ev['case__created_at'] or ev['timestamp'],
+                'pages': [ev['page_url'] or ''],
+                'duration': ev['time_on_page'] or 0,
+                'clicks': ev['clicks_count'] or 0,
+                'scroll_depths': [ev['scroll_depth'] or 0],
+                'is_vpn': ev['is_vpn'] or False,
+                'is_tor': ev['is_tor'] or False,
+                'is_proxy': ev['is_proxy'] or False,
+                'fingerprint_hash': ev['fingerprint_hash'] or '',
+                'ip_address': ev['ip_address'] or '',
+                'device_type': ev['device_type'] or '',
+                'browser': ev['browser'] or '',
+            } for ev in events_list]
+            X_unsup = ml_analyzer.extract_criminal_features_batch(sessions)
             self.stdout.write(f"  Feature matrix: {X_unsup.shape}")
 
             if not dry_run:
@@ -154,9 +193,8 @@ class Command(BaseCommand):
                 )
                 iforest.fit(X_scaled)
 
-                joblib.dump(iforest, model_dir / 'isolation_forest.joblib')
-                joblib.dump(scaler,  model_dir / 'scaler.joblib')
-                self.stdout.write(self.style.SUCCESS("  ✓ IsolationForest saved"))
+                estimators['isolation_forest'] = iforest
+                self.stdout.write(self.style.SUCCESS("  ✓ IsolationForest trained"))
             else:
                 self.stdout.write("  [dry-run] Would train IsolationForest")
 
@@ -183,44 +221,49 @@ class Command(BaseCommand):
                 )
             )
         else:
-            X_sup, y_sup = [], []
+            sup_sessions, y_sup = [], []
             skipped = 0
             for lbl in labels:
                 try:
                     # Pull last 10 events for this fingerprint
-                    ev_qs = TrackingEvent.objects.filter(
+                    ev_rows = list(TrackingEvent.objects.filter(
                         fingerprint_hash=lbl.fingerprint_hash
-                    ).order_by('-timestamp')[:10]
-
-                    for ev in ev_qs:
+                    ).order_by('-timestamp').values(*TRAINING_FIELDS)[:10])
+                    if not ev_rows:
+                        # every event of this visitor may already be archived
+                        ev_rows = sorted(
+                            archived_training_events(fingerprint_hash=lbl.fingerprint_hash),
+                            key=lambda ev: ev['timestamp'], reverse=True,
+                        )[:10]
+
+                    for ev in ev_rows:
                         session_data = {
-                            'timestamp': ev.timestamp,
-                            'case_start_date': ev.case.created_at if ev.case else ev.timestamp,
-                            'pages': [ev.page_url or ''],
-                            'duration': ev.time_on_page or 0,
-                            'clicks': ev.clicks_count or 0,
-                            'scroll_depths': [ev.scroll_depth or 0],
-                            'is_vpn': ev.is_vpn,
-                            'is_tor': ev.is_tor,
-                            'is_proxy': ev.is_proxy,
-                            'fingerprint_hash': ev.fingerprint_hash or '',
-                            'ip_address': ev.ip_address or '',
-                            'device_type': ev.device_type or '',
-                            'browser': ev.browser or '',
+                            'timestamp': ev['timestamp'],
+                            'case_start_date': ev['case__created_at'] or ev['timestamp'],
+                            'pages': [ev['page_url'] or ''],
+                            'duration': ev['time_on_page'] or 0,
+                            'clicks': ev['clicks_count'] or 0,
+                            'scroll_depths': [ev['scroll_depth'] or 0],
+                            'is_vpn': ev['is_vpn'],
+                            'is_tor': ev['is_tor'],
+                            'is_proxy': ev['is_proxy'],
+                            'fingerprint_hash': ev['fingerprint_hash'] or '',
+                            'ip_address': ev['ip_address'] or '',
+                            'device_type': ev['device_type'] or '',
+                            'browser': ev['browser'] or '',
                         }
-                        feats = ml_analyzer.extract_criminal_features(session_data)
-                        X_sup.append(list(feats.values()))
+                        sup_sessions.append(session_data)
                         y_sup.append(1 if lbl.is_positive else 0)
                 except Exception as exc:
                     skipped += 1
                     logger.debug(f"Skipped label {lbl.fingerprint_hash[:8]}: {exc}")
 
-            self.stdout.write(f"  Feature rows: {len(X_sup)}  (skipped {skipped} labels)")
+            self.stdout.write(f"  Feature rows: {len(sup_sessions)}  (skipped {skipped} labels)")
 
-            if len(X_sup) < min_labeled:
+            if len(sup_sessions) < min_labeled:
                 self.stdout.write(self.style.WARNING("  ⚠ Too few feature rows. Skipping supervised training."))
             elif not dry_run:
-                X_sup = np.array(X_sup, dtype=float)
+                X_sup = ml_analyzer.extract_criminal_features_batch(sup_sessions)
                 y_sup = np.array(y_sup)
 
                 # Train/test split when possible
@@ -238,22 +281,30 @@ class Command(BaseCommand):
                     random_state=42,
                 )
                 gb.fit(X_tr, y_tr)
-                joblib.dump(gb, model_dir / 'gradient_boosting.joblib')
-                self.stdout.write(self.style.SUCCESS("  ✓ GradientBoostingClassifier saved"))
+                estimators['gradient_boosting'] = gb
+                self.stdout.write(self.style.SUCCESS("  ✓ GradientBoostingClassifier trained"))
 
                 # RandomForest
                 rf = RandomForestClassifier(
                     n_estimators=200, max_depth=8, random_state=42, n_jobs=-1
                 )
                 rf.fit(X_tr, y_tr)
-                joblib.dump(rf, model_dir / 'random_forest.joblib')
-                self.stdout.write(self.style.SUCCESS("  ✓ RandomForestClassifier saved"))
+                estimators['random_forest'] = rf
+                self.stdout.write(self.style.SUCCESS("  ✓ RandomForestClassifier trained"))
 
                 # Metrics
                 if X_te is not None:
                     self.stdout.write("\n  GradientBoosting classification report:")
                     self.stdout.write(classification_report(y_te, gb.predict(X_te),
                                                              target_names=['innocent', 'suspect']))
+                    for name, model in (('gradient_boosting', gb), ('random_forest', rf)):
+                        y_pred = model.predict(X_te)
+                        metrics[name] = {
+                            'accuracy': float(accuracy_score(y_te, y_pred)),
+                            'precision': float(precision_score(y_te, y_pred, zero_division=0)),
+                            'recall': float(recall_score(y_te, y_pred, zero_division=0)),
+                            'f1_score': float(f1_score(y_te, y_pred, zero_division=0)),
+                        }
 
                 # Save training metadata
                 meta = {
@@ -266,15 +317,29 @@ class Command(BaseCommand):
                 (model_dir / 'training_meta.json').write_text(json.dumps(meta, indent=2))
                 self.stdout.write(self.style.SUCCESS("  ✓ Training metadata saved"))
             else:
-                self.stdout.write(f"  [dry-run] Would train supervised models on {len(X_sup)} rows")
-
-        # ── optional hot-reload ───────────────────────────────────────────────
-        if do_reload and not dry_run:
-            self.stdout.write(self.style.HTTP_INFO("\n[Phase 3] Hot-reloading models"))
-            try:
-                ml_analyzer.load_models()
-                self.stdout.write(self.style.SUCCESS("  ✓ Models reloaded in this process"))
-            except Exception as exc:
-                self.stdout.write(self.style.WARNING(f"  ⚠ Reload failed: {exc}"))
+                self.stdout.write(f"  [dry-run] Would train supervised models on {len(sup_sessions)} rows")
+
+        # ════════════════════════════════════════════════════════════════════
+        # PHASE 3: Publish — one registry version for everything trained above
+        # ════════════════════════════════════════════════════════════════════
+        if estimators and not dry_run:
+            self.stdout.write(self.style.HTTP_INFO("\n[Phase 3] Publishing model version"))
+            version = registry.publish(
+                estimators,
+                feature_names,
+                scaler=scaler if 'isolation_forest' in estimators else None,
+                training_samples=total_events,
+                metrics=metrics,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"  ✓ Version {version} active: {', '.join(sorted(estimators))}"
+            ))
+            if do_reload:
+                registry.reload()
+                self.stdout.write(self.style.SUCCESS(
+                    f"  ✓ Models reloaded in this process: {registry.status()['versions']}"
+                ))
+        elif do_reload and not dry_run:
+            self.stdout.write(self.style.WARNING("  ⚠ Nothing trained — nothing to reload"))
 
         self.stdout.write(self.style.SUCCESS("\n✅ Training complete.\n"))
@@ -0,0 +1,372 @@
+# backend/tracker/metrics.py
+"""
+Fixed-memory detection metrics, exported in Prometheus text format.
+
+MetricsService (detection/base/base_detector.py) appended a dict to a list
+for every detection and every alert and never trimmed them, so a long-lived
+web or Celery process grew without bound.  get_statistics then walked the
+whole list on every call.
+
+MetricsRegistry holds only fixed-size structures:
+
+  * counters       {(name, labels): value}
+  * histograms     cumulative buckets + sum + count (score 0-10, latency)
+  * rolling rates  a ring of RATE_SLOTS time slots of RATE_RESOLUTION seconds,
+                   read back as per-second rates over RATE_WINDOWS
+
+Each metric family keeps at most MAX_SERIES label sets.  Label sets past that
+land in one `other` series, so a bad label cannot grow memory either.
+
+render_metrics() writes the Prometheus exposition text served by
+/api/tracker/metrics/.  With METRICS_AGGREGATE and REDIS_URL set, every
+process also publishes its snapshot to one Redis hash (`metrics:v1:processes`,
+field host:pid), at most every METRICS_PUSH_INTERVAL seconds on the write
+path.  The endpoint then merges all snapshots: counters and histograms are
+summed, and rates are summed over the snapshots fresh enough to still
+describe the current window.  A snapshot idle for METRICS_PROCESS_TTL seconds
+is dropped; Prometheus reads the drop in its counters as a reset.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SCORE_BUCKETS = (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RATE_RESOLUTION = 10            # seconds per rate slot
+RATE_SLOTS = 90                 # 15 minutes of slots
+RATE_WINDOWS = (60, 300, 900)   # exported rate windows, seconds
+MAX_SERIES = 200                # label sets per metric family
+
+PROCESSES_KEY = 'metrics:v1:processes'
+
+# name: (type, help, label names, buckets)
+FAMILIES = {
+    'tracker_detections_total': (
+        'counter', 'Detections recorded, by detector and severity', ('detector', 'severity'), None),
+    'tracker_detection_score': (
+        'histogram', 'Detection score (0-10), by detector', ('detector',), SCORE_BUCKETS),
+    'tracker_detections_per_second': (
+        'rate', 'Detections per second over the trailing window', ('detector',), None),
+    'tracker_detector_latency_seconds': (
+        'histogram', 'Detector run time in seconds', ('detector',), LATENCY_BUCKETS),
+    'tracker_detector_runs_total': (
+        'counter', 'Detector runs, by outcome (ok, errors, timeouts, over_budget)', ('detector', 'outcome'), None),
+    'tracker_alerts_total': (
+        'counter', 'Alerts raised, by type and priority', ('type', 'priority'), None),
+    'tracker_alerts_per_second': (
+        'rate', 'Alerts per second over the trailing window', (), None),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed bucket list."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, counts, total, count):
+        for i, n in enumerate(counts):
+            self.counts[i] += n
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self):
+        running = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            running += n
+            yield bound, running
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'buckets': {_format_bound(bound): n for bound, n in self.cumulative()},
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class RollingRate:
+    """Event counts in a ring of time slots; rate() over any window it covers."""
+
+    def __init__(self, slots=RATE_SLOTS, resolution=RATE_RESOLUTION):
+        self.resolution = resolution
+        self.counts = [0] * slots
+        self.stamps = [-1] * slots
+
+    def add(self, n=1, now=None):
+        tick = int((now or time.time()) // self.resolution)
+        slot = tick % len(self.counts)
+        if self.stamps[slot] != tick:
+            self.stamps[slot] = tick
+            self.counts[slot] = 0
+        self.counts[slot] += n
+
+    def total(self, seconds, now=None):
+        tick = int((now or time.time()) // self.resolution)
+        span = max(1, int(seconds // self.resolution))
+        return sum(n for n, stamp in zip(self.counts, self.stamps) if 0 <= tick - stamp < span)
+
+    def rate(self, seconds, now=None):
+        return self.total(seconds, now) / float(seconds)
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class MetricsRegistry:
+    """Process-local counters, histograms and rolling rates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {name: {} for name in FAMILIES}
+        self._last_push = 0.0
+
+    def _get(self, name, labels, factory):
+        series = self._series[name]
+        key = tuple(str(labels.get(label, '')) for label in FAMILIES[name][2])
+        if key not in series and len(series) >= MAX_SERIES - 1:
+            key = ('other',) * len(key)
+        if key not in series:
+            series[key] = factory()
+        return key
+
+    # ── write path ───────────────────────────────────────────────────────────
+
+    def inc(self, name, n=1, **labels):
+        with self._lock:
+            key = self._get(name, labels, int)
+            self._series[name][key] += n
+
+    def observe(self, name, value, **labels):
+        buckets = FAMILIES[name][3]
+        with self._lock:
+            key = self._get(name, labels, lambda: Histogram(buckets))
+            self._series[name][key].observe(value)
+
+    def tick(self, name, n=1, **labels):
+        with self._lock:
+            key = self._get(name, labels, RollingRate)
+            self._series[name][key].add(n)
+
+    def record_detection(self, detector, score, severity, seconds=None):
+        severity = min(max(int(severity or 1), 1), 5)
+        self.inc('tracker_detections_total', detector=detector, severity=severity)
+        self.observe('tracker_detection_score', float(score or 0), detector=detector)
+        self.tick('tracker_detections_per_second', detector=detector)
+        if seconds is not None:
+            self.observe('tracker_detector_latency_seconds', seconds, detector=detector)
+        self.maybe_publish()
+
+    def record_alert(self, alert_type, priority):
+        self.inc('tracker_alerts_total', type=alert_type, priority=priority)
+        self.tick('tracker_alerts_per_second')
+        self.maybe_publish()
+
+    # ── read path ────────────────────────────────────────────────────────────
+
+    def counter(self, name, **labels):
+        """Sum of a counter over the series matching `labels`."""
+        names = FAMILIES[name][2]
+        with self._lock:
+            return sum(
+                value for key, value in self._series[name].items()
+                if all(dict(zip(names, key)).get(k) == str(v) for k, v in labels.items())
+            )
+
+    def histogram(self, name):
+        """All series of a histogram family merged into one."""
+        merged = Histogram(FAMILIES[name][3])
+        with self._lock:
+            for histogram in self._series[name].values():
+                merged.merge(histogram.counts, histogram.sum, histogram.count)
+        return merged
+
+    def rate(self, name, seconds):
+        with self._lock:
+            return sum(rate.rate(seconds) for rate in self._series[name].values())
+
+    def snapshot(self, now=None):
+        """JSON-able state: {'at': epoch, name: [[labels, value], ...]}."""
+        now = now or time.time()
+        data = {'at': now}
+        with self._lock:
+            for name, (kind, _help, _labels, _buckets) in FAMILIES.items():
+                rows = []
+                for key, value in self._series[name].items():
+                    if kind == 'counter':
+                        rows.append([list(key), value])
+                    elif kind == 'histogram':
+                        rows.append([list(key), [value.counts, value.sum, value.count]])
+                    else:
+                        rows.append([list(key), [value.total(window, now) for window in RATE_WINDOWS]])
+                data[name] = rows
+        return data
+
+    # ── cross-process aggregation ────────────────────────────────────────────
+
+    def _redis(self):
+        if not getattr(settings, 'METRICS_AGGREGATE', False):
+            return None
+        from .redis_pool import get_redis
+        return get_redis()
+
+    def maybe_publish(self):
+        """Publish this process's snapshot, at most every METRICS_PUSH_INTERVAL."""
+        now = time.time()
+        if now - self._last_push < getattr(settings, 'METRICS_PUSH_INTERVAL', 15.0):
+            return
+        self._last_push = now
+        try:
+            self.publish(now)
+        except Exception as e:
+            logger.debug(f"metrics: publish failed: {e}")
+
+    def publish(self, now=None):
+        client = self._redis()
+        if client is None:
+            return False
+        client.hset(PROCESSES_KEY, f'{socket.gethostname()}:{os.getpid()}', json.dumps(self.snapshot(now)))
+        return True
+
+    def collect(self):
+        """Snapshots to export: every live process, or just this one."""
+        now = time.time()
+        own = self.snapshot(now)
+        try:
+            client = self._redis()
+            if client is None:
+                return [own]
+            self._last_push = now
+            own_field = f'{socket.gethostname()}:{os.getpid()}'
+            client.hset(PROCESSES_KEY, own_field, json.dumps(own))
+            ttl = getattr(settings, 'METRICS_PROCESS_TTL', 3600)
+            snapshots, stale = [], []
+            for field, raw in client.hgetall(PROCESSES_KEY).items():
+                snapshot = json.loads(raw)
+                if now - snapshot.get('at', 0) > ttl:
+                    stale.append(field)
+                else:
+                    snapshots.append(snapshot)
+            if stale:
+                client.hdel(PROCESSES_KEY, *stale)
+            return snapshots
+        except Exception as e:
+            logger.debug(f"metrics: aggregation unavailable, exporting this process only: {e}")
+            return [own]
+
+
+def merge_snapshots(snapshots, now=None):
+    """{name: {label tuple: merged value}} over several process snapshots."""
+    now = now or time.time()
+    rate_fresh = 2 * max(getattr(settings, 'METRICS_PUSH_INTERVAL', 15.0), RATE_RESOLUTION)
+    merged = {name: {} for name in FAMILIES}
+    for snapshot in snapshots:
+        fresh = now - snapshot.get('at', 0) <= rate_fresh
+        for name, (kind, _help, _labels, buckets) in FAMILIES.items():
+            series = merged[name]
+            for key, value in snapshot.get(name, []):
+                key = tuple(key)
+                if kind == 'counter':
+                    series[key] = series.get(key, 0) + value
+                elif kind == 'histogram':
+                    series.setdefault(key, Histogram(buckets)).merge(*value)
+                elif fresh:
+                    totals = series.setdefault(key, [0] * len(RATE_WINDOWS))
+                    series[key] = [a + b for a, b in zip(totals, value)]
+    return merged
+
+
+def render_prometheus(merged):
+    """Prometheus text exposition (format 0.0.4) of merge_snapshots() output."""
+    lines = []
+    for name, (kind, help_text, label_names, _buckets) in FAMILIES.items():
+        series = merged.get(name) or {}
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {"gauge" if kind == "rate" else kind}')
+        for key in sorted(series):
+            pairs = list(zip(label_names, key))
+            value = series[key]
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(pairs)} {value}')
+            elif kind == 'histogram':
+                for bound, n in value.cumulative():
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", _format_bound(bound))])} {n}')
+                lines.append(f'{name}_sum{_labels(pairs)} {value.sum}')
+                lines.append(f'{name}_count{_labels(pairs)} {value.count}')
+            else:
+                for window, total in zip(RATE_WINDOWS, value):
+                    lines.append(f'{name}{_labels(pairs + [("window", f"{window}s")])} {total / window}')
+    return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _registry
+
+
+def render_metrics():
+    """Exposition text for this process, or for all processes when aggregating."""
+    return render_prometheus(merge_snapshots(_registry.collect()))
+
+
+def record_detection(detector, score, severity=1, seconds=None):
+    """Detection hook: never raises."""
+    try:
+        _registry.record_detection(detector, score, severity, seconds)
+    except Exception as e:
+        logger.debug(f"metrics: record_detection failed: {e}")
+
+
+def record_detector_run(detector, seconds, outcome):
+    """Execution engine hook: latency (None for timeouts) plus the outcome."""
+    try:
+        if seconds is not None:
+            _registry.observe('tracker_detector_latency_seconds', seconds, detector=detector)
+        _registry.inc('tracker_detector_runs_total', detector=detector, outcome=outcome)
+    except Exception as e:
+        logger.debug(f"metrics: record_detector_run failed: {e}")
@@ -5,22 +5,25 @@ import uuid
 import hashlib
 import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional
 from django.utils import timezone
 from django.core.cache import cache
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
-from user_agents import parse
 import logging
 import re
-from ipaddress import ip_address, ip_network
 
 from .models import (
     TrackingEvent, UserSession, SuspiciousActivity,
     DeviceFingerprint, Alert
 )
 from cases.models import Case
+from .ip_reputation import get_ip_reputation
+from .user_agent import classify_user_agent, UAInfo
+from .ingest import after_events_saved
+from .presence import get_presence
+from .session_counters import record_page_view
 
 logger = logging.getLogger(__name__)
 
@@ -60,9 +63,8 @@ class TrackingMiddleware(MiddlewareMixin):
             '/api/tracker/suspicious/',
         ]
         
-        # Initialize VPN/Proxy detection lists (would be loaded from external source)
-        self.vpn_ranges = self.load_vpn_ranges()
-        self.known_proxies = self.load_known_proxies()
+        # VPN/Proxy/Tor classification comes from the shared IP reputation
+        # index (tracker/ip_reputation.py), which reloads itself on change
         
     def __call__(self, request):
         """Process the request through middleware"""
@@ -135,9 +137,17 @@ class TrackingMiddleware(MiddlewareMixin):
         if self.should_create_event(request, response):
             event = self.create_tracking_event(request, response, duration)
             
-            # Run suspicious behavior analysis
-            if event and hasattr(request, 'suspicious_indicators'):
-                self.analyze_suspicious_behavior(event, request.suspicious_indicators)
+            # Shared post-insert hooks, running the suspicious behavior
+            # analysis before the event is pushed to the live dashboards
+            if event:
+                indicators = getattr(request, 'suspicious_indicators', None)
+                analyze = None
+                if indicators is not None:
+                    analyze = lambda saved: self.analyze_suspicious_behavior(saved, indicators)
+                try:
+                    after_events_saved([event], analyze)
+                except Exception as e:
+                    logger.error(f"Error running post-insert hooks for {event.id}: {e}")
         
         # Add tracking headers to response
         if hasattr(request, 'tracking_session'):
@@ -183,10 +193,8 @@ class TrackingMiddleware(MiddlewareMixin):
                 }
             )
             
-            # Update last activity
-            session.last_activity = timezone.now()
-            session.page_views += 1
-            session.save(update_fields=['last_activity', 'page_views'])
+            # Count the page view (coalesced with the tracker's counters)
+            record_page_view(session)
             
             session_data = {
                 'session_id': session_id,
@@ -215,7 +223,7 @@ class TrackingMiddleware(MiddlewareMixin):
         """
         # Get user agent data
         user_agent_string = request.META.get('HTTP_USER_AGENT', '')
-        user_agent = parse(user_agent_string)
+        user_agent = classify_user_agent(user_agent_string)
         
         # Get IP and location data
         ip = self.get_client_ip(request)
@@ -229,10 +237,10 @@ class TrackingMiddleware(MiddlewareMixin):
             
             # Device information
             'user_agent': user_agent_string,
-            'browser': user_agent.browser.family,
-            'browser_version': user_agent.browser.version_string,
-            'os': user_agent.os.family,
-            'os_version': user_agent.os.version_string,
+            'browser': user_agent.browser,
+            'browser_version': user_agent.browser_version,
+            'os': user_agent.os,
+            'os_version': user_agent.os_version,
             'device_type': self.get_device_type(user_agent),
             'is_bot': user_agent.is_bot,
             'is_mobile': user_agent.is_mobile,
@@ -397,8 +405,14 @@ class TrackingMiddleware(MiddlewareMixin):
         
         # If IP changed
         if session.ip_address != current_ip:
-            # Check if the change happened too quickly for physical travel
-            time_diff = (timezone.now() - session.last_activity).total_seconds() / 3600  # hours
+            # Check if the change happened too quickly for physical travel.
+            # session.last_activity lags behind the buffered session counters;
+            # presence holds the visitor's newest event time.
+            last_seen = session.last_activity.timestamp()
+            presence_seen = get_presence().last_seen(session.case_id, session.fingerprint_hash)
+            if presence_seen:
+                last_seen = max(last_seen, presence_seen)
+            time_diff = (timezone.now().timestamp() - last_seen) / 3600  # hours
             
             # This would use actual geo distance calculation in production
             # For now, just flag any IP change within 1 hour as suspicious
@@ -821,9 +835,9 @@ class TrackingMiddleware(MiddlewareMixin):
         # Fall back to remote addr
         return request.META.get('REMOTE_ADDR', '0.0.0.0')
     
-    def get_device_type(self, user_agent) -> str:
+    def get_device_type(self, user_agent: UAInfo) -> str:
         """
-        Determine device type from user agent
+        Determine device type from a classified user agent
         """
         if user_agent.is_mobile:
             return 'mobile'
@@ -838,30 +852,22 @@ class TrackingMiddleware(MiddlewareMixin):
         """
         Check if IP is from known VPN service
         """
-        # Check against VPN ranges
-        try:
-            ip_obj = ip_address(ip)
-            for vpn_range in self.vpn_ranges:
-                if ip_obj in ip_network(vpn_range):
-                    return True
-        except:
-            pass
-        
-        return False
+        return get_ip_reputation().is_vpn(ip)
     
     def is_proxy(self, ip: str) -> bool:
         """
         Check if IP is from known proxy
         """
-        return ip in self.known_proxies
+        return get_ip_reputation().is_proxy(ip)
     
     def is_tor(self, request: HttpRequest) -> bool:
         """
         Check if request is from Tor network
         """
         # Check for Tor exit node IPs
-        # In production, this would check against Tor exit node list
         ip = self.get_client_ip(request)
+        if get_ip_reputation().is_tor(ip):
+            return True
         
         # Check for common Tor patterns
         if '.onion' in request.META.get('HTTP_HOST', ''):
@@ -929,24 +935,6 @@ class TrackingMiddleware(MiddlewareMixin):
                     f"Suspicious indicators detected: {active_indicators} "
                     f"for IP {tracking_info['ip_address']} on path {request.path}"
                 )
-    
-    def load_vpn_ranges(self) -> List[str]:
-        """
-        Load known VPN IP ranges
-        """
-        # In production, this would load from a database or external service
-        return [
-            '10.0.0.0/8',      # Example private range
-            '172.16.0.0/12',   # Example private range
-            # Add actual VPN ranges
-        ]
-    
-    def load_known_proxies(self) -> set:
-        """
-        Load known proxy IP addresses
-        """
-        # In production, this would load from a database or external service
-        return set()
 
 
 class RateLimitMiddleware(MiddlewareMixin):
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.19 on 2026-10-16 19:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0009_add_timeline_event'),
+        ('tracker', '0003_add_ip_postal_to_trackingevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(db_index=True, help_text='Start of the hour (UTC)')),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('page_views', models.PositiveIntegerField(default=0)),
+                ('engagement_events', models.PositiveIntegerField(default=0)),
+                ('suspicious_events', models.PositiveIntegerField(default=0)),
+                ('unusual_hour_events', models.PositiveIntegerField(default=0)),
+                ('suspicious_activities', models.PositiveIntegerField(default=0)),
+                ('time_on_page_total', models.BigIntegerField(default=0)),
+                ('time_on_page_samples', models.PositiveIntegerField(default=0)),
+                ('visitors', models.PositiveIntegerField(default=0)),
+                ('visitor_sketch', models.BinaryField(default=bytes)),
+                ('referrers', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='cases.case')),
+            ],
+            options={
+                'db_table': 'case_hourly_rollups',
+                'ordering': ['-hour'],
+                'unique_together': {('case', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CaseDailyBreakdown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='UTC date')),
+                ('dimension', models.CharField(choices=[('country', 'Country'), ('region', 'Region'), ('device', 'Device Type')], max_length=10)),
+                ('value', models.CharField(blank=True, max_length=100)),
+                ('visitors', models.PositiveIntegerField(default=0)),
+                ('visitor_sketch', models.BinaryField(default=bytes)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_breakdowns', to='cases.case')),
+            ],
+            options={
+                'db_table': 'case_daily_breakdowns',
+                'indexes': [models.Index(fields=['case', 'dimension', 'day'], name='case_breakdowns_day_idx')],
+                'unique_together': {('case', 'day', 'dimension', 'value')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.19 on 2026-10-16 19:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0009_add_timeline_event'),
+        ('tracker', '0004_add_case_hourly_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseSuspect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint_hash', models.CharField(max_length=255)),
+                ('visit_count', models.PositiveIntegerField(default=0)),
+                ('unusual_hour_count', models.PositiveIntegerField(default=0)),
+                ('vpn_count', models.PositiveIntegerField(default=0)),
+                ('tor_count', models.PositiveIntegerField(default=0)),
+                ('honeypot_events', models.PositiveIntegerField(default=0)),
+                ('ip_addresses', models.JSONField(blank=True, default=list, help_text='Distinct IPs seen (capped)')),
+                ('unique_ips', models.PositiveIntegerField(default=0)),
+                ('first_seen', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('activity_count', models.PositiveIntegerField(default=0)),
+                ('honeypot_activities', models.PositiveIntegerField(default=0)),
+                ('max_severity', models.PositiveSmallIntegerField(default=0)),
+                ('latest_ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('latest_country', models.CharField(blank=True, max_length=2)),
+                ('latest_region', models.CharField(blank=True, max_length=100)),
+                ('latest_city', models.CharField(blank=True, max_length=100)),
+                ('latest_lat', models.FloatField(blank=True, null=True)),
+                ('latest_lon', models.FloatField(blank=True, null=True)),
+                ('latest_postal', models.CharField(blank=True, max_length=20)),
+                ('latest_isp', models.CharField(blank=True, max_length=255)),
+                ('browser', models.CharField(blank=True, max_length=50)),
+                ('os', models.CharField(blank=True, max_length=50)),
+                ('device_type', models.CharField(blank=True, max_length=20)),
+                ('score', models.PositiveSmallIntegerField(default=0)),
+                ('risk', models.CharField(default='low', max_length=10)),
+                ('signals', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suspects', to='cases.case')),
+            ],
+            options={
+                'db_table': 'case_suspects',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['case', '-score'], name='case_suspects_score_idx')],
+                'unique_together': {('case', 'fingerprint_hash')},
+            },
+        ),
+    ]
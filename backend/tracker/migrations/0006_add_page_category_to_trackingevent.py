@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-16 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_add_case_suspect'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackingevent',
+            name='page_category',
+            field=models.CharField(blank=True, choices=[('photos', 'Photos'), ('timeline', 'Timeline'), ('evidence', 'Evidence'), ('witnesses', 'Witnesses'), ('news', 'News'), ('other', 'Other')], max_length=20),
+        ),
+    ]
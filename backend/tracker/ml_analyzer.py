@@ -11,35 +11,94 @@ from typing import Dict, List, Any, Optional, Tuple
 import warnings
 warnings.filterwarnings('ignore')
 
-# Heavy ML dependencies — optional, installed separately
+import importlib.util
+import threading
+
+# pandas / numpy are needed for feature extraction. scikit-learn, scipy and
+# TensorFlow are heavy (seconds of import time, hundreds of MB of RSS per
+# worker), so they are only probed here and imported on first real use.
 try:
     import pandas as pd
     import numpy as np
-    from sklearn.ensemble import IsolationForest, RandomForestClassifier, GradientBoostingClassifier
-    from sklearn.preprocessing import StandardScaler, MinMaxScaler
-    from sklearn.cluster import DBSCAN, KMeans, AgglomerativeClustering
-    from sklearn.decomposition import PCA
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.neural_network import MLPClassifier
-    from scipy import stats
-    from scipy.spatial.distance import euclidean, cosine
-    from scipy.signal import find_peaks
-    import joblib
-    _SKLEARN_AVAILABLE = True
+    _NUMPY_AVAILABLE = True
 except ImportError:
-    _SKLEARN_AVAILABLE = False
+    _NUMPY_AVAILABLE = False
 
-try:
-    import tensorflow as tf
-    from tensorflow import keras
-    from tensorflow.keras import layers
-    _TF_AVAILABLE = True
-except ImportError:
-    _TF_AVAILABLE = False
+_SKLEARN_AVAILABLE = _NUMPY_AVAILABLE and importlib.util.find_spec('sklearn') is not None
+_TF_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+
+from .detection.utils.constants import EVIDENCE_PAGE_KEYWORDS, VICTIM_PAGE_KEYWORDS
+from .ml_registry import get_model_registry, model_root
+from .page_classifier import matches_any
 
 logger = logging.getLogger(__name__)
 
+# Column order of extract_criminal_features() / extract_criminal_features_batch()
+CRIMINAL_FEATURE_NAMES = [
+    # temporal
+    'hour_of_day', 'day_of_week', 'is_weekend', 'is_night_stalking', 'is_unusual_hour',
+    'days_since_case_start', 'is_anniversary',
+    # navigation
+    'page_views_count', 'unique_pages_count', 'victim_page_ratio', 'evidence_page_ratio',
+    'timeline_obsession_score', 'navigation_speed', 'avg_time_per_page', 'rapid_navigation_count',
+    # behavioral
+    'click_count', 'panic_click_rate', 'scroll_depth_avg', 'scroll_stuttering',
+    'hover_duration_avg', 'mouse_velocity_avg', 'erratic_mouse_score',
+    # content interaction
+    'copy_events', 'screenshot_attempts', 'download_count', 'print_attempts',
+    'form_submissions', 'failed_submissions', 'search_count', 'victim_name_searches',
+    # evasion
+    'is_vpn', 'is_tor', 'is_proxy', 'device_changes', 'ip_changes', 'user_agent_changes',
+    'cookie_cleared', 'fingerprint_spoofing',
+    # authentication
+    'failed_login_attempts', 'password_reset_attempts', 'account_creation_attempts',
+    # psychological
+    'typing_speed_variance', 'backspace_ratio', 'decision_paralysis_score', 'cognitive_load_indicator',
+    # patterns
+    'repeat_visits', 'compulsive_checking_score', 'stalking_pattern_score', 'obsession_indicator',
+]
+_FEATURE_INDEX = {name: i for i, name in enumerate(CRIMINAL_FEATURE_NAMES)}
+
+# feature column -> session_data key, for features that are plain counters
+_COUNTER_FEATURES = {
+    'rapid_navigation_count': 'rapid_nav_count',
+    'click_count': 'clicks',
+    'copy_events': 'copy_events',
+    'screenshot_attempts': 'screenshot_attempts',
+    'download_count': 'downloads',
+    'print_attempts': 'print_attempts',
+    'form_submissions': 'form_submissions',
+    'failed_submissions': 'failed_submissions',
+    'search_count': 'search_count',
+    'victim_name_searches': 'victim_searches',
+    'device_changes': 'device_changes',
+    'ip_changes': 'ip_changes',
+    'user_agent_changes': 'ua_changes',
+    'failed_login_attempts': 'failed_logins',
+    'password_reset_attempts': 'password_resets',
+    'account_creation_attempts': 'account_creations',
+    'typing_speed_variance': 'typing_variance',
+    'backspace_ratio': 'backspace_ratio',
+    'repeat_visits': 'repeat_visits',
+}
+
+# feature column -> session_data key, for 0/1 flags
+_FLAG_FEATURES = {
+    'is_vpn': 'is_vpn',
+    'is_tor': 'is_tor',
+    'is_proxy': 'is_proxy',
+    'cookie_cleared': 'cookies_cleared',
+    'fingerprint_spoofing': 'fingerprint_anomaly',
+}
+
+RISK_COMPONENT_WEIGHTS = {
+    'temporal_risk': 0.15,
+    'behavioral_risk': 0.25,
+    'evasion_risk': 0.6,
+    'obsession_risk': 0.25,
+    'technical_risk': 0.10
+}
+
 
 class CriminalMLAnalyzer:
     """
@@ -48,46 +107,15 @@ class CriminalMLAnalyzer:
     """
     
     def __init__(self):
-        # Initialize ML models
-        self.anomaly_detector = IsolationForest(
-            contamination=0.05,  # Lower contamination for criminal cases
-            random_state=42,
-            n_estimators=200
-        )
-        
-        # Criminal behavior classifier
-        self.criminal_classifier = GradientBoostingClassifier(
-            n_estimators=300,
-            max_depth=5,  # Changed from learning_depth to max_depth
-            random_state=42
-        )
-        
-        # Behavioral pattern classifier
-        self.pattern_classifier = RandomForestClassifier(
-            n_estimators=200,
-            max_depth=10,
-            random_state=42
-        )
+        if not _NUMPY_AVAILABLE:
+            raise ImportError("pandas / numpy are required for CriminalMLAnalyzer")
         
-        # Deep learning model for complex patterns
-        self.deep_model = self._build_deep_model()
-        
-        # Clustering for behavior grouping
-        self.behavior_clusterer = DBSCAN(eps=0.3, min_samples=5)
-        
-        # Scalers for different feature types
-        self.standard_scaler = StandardScaler()
-        self.minmax_scaler = MinMaxScaler()
-        
-        # Text analyzer for linguistic patterns
-        self.text_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            ngram_range=(1, 3),
-            stop_words='english'
-        )
-        
-        # Load pre-trained models if available
-        self.load_models()
+        # Nothing heavy is built here: the fitted estimators come from the
+        # model registry and the deep model is loaded on first use, only if a
+        # trained artifact exists (see the properties below).
+        # Pre-fitted scaler / IsolationForest / classifiers (loaded once per
+        # process from MLModel-registered artifacts — see ml_registry.py)
+        self.registry = get_model_registry()
         
         # Criminal-specific thresholds
         self.ml_thresholds = {
@@ -99,8 +127,52 @@ class CriminalMLAnalyzer:
             'behavioral_consistency': 0.75,
         }
     
-    def _build_deep_model(self) -> keras.Model:
-        """Build deep learning model for complex pattern detection"""
+    # ── lazily resolved models ───────────────────────────────────────────────
+    
+    @property
+    def anomaly_detector(self):
+        """Pre-fitted IsolationForest, or None if none has been trained"""
+        return self.registry.get().anomaly_detector
+    
+    @property
+    def criminal_classifier(self):
+        return self.registry.get().criminal_classifier
+    
+    @property
+    def pattern_classifier(self):
+        return self.registry.get().pattern_classifier
+    
+    @property
+    def standard_scaler(self):
+        return self.registry.get().scaler
+    
+    @property
+    def deep_model(self):
+        """Trained Keras model, or None (TensorFlow is never imported without one)"""
+        return get_deep_model()
+    
+    @property
+    def behavior_clusterer(self):
+        # Fitted per call on the sessions being compared; a fresh instance
+        # keeps a shared analyzer safe to use from several threads.
+        from sklearn.cluster import DBSCAN
+        return DBSCAN(eps=0.3, min_samples=5)
+    
+    @property
+    def text_vectorizer(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        return TfidfVectorizer(
+            max_features=1000,
+            ngram_range=(1, 3),
+            stop_words='english'
+        )
+    
+    @staticmethod
+    def _build_deep_model():
+        """Build (untrained) deep learning model, for offline training only"""
+        from tensorflow import keras
+        from tensorflow.keras import layers
+        
         model = keras.Sequential([
             layers.Dense(256, activation='relu', input_shape=(100,)),
             layers.Dropout(0.3),
@@ -192,65 +264,259 @@ class CriminalMLAnalyzer:
         
         return pd.DataFrame([features])
     
+    # ============================================
+    # BATCH SCORING
+    # ============================================
+    
+    def extract_criminal_features_batch(self, sessions: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Feature matrix for N sessions (N x len(CRIMINAL_FEATURE_NAMES)), built
+        column by column. Same values as stacking extract_criminal_features()
+        rows, without a DataFrame per session.
+        """
+        n = len(sessions)
+        X = np.zeros((n, len(CRIMINAL_FEATURE_NAMES)), dtype=float)
+        if not n:
+            return X
+        
+        def put(name, values):
+            X[:, _FEATURE_INDEX[name]] = values
+        
+        def column(key, default=0):
+            return np.array([s.get(key, default) for s in sessions], dtype=float)
+        
+        def mean_column(key):
+            values = (s.get(key, [0]) for s in sessions)
+            return np.array([sum(v) / len(v) if len(v) else np.nan for v in values], dtype=float)
+        
+        # ── temporal ──
+        timestamps = [s['timestamp'] for s in sessions]
+        hours = np.array([t.hour for t in timestamps], dtype=float)
+        weekdays = np.array([t.weekday() for t in timestamps], dtype=float)
+        put('hour_of_day', hours)
+        put('day_of_week', weekdays)
+        put('is_weekend', weekdays >= 5)
+        put('is_night_stalking', (hours >= 23) | (hours < 4))
+        put('is_unusual_hour', (hours >= 2) & (hours < 6))
+        put('days_since_case_start', [
+            (t - s.get('case_start_date', t)).days for t, s in zip(timestamps, sessions)
+        ])
+        put('is_anniversary', [t.day in (15, 30) for t in timestamps])
+        
+        # ── navigation ──
+        pages = [[p.lower() for p in s.get('pages', [])] for s in sessions]
+        page_counts = np.array([len(p) for p in pages], dtype=float)
+        has_pages = np.maximum(page_counts, 1)
+        victim_hits = np.array([
+            sum(1 for p in ps if matches_any(p, VICTIM_PAGE_KEYWORDS)) for ps in pages
+        ], dtype=float)
+        evidence_hits = np.array([
+            sum(1 for p in ps if matches_any(p, EVIDENCE_PAGE_KEYWORDS)) for ps in pages
+        ], dtype=float)
+        timeline_hits = np.array([sum('timeline' in p for p in ps) for ps in pages], dtype=float)
+        duration = np.maximum(column('duration', 1), 1)
+        
+        put('page_views_count', page_counts)
+        put('unique_pages_count', [len(set(s.get('pages', []))) for s in sessions])
+        put('victim_page_ratio', np.where(page_counts > 0, victim_hits / has_pages, 0.0))
+        put('evidence_page_ratio', np.where(page_counts > 0, evidence_hits / has_pages, 0.0))
+        put('timeline_obsession_score', np.minimum(timeline_hits / 10.0, 1.0))
+        put('navigation_speed', page_counts / duration)
+        put('avg_time_per_page', mean_column('page_times'))
+        
+        # ── behavioral ──
+        put('panic_click_rate', column('panic_clicks') / duration)
+        put('scroll_depth_avg', mean_column('scroll_depths'))
+        put('scroll_stuttering', column('scroll_direction_changes') > 5)
+        put('hover_duration_avg', mean_column('hover_durations'))
+        put('mouse_velocity_avg', mean_column('mouse_velocities'))
+        put('erratic_mouse_score', np.minimum(
+            (column('mouse_velocity_spikes') / 20.0 + column('mouse_direction_changes') / 50.0) / 2.0, 1.0
+        ))
+        
+        # ── counters and flags ──
+        for name, key in _COUNTER_FEATURES.items():
+            put(name, column(key))
+        for name, key in _FLAG_FEATURES.items():
+            put(name, [bool(s.get(key, False)) for s in sessions])
+        
+        # ── psychological / pattern scores ──
+        put('decision_paralysis_score', (
+            np.minimum(column('max_hover_duration') / 10000.0, 1.0) +
+            np.minimum(column('repeated_hover_count') / 5.0, 1.0)
+        ) / 2.0)
+        put('cognitive_load_indicator', np.minimum(
+            (column('rapid_page_closes') / 5.0 + column('tab_switches') / 10.0 +
+             column('early_screenshots') / 3.0) / 3.0, 1.0
+        ))
+        put('compulsive_checking_score', np.minimum(
+            (column('page_refreshes') / 10.0 + column('repeat_page_visits') / 15.0) / 2.0, 1.0
+        ))
+        # The two scores below read the raw session_data keys, like the
+        # single-session helpers do
+        put('stalking_pattern_score', np.minimum(
+            np.array([bool(s.get('is_night_stalking', False)) for s in sessions], dtype=float) * 0.4 +
+            column('location_page_ratio') * 0.3 + column('photo_view_ratio') * 0.3, 1.0
+        ))
+        put('obsession_indicator', (
+            column('victim_page_ratio') * 0.4 +
+            np.minimum(column('duration', 0) / 28800.0, 1.0) * 0.3 +
+            np.minimum(column('repeat_visits') / 20.0, 1.0) * 0.3
+        ))
+        return X
+    
+    def _risk_components_batch(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """All five risk components for a feature matrix, as column expressions"""
+        f = lambda name: X[:, _FEATURE_INDEX[name]]
+        flag = lambda name: (f(name) != 0).astype(float)
+        
+        return {
+            'temporal_risk': np.minimum(
+                flag('is_night_stalking') * 0.3 + flag('is_unusual_hour') * 0.2 +
+                flag('is_anniversary') * 0.2 + f('repeat_visits') / 50.0, 1.0),
+            'behavioral_risk': np.minimum(
+                f('panic_click_rate') * 0.2 + f('erratic_mouse_score') * 0.2 +
+                f('cognitive_load_indicator') * 0.2 + f('stalking_pattern_score') * 0.2 +
+                f('obsession_indicator') * 0.2, 1.0),
+            'evasion_risk': np.minimum(
+                flag('is_tor') * 1.0 + flag('is_vpn') * 0.6 + flag('is_proxy') * 0.4 +
+                f('device_changes') / 10.0 + f('fingerprint_spoofing') * 0.25, 1.0),
+            'obsession_risk': np.minimum(
+                f('victim_page_ratio') * 0.3 + f('timeline_obsession_score') * 0.2 +
+                f('compulsive_checking_score') * 0.2 + f('victim_name_searches') / 10.0 * 0.3, 1.0),
+            'technical_risk': np.minimum(
+                f('screenshot_attempts') / 10.0 * 0.2 + f('download_count') / 10.0 * 0.2 +
+                f('copy_events') / 15.0 * 0.2 + f('failed_login_attempts') / 5.0 * 0.2 +
+                f('fingerprint_spoofing') * 0.2, 1.0),
+        }
+    
+    def _bundle_matrix(self, X: np.ndarray, bundle) -> np.ndarray:
+        """Reorder a CRIMINAL_FEATURE_NAMES matrix into the columns a model was trained on"""
+        if not bundle.feature_names or list(bundle.feature_names) == CRIMINAL_FEATURE_NAMES:
+            return X
+        aligned = np.zeros((X.shape[0], len(bundle.feature_names)), dtype=float)
+        for j, name in enumerate(bundle.feature_names):
+            i = _FEATURE_INDEX.get(name)
+            if i is not None:
+                aligned[:, j] = X[:, i]
+        return aligned
+    
+    def detect_criminal_anomalies_batch(self, X: np.ndarray) -> List[Dict[str, Any]]:
+        """detect_criminal_anomalies() for every row of a feature matrix"""
+        n = X.shape[0]
+        anomaly_scores = np.full(n, -0.1)
+        is_anomaly = np.zeros(n, dtype=bool)
+        bundle = self.registry.get()
+        if n and bundle.has_anomaly_model:
+            try:
+                scaled = bundle.scaler.transform(self._bundle_matrix(X, bundle))
+                anomaly_scores = bundle.anomaly_detector.decision_function(scaled)
+                is_anomaly = anomaly_scores < self.ml_thresholds['anomaly_threshold']
+            except Exception as e:
+                logger.debug(f"Anomaly model scoring failed, using rule-based scores: {e}")
+        
+        components = self._risk_components_batch(X)
+        weighted = sum(components[k] * w for k, w in RISK_COMPONENT_WEIGHTS.items())
+        
+        names = list(components)
+        rows = np.column_stack([components[k] for k in names]).tolist() if n else []
+        results = []
+        for i, values in enumerate(rows):
+            risk_components = dict(zip(names, values))
+            criminal_risk = round(float(weighted[i]) * 10, 1)
+            results.append({
+                'is_anomaly': bool(is_anomaly[i]),
+                'anomaly_score': float(anomaly_scores[i]),
+                'criminal_risk_score': criminal_risk,
+                'risk_components': risk_components,
+                'threat_level': self._determine_threat_level(criminal_risk),
+                'recommended_action': self._recommend_action(criminal_risk, risk_components),
+            })
+        return results
+    
+    def analyze_sessions_batch(self, sessions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Score N sessions in one pass: one feature matrix, one model call per
+        estimator. Each result combines detect_criminal_anomalies() with the
+        profile / risk factors / probability of predict_criminal_behavior().
+        """
+        X = self.extract_criminal_features_batch(sessions)
+        results = self.detect_criminal_anomalies_batch(X)
+        
+        bundle = self.registry.get()
+        probabilities = np.full(len(results), 0.5)
+        if results and bundle.pattern_classifier is not None:
+            try:
+                probabilities = bundle.pattern_classifier.predict_proba(self._bundle_matrix(X, bundle))[:, 1]
+            except Exception as e:
+                logger.debug(f"Pattern classifier failed, using default probabilities: {e}")
+        
+        for i, result in enumerate(results):
+            row = dict(zip(CRIMINAL_FEATURE_NAMES, X[i].tolist()))
+            result['criminal_probability'] = float(probabilities[i])
+            result['behavioral_profile'] = self._behavioral_profile_for(row)
+            result['risk_factors'] = self._risk_factors_for(row)
+        return results
+    
     def detect_criminal_anomalies(self, features: pd.DataFrame) -> Dict[str, Any]:
-                """Detect anomalous patterns specific to criminal behavior"""
-                
-                # Scale features
-                features_scaled = self.standard_scaler.fit_transform(features)
-                
-                # Anomaly detection - handle unfitted model
-                try:
-                    anomaly_score = self.anomaly_detector.decision_function(features_scaled)[0]
-                    is_anomaly = anomaly_score < self.ml_thresholds['anomaly_threshold']
-                except:
-                    # If model not fitted, fit it with current data and use default scores
-                    try:
-                        self.anomaly_detector.fit(features_scaled)
-                        anomaly_score = self.anomaly_detector.decision_function(features_scaled)[0]
-                        is_anomaly = anomaly_score < self.ml_thresholds['anomaly_threshold']
-                    except:
-                        # Fallback to rule-based scoring
-                        anomaly_score = -0.1
-                        is_anomaly = False
-                
-                # Calculate risk components
-                risk_components = {
-                    'temporal_risk': self._calculate_temporal_risk(features),
-                    'behavioral_risk': self._calculate_behavioral_risk(features),
-                    'evasion_risk': self._calculate_evasion_risk(features),
-                    'obsession_risk': self._calculate_obsession_risk(features),
-                    'technical_risk': self._calculate_technical_risk(features),
-                }
-                
-                # Overall criminal risk score (0-10 scale)
-                criminal_risk = self._calculate_overall_criminal_risk(risk_components)
-                
-                return {
-                    'is_anomaly': is_anomaly,
-                    'anomaly_score': float(anomaly_score),
-                    'criminal_risk_score': criminal_risk,
-                    'risk_components': risk_components,
-                    'threat_level': self._determine_threat_level(criminal_risk),
-                    'recommended_action': self._recommend_action(criminal_risk, risk_components)
-                }
+        """Detect anomalous patterns specific to criminal behavior"""
+        
+        # Anomaly detection with the pre-fitted scaler + IsolationForest from
+        # the model registry. Nothing is ever fitted on the request path: if no
+        # trained model is published yet, fall back to rule-based scoring.
+        anomaly_score = -0.1
+        is_anomaly = False
+        bundle = self.registry.get()
+        if bundle.has_anomaly_model:
+            try:
+                features_scaled = bundle.scaler.transform(bundle.matrix(features))
+                anomaly_score = bundle.anomaly_detector.decision_function(features_scaled)[0]
+                is_anomaly = anomaly_score < self.ml_thresholds['anomaly_threshold']
+            except Exception as e:
+                logger.debug(f"Anomaly model scoring failed, using rule-based scores: {e}")
+        
+        # Calculate risk components
+        risk_components = {
+            'temporal_risk': self._calculate_temporal_risk(features),
+            'behavioral_risk': self._calculate_behavioral_risk(features),
+            'evasion_risk': self._calculate_evasion_risk(features),
+            'obsession_risk': self._calculate_obsession_risk(features),
+            'technical_risk': self._calculate_technical_risk(features),
+        }
+        
+        # Overall criminal risk score (0-10 scale)
+        criminal_risk = self._calculate_overall_criminal_risk(risk_components)
+        
+        return {
+            'is_anomaly': bool(is_anomaly),
+            'anomaly_score': float(anomaly_score),
+            'criminal_risk_score': criminal_risk,
+            'risk_components': risk_components,
+            'threat_level': self._determine_threat_level(criminal_risk),
+            'recommended_action': self._recommend_action(criminal_risk, risk_components)
+        }
     
     def predict_criminal_behavior(self, features: pd.DataFrame, history: List[Dict] = None) -> Dict[str, Any]:
         """Predict probability of criminal involvement"""
         
-        features_scaled = self.standard_scaler.fit_transform(features)
-        
-        # Get predictions from multiple models - handle unfitted models
-        try:
-            rf_prob = self.pattern_classifier.predict_proba(features_scaled)[0]
-        except:
-            # Model not fitted, use default probabilities
-            rf_prob = [0.5, 0.5]
-        # Deep model prediction
+        # Supervised classifiers are trained on unscaled feature rows (train_ml)
+        bundle = self.registry.get()
+        rf_prob = [0.5, 0.5]
+        if bundle.pattern_classifier is not None:
+            try:
+                rf_prob = bundle.pattern_classifier.predict_proba(bundle.matrix(features))[0]
+            except Exception as e:
+                logger.debug(f"Pattern classifier failed, using default probabilities: {e}")
+        # Deep model prediction (only when a trained model was loaded)
         # Skip deep model if input shape doesn't match
-        try:
-            deep_prob = self.deep_model.predict(features_scaled)[0][0] if self.deep_model else 0.5
-        except:
-            deep_prob = 0.5  # Default probability if model fails
+        deep_prob = 0.5
+        deep_model = self.deep_model
+        if deep_model is not None:
+            try:
+                features_scaled = bundle.scaler.transform(bundle.matrix(features)) if bundle.scaler is not None else bundle.matrix(features)
+                deep_prob = deep_model.predict(features_scaled, verbose=0)[0][0]
+            except Exception:
+                deep_prob = 0.5  # Default probability if model fails
         
         # Ensemble prediction
         ensemble_prob = (rf_prob[1] * 0.4 + deep_prob * 0.6) if len(rf_prob) > 1 else deep_prob
@@ -310,12 +576,7 @@ class CriminalMLAnalyzer:
             return {'coordinated_activity': False}
         
         # Extract features for all sessions
-        features_list = []
-        for session in all_sessions:
-            features = self.extract_criminal_features(session)
-            features_list.append(features.values[0])
-        
-        features_matrix = np.array(features_list)
+        features_matrix = self.extract_criminal_features_batch(all_sessions)
         
         # Cluster analysis
         clusters = self.behavior_clusterer.fit_predict(features_matrix)
@@ -492,8 +753,7 @@ class CriminalMLAnalyzer:
         if not pages:
             return 0.0
         
-        victim_keywords = ['victim', 'missing', 'disappeared', 'personal', 'family', 'photos']
-        victim_pages = sum(1 for page in pages if any(kw in page.lower() for kw in victim_keywords))
+        victim_pages = sum(1 for page in pages if matches_any(page, VICTIM_PAGE_KEYWORDS))
         return victim_pages / len(pages)
     
     def _calculate_evidence_page_ratio(self, pages: List[str]) -> float:
@@ -501,8 +761,7 @@ class CriminalMLAnalyzer:
         if not pages:
             return 0.0
         
-        evidence_keywords = ['evidence', 'timeline', 'investigation', 'report', 'witness']
-        evidence_pages = sum(1 for page in pages if any(kw in page.lower() for kw in evidence_keywords))
+        evidence_pages = sum(1 for page in pages if matches_any(page, EVIDENCE_PAGE_KEYWORDS))
         return evidence_pages / len(pages)
     
     def _calculate_timeline_obsession(self, pages: List[str]) -> float:
@@ -563,94 +822,33 @@ class CriminalMLAnalyzer:
     
     def _calculate_temporal_risk(self, features: pd.DataFrame) -> float:
         """Calculate temporal risk component"""
-        row = features.iloc[0]
-        
-        risk = 0.0
-        if row.get('is_night_stalking', 0):
-            risk += 0.3
-        if row.get('is_unusual_hour', 0):
-            risk += 0.2
-        if row.get('is_anniversary', 0):
-            risk += 0.2
-        
-        # Add pattern-based risk
-        risk += row.get('repeat_visits', 0) / 50.0
-        
-        return min(risk, 1.0)
+        return self._single_risk_component(features, 'temporal_risk')
     
     def _calculate_behavioral_risk(self, features: pd.DataFrame) -> float:
         """Calculate behavioral risk component"""
-        row = features.iloc[0]
-        
-        risk = (
-            row.get('panic_click_rate', 0) * 0.2 +
-            row.get('erratic_mouse_score', 0) * 0.2 +
-            row.get('cognitive_load_indicator', 0) * 0.2 +
-            row.get('stalking_pattern_score', 0) * 0.2 +
-            row.get('obsession_indicator', 0) * 0.2
-        )
-        
-        return min(risk, 1.0)
+        return self._single_risk_component(features, 'behavioral_risk')
     
-
     def _calculate_evasion_risk(self, features: pd.DataFrame) -> float:
         """Calculate evasion risk component"""
-        row = features.iloc[0]
-        
-        risk = 0.0
-        if row.get('is_tor', 0):
-            risk += 1.0
-        if row.get('is_vpn', 0):
-            risk += 0.6
-        if row.get('is_proxy', 0):
-            risk += 0.4
-        
-        risk += row.get('device_changes', 0) / 10.0
-        risk += row.get('fingerprint_spoofing', 0) * 0.25
-        
-        return min(risk, 1.0)
-
-
+        return self._single_risk_component(features, 'evasion_risk')
+    
     def _calculate_obsession_risk(self, features: pd.DataFrame) -> float:
         """Calculate obsession risk component"""
-        row = features.iloc[0]
-        
-        risk = (
-            row.get('victim_page_ratio', 0) * 0.3 +
-            row.get('timeline_obsession_score', 0) * 0.2 +
-            row.get('compulsive_checking_score', 0) * 0.2 +
-            row.get('victim_name_searches', 0) / 10.0 * 0.3
-        )
-        
-        return min(risk, 1.0)
+        return self._single_risk_component(features, 'obsession_risk')
     
     def _calculate_technical_risk(self, features: pd.DataFrame) -> float:
         """Calculate technical sophistication risk"""
-        row = features.iloc[0]
-        
-        risk = (
-            row.get('screenshot_attempts', 0) / 10.0 * 0.2 +
-            row.get('download_count', 0) / 10.0 * 0.2 +
-            row.get('copy_events', 0) / 15.0 * 0.2 +
-            row.get('failed_login_attempts', 0) / 5.0 * 0.2 +
-            row.get('fingerprint_spoofing', 0) * 0.2
-        )
-        
-        return min(risk, 1.0)
+        return self._single_risk_component(features, 'technical_risk')
+    
+    def _single_risk_component(self, features: pd.DataFrame, name: str) -> float:
+        X = features.reindex(columns=CRIMINAL_FEATURE_NAMES, fill_value=0).to_numpy(dtype=float)[:1]
+        return float(self._risk_components_batch(X)[name][0])
     
     def _calculate_overall_criminal_risk(self, components: Dict[str, float]) -> float:
         """Calculate overall criminal risk score (0-10)"""
         
         # Weighted combination of risk components
-        weights = {
-            'temporal_risk': 0.15,
-            'behavioral_risk': 0.25,
-            'evasion_risk': 0.6,
-            'obsession_risk': 0.25,
-            'technical_risk': 0.10
-        }
-        
-        weighted_sum = sum(components.get(k, 0) * v for k, v in weights.items())
+        weighted_sum = sum(components.get(k, 0) * v for k, v in RISK_COMPONENT_WEIGHTS.items())
 
         
         # Scale to 0-10
@@ -694,8 +892,10 @@ class CriminalMLAnalyzer:
     
     def _determine_behavioral_profile(self, features: pd.DataFrame, history: List[Dict]) -> Dict:
         """Determine behavioral profile from features"""
-        row = features.iloc[0]
-        
+        return self._behavioral_profile_for(features.iloc[0])
+    
+    def _behavioral_profile_for(self, row) -> Dict:
+        """Behavioral profile for one feature row (Series or dict)"""
         profile = {
             'type': 'unknown',
             'characteristics': [],
@@ -722,7 +922,10 @@ class CriminalMLAnalyzer:
     
     def _identify_risk_factors(self, features: pd.DataFrame) -> List[str]:
         """Identify key risk factors from features"""
-        row = features.iloc[0]
+        return self._risk_factors_for(features.iloc[0])
+    
+    def _risk_factors_for(self, row) -> List[str]:
+        """Risk factors for one feature row (Series or dict)"""
         risk_factors = []
         
         if row.get('is_tor', 0):
@@ -1365,6 +1568,7 @@ class CriminalMLAnalyzer:
         """Calculate similarity between behavioral signatures"""
         
         # Use cosine similarity
+        from scipy.spatial.distance import cosine
         similarity = 1 - cosine(sig1, sig2)
         return max(0, similarity)  # Ensure non-negative
     
@@ -1440,22 +1644,67 @@ class CriminalMLAnalyzer:
         return confidence
     
     def load_models(self):
-        """Load pre-trained models"""
+        """Hot-reload the active model versions from the registry"""
         try:
-            # Load models if they exist
-            # self.criminal_classifier = joblib.load('models/criminal_classifier.pkl')
-            # self.pattern_classifier = joblib.load('models/pattern_classifier.pkl')
-            # self.deep_model = keras.models.load_model('models/deep_criminal_model.h5')
-            pass
+            bundle = self.registry.reload()
+            if not bundle.versions:
+                logger.info("No trained models published yet, using rule-based scoring")
         except Exception as e:
             logger.info(f"No pre-trained models found, using defaults: {e}")
     
-    def save_models(self):
-        """Save trained models"""
+    def save_models(self, estimators, feature_names, scaler=None):
+        """Publish fitted estimators ({'isolation_forest': ..., ...}) as a new registry version"""
         try:
-            # joblib.dump(self.criminal_classifier, 'models/criminal_classifier.pkl')
-            # joblib.dump(self.pattern_classifier, 'models/pattern_classifier.pkl')
-            # self.deep_model.save('models/deep_criminal_model.h5')
-            pass
+            return self.registry.publish(estimators, feature_names, scaler=scaler)
         except Exception as e:
-            logger.error(f"Error saving models: {e}")
\ No newline at end of file
+            logger.error(f"Error saving models: {e}")
+            return None
+
+
+# ============================================
+# PROCESS-WIDE INSTANCES
+# ============================================
+
+DEEP_MODEL_FILES = ('deep_model.keras', 'deep_model.h5')
+
+_deep_model = None
+_deep_model_checked = False
+_deep_model_lock = threading.Lock()
+
+
+def get_deep_model():
+    """
+    Load the trained Keras model once per process. Returns None (without
+    importing TensorFlow) when TensorFlow is missing or no artifact exists.
+    """
+    global _deep_model, _deep_model_checked
+    if _deep_model_checked:
+        return _deep_model
+    with _deep_model_lock:
+        if _deep_model_checked:
+            return _deep_model
+        path = next((model_root() / name for name in DEEP_MODEL_FILES
+                     if (model_root() / name).exists()), None)
+        if path is not None and _TF_AVAILABLE:
+            try:
+                from tensorflow import keras
+                _deep_model = keras.models.load_model(path)
+                logger.info(f"Deep model loaded from {path}")
+            except Exception as e:
+                logger.warning(f"Deep model could not be loaded ({path}): {e}")
+        _deep_model_checked = True
+    return _deep_model
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_ml_analyzer():
+    """Shared CriminalMLAnalyzer for this process (it holds no per-call state)."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = CriminalMLAnalyzer()
+    return _analyzer
@@ -0,0 +1,259 @@
+# backend/tracker/ml_registry.py
+"""
+Model registry for the tracker ML stack, backed by the MLModel table.
+
+train_ml publishes a new *version*: the fitted estimators are written to
+MEDIA_ROOT/ml_models/<version>/*.joblib and one MLModel row is created per
+model type (anomaly_detection, risk_scoring, pattern_recognition) and marked
+active.  Every process loads the active artifacts once (memory-mapped, so
+forked workers share the pages) and never fits anything on the request path.
+
+Hot swap: each process re-reads the (model_type, version) pairs of the
+active rows at most every CHECK_INTERVAL seconds — one small indexed query —
+and reloads when they differ from what it has loaded, so a publish reaches
+every worker without a shared cache.  Installs that predate the registry still work:
+if no MLModel rows exist, the flat files train_ml used to write
+(MEDIA_ROOT/ml_models/*.joblib) are loaded instead.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 10  # seconds between active-version checks
+
+# artifact name -> (MLModel.model_type, bundle attribute, algorithm)
+ARTIFACTS = {
+    'isolation_forest':  ('anomaly_detection',   'anomaly_detector',    'IsolationForest'),
+    'gradient_boosting': ('risk_scoring',        'criminal_classifier', 'GradientBoostingClassifier'),
+    'random_forest':     ('pattern_recognition', 'pattern_classifier',  'RandomForestClassifier'),
+}
+
+
+def model_root():
+    return Path(getattr(settings, 'MEDIA_ROOT', '/tmp')) / 'ml_models'
+
+
+class ModelBundle:
+    """The estimators active in this process. Any of them may be None."""
+
+    def __init__(self, scaler=None, anomaly_detector=None, criminal_classifier=None,
+                 pattern_classifier=None, feature_names=None, versions=None):
+        self.scaler = scaler
+        self.anomaly_detector = anomaly_detector
+        self.criminal_classifier = criminal_classifier
+        self.pattern_classifier = pattern_classifier
+        self.feature_names = feature_names or []
+        self.versions = versions or {}
+
+    @property
+    def has_anomaly_model(self):
+        return self.scaler is not None and self.anomaly_detector is not None
+
+    def matrix(self, features):
+        """DataFrame -> float matrix in the column order the models were trained on."""
+        if self.feature_names:
+            features = features.reindex(columns=self.feature_names, fill_value=0)
+        return features.to_numpy(dtype=float)
+
+
+EMPTY_BUNDLE = ModelBundle()
+
+
+def _load_artifact(path):
+    import joblib
+    # mmap_mode='r': numpy arrays inside the pickle (tree node arrays, scaler
+    # means/scales) are mapped read-only instead of copied into each worker
+    return joblib.load(path, mmap_mode='r')
+
+
+class ModelRegistry:
+    """Process-wide cache of the active model versions."""
+
+    def __init__(self):
+        self._bundle = None
+        self._active = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    # ── read path ────────────────────────────────────────────────────────────
+
+    def get(self):
+        """Return the active ModelBundle (cheap; reloads only after a publish)."""
+        now = time.monotonic()
+        if self._bundle is not None and now - self._last_check < CHECK_INTERVAL:
+            return self._bundle
+
+        self._last_check = now
+        try:
+            active = self._active_versions()
+        except Exception as e:
+            logger.debug(f"ML registry: version check failed: {e}")
+            active = self._active
+
+        if self._bundle is None or active != self._active:
+            self.reload(active)
+        return self._bundle or EMPTY_BUNDLE
+
+    def reload(self, active=None):
+        """Load the active artifacts now (hot swap)."""
+        with self._lock:
+            try:
+                if active is None:
+                    active = self._active_versions()
+                bundle = self._load_active() or self._load_legacy() or EMPTY_BUNDLE
+            except Exception as e:
+                logger.warning(f"ML registry: load failed, keeping previous models: {e}")
+                bundle = self._bundle or EMPTY_BUNDLE
+            self._bundle = bundle  # atomic swap
+            self._active = active
+            self._last_check = time.monotonic()
+            if bundle.versions:
+                logger.info(f"ML registry: loaded {bundle.versions}")
+            return bundle
+
+    @staticmethod
+    def _active_versions():
+        """{model_type: version} of the active rows — the hot-swap signal."""
+        from .models import MLModel
+
+        return dict(MLModel.objects.filter(
+            is_active=True,
+            model_type__in=[t for t, _attr, _alg in ARTIFACTS.values()],
+        ).values_list('model_type', 'version'))
+
+    def _load_active(self):
+        from .models import MLModel
+
+        rows = {
+            row.model_type: row
+            for row in MLModel.objects.filter(
+                is_active=True,
+                model_type__in=[t for t, _attr, _alg in ARTIFACTS.values()],
+            )
+        }
+        if not rows:
+            return None
+
+        bundle = ModelBundle()
+        for _name, (model_type, attr, _alg) in ARTIFACTS.items():
+            row = rows.get(model_type)
+            if not row or not row.model_file_path or not Path(row.model_file_path).exists():
+                continue
+            setattr(bundle, attr, _load_artifact(row.model_file_path))
+            bundle.versions[model_type] = row.version
+            if row.features and not bundle.feature_names:
+                bundle.feature_names = list(row.features)
+            scaler_path = (row.parameters or {}).get('scaler_path')
+            if scaler_path and Path(scaler_path).exists():
+                bundle.scaler = _load_artifact(scaler_path)
+        return bundle
+
+    def _load_legacy(self):
+        root = model_root()
+        files = {
+            'scaler': root / 'scaler.joblib',
+            'isolation_forest': root / 'isolation_forest.joblib',
+            'gradient_boosting': root / 'gradient_boosting.joblib',
+            'random_forest': root / 'random_forest.joblib',
+        }
+        if not any(p.exists() for p in files.values()):
+            return None
+
+        bundle = ModelBundle()
+        if files['scaler'].exists():
+            bundle.scaler = _load_artifact(files['scaler'])
+        for name, (model_type, attr, _alg) in ARTIFACTS.items():
+            if files[name].exists():
+                setattr(bundle, attr, _load_artifact(files[name]))
+                bundle.versions[model_type] = 'legacy'
+        return bundle
+
+    # ── write path (train_ml) ────────────────────────────────────────────────
+
+    def publish(self, estimators, feature_names, scaler=None, training_samples=None,
+                metrics=None):
+        """
+        Persist fitted estimators as a new version and make it active.
+
+        estimators: {'isolation_forest': obj, 'gradient_boosting': obj, ...}
+        (any subset — model types not included keep their current version).
+        Every running process hot-swaps within CHECK_INTERVAL seconds of the
+        commit.  Returns the version string.
+        """
+        import joblib
+        from .models import MLModel
+
+        # timestamp for ordering, random suffix so two trainings in the same
+        # second never share a version (or an artifact directory)
+        version = timezone.now().strftime('%Y%m%d%H%M%S') + uuid.uuid4().hex[:6]
+        version_dir = model_root() / version
+        version_dir.mkdir(parents=True)
+
+        scaler_path = ''
+        if scaler is not None:
+            scaler_path = str(version_dir / 'scaler.joblib')
+            joblib.dump(scaler, scaler_path)  # uncompressed, so it can be mmapped
+
+        with transaction.atomic():
+            for name, estimator in estimators.items():
+                if estimator is None or name not in ARTIFACTS:
+                    continue
+                model_type, _attr, algorithm = ARTIFACTS[name]
+                path = version_dir / f'{name}.joblib'
+                joblib.dump(estimator, path)
+
+                parameters = {}
+                if name == 'isolation_forest' and scaler_path:
+                    parameters['scaler_path'] = scaler_path
+                try:
+                    parameters['hyperparameters'] = {
+                        k: v for k, v in estimator.get_params().items()
+                        if isinstance(v, (int, float, str, bool, type(None)))
+                    }
+                except Exception:
+                    pass
+
+                MLModel.objects.filter(model_type=model_type, is_active=True).update(is_active=False)
+                MLModel.objects.create(
+                    name=name,
+                    model_type=model_type,
+                    version=version,
+                    algorithm=algorithm,
+                    parameters=parameters,
+                    features=list(feature_names),
+                    training_samples=training_samples,
+                    training_date=timezone.now(),
+                    model_file_path=str(path),
+                    model_size=path.stat().st_size,
+                    is_active=True,
+                    deployed_at=timezone.now(),
+                    **{k: v for k, v in (metrics or {}).get(name, {}).items()
+                       if k in ('accuracy', 'precision', 'recall', 'f1_score', 'auc_score')},
+                )
+        return version
+
+    def status(self):
+        """Summary of what this process has loaded, for the ML status endpoint."""
+        bundle = self._bundle or EMPTY_BUNDLE
+        return {
+            'loaded': bool(bundle.versions),
+            'versions': bundle.versions,
+            'has_scaler': bundle.scaler is not None,
+            'feature_count': len(bundle.feature_names),
+        }
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry():
+    return _registry
@@ -10,6 +10,8 @@ import json
 # Import the Case model from your main app
 from cases.models import Case
 
+from .page_classifier import page_category
+
 
 # ============================================================================
 # TRACKING MODELS
@@ -240,6 +242,16 @@ class TrackingEvent(models.Model):
         ('honeypot_triggered', 'Honeypot Triggered'),
     ]
     
+    # Detector page sections (detection/utils/constants.PAGE_CATEGORY_RULES)
+    PAGE_CATEGORIES = [
+        ('photos', 'Photos'),
+        ('timeline', 'Timeline'),
+        ('evidence', 'Evidence'),
+        ('witnesses', 'Witnesses'),
+        ('news', 'News'),
+        ('other', 'Other'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='tracking_events', null=True, blank=True)
     session = models.ForeignKey(UserSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
@@ -262,6 +274,9 @@ class TrackingEvent(models.Model):
     page_url = models.TextField()
     page_title = models.CharField(max_length=255, blank=True)
     referrer_url = models.TextField(blank=True)
+    # Classified once at ingest (tracker/page_classifier.py); blank on rows
+    # saved before the column existed
+    page_category = models.CharField(max_length=20, choices=PAGE_CATEGORIES, blank=True)
     
     # Network information
     ip_address = models.GenericIPAddressField(db_index=True)
@@ -330,6 +345,11 @@ class TrackingEvent(models.Model):
         case_name = self.case.victim_name if self.case else "No Case"
         return f"{self.event_type} - {case_name} - {self.timestamp}"
 
+    def save(self, *args, **kwargs):
+        if not self.page_category:
+            self.page_category = page_category(self.page_url)
+        super().save(*args, **kwargs)
+
 
 class SuspiciousActivity(models.Model):
     """Model for tracking suspicious activities"""
@@ -645,3 +665,145 @@ class MLTrainingLabel(models.Model):
     def is_positive(self):
         """True for labels that map to the 'criminal' class in binary training."""
         return self.label in ('suspect', 'high_risk')
+
+
+# ============================================================================
+# DASHBOARD ROLLUPS
+# ============================================================================
+
+class CaseHourlyRollup(models.Model):
+    """
+    Pre-aggregated tracker activity for one case and one UTC hour.
+
+    Maintained by the update_hourly_rollups beat task (see tracker.rollups) so
+    dashboard endpoints read a few hundred small rows instead of aggregating
+    raw TrackingEvent rows per request.  referrers holds the top referrers of
+    the hour; visitor_sketch is a HyperLogLog (tracker.hll) so distinct
+    visitors can be unioned across any set of hours.
+    """
+
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='hourly_rollups')
+    hour = models.DateTimeField(db_index=True, help_text='Start of the hour (UTC)')
+
+    # Event counters
+    events = models.PositiveIntegerField(default=0)
+    page_views = models.PositiveIntegerField(default=0)
+    engagement_events = models.PositiveIntegerField(default=0)
+    suspicious_events = models.PositiveIntegerField(default=0)
+    unusual_hour_events = models.PositiveIntegerField(default=0)
+    suspicious_activities = models.PositiveIntegerField(default=0)
+    time_on_page_total = models.BigIntegerField(default=0)
+    time_on_page_samples = models.PositiveIntegerField(default=0)
+
+    # Distinct visitors (exact for the hour; the sketch unions across hours)
+    visitors = models.PositiveIntegerField(default=0)
+    visitor_sketch = models.BinaryField(default=bytes)
+
+    # Referrer histogram: referrer URL -> events
+    referrers = models.JSONField(default=dict, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'case_hourly_rollups'
+        unique_together = [['case', 'hour']]
+        ordering = ['-hour']
+
+    def __str__(self):
+        return f"{self.case_id} @ {self.hour:%Y-%m-%d %H:00} ({self.events} events)"
+
+
+class CaseDailyBreakdown(models.Model):
+    """
+    Distinct visitors of one case per UTC day and per country, region or
+    device type, maintained with CaseHourlyRollup (see tracker.rollups).
+    A visitor seen in many hours counts once per day; visitor_sketch is a
+    HyperLogLog so the days union into distinct visitors over any window.
+    """
+
+    DIMENSION_CHOICES = [
+        ('country', 'Country'),
+        ('region', 'Region'),
+        ('device', 'Device Type'),
+    ]
+
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='daily_breakdowns')
+    day = models.DateField(help_text='UTC date')
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    value = models.CharField(max_length=100, blank=True)
+
+    # Distinct visitors (exact for the day; the sketch unions across days)
+    visitors = models.PositiveIntegerField(default=0)
+    visitor_sketch = models.BinaryField(default=bytes)
+
+    class Meta:
+        db_table = 'case_daily_breakdowns'
+        unique_together = [['case', 'day', 'dimension', 'value']]
+        indexes = [
+            models.Index(fields=['case', 'dimension', 'day'], name='case_breakdowns_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.case_id} @ {self.day} {self.dimension}={self.value or '-'} ({self.visitors} visitors)"
+
+
+class CaseSuspect(models.Model):
+    """
+    Materialized suspect ranking: one row per (case, fingerprint).
+
+    Counters are updated incrementally as TrackingEvent / SuspiciousActivity
+    rows arrive and the score, risk and signals are recomputed from them on
+    every update (see tracker.suspects), so the suspects endpoint reads the
+    top of the (case, -score) index instead of aggregating the case's history.
+    `manage.py rebuild_suspects` rebuilds the table from scratch.
+    """
+
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='suspects')
+    fingerprint_hash = models.CharField(max_length=255)
+
+    # Event counters
+    visit_count = models.PositiveIntegerField(default=0)
+    unusual_hour_count = models.PositiveIntegerField(default=0)
+    vpn_count = models.PositiveIntegerField(default=0)
+    tor_count = models.PositiveIntegerField(default=0)
+    honeypot_events = models.PositiveIntegerField(default=0)
+    ip_addresses = models.JSONField(default=list, blank=True, help_text='Distinct IPs seen (capped)')
+    unique_ips = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    # SuspiciousActivity counters
+    activity_count = models.PositiveIntegerField(default=0)
+    honeypot_activities = models.PositiveIntegerField(default=0)
+    max_severity = models.PositiveSmallIntegerField(default=0)
+
+    # Context of the latest event
+    latest_ip = models.GenericIPAddressField(null=True, blank=True)
+    latest_country = models.CharField(max_length=2, blank=True)
+    latest_region = models.CharField(max_length=100, blank=True)
+    latest_city = models.CharField(max_length=100, blank=True)
+    latest_lat = models.FloatField(null=True, blank=True)
+    latest_lon = models.FloatField(null=True, blank=True)
+    latest_postal = models.CharField(max_length=20, blank=True)
+    latest_isp = models.CharField(max_length=255, blank=True)
+    browser = models.CharField(max_length=50, blank=True)
+    os = models.CharField(max_length=50, blank=True)
+    device_type = models.CharField(max_length=20, blank=True)
+
+    # Derived from the counters
+    score = models.PositiveSmallIntegerField(default=0)
+    risk = models.CharField(max_length=10, default='low')
+    signals = models.JSONField(default=list, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'case_suspects'
+        unique_together = [['case', 'fingerprint_hash']]
+        indexes = [
+            models.Index(fields=['case', '-score'], name='case_suspects_score_idx'),
+        ]
+        ordering = ['-score']
+
+    def __str__(self):
+        return f"{self.fingerprint_hash[:14]} ({self.case_id}): {self.score}"
@@ -0,0 +1,101 @@
+# backend/tracker/page_classifier.py
+"""
+One compiled URL keyword matcher shared by every detector.
+
+Page categorisation used to be repeated chains of `term in url.lower()`:
+DetectorUtils.categorize_page_type, the identical _categorize_page of the
+content-forensics / temporal / behavioral detectors, the ML page ratios and
+the feature-store counters each had their own.  Every history entry was
+re-categorised on every event, one substring scan per keyword.
+
+All keyword tables in detection/utils/constants.py are now compiled once
+into a single alternation regex.  One scan of the URL gives every keyword it
+contains, as a frozenset.  The scan is a lookahead at each position with the
+longest keywords first, plus the keywords contained in each hit, so
+overlapping keywords ('photo' / 'photos', 'person' / 'personal') are all
+found.  url_keywords() is LRU-cached per URL, and the category functions are
+set lookups on its result, with the same outcomes as the `in` chains they
+replace.
+
+page_category() is also stored on TrackingEvent.page_category at ingest.
+History entries carry it, so detectors read history_category(entry) instead
+of re-parsing the URL.  Rows saved before the column existed fall back to
+the classifier.
+"""
+
+import re
+from functools import lru_cache
+
+from .detection.utils.constants import (
+    EVIDENCE_PAGE_KEYWORDS, PAGE_CATEGORY_RULES, PAGE_COUNTERS, PAGE_TYPE_RULES,
+    VICTIM_PAGE_KEYWORDS,
+)
+
+URL_CACHE_SIZE = 8192
+OTHER = 'other'
+
+
+def _keyword_tables():
+    yield from (keywords for _category, keywords in PAGE_CATEGORY_RULES)
+    yield from (keywords for _category, keywords in PAGE_TYPE_RULES)
+    yield from PAGE_COUNTERS.values()
+    yield VICTIM_PAGE_KEYWORDS
+    yield EVIDENCE_PAGE_KEYWORDS
+
+
+def _compile():
+    keywords = sorted({kw.lower() for table in _keyword_tables() for kw in table},
+                      key=lambda kw: (-len(kw), kw))
+    pattern = re.compile('(?=(' + '|'.join(re.escape(kw) for kw in keywords) + '))')
+    # a hit also contains every shorter keyword that is a substring of it
+    contained = {kw: frozenset(other for other in keywords if other in kw) for kw in keywords}
+    return pattern, contained
+
+
+_PATTERN, _CONTAINED = _compile()
+
+KEYWORDS = frozenset(_CONTAINED)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def url_keywords(url):
+    """Every table keyword contained in `url` (case-insensitive)."""
+    found = set()
+    for match in _PATTERN.finditer(url.lower()):
+        found |= _CONTAINED[match.group(1)]
+    return frozenset(found)
+
+
+def matches_any(url, keywords):
+    """`any(kw in url.lower() for kw in keywords)` for keywords from the tables."""
+    return bool(url) and not url_keywords(url).isdisjoint(keywords)
+
+
+def _first_rule(rules, found):
+    for category, keywords in rules:
+        if not found.isdisjoint(keywords):
+            return category
+    return None
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def page_category(url):
+    """Detector page section (PAGE_CATEGORY_RULES), 'other' when none match."""
+    if not url:
+        return OTHER
+    return _first_rule(PAGE_CATEGORY_RULES, url_keywords(url)) or OTHER
+
+
+def page_type(url):
+    """Page type (PAGE_TYPE_RULES) as DetectorUtils.categorize_page_type."""
+    if not url:
+        return 'unknown'
+    category = _first_rule(PAGE_TYPE_RULES, url_keywords(url))
+    if category is None and url.endswith('/'):
+        category = 'home'
+    return category or OTHER
+
+
+def history_category(entry):
+    """page_category of a history entry: the stored value, else from its URL."""
+    return entry.get('page_category') or page_category(entry.get('page_url') or '')
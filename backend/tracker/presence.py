@@ -0,0 +1,152 @@
+# backend/tracker/presence.py
+"""
+"Active now" presence per case.
+
+dashboard_realtime, realtime_activity_stream, the realtime metrics and
+DashboardAnalytics.get_real_time_metrics counted
+`UserSession.last_activity__gte=now-5min`, which only worked because every
+tracked hit re-saved its session row to bump last_activity.
+
+PresenceTracker keeps one sorted set per case instead: member = visitor
+fingerprint, score = last-seen epoch seconds.
+
+  * with REDIS_URL set, a native Redis ZSET: ZADD on ingest, and on read
+    ZREMRANGEBYSCORE drops members older than PRESENCE_RETENTION_SECONDS
+    before a ZCOUNT over the window, both O(log n)
+  * otherwise a {fingerprint: last_seen} dict in the Django cache, trimmed
+    the same way
+
+Ingest calls record_presence() for every saved event.  last_seen() gives
+one visitor's newest event time (within PRESENCE_RETENTION_SECONDS); prefer
+it to UserSession.last_activity, which the session-counter flush writes late.
+"""
+
+import logging
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_WINDOW_SECONDS = 5 * 60
+PRESENCE_RETENTION_SECONDS = 60 * 60   # longest window a caller can ask for
+
+
+def _presence_key(case_id):
+    return f'presence:v1:{case_id}'
+
+
+class PresenceTracker:
+    """Per-case sorted set of visitors by last-seen time."""
+
+    def _redis(self):
+        from .redis_pool import get_redis
+        return get_redis()
+
+    # ── write path (ingest) ──────────────────────────────────────────────────
+
+    def touch(self, events):
+        """Mark the visitors of just-saved events as seen at the event time."""
+        seen = defaultdict(dict)
+        for event in events:
+            if getattr(event, 'case_id', None) and getattr(event, 'fingerprint_hash', ''):
+                ts = event.timestamp.timestamp() if event.timestamp else time.time()
+                members = seen[event.case_id]
+                members[event.fingerprint_hash] = max(ts, members.get(event.fingerprint_hash, 0))
+        if not seen:
+            return
+
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for case_id, members in seen.items():
+                    key = _presence_key(case_id)
+                    pipe.zadd(key, members, gt=True)
+                    pipe.expire(key, PRESENCE_RETENTION_SECONDS)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.debug(f"presence: Redis ZADD failed, using Django cache: {e}")
+
+        keys = {_presence_key(case_id): members for case_id, members in seen.items()}
+        cutoff = time.time() - PRESENCE_RETENTION_SECONDS
+        stored = cache.get_many(list(keys))
+        for key, members in keys.items():
+            current = {fp: ts for fp, ts in (stored.get(key) or {}).items() if ts >= cutoff}
+            for fp, ts in members.items():
+                if ts > current.get(fp, 0):
+                    current[fp] = ts
+            stored[key] = current
+        cache.set_many(stored, PRESENCE_RETENTION_SECONDS)
+
+    # ── read path ────────────────────────────────────────────────────────────
+
+    def count(self, case_id, seconds=ACTIVE_WINDOW_SECONDS):
+        """Visitors of the case seen in the last `seconds`."""
+        return self.count_many([case_id], seconds)[case_id]
+
+    def count_many(self, case_ids, seconds=ACTIVE_WINDOW_SECONDS):
+        """{case_id: visitors seen in the last `seconds`} in one round trip."""
+        case_ids = list(case_ids)
+        if not case_ids:
+            return {}
+        now = time.time()
+        since = now - seconds
+
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for case_id in case_ids:
+                    key = _presence_key(case_id)
+                    pipe.zremrangebyscore(key, '-inf', now - PRESENCE_RETENTION_SECONDS)
+                    pipe.zcount(key, since, '+inf')
+                results = pipe.execute()
+                return dict(zip(case_ids, results[1::2]))
+            except Exception as e:
+                logger.debug(f"presence: Redis count failed, using Django cache: {e}")
+
+        stored = cache.get_many([_presence_key(case_id) for case_id in case_ids])
+        return {
+            case_id: sum(1 for ts in (stored.get(_presence_key(case_id)) or {}).values() if ts >= since)
+            for case_id in case_ids
+        }
+
+    def last_seen(self, case_id, fingerprint_hash):
+        """Epoch seconds the visitor's newest event was seen, or None."""
+        if not case_id or not fingerprint_hash:
+            return None
+        key = _presence_key(case_id)
+        client = self._redis()
+        if client is not None:
+            try:
+                return client.zscore(key, fingerprint_hash)
+            except Exception as e:
+                logger.debug(f"presence: Redis ZSCORE failed, using Django cache: {e}")
+        return (cache.get(key) or {}).get(fingerprint_hash)
+
+
+_presence = PresenceTracker()
+
+
+def get_presence():
+    return _presence
+
+
+def record_presence(events):
+    """Ingest hook: mark the events' visitors as active."""
+    try:
+        _presence.touch(events)
+    except Exception as e:
+        logger.debug(f"presence: touch failed: {e}")
+
+
+def active_visitors(case, seconds=ACTIVE_WINDOW_SECONDS):
+    """Visitors of `case` (instance or id) active in the last `seconds`."""
+    try:
+        return _presence.count(getattr(case, 'pk', case), seconds)
+    except Exception as e:
+        logger.debug(f"presence: count failed: {e}")
+        return 0
@@ -0,0 +1,306 @@
+# backend/tracker/realtime.py
+"""
+Realtime fan-out: ingest publishes compact deltas to the Channels groups.
+
+TrackingConsumer.get_current_stats and AdminMonitoringConsumer's five second
+loop used to run their COUNT queries for every open socket, and nothing ever
+sent to the `case_<id>` groups, so dashboards polled the HTTP endpoints
+instead.
+
+Now every saved event, SuspiciousActivity and Alert is folded into a per-case
+delta (DeltaPublisher).  Deltas are coalesced for FRAME_SECONDS and sent as
+one `metrics.delta` frame per case (to `case_<id>`) plus one for all cases
+(to `admin_monitoring`), however many events arrived.  A frame holds one
+bucket per minute touched:
+
+    {'events': n, 'page_views': n, 'interactions': n, 'suspicious': n,
+     'critical_alerts': n, 'pages': {url: n},
+     'visitors': [...], 'vpn': [...], 'tor': [...], 'suspicious_users': [...]}
+
+(visitor lists hold fingerprint prefixes).  Consumers keep these buckets in a
+LiveCounters window and answer stats requests from memory.  The buckets are
+also merged into the Django cache so a newly connected socket starts from the
+recent past instead of zero; that copy is best effort (concurrent writers can
+drop an update), the frames themselves are exact.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FRAME_SECONDS = 1.0
+BUCKET_TTL = 2 * 3600
+ADMIN_GROUP = 'admin_monitoring'
+ALL_CASES = 'all'
+FINGERPRINT_PREFIX = 16
+MAX_VISITORS_PER_BUCKET = 5000
+MAX_PAGES_PER_BUCKET = 50
+
+COUNTERS = ('events', 'page_views', 'interactions', 'suspicious', 'critical_alerts')
+SETS = ('visitors', 'vpn', 'tor', 'suspicious_users')
+INTERACTION_EVENT_TYPES = {'click', 'form_submit', 'scroll'}
+
+
+def case_group(case_id):
+    return f'case_{case_id}'
+
+
+def _minute(ts):
+    return int(ts.timestamp() // 60) if ts is not None else int(time.time() // 60)
+
+
+def _bucket_key(scope, minute):
+    return f'rt:v1:{scope}:{minute}'
+
+
+def empty_bucket():
+    bucket = {name: 0 for name in COUNTERS}
+    bucket.update({name: set() for name in SETS})
+    bucket['pages'] = Counter()
+    return bucket
+
+
+def merge_bucket(bucket, delta):
+    """Fold a (possibly serialized) delta bucket into `bucket` in place."""
+    for name in COUNTERS:
+        bucket[name] += delta.get(name, 0)
+    for name in SETS:
+        if len(bucket[name]) < MAX_VISITORS_PER_BUCKET:
+            bucket[name].update(delta.get(name, ()))
+    bucket['pages'].update(delta.get('pages', {}))
+    return bucket
+
+
+def serialize_bucket(bucket):
+    data = {name: bucket[name] for name in COUNTERS}
+    data.update({name: sorted(bucket[name]) for name in SETS})
+    data['pages'] = dict(bucket['pages'].most_common(MAX_PAGES_PER_BUCKET))
+    return data
+
+
+# ============================================
+# CONSUMER SIDE
+# ============================================
+
+class LiveCounters:
+    """Rolling per-minute buckets of the frames a consumer received."""
+
+    def __init__(self, window_minutes):
+        self.window_minutes = window_minutes
+        self.buckets = {}
+
+    def apply(self, buckets):
+        """Merge a frame's {minute: bucket} (minute keys may be strings)."""
+        for minute, delta in buckets.items():
+            minute = int(minute)
+            if minute not in self.buckets:
+                self.buckets[minute] = empty_bucket()
+            merge_bucket(self.buckets[minute], delta)
+        self._expire()
+
+    def _expire(self):
+        oldest = int(time.time() // 60) - self.window_minutes
+        for minute in [m for m in self.buckets if m < oldest]:
+            del self.buckets[minute]
+
+    def window(self, minutes):
+        """Merged bucket of the last `minutes` minutes (current one included)."""
+        first = int(time.time() // 60) - minutes + 1
+        merged = empty_bucket()
+        for minute, bucket in self.buckets.items():
+            if minute >= first:
+                merge_bucket(merged, bucket)
+        return merged
+
+    def seed(self, scope):
+        """Start from the cached buckets of the window (no database access)."""
+        now = int(time.time() // 60)
+        keys = {_bucket_key(scope, m): m for m in range(now - self.window_minutes + 1, now + 1)}
+        try:
+            cached = cache.get_many(list(keys))
+        except Exception as e:
+            logger.debug(f"realtime: seed read failed: {e}")
+            return
+        self.apply({keys[key]: bucket for key, bucket in cached.items()})
+
+
+# ============================================
+# PUBLISHER SIDE
+# ============================================
+
+class DeltaPublisher:
+    """
+    Collects deltas per case and sends them as one frame per case every
+    FRAME_SECONDS (a timer thread starts with the first delta of a frame).
+    """
+
+    def __init__(self, frame_seconds=FRAME_SECONDS):
+        self.frame_seconds = frame_seconds
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._messages = []
+        self._timer = None
+
+    def _bucket(self, case_id, ts):
+        buckets = self._frames.setdefault(case_id, {})
+        minute = _minute(ts)
+        if minute not in buckets:
+            buckets[minute] = empty_bucket()
+        return buckets[minute]
+
+    def _schedule(self):
+        if self._timer is None and self.frame_seconds:
+            self._timer = threading.Timer(self.frame_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def add_events(self, events):
+        with self._lock:
+            for event in events:
+                if not getattr(event, 'case_id', None):
+                    continue
+                bucket = self._bucket(event.case_id, event.timestamp)
+                bucket['events'] += 1
+                bucket['page_views'] += event.event_type == 'page_view'
+                bucket['interactions'] += event.event_type in INTERACTION_EVENT_TYPES
+                bucket['suspicious'] += bool(event.is_suspicious)
+                if event.page_url:
+                    bucket['pages'][event.page_url] += 1
+                fingerprint = (event.fingerprint_hash or '')[:FINGERPRINT_PREFIX]
+                if fingerprint:
+                    bucket['visitors'].add(fingerprint)
+                    if event.is_vpn:
+                        bucket['vpn'].add(fingerprint)
+                    if event.is_tor:
+                        bucket['tor'].add(fingerprint)
+            self._schedule()
+
+    def add_activity(self, activity):
+        if not activity.case_id:
+            return
+        with self._lock:
+            bucket = self._bucket(activity.case_id, activity.created_at)
+            if activity.fingerprint_hash:
+                bucket['suspicious_users'].add(activity.fingerprint_hash[:FINGERPRINT_PREFIX])
+            # the consumers' existing suspicious_alert handler
+            self._messages.append((case_group(activity.case_id), {
+                'type': 'suspicious.alert',
+                'severity': activity.severity_level,
+                'data': {
+                    'id': str(activity.pk),
+                    'activity_type': activity.activity_type,
+                    'fingerprint': activity.fingerprint_hash[:8] if activity.fingerprint_hash else '',
+                },
+                'timestamp': activity.created_at.isoformat() if activity.created_at else None,
+            }))
+            self._schedule()
+
+    def add_alert(self, alert):
+        if not alert.case_id or alert.priority != 'critical':
+            return
+        with self._lock:
+            self._bucket(alert.case_id, alert.created_at)['critical_alerts'] += 1
+            self._messages.append((case_group(alert.case_id), {
+                'type': 'critical.alert',
+                'priority': alert.priority,
+                'data': {'id': str(alert.pk), 'title': alert.title, 'alert_type': alert.alert_type},
+                'timestamp': alert.created_at.isoformat() if alert.created_at else None,
+            }))
+            self._schedule()
+
+    def flush(self):
+        """Send the pending frames (timer callback; safe to call directly)."""
+        with self._lock:
+            frames, self._frames = self._frames, {}
+            messages, self._messages = self._messages, []
+            self._timer = None
+        if not frames and not messages:
+            return
+
+        totals = {}
+        for case_id, buckets in frames.items():
+            for minute, bucket in buckets.items():
+                if minute not in totals:
+                    totals[minute] = empty_bucket()
+                merge_bucket(totals[minute], bucket)
+            messages.append((case_group(case_id), self._frame(case_id, buckets)))
+        if totals:
+            messages.append((ADMIN_GROUP, self._frame(ALL_CASES, totals)))
+
+        self._store(frames, totals)
+        self._send(messages)
+
+    def _frame(self, scope, buckets):
+        return {
+            'type': 'metrics.delta',
+            'scope': str(scope),
+            'buckets': {str(minute): serialize_bucket(b) for minute, b in buckets.items()},
+            'timestamp': time.time(),
+        }
+
+    def _store(self, frames, totals):
+        """Merge the frames into the cached buckets new sockets seed from."""
+        updates = {}
+        for scope, buckets in [*frames.items(), (ALL_CASES, totals)]:
+            for minute, bucket in buckets.items():
+                updates[_bucket_key(scope, minute)] = bucket
+        try:
+            cached = cache.get_many(list(updates))
+            merged = {}
+            for key, bucket in updates.items():
+                base = cached.get(key)
+                merged[key] = serialize_bucket(
+                    merge_bucket(merge_bucket(empty_bucket(), base), bucket) if base else bucket
+                )
+            cache.set_many(merged, BUCKET_TTL)
+        except Exception as e:
+            logger.debug(f"realtime: bucket store failed: {e}")
+
+    def _send(self, messages):
+        try:
+            from asgiref.sync import async_to_sync
+            from channels.layers import get_channel_layer
+        except ImportError:
+            return
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        for group, message in messages:
+            try:
+                async_to_sync(layer.group_send)(group, message)
+            except Exception as e:
+                logger.debug(f"realtime: group_send to {group} failed: {e}")
+
+
+_publisher = DeltaPublisher()
+
+
+def get_publisher():
+    return _publisher
+
+
+def publish_events(events):
+    """Ingest hook: queue just-saved events for the next realtime frame."""
+    try:
+        _publisher.add_events(events)
+    except Exception as e:
+        logger.debug(f"realtime: publish failed: {e}")
+
+
+def publish_activity(activity):
+    try:
+        _publisher.add_activity(activity)
+    except Exception as e:
+        logger.debug(f"realtime: activity publish failed: {e}")
+
+
+def publish_alert(alert):
+    try:
+        _publisher.add_alert(alert)
+    except Exception as e:
+        logger.debug(f"realtime: alert publish failed: {e}")
@@ -0,0 +1,241 @@
+# backend/tracker/redis_pool.py
+"""
+One Redis connection pool per process, behind a circuit breaker.
+
+Each Redis user used to build its own client.  history._redis_client was
+used by presence, cardinality, session counters and metrics.
+EnhancedSuspiciousDetector connected to a hard-coded localhost:6379
+whatever REDIS_URL said.  DetectorFactory built one more client, and the
+ingest buffer another.  Constructing a redis client never touches the
+server, so the `try: redis.Redis(...) except` guards around them never saw
+a missing Redis.  Each call then paid the socket timeout before its
+fallback ran.
+
+get_redis() returns a client on the process-wide ConnectionPool built from
+REDIS_URL (REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT).  The client and its
+pipelines report connection errors and timeouts to a CircuitBreaker:
+
+  * closed     normal operation
+  * open       after REDIS_BREAKER_FAILURES consecutive failures.  Commands
+               raise RedisUnavailable at once (a redis ConnectionError, so
+               existing `except Exception` fallbacks apply), and get_redis()
+               returns None.  Callers go straight to the Django cache.
+  * half-open  after REDIS_BREAKER_RESET seconds, one probe command is let
+               through.  Success closes the breaker; failure re-opens it.
+
+push_capped() is the pipelined LPUSH + LTRIM + EXPIRE used for capped
+per-key logs, with a Django cache list as fallback.  redis is optional:
+without the package or REDIS_URL, get_redis() is always None.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    from redis.client import Pipeline
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+except ImportError:     # pragma: no cover - redis is in requirements.txt
+    redis = None
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        """May a command go to Redis now?"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def available(self):
+        """Non-consuming check: closed, or due for a probe."""
+        with self._lock:
+            return self.state == CLOSED or (
+                self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout
+            ) or (self.state == HALF_OPEN and not self._probing)
+
+    def success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("redis: connection restored, circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(
+                        f"redis: circuit open after {self.failures} failures; "
+                        f"using the Django cache for {self.reset_timeout}s"
+                    )
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+
+if redis is not None:
+    class RedisUnavailable(RedisConnectionError):
+        """Raised instead of calling Redis while the circuit is open."""
+
+    _TRANSPORT_ERRORS = (RedisConnectionError, RedisTimeoutError)
+
+    def _guarded(breaker, call):
+        if not breaker.allow():
+            raise RedisUnavailable('redis circuit open')
+        try:
+            result = call()
+        except RedisUnavailable:
+            raise
+        except _TRANSPORT_ERRORS:
+            breaker.failure()
+            raise
+        breaker.success()
+        return result
+
+    class GuardedPipeline(Pipeline):
+        breaker = None
+
+        def execute(self, raise_on_error=True):
+            return _guarded(self.breaker, lambda: super(GuardedPipeline, self).execute(raise_on_error))
+
+    class GuardedRedis(redis.Redis):
+        """redis.Redis whose commands and pipelines go through the breaker."""
+        breaker = None
+
+        def execute_command(self, *args, **options):
+            return _guarded(self.breaker, lambda: super(GuardedRedis, self).execute_command(*args, **options))
+
+        def pipeline(self, transaction=True, shard_hint=None):
+            pipe = GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+            pipe.breaker = self.breaker
+            return pipe
+else:
+    class RedisUnavailable(Exception):
+        pass
+
+
+class RedisService:
+    """Lazily built process-wide pool + breaker-guarded client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._configured = False
+        self.breaker = None
+
+    def _build(self):
+        url = getattr(settings, 'REDIS_URL', '')
+        if not url or redis is None:
+            return None
+        self.breaker = CircuitBreaker(
+            failure_threshold=getattr(settings, 'REDIS_BREAKER_FAILURES', 3),
+            reset_timeout=getattr(settings, 'REDIS_BREAKER_RESET', 30.0),
+        )
+        timeout = getattr(settings, 'REDIS_SOCKET_TIMEOUT', 1.0)
+        pool = redis.ConnectionPool.from_url(
+            url,
+            max_connections=getattr(settings, 'REDIS_MAX_CONNECTIONS', 50),
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            health_check_interval=30,
+        )
+        client = GuardedRedis(connection_pool=pool)
+        client.breaker = self.breaker
+        return client
+
+    def client(self):
+        """The shared client (even while the circuit is open), or None."""
+        if not self._configured:
+            with self._lock:
+                if not self._configured:
+                    try:
+                        self._client = self._build()
+                    except Exception as e:
+                        logger.warning(f"redis: could not configure the pool, using Django cache: {e}")
+                    self._configured = True
+        return self._client
+
+    def available_client(self):
+        """The shared client, or None when Redis is off or the circuit is open."""
+        client = self.client()
+        if client is None or not self.breaker.available():
+            return None
+        return client
+
+    def reset(self):
+        """Drop the pool (tests / settings changes)."""
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.connection_pool.disconnect()
+                except Exception as e:
+                    logger.debug(f"redis: pool disconnect failed: {e}")
+            self._client = None
+            self._configured = False
+            self.breaker = None
+
+
+_service = RedisService()
+
+
+def get_redis_service():
+    return _service
+
+
+def get_redis():
+    """Shared Redis client, or None (no REDIS_URL / redis package, or circuit open)."""
+    return _service.available_client()
+
+
+def push_capped(key, value, maxlen=None, ttl=None):
+    """
+    LPUSH `value` as JSON onto the list at `key`, keep the newest `maxlen`
+    entries and set `ttl` seconds: one pipelined round trip. Falls back to a
+    list of the values in the Django cache.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.lpush(key, json.dumps(value, default=str))
+            if maxlen:
+                pipe.ltrim(key, 0, maxlen - 1)
+            if ttl:
+                pipe.expire(key, ttl)
+            pipe.execute()
+            return
+        except Exception as e:
+            logger.debug(f"redis: push to {key} failed, using Django cache: {e}")
+    entries = cache.get(key, [])
+    entries.insert(0, value)
+    cache.set(key, entries[:maxlen] if maxlen else entries, ttl)
@@ -0,0 +1,374 @@
+# backend/tracker/rollups.py
+"""
+Hourly rollups for the tracker dashboards.
+
+dashboard_overview, family_analytics, get_visitor_trend, get_peak_hours,
+analyze_temporal_patterns and DashboardAnalytics.get_overview_stats used to
+aggregate raw TrackingEvent / UserSession rows on every request (get_peak_hours
+alone was 24 COUNT queries).  CaseHourlyRollup keeps one row per (case, UTC
+hour) instead, and the readers below answer the same questions from those
+rows, so a case with millions of events renders in a handful of small queries.
+
+Maintenance is incremental: the update_hourly_rollups beat task calls
+update_rollups(), which rebuilds only the hours since the newest rollup (plus
+ROLLUP_LATE_HOURS for buffered / late events and SuspiciousActivity rows
+written by the async analysis).  The same routine backfills an empty table a
+chunk at a time; `manage.py rebuild_rollups` rebuilds any range on demand.
+Hours before the archive cutoff are never rebuilt (see rebuildable_since()).
+
+Visitors per country, region and device type are kept per UTC day instead
+(CaseDailyBreakdown): an hourly breakdown would count a visitor once per hour
+they were seen.  rebuild_rollups() re-aggregates every day its range touches.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncDate, TruncHour
+from django.utils import timezone
+
+from .hll import HyperLogLog, merge_sketches
+from .models import CaseDailyBreakdown, CaseHourlyRollup, SuspiciousActivity, TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_LATE_HOURS = 2                 # closed hours re-aggregated on every run
+ROLLUP_MAX_HOURS_PER_RUN = 24 * 7     # backfill step for the beat task
+ROLLUP_CHUNK_HOURS = 24               # hours aggregated per set of queries
+HISTOGRAM_TOP_N = 50                  # values kept per histogram per hour
+
+ENGAGEMENT_EVENT_TYPES = ['click', 'form_submit', 'download']
+
+BREAKDOWN_FIELDS = {                  # CaseDailyBreakdown.dimension -> event field
+    'country': 'ip_country',
+    'region': 'ip_region',
+    'device': 'device_type',
+}
+
+COUNTER_FIELDS = (
+    'events', 'page_views', 'engagement_events', 'suspicious_events',
+    'unusual_hour_events', 'suspicious_activities',
+    'time_on_page_total', 'time_on_page_samples',
+)
+
+
+def floor_hour(dt):
+    return dt.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_bucket(field):
+    return TruncHour(field, tzinfo=dt_timezone.utc)
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+# ============================================
+# BUILD
+# ============================================
+
+def _aggregate(start, end, case_ids=None):
+    """Aggregate [start, end) into {(case_id, hour): CaseHourlyRollup}."""
+    events = TrackingEvent.objects.filter(
+        case__isnull=False, timestamp__gte=start, timestamp__lt=end,
+    )
+    activities = SuspiciousActivity.objects.filter(
+        case__isnull=False, created_at__gte=start, created_at__lt=end,
+    )
+    if case_ids is not None:
+        events = events.filter(case_id__in=case_ids)
+        activities = activities.filter(case_id__in=case_ids)
+    events = events.annotate(bucket=_hour_bucket('timestamp')).order_by()
+    visitor_q = ~Q(fingerprint_hash='')
+
+    rows = {}
+
+    def row(case_id, hour):
+        key = (case_id, hour)
+        if key not in rows:
+            rows[key] = CaseHourlyRollup(case_id=case_id, hour=hour)
+        return rows[key]
+
+    # 1. counters
+    for r in events.values('case_id', 'bucket').annotate(
+        n_events=Count('id'),
+        n_page_views=Count('id', filter=Q(event_type='page_view')),
+        n_engagement=Count('id', filter=Q(event_type__in=ENGAGEMENT_EVENT_TYPES)),
+        n_suspicious=Count('id', filter=Q(is_suspicious=True)),
+        n_unusual=Count('id', filter=Q(is_unusual_hour=True)),
+        n_visitors=Count('fingerprint_hash', distinct=True, filter=visitor_q),
+        top_total=Sum('time_on_page', filter=Q(time_on_page__gt=0)),
+        top_samples=Count('id', filter=Q(time_on_page__gt=0)),
+    ):
+        rollup = row(r['case_id'], r['bucket'])
+        rollup.events = r['n_events']
+        rollup.page_views = r['n_page_views']
+        rollup.engagement_events = r['n_engagement']
+        rollup.suspicious_events = r['n_suspicious']
+        rollup.unusual_hour_events = r['n_unusual']
+        rollup.visitors = r['n_visitors']
+        rollup.time_on_page_total = r['top_total'] or 0
+        rollup.time_on_page_samples = r['top_samples']
+
+    # 2. visitor sketches (one pass over the distinct visitor-hours)
+    sketches = defaultdict(HyperLogLog)
+    for case_id, bucket, fingerprint in (
+        events.filter(visitor_q)
+        .values_list('case_id', 'bucket', 'fingerprint_hash')
+        .distinct()
+        .iterator(chunk_size=5000)
+    ):
+        sketches[(case_id, bucket)].add(fingerprint)
+    for key, sketch in sketches.items():
+        row(*key).visitor_sketch = sketch.to_bytes()
+
+    # 3. referrer histogram
+    referrers = defaultdict(Counter)
+    for r in events.values('case_id', 'bucket', 'referrer_url').annotate(n=Count('id')):
+        referrers[(r['case_id'], r['bucket'])][r['referrer_url'] or ''] += r['n']
+    for key, counts in referrers.items():
+        row(*key).referrers = dict(counts.most_common(HISTOGRAM_TOP_N))
+
+    # 4. suspicious activity records
+    for r in (
+        activities.annotate(bucket=_hour_bucket('created_at')).order_by()
+        .values('case_id', 'bucket').annotate(n=Count('id'))
+    ):
+        row(r['case_id'], r['bucket']).suspicious_activities = r['n']
+
+    return rows
+
+
+def _aggregate_breakdowns(day, case_ids=None):
+    """Aggregate one UTC day into CaseDailyBreakdown rows (one pass per dimension)."""
+    start = _day_start(day)
+    events = TrackingEvent.objects.filter(
+        case__isnull=False, timestamp__gte=start, timestamp__lt=start + timedelta(days=1),
+    ).exclude(fingerprint_hash='').order_by()
+    if case_ids is not None:
+        events = events.filter(case_id__in=case_ids)
+
+    rows = []
+    for dimension, field in BREAKDOWN_FIELDS.items():
+        sketches = defaultdict(HyperLogLog)
+        visitors = Counter()
+        for case_id, value, fingerprint in (
+            events.values_list('case_id', field, 'fingerprint_hash')
+            .distinct()
+            .iterator(chunk_size=5000)
+        ):
+            sketches[(case_id, value)].add(fingerprint)
+            visitors[(case_id, value)] += 1
+        rows.extend(
+            CaseDailyBreakdown(case_id=case_id, day=day, dimension=dimension, value=value,
+                               visitors=visitors[(case_id, value)], visitor_sketch=sketch.to_bytes())
+            for (case_id, value), sketch in sketches.items()
+        )
+    return rows
+
+
+def rebuildable_since():
+    """
+    First hour rebuild_rollups() may recompute, or None without an archive.
+    Older hours can hold events that archive_events() moved to Parquet;
+    re-aggregating them from the hot table would wipe those from the rollups,
+    which are the only aggregate record of archived traffic.
+    """
+    from .archive import archive_cutoff, archive_enabled
+
+    if not archive_enabled():
+        return None
+    return floor_hour(archive_cutoff()) + timedelta(hours=1)
+
+
+def rebuild_rollups(start, end, case_ids=None):
+    """
+    Recompute every (case, hour) bucket in [start, end), replacing what is
+    stored. The range is clamped to rebuildable_since(): archived hours keep
+    their rollups. Returns the number of rollup rows written.
+    """
+    start, end = floor_hour(start), floor_hour(end)
+    hot_since = rebuildable_since()
+    if hot_since is not None and start < hot_since:
+        logger.debug(f"rollups: keeping archived hours before {hot_since:%Y-%m-%d %H:00}")
+        start = hot_since
+    written = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(hours=ROLLUP_CHUNK_HOURS), end)
+        rows = _aggregate(chunk_start, chunk_end, case_ids)
+        with transaction.atomic():
+            stale = CaseHourlyRollup.objects.filter(hour__gte=chunk_start, hour__lt=chunk_end)
+            if case_ids is not None:
+                stale = stale.filter(case_id__in=case_ids)
+            stale.delete()
+            CaseHourlyRollup.objects.bulk_create(rows.values(), batch_size=500)
+        written += len(rows)
+        chunk_start = chunk_end
+    if start < end:
+        rebuild_breakdowns(start, end, case_ids, hot_since)
+    return written
+
+
+def rebuild_breakdowns(start, end, case_ids=None, hot_since=None):
+    """
+    Recompute the CaseDailyBreakdown rows of every UTC day that overlaps
+    [start, end). A day starting before hot_since is partly archived and
+    keeps its rows. Returns the number of rows written.
+    """
+    day = start.astimezone(dt_timezone.utc).date()
+    if hot_since is not None and _day_start(day) < hot_since:
+        day += timedelta(days=1)
+    last_day = (end.astimezone(dt_timezone.utc) - timedelta(microseconds=1)).date()
+    written = 0
+    while day <= last_day:
+        rows = _aggregate_breakdowns(day, case_ids)
+        with transaction.atomic():
+            stale = CaseDailyBreakdown.objects.filter(day=day)
+            if case_ids is not None:
+                stale = stale.filter(case_id__in=case_ids)
+            stale.delete()
+            CaseDailyBreakdown.objects.bulk_create(rows, batch_size=500)
+        written += len(rows)
+        day += timedelta(days=1)
+    return written
+
+
+def update_rollups(now=None):
+    """
+    Bring the rollups up to date (beat task entry point).
+
+    Re-aggregates from ROLLUP_LATE_HOURS before the newest rollup; idle
+    stretches are skipped by jumping to the next event, and an empty table is
+    backfilled ROLLUP_MAX_HOURS_PER_RUN hours per call.
+    Returns {'start', 'end', 'rows'}.
+    """
+    end = floor_hour(now or timezone.now()) + timedelta(hours=1)
+
+    newest = CaseHourlyRollup.objects.aggregate(newest=Max('hour'))['newest']
+    start = newest - timedelta(hours=ROLLUP_LATE_HOURS) if newest else None
+    hot_since = rebuildable_since()
+    if hot_since is not None:
+        start = max(start, hot_since) if start is not None else hot_since
+
+    pending = TrackingEvent.objects.filter(case__isnull=False)
+    if start is not None:
+        pending = pending.filter(timestamp__gte=start)
+    first = pending.order_by('timestamp').values_list('timestamp', flat=True).first()
+    if first is None:
+        return {'start': None, 'end': None, 'rows': 0}
+
+    start = max(start, floor_hour(first)) if start is not None else floor_hour(first)
+    end = min(end, start + timedelta(hours=ROLLUP_MAX_HOURS_PER_RUN))
+    rows = rebuild_rollups(start, end)
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'rows': rows}
+
+
+# ============================================
+# READ
+# ============================================
+
+def rollups_for(case, since=None, until=None):
+    qs = CaseHourlyRollup.objects.filter(case=case)
+    if since is not None:
+        qs = qs.filter(hour__gte=floor_hour(since))
+    if until is not None:
+        qs = qs.filter(hour__lt=until)
+    return qs.order_by()
+
+
+def rollup_totals(case, since=None, until=None):
+    """Summed counters for the case (optionally within a window)."""
+    totals = rollups_for(case, since, until).aggregate(
+        **{name: Sum(name) for name in COUNTER_FIELDS}
+    )
+    return {name: totals[name] or 0 for name in COUNTER_FIELDS}
+
+
+def distinct_visitors(case, since=None, until=None):
+    """Distinct visitors over the window (HyperLogLog union of the hours)."""
+    return merge_sketches(
+        rollups_for(case, since, until).values_list('visitor_sketch', flat=True)
+    ).count()
+
+
+def daily_series(case, days):
+    """
+    Per-day rollups for the last `days` days (local dates, oldest first):
+    [{'date': date, 'visitors': n, 'page_views': n, 'events': n,
+      'suspicious_activities': n, ...}, ...] with zero-filled gaps.
+    """
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    since = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+
+    counters = defaultdict(Counter)
+    sketches = defaultdict(list)
+    for values in (
+        rollups_for(case, since)
+        .annotate(day=TruncDate('hour'))
+        .values_list('day', 'visitor_sketch', *COUNTER_FIELDS)
+    ):
+        day, sketch = values[0], values[1]
+        counters[day].update(dict(zip(COUNTER_FIELDS, values[2:])))
+        sketches[day].append(sketch)
+
+    series = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        entry = {'date': day, 'visitors': merge_sketches(sketches.get(day, [])).count()}
+        entry.update({name: counters[day][name] for name in COUNTER_FIELDS})
+        series.append(entry)
+    return series
+
+
+def hour_of_day_counts(case, since=None, field='events'):
+    """{local hour of day: summed `field`} for all 24 hours."""
+    counts = {hour: 0 for hour in range(24)}
+    for r in (
+        rollups_for(case, since)
+        .annotate(hod=ExtractHour('hour'))
+        .values('hod').annotate(n=Sum(field))
+    ):
+        counts[r['hod']] = r['n'] or 0
+    return counts
+
+
+def weekday_counts(case, since=None, field='events'):
+    """{Django week_day (1=Sunday .. 7=Saturday): summed `field`}."""
+    counts = {day: 0 for day in range(1, 8)}
+    for r in (
+        rollups_for(case, since)
+        .annotate(dow=ExtractWeekDay('hour'))
+        .values('dow').annotate(n=Sum(field))
+    ):
+        counts[r['dow']] = r['n'] or 0
+    return counts
+
+
+def visitor_breakdown(case, dimension, since=None, limit=10):
+    """
+    Top `limit` (value, distinct visitors) pairs for a CaseDailyBreakdown
+    dimension; `since` is floored to its UTC day. limit=None keeps them all.
+    """
+    rows = CaseDailyBreakdown.objects.filter(case=case, dimension=dimension)
+    if since is not None:
+        rows = rows.filter(day__gte=since.astimezone(dt_timezone.utc).date())
+    sketches = defaultdict(list)
+    for value, sketch in rows.order_by().values_list('value', 'visitor_sketch'):
+        sketches[value].append(sketch)
+    counts = Counter({value: merge_sketches(days).count() for value, days in sketches.items()})
+    return counts.most_common(limit)
+
+
+def merged_histogram(case, name, since=None, limit=10):
+    """Top `limit` (value, count) pairs of a rollup histogram over the window."""
+    merged = Counter()
+    for histogram in rollups_for(case, since).values_list(name, flat=True):
+        if histogram:
+            merged.update(histogram)
+    return merged.most_common(limit)
@@ -0,0 +1,223 @@
+# backend/tracker/session_counters.py
+"""
+Coalesced UserSession counters.
+
+update_session_metrics used to read the session, bump page_views /
+forms_submitted / copy_events in Python and save the row for every tracked
+event: one UPDATE per hit, and two requests for the same session racing
+through that read-modify-write lost one of the increments.
+
+SessionCounterBuffer accumulates the increments instead:
+
+  * with REDIS_URL set, HINCRBY into one hash per session
+    (`session_counters:<pk>`), the event time into a sorted set with ZADD GT
+    (`session_counters:last_activity`, so the newest time wins whatever the
+    arrival order), and the session id into a dirty set.
+    flush_session_counters (Celery beat, every SESSION_COUNTER_FLUSH_INTERVAL
+    seconds) pops the dirty ids, takes each hash and score in one MULTI
+    (HGETALL + DEL, ZSCORE + ZREM), and writes all touched sessions with a
+    single bulk_update(update_fields=...) under select_for_update.
+  * otherwise the increments go straight to the row as one UPDATE built from
+    F() expressions, so concurrent writers still never overwrite each other.
+
+last_activity is the newest event's timestamp, not the write time, so events
+drained late from the write-behind buffer keep the time they happened.  With
+Redis it reaches the row only on the next flush; readers that need "seen
+just now" use tracker.presence.  avg_time_per_page / total_duration are
+derived from last_activity - created_at and recomputed on every write.
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import UserSession
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('page_views', 'forms_submitted', 'copy_events')
+UPDATE_FIELDS = (*COUNTERS, 'last_activity', 'avg_time_per_page', 'total_duration')
+EVENT_COUNTERS = {'form_submit': 'forms_submitted', 'copy': 'copy_events'}
+
+DIRTY_KEY = 'session_counters:dirty'
+LAST_ACTIVITY_KEY = 'session_counters:last_activity'
+HASH_TTL = 24 * 3600        # an unflushed hash outlives any worker outage
+FLUSH_BATCH = 1000
+
+
+def _hash_key(session_pk):
+    return f'session_counters:{session_pk}'
+
+
+def event_deltas(event_type):
+    """Counter increments one tracked event contributes to its session."""
+    deltas = {'page_views': 1}
+    counter = EVENT_COUNTERS.get(event_type)
+    if counter:
+        deltas[counter] = 1
+    return deltas
+
+
+def _derive_durations(session):
+    if session.page_views > 1:
+        duration = (session.last_activity - session.created_at).total_seconds()
+        session.avg_time_per_page = duration / session.page_views
+        session.total_duration = int(duration)
+
+
+class SessionCounterBuffer:
+    """Per-session counter increments, written to UserSession in bulk."""
+
+    def _redis(self):
+        from .redis_pool import get_redis
+        return get_redis()
+
+    # ── write path ───────────────────────────────────────────────────────────
+
+    def add(self, session, deltas, seen_at=None):
+        """Record `deltas` ({counter: n}) for `session` seen at `seen_at`."""
+        seen_at = seen_at or timezone.now()
+        client = self._redis()
+        if client is not None:
+            try:
+                key = _hash_key(session.pk)
+                pipe = client.pipeline(transaction=False)
+                for name, n in deltas.items():
+                    pipe.hincrby(key, name, n)
+                # GT: a drained (older) event never moves last_activity back
+                pipe.zadd(LAST_ACTIVITY_KEY, {str(session.pk): seen_at.timestamp()}, gt=True)
+                pipe.expire(key, HASH_TTL)
+                pipe.expire(LAST_ACTIVITY_KEY, HASH_TTL)
+                pipe.sadd(DIRTY_KEY, str(session.pk))
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.debug(f"session_counters: Redis HINCRBY failed, updating the row: {e}")
+        self._apply_now(session, deltas, seen_at)
+
+    def _apply_now(self, session, deltas, seen_at):
+        """One UPDATE with F() increments (no read-modify-write)."""
+        values = {name: F(name) + n for name, n in deltas.items()}
+        page_views = deltas.get('page_views', 0)
+        if page_views and session.created_at:
+            duration = (seen_at - session.created_at).total_seconds()
+            # the right-hand side sees the pre-update page_views
+            values['avg_time_per_page'] = Case(
+                When(page_views__gte=2 - page_views, then=ExpressionWrapper(
+                    Value(duration) / (F('page_views') + Value(float(page_views))),
+                    output_field=FloatField(),
+                )),
+                default=F('avg_time_per_page'),
+            )
+            values['total_duration'] = Case(
+                When(page_views__gte=2 - page_views, then=Value(int(duration))),
+                default=F('total_duration'),
+            )
+        # Greatest: a drained (older) event never moves last_activity back
+        UserSession.objects.filter(pk=session.pk).update(
+            last_activity=Greatest(F('last_activity'), Value(seen_at)), **values,
+        )
+
+    # ── flush (periodic task) ────────────────────────────────────────────────
+
+    def flush(self, max_sessions=FLUSH_BATCH):
+        """Write buffered increments to UserSession; returns sessions updated."""
+        client = self._redis()
+        if client is None:
+            return 0
+
+        pks = [pk.decode() if isinstance(pk, bytes) else pk
+               for pk in (client.spop(DIRTY_KEY, max_sessions) or [])]
+        if not pks:
+            return 0
+
+        pipe = client.pipeline(transaction=True)
+        for pk in pks:
+            pipe.hgetall(_hash_key(pk))
+            pipe.delete(_hash_key(pk))
+            pipe.zscore(LAST_ACTIVITY_KEY, pk)
+            pipe.zrem(LAST_ACTIVITY_KEY, pk)
+        results = pipe.execute()
+
+        pending = {}
+        for pk, raw, score in zip(pks, results[::4], results[2::4]):
+            if not raw and score is None:
+                continue
+            fields = {
+                (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in (raw or {}).items()
+            }
+            deltas = {name: int(fields[name]) for name in COUNTERS if name in fields}
+            seen_at = None
+            if score is not None:
+                seen_at = datetime.fromtimestamp(float(score), tz=dt_timezone.utc)
+            pending[pk] = (deltas, seen_at)
+        if not pending:
+            return 0
+
+        try:
+            return self._write(pending)
+        except Exception:
+            # put the increments back so the next flush retries them
+            self._restore(client, pending)
+            raise
+
+    def _write(self, pending):
+        with transaction.atomic():
+            sessions = list(UserSession.objects.select_for_update().filter(pk__in=list(pending)))
+            for session in sessions:
+                deltas, seen_at = pending[str(session.pk)]
+                for name, n in deltas.items():
+                    setattr(session, name, getattr(session, name) + n)
+                if seen_at and (session.last_activity is None or seen_at > session.last_activity):
+                    session.last_activity = seen_at
+                _derive_durations(session)
+            UserSession.objects.bulk_update(sessions, UPDATE_FIELDS, batch_size=500)
+        return len(sessions)
+
+    def _restore(self, client, pending):
+        try:
+            pipe = client.pipeline(transaction=False)
+            for pk, (deltas, seen_at) in pending.items():
+                key = _hash_key(pk)
+                for name, n in deltas.items():
+                    pipe.hincrby(key, name, n)
+                if seen_at:
+                    pipe.zadd(LAST_ACTIVITY_KEY, {pk: seen_at.timestamp()}, gt=True)
+                pipe.expire(key, HASH_TTL)
+                pipe.expire(LAST_ACTIVITY_KEY, HASH_TTL)
+                pipe.sadd(DIRTY_KEY, pk)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"session_counters: could not re-queue {len(pending)} sessions: {e}")
+
+
+_buffer = SessionCounterBuffer()
+
+
+def get_session_counters():
+    return _buffer
+
+
+def record_session_event(session, event):
+    """Count one tracked event against its session, active as of the event time."""
+    try:
+        _buffer.add(session, event_deltas(event.event_type), seen_at=event.timestamp)
+    except Exception as e:
+        logger.debug(f"session_counters: update failed for {session.pk}: {e}")
+
+
+def record_page_view(session):
+    """Count a page view served through the middleware."""
+    try:
+        _buffer.add(session, {'page_views': 1})
+    except Exception as e:
+        logger.debug(f"session_counters: page view failed for {session.pk}: {e}")
+
+
+def flush_session_counters(max_sessions=FLUSH_BATCH):
+    return _buffer.flush(max_sessions)
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Alert, SuspiciousActivity
+from .realtime import publish_activity, publish_alert
+from .suspects import record_suspect_activities
+
+
+@receiver(post_save, sender=SuspiciousActivity)
+def update_suspect_ranking(sender, instance, created, **kwargs):
+    """Fold each new SuspiciousActivity into the materialized suspect table."""
+    if created:
+        record_suspect_activities([instance])
+
+
+@receiver(post_save, sender=SuspiciousActivity)
+def publish_suspicious_activity(sender, instance, created, **kwargs):
+    """Push new suspicious activity to the case's realtime group."""
+    if created:
+        publish_activity(instance)
+
+
+@receiver(post_save, sender=Alert)
+def publish_new_alert(sender, instance, created, **kwargs):
+    """Push new critical alerts to the case's realtime group."""
+    if created:
+        publish_alert(instance)
@@ -0,0 +1,335 @@
+# backend/tracker/suspects.py
+"""
+Materialized suspect ranking (CaseSuspect).
+
+_compute_suspects used to run three grouped aggregates over every event and
+suspicious activity of a case on each request to the suspects endpoint (and
+again for the CSV export), then score every visitor in Python.  Its "latest
+event" query used the Postgres-only DISTINCT ON, so it failed on SQLite.
+
+Each (case, fingerprint) now has one CaseSuspect row holding the counters the
+score is built from:
+
+  * record_suspect_events() folds just-saved events in (ingest hook)
+  * record_suspect_activities() folds in new SuspiciousActivity rows
+    (post_save, see tracker.signals)
+  * rebuild_suspects() recomputes a case from scratch, archived events
+    included (rebuild_suspects command)
+
+Every update re-scores the touched rows with score_suspect(), so reads are an
+index scan over (case, -score).
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, Q
+
+from .archive import archive_cutoff, archive_enabled, archived_rows
+from .models import CaseSuspect, SuspiciousActivity, TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_IPS = 50        # distinct IPs kept per suspect (unique_ips caps here)
+MIN_SUSPECT_SCORE = 15      # visitors below this have almost no signals
+TOP_SUSPECTS = 50
+REBUILD_CHUNK = 5000
+
+EVENT_COUNTERS = ('visit_count', 'unusual_hour_count', 'vpn_count', 'tor_count', 'honeypot_events')
+ACTIVITY_COUNTERS = ('activity_count', 'honeypot_activities')
+
+# TrackingEvent field -> CaseSuspect "latest event" field
+LATEST_FIELDS = {
+    'ip_address': 'latest_ip',
+    'ip_country': 'latest_country',
+    'ip_region': 'latest_region',
+    'ip_city': 'latest_city',
+    'ip_latitude': 'latest_lat',
+    'ip_longitude': 'latest_lon',
+    'ip_postal': 'latest_postal',
+    'isp': 'latest_isp',
+    'browser': 'browser',
+    'os': 'os',
+    'device_type': 'device_type',
+}
+NULLABLE_LATEST_FIELDS = {'latest_ip', 'latest_lat', 'latest_lon'}
+
+EVENT_FIELDS = (
+    'case_id', 'fingerprint_hash', 'timestamp', 'event_type',
+    'is_unusual_hour', 'is_vpn', 'is_tor', *LATEST_FIELDS,
+)
+
+UPDATE_FIELDS = (
+    *EVENT_COUNTERS, *ACTIVITY_COUNTERS, 'max_severity', 'ip_addresses', 'unique_ips',
+    'first_seen', 'last_seen', *LATEST_FIELDS.values(), 'score', 'risk', 'signals', 'updated_at',
+)
+
+
+# ============================================
+# SCORING
+# ============================================
+
+def score_suspect(suspect):
+    """
+    Recompute score, risk and signals from the counters.
+
+    Signals and weights
+    ───────────────────
+    honeypot_triggered   +60  clicked a hidden trap — highest indicator
+    tor_detected         +20  using Tor anonymiser
+    vpn_detected         +15  using VPN / proxy
+    multiple_ips (3+)    +20  same fingerprint, 3+ different IPs
+    multiple_ips (2)     +10  same fingerprint, 2 different IPs
+    unusual_hour         +10  visited between 2–5 AM
+    high_visit_count 10+ +20  10 or more total visits
+    high_visit_count 5+  +15  5–9 total visits
+    return_visitor  3+   +10  3–4 total visits
+    suspicious_patterns  +5   per flagged SuspiciousActivity record (max 25)
+    high_severity act.   +15  at least one severity-4/5 activity
+    """
+    score = 0
+    signals = []
+
+    honeypot_hits = suspect.honeypot_events + suspect.honeypot_activities
+    if honeypot_hits > 0:
+        score += 60
+        signals.append({
+            'type': 'honeypot_triggered',
+            'label': f'Accessed hidden trap link ({honeypot_hits}×)',
+            'weight': 60,
+        })
+
+    if suspect.tor_count > 0:
+        score += 20
+        signals.append({'type': 'tor_detected', 'label': 'Tor anonymiser detected', 'weight': 20})
+
+    if suspect.vpn_count > 0:
+        score += 15
+        signals.append({'type': 'vpn_detected', 'label': 'VPN / proxy detected', 'weight': 15})
+
+    if suspect.unique_ips >= 3:
+        score += 20
+        signals.append({'type': 'multiple_ips', 'label': f'{suspect.unique_ips} different IP addresses', 'weight': 20})
+    elif suspect.unique_ips == 2:
+        score += 10
+        signals.append({'type': 'multiple_ips', 'label': '2 different IP addresses', 'weight': 10})
+
+    if suspect.unusual_hour_count > 0:
+        score += 10
+        signals.append({'type': 'unusual_hour', 'label': f'Visited during 2–5 AM ({suspect.unusual_hour_count}×)', 'weight': 10})
+
+    vc = suspect.visit_count
+    if vc >= 10:
+        score += 20
+        signals.append({'type': 'high_visit_count', 'label': f'{vc} total visits', 'weight': 20})
+    elif vc >= 5:
+        score += 15
+        signals.append({'type': 'return_visitor', 'label': f'{vc} visits (frequent returner)', 'weight': 15})
+    elif vc >= 3:
+        score += 10
+        signals.append({'type': 'return_visitor', 'label': f'{vc} visits', 'weight': 10})
+
+    if suspect.activity_count > 0:
+        pts = min(25, suspect.activity_count * 5)
+        score += pts
+        signals.append({'type': 'suspicious_patterns', 'label': f'{suspect.activity_count} flagged behaviour patterns', 'weight': pts})
+
+    if suspect.max_severity >= 4:
+        score += 15
+        signals.append({'type': 'high_severity', 'label': f'Severity-{suspect.max_severity} activity on record', 'weight': 15})
+
+    suspect.score = min(100, score)
+    suspect.signals = sorted(signals, key=lambda s: s['weight'], reverse=True)
+    if suspect.score >= 70 or honeypot_hits > 0:
+        suspect.risk = 'critical'
+    elif suspect.score >= 50:
+        suspect.risk = 'high'
+    elif suspect.score >= 30:
+        suspect.risk = 'medium'
+    else:
+        suspect.risk = 'low'
+    return suspect
+
+
+def _apply_event(suspect, event):
+    """Fold one event (model instance or values() dict) into the counters."""
+    get = event.get if isinstance(event, dict) else lambda name: getattr(event, name)
+
+    suspect.visit_count += 1
+    suspect.unusual_hour_count += bool(get('is_unusual_hour'))
+    suspect.vpn_count += bool(get('is_vpn'))
+    suspect.tor_count += bool(get('is_tor'))
+    suspect.honeypot_events += get('event_type') == 'honeypot_triggered'
+
+    ip = get('ip_address')
+    if ip and ip not in suspect.ip_addresses and len(suspect.ip_addresses) < MAX_TRACKED_IPS:
+        suspect.ip_addresses = suspect.ip_addresses + [ip]
+        suspect.unique_ips = len(suspect.ip_addresses)
+
+    timestamp = get('timestamp')
+    if suspect.first_seen is None or timestamp < suspect.first_seen:
+        suspect.first_seen = timestamp
+    if suspect.last_seen is None or timestamp >= suspect.last_seen:
+        suspect.last_seen = timestamp
+        for source, target in LATEST_FIELDS.items():
+            value = get(source)
+            if value is None and target not in NULLABLE_LATEST_FIELDS:
+                value = ''
+            setattr(suspect, target, value)
+
+
+def _apply_activity(suspect, activity):
+    suspect.activity_count += 1
+    suspect.honeypot_activities += activity.activity_type == 'honeypot_triggered'
+    suspect.max_severity = max(suspect.max_severity, activity.severity_level or 0)
+
+
+# ============================================
+# INCREMENTAL UPDATES
+# ============================================
+
+def _update(items, apply):
+    """
+    Fold `items` (anything with case_id / fingerprint_hash) into their rows:
+    create the missing rows, then lock, update and re-score all of them.
+    """
+    grouped = defaultdict(list)
+    for item in items:
+        if getattr(item, 'case_id', None) and getattr(item, 'fingerprint_hash', ''):
+            grouped[(item.case_id, item.fingerprint_hash)].append(item)
+    if not grouped:
+        return 0
+
+    case_ids = {case_id for case_id, _fp in grouped}
+    fingerprints = {fp for _case_id, fp in grouped}
+    with transaction.atomic():
+        CaseSuspect.objects.bulk_create(
+            [CaseSuspect(case_id=case_id, fingerprint_hash=fp) for case_id, fp in grouped],
+            ignore_conflicts=True,
+        )
+        suspects = [
+            suspect for suspect in (
+                CaseSuspect.objects.select_for_update()
+                .filter(case_id__in=case_ids, fingerprint_hash__in=fingerprints)
+            )
+            if (suspect.case_id, suspect.fingerprint_hash) in grouped
+        ]
+        for suspect in suspects:
+            for item in grouped[(suspect.case_id, suspect.fingerprint_hash)]:
+                apply(suspect, item)
+            score_suspect(suspect)
+        CaseSuspect.objects.bulk_update(suspects, UPDATE_FIELDS, batch_size=500)
+    return len(suspects)
+
+
+def record_suspect_events(events):
+    """Ingest hook: fold just-saved TrackingEvents into the suspect table."""
+    try:
+        _update(sorted(events, key=lambda e: e.timestamp), _apply_event)
+    except Exception as e:
+        logger.debug(f"suspects: event update failed: {e}")
+
+
+def record_suspect_activities(activities):
+    """Fold new SuspiciousActivity rows into the suspect table."""
+    try:
+        _update(activities, _apply_activity)
+    except Exception as e:
+        logger.debug(f"suspects: activity update failed: {e}")
+
+
+# ============================================
+# REBUILD
+# ============================================
+
+def rebuild_suspects(case_id, chunk_size=REBUILD_CHUNK):
+    """
+    Recompute every suspect row of a case from its raw events (hot and
+    archived) and activities, replacing what is stored. Hot events are
+    streamed in timestamp order, chunk_size rows at a time. Returns the number
+    of rows written.
+    """
+    suspects = {}
+
+    def suspect_for(fingerprint):
+        if fingerprint not in suspects:
+            suspects[fingerprint] = CaseSuspect(case_id=case_id, fingerprint_hash=fingerprint)
+        return suspects[fingerprint]
+
+    events = (
+        TrackingEvent.objects.filter(case_id=case_id)
+        .exclude(fingerprint_hash='')
+        .order_by('timestamp')
+        .values(*EVENT_FIELDS)
+    )
+    for event in events.iterator(chunk_size=chunk_size):
+        _apply_event(suspect_for(event['fingerprint_hash']), event)
+
+    if archive_enabled():
+        cutoff = archive_cutoff()
+        # rows still hot past the cutoff (evidence, interrupted runs) may also be archived
+        hot = {
+            str(pk) for pk in TrackingEvent.objects.filter(case_id=case_id, timestamp__lt=cutoff)
+            .values_list('id', flat=True)
+        }
+        for event in archived_rows(case_id=case_id, until=cutoff, columns=('id', *EVENT_FIELDS)):
+            if event['fingerprint_hash'] and event['id'] not in hot:
+                _apply_event(suspect_for(event['fingerprint_hash']), event)
+
+    for row in (
+        SuspiciousActivity.objects.filter(case_id=case_id)
+        .exclude(fingerprint_hash='')
+        .values('fingerprint_hash')
+        .annotate(
+            total=Count('id'),
+            honeypot=Count('id', filter=Q(activity_type='honeypot_triggered')),
+            max_severity=Max('severity_level'),
+        )
+        .order_by()
+    ):
+        suspect = suspect_for(row['fingerprint_hash'])
+        suspect.activity_count = row['total']
+        suspect.honeypot_activities = row['honeypot']
+        suspect.max_severity = row['max_severity'] or 0
+
+    for suspect in suspects.values():
+        score_suspect(suspect)
+
+    with transaction.atomic():
+        CaseSuspect.objects.filter(case_id=case_id).delete()
+        CaseSuspect.objects.bulk_create(suspects.values(), batch_size=chunk_size)
+    return len(suspects)
+
+
+# ============================================
+# READ
+# ============================================
+
+# seen at least once: a tracked event, or a honeypot hit (whose event may not
+# have reached the table yet)
+_SEEN = Q(visit_count__gt=0) | Q(honeypot_activities__gt=0)
+
+
+def top_suspects(case, limit=TOP_SUSPECTS):
+    """Highest-scoring visitors of the case (seen at least once), best first."""
+    suspects = list(
+        CaseSuspect.objects.filter(_SEEN, case=case, score__gte=MIN_SUSPECT_SCORE)
+        .order_by('-score')[:limit]
+    )
+    # honeypot hits first among equal scores
+    suspects.sort(key=lambda s: (s.score, s.honeypot_events + s.honeypot_activities > 0), reverse=True)
+    return suspects
+
+
+def iter_suspects(case, chunk_size=REBUILD_CHUNK):
+    """
+    Every visitor top_suspects() would rank, in the same order, streamed from
+    the cursor (the full list for exports).
+    """
+    honeypot = ExpressionWrapper(Q(honeypot_events__gt=0) | Q(honeypot_activities__gt=0), output_field=BooleanField())
+    return (
+        CaseSuspect.objects.filter(_SEEN, case=case, score__gte=MIN_SUSPECT_SCORE)
+        .order_by('-score', honeypot.desc())
+        .iterator(chunk_size=chunk_size)
+    )
@@ -1,6 +1,6 @@
 # tracker/tasks.py - Celery tasks for async ML processing
 
-from celery import shared_task, chain, group, chord
+from celery import shared_task, chain, chord
 from celery.result import AsyncResult
 from celery.exceptions import SoftTimeLimitExceeded
 from django.core.mail import send_mail
@@ -22,12 +22,15 @@ from .apps import get_detection_system
 
 logger = logging.getLogger(__name__)
 
+# Events scored per batch_analyze_recent_events run (one vectorized pass)
+BATCH_ANALYSIS_SIZE = 5000
+
 try:
-    from .ml_analyzer import CriminalMLAnalyzer
+    from .ml_analyzer import CriminalMLAnalyzer, get_ml_analyzer
     ML_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"ML packages not installed ({e}). ML analysis tasks will be skipped.")
-    CriminalMLAnalyzer = None
+    CriminalMLAnalyzer = get_ml_analyzer = None
     ML_AVAILABLE = False
 
 
@@ -50,7 +53,7 @@ def analyze_tracking_event(self, event_id: str) -> Dict[str, Any]:
         event = TrackingEvent.objects.get(id=event_id)
         
         # Initialize analyzers
-        ml_analyzer = CriminalMLAnalyzer()
+        ml_analyzer = get_ml_analyzer()
         
         # Extract features
         session_data = {
@@ -135,7 +138,7 @@ def analyze_user_session(self, session_id: str) -> Dict[str, Any]:
         if not events.exists():
             return {'error': 'No events in session'}
         
-        ml_analyzer = CriminalMLAnalyzer()
+        ml_analyzer = get_ml_analyzer()
         
         # Prepare session data
         history = []
@@ -175,7 +178,8 @@ def analyze_user_session(self, session_id: str) -> Dict[str, Any]:
         # Update session with ML results
         session.ml_analysis_results = result
         session.risk_score = escalation.get('escalation_probability', 0)
-        session.save()
+        # only the ML fields: a full save would overwrite the session counters
+        session.save(update_fields=['ml_analysis_results', 'risk_score'])
         
         return result
         
@@ -207,8 +211,7 @@ def analyze_case_patterns(self, case_id: str) -> Dict[str, Any]:
             timestamp__gte=timezone.now() - timedelta(days=7)
         ).order_by('-timestamp')[:1000]
         
-        ml_analyzer = CriminalMLAnalyzer()
-        suspicious_detector = EnhancedSuspiciousDetector()
+        ml_analyzer = get_ml_analyzer()
         
         # Group events by fingerprint
         user_groups = {}
@@ -251,7 +254,8 @@ def analyze_case_patterns(self, case_id: str) -> Dict[str, Any]:
                 if escalation.get('escalation_probability', 0) > 0.7:
                     high_risk_users.append(fingerprint)
         
-        # Check for coordination between users
+        # Check for coordination between users (features are extracted for
+        # all sessions at once with the batch API)
         all_events_data = [{
             'fingerprint_hash': e.fingerprint_hash,
             'timestamp': e.timestamp,
@@ -423,34 +427,80 @@ def batch_analyze_recent_events(self):
         # Get unanalyzed events from last hour
         one_hour_ago = timezone.now() - timedelta(hours=1)
         
-        unanalyzed_events = TrackingEvent.objects.filter(
+        events = list(TrackingEvent.objects.filter(
             timestamp__gte=one_hour_ago,
             ml_analyzed=False
-        ).values_list('id', flat=True)[:100]  # Process 100 at a time
+        ).values(
+            'id', 'timestamp', 'case__created_at', 'page_url', 'time_on_page',
+            'event_data', 'scroll_depth', 'is_vpn', 'is_tor', 'is_proxy',
+            'fingerprint_hash', 'suspicious_score', 'processed',
+        )[:BATCH_ANALYSIS_SIZE])
         
-        if not unanalyzed_events:
+        if not events:
             logger.info("No unanalyzed events found")
             return {'processed': 0}
         
-        # Create group of analysis tasks
-        job = group(
-            analyze_tracking_event.s(str(event_id)) 
-            for event_id in unanalyzed_events
-        )
+        # Same session shape as analyze_tracking_event, scored in one pass
+        sessions = [{
+            'timestamp': e['timestamp'],
+            'case_start_date': e['case__created_at'] or e['timestamp'],
+            'pages': [e['page_url']],
+            'duration': e['time_on_page'] or 0,
+            'clicks': e['event_data'].get('click_count', 0) if isinstance(e['event_data'], dict) else 0,
+            'scroll_depths': [e['scroll_depth']] if e['scroll_depth'] else [0],
+            'is_vpn': e['is_vpn'],
+            'is_tor': e['is_tor'],
+            'is_proxy': e['is_proxy'],
+            'fingerprint_hash': e['fingerprint_hash'],
+        } for e in events]
+        
+        ml_analyzer = get_ml_analyzer()
+        analyses = ml_analyzer.analyze_sessions_batch(sessions)
+        
+        now_iso = timezone.now().isoformat()
+        to_cache = {}
+        alerts = []
+        for event, analysis in zip(events, analyses):
+            event_id = str(event['id'])
+            ml_risk = analysis['criminal_risk_score']
+            result = {
+                'event_id': event_id,
+                'ml_risk_score': ml_risk,
+            }
+            # Detection system score stored at ingest (process_tracked_event);
+            # left out for events that never went through detection
+            if event['processed']:
+                suspicion_score = event['suspicious_score']
+                result['suspicion_score'] = suspicion_score
+                combined_risk = (ml_risk + suspicion_score) / 2
+            else:
+                combined_risk = ml_risk
+            result.update({
+                'combined_risk': combined_risk,
+                'is_anomaly': analysis['is_anomaly'],
+                'threat_level': analysis['threat_level'],
+                'behavioral_profile': analysis['behavioral_profile'],
+                'risk_factors': analysis['risk_factors'],
+                'timestamp': now_iso,
+            })
+            to_cache[f'ml_analysis:{event_id}'] = result
+            if combined_risk >= 6.0:
+                alerts.append((event_id, result))
         
-        # Execute group
-        result = job.apply_async()
+        cache.set_many(to_cache, 3600)  # Cache for 1 hour
         
-        # Mark events as queued for analysis
         TrackingEvent.objects.filter(
-            id__in=unanalyzed_events
+            id__in=[e['id'] for e in events]
         ).update(ml_analyzed=True)
         
-        logger.info(f"Queued {len(unanalyzed_events)} events for ML analysis")
+        for event_id, result in alerts:
+            generate_alert.delay(event_id, result)
+        
+        logger.info(f"Batch ML analysis: {len(events)} events, {len(alerts)} alerts")
         
         return {
-            'processed': len(unanalyzed_events),
-            'job_id': result.id
+            'processed': len(events),
+            'alerts': len(alerts),
         }
         
     except Exception as e:
@@ -541,10 +591,114 @@ def cleanup_old_analyses(self):
         raise
 
 
+@shared_task(
+    bind=True,
+    max_retries=0,
+    soft_time_limit=3 * 3600,
+    time_limit=3 * 3600 + 300,
+    queue='batch'
+)
+def archive_cold_events(self):
+    """
+    Move TrackingEvents older than TRACKING_ARCHIVE_AFTER_DAYS into the
+    Parquet archive (tracker/archive.py) so the hot table stays small.
+    """
+    from .archive import archive_enabled, archive_events
+
+    if not archive_enabled():
+        logger.info("archive_cold_events: archive disabled (TRACKING_ARCHIVE_URI unset or pyarrow missing)")
+        return {'archived': 0}
+    stats = archive_events()
+    logger.info(f"archive_cold_events: {stats}")
+    return stats
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=240,
+    time_limit=300,
+    queue='batch'
+)
+def update_hourly_rollups(self):
+    """
+    Keep the dashboard rollups (CaseHourlyRollup) current.
+    Re-aggregates only the hours since the newest rollup; see tracker.rollups.
+    """
+    from .rollups import update_rollups
+
+    try:
+        result = update_rollups()
+        if result['rows']:
+            logger.info(f"Rollups updated {result['start']} → {result['end']}: {result['rows']} rows")
+        return result
+    except Exception as e:
+        logger.error(f"Error updating hourly rollups: {str(e)}")
+        raise
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=50,
+    time_limit=60,
+    queue='batch'
+)
+def refresh_analytics_metric(self, case_id, name: str, params: Dict = None, lock_token: str = None):
+    """
+    Recompute a stale dashboard metric (stale-while-revalidate); queued by
+    tracker.analytics when a reader is served an expired value, with the
+    token of the refresh lock it took.
+    """
+    from .analytics import get_analytics
+
+    try:
+        get_analytics().refresh(case_id, name, params, lock_token)
+    except Exception as e:
+        logger.warning(f"Error refreshing analytics metric {name} for case {case_id}: {str(e)}")
+
+
+@shared_task(
+    bind=True,
+    soft_time_limit=50,
+    time_limit=60,
+    queue='batch'
+)
+def flush_session_counters(self, max_sessions: int = 1000) -> int:
+    """
+    Write the buffered UserSession counter increments (tracker.session_counters)
+    in one bulk_update. A no-op without Redis, where increments are applied
+    directly with F() expressions.
+    """
+    from .session_counters import flush_session_counters as flush
+
+    try:
+        return flush(max_sessions)
+    except Exception as e:
+        logger.warning(f"Error flushing session counters: {str(e)}")
+        return 0
+
+
 # ============================================================================
 # REPORT GENERATION TASKS
 # ============================================================================
 
+@shared_task(
+    bind=True,
+    max_retries=0,
+    soft_time_limit=3300,
+    time_limit=3600,
+    queue='reports'
+)
+def export_case_data(self, job_id: str, export: Dict, case_slug: str) -> Dict:
+    """
+    Background mode of export_data: stream a (large) case export into
+    default_storage. Progress and the file URL are kept in the job state
+    read by the export_status endpoint.
+    """
+    from .export import ExportRequest, write_export
+
+    return write_export(job_id, ExportRequest(**export), case_slug)
+
+
 @shared_task(
     bind=True,
     soft_time_limit=120,
@@ -636,6 +790,33 @@ def generate_case_report(self, case_id: str, analysis_data: Dict):
 # REAL-TIME PROCESSING TASKS
 # ============================================================================
 
+@shared_task(
+    bind=True,
+    max_retries=3,
+    soft_time_limit=30,
+    time_limit=60,
+    queue='ml_analysis'
+)
+def record_criminal_analysis(self, event_id: str) -> None:
+    """
+    Evaluate every criminal indicator for an event whose score was already
+    pinned at 10.0 and store / record / alert on it; queued by
+    EnhancedSuspiciousDetector.analyze_criminal_behavior.
+    """
+    from .detection.core_detector import EnhancedSuspiciousDetector
+
+    try:
+        event = TrackingEvent.objects.get(id=event_id)
+    except TrackingEvent.DoesNotExist:
+        logger.error(f"Event {event_id} not found")
+        return
+    try:
+        EnhancedSuspiciousDetector().record_criminal_analysis(event)
+    except Exception as e:
+        logger.error(f"Error recording criminal analysis for event {event_id}: {str(e)}")
+        self.retry(countdown=30)
+
+
 @shared_task(
     bind=True,
     max_retries=1,
@@ -690,6 +871,137 @@ def quick_risk_assessment(self, event_id: str) -> float:
         return 0.0
 
 
+@shared_task(
+    bind=True,
+    max_retries=0,
+    soft_time_limit=50,
+    time_limit=60,
+    queue='realtime'
+)
+def drain_tracking_buffer(self, max_records: int = 1000) -> Dict[str, int]:
+    """
+    Drain the write-behind ingest buffer (TRACKING_WRITE_BEHIND).
+
+    Records are grouped by client (IP + user agent) and bulk-inserted through
+    tracker.ingest, then every new event goes through the same detection /
+    alerting pipeline track_event runs inline.
+
+    Only records that were saved, or can never be saved (malformed payloads),
+    are acknowledged.  If a group hits a database error — case / session
+    lookup or the insert itself — that group and every group after it stay in
+    the buffer for the next run, and the task re-raises so the failure shows.
+    """
+    from .ingest_buffer import get_ingest_buffer
+    from .ingest import ingest_batch
+    from .views import process_tracked_event
+
+    buffer = get_ingest_buffer()
+    records, ack = buffer.read(max_records)
+    if not records:
+        ack()
+        return {'drained': 0, 'saved': 0, 'errors': 0}
+
+    groups = {}
+    for index, record in enumerate(records):
+        client = record.get('client') or {}
+        key = (client.get('ip', ''), client.get('user_agent', ''))
+        group_client, payloads, received, indexes = groups.setdefault(key, (client, [], [], []))
+        indexes.append(index)
+        payloads.append(record.get('payload'))
+        try:
+            received.append(datetime.fromisoformat(record['received_at']))
+        except (KeyError, TypeError, ValueError):
+            received.append(None)
+
+    # Resolve every distinct IP in one pass so each group's enrichment is an
+    # in-process cache hit
+    try:
+        from .geo import lookup_geo_many
+        lookup_geo_many([ip for ip, _ua in groups])
+    except Exception as e:
+        logger.debug(f"drain_tracking_buffer: geo prefetch failed: {e}")
+
+    saved = errors = 0
+    pending = []
+    failure = None
+    for client, payloads, received, indexes in groups.values():
+        if failure is not None:
+            pending.extend(indexes)
+            continue
+        client.setdefault('ip', '0.0.0.0')
+        client.setdefault('user_agent', '')
+        try:
+            group_saved, group_errors, _created = ingest_batch(
+                payloads, client, received, process=lambda event: process_tracked_event(event, event.session),
+            )
+        except Exception as e:
+            # Nothing from this group was committed; keep it and the rest for
+            # the next run rather than hammering a database that is down
+            logger.error(f"drain_tracking_buffer: ingest failed, leaving records buffered: {e}")
+            failure = e
+            pending.extend(indexes)
+            continue
+        saved += group_saved
+        errors += group_errors
+
+    ack(pending)
+    if failure is not None:
+        raise failure
+    logger.info(f"drain_tracking_buffer: {len(records)} records, {saved} saved, {errors} errors")
+    return {'drained': len(records), 'saved': saved, 'errors': errors}
+
+
+@shared_task(
+    bind=True,
+    max_retries=2,
+    default_retry_delay=60,
+    soft_time_limit=20,
+    time_limit=30,
+    queue='batch'
+)
+def backfill_geo(self, ip_address: str) -> int:
+    """
+    Resolve an IP the local GeoLite2 DB could not, via the remote ip-api.com
+    endpoint, then cache it and fill in the geo columns of recent events and
+    sessions that were stored without it. Returns the number of events updated.
+    """
+    from .geo import fetch_remote_geo, remember_geo
+
+    try:
+        geo = fetch_remote_geo(ip_address)
+    except Exception as e:
+        logger.debug(f"backfill_geo: remote lookup failed for {ip_address}: {e}")
+        raise self.retry(exc=e)
+
+    if not geo:
+        return 0
+
+    remember_geo(ip_address, geo)
+
+    since = timezone.now() - timedelta(days=1)
+    updated = TrackingEvent.objects.filter(
+        ip_address=ip_address,
+        timestamp__gte=since,
+        ip_country='',
+        ip_latitude__isnull=True,
+    ).update(
+        ip_country=geo['country'],
+        ip_region=geo['region'],
+        ip_city=geo['city'],
+        ip_latitude=geo['lat'],
+        ip_longitude=geo['lon'],
+        ip_postal=geo['postal'],
+        isp=geo['isp'],
+    )
+    UserSession.objects.filter(
+        ip_address=ip_address,
+        created_at__gte=since,
+        ip_country='',
+    ).update(ip_country=geo['country'], ip_city=geo['city'])
+
+    return updated
+
+
 # ============================================================================
 # COORDINATED TASK WORKFLOWS
 # ============================================================================
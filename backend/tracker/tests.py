@@ -1,3 +1,2141 @@
-from django.test import TestCase
+import importlib.util
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cases.models import Case
+
+from .analytics import AnalyticsService, MetricSpec, _cache_key, _lock_key
+from .archive import archive_events, scan_archive
+from .cardinality import get_visitor_cardinality
+from .detection.base.execution_engine import DetectorExecutionEngine
+from .export import ExportRequest, iter_export
+from . import feature_store
+from .feature_store import VisitorFeatures, get_visitor_features, update_visitor_features
+from .history import HistoryProvider
+from .hll import HyperLogLog, merge_sketches
+from .ingest import ingest_batch
+from .ip_reputation import IPReputationIndex
+from .metrics import MAX_SERIES, MetricsRegistry, merge_snapshots, render_prometheus
+from .detection.utils.constants import (
+    EVIDENCE_PAGE_KEYWORDS, PAGE_CATEGORY_RULES, PAGE_COUNTERS, PAGE_TYPE_RULES, VICTIM_PAGE_KEYWORDS,
+)
+from .models import CaseDailyBreakdown, CaseHourlyRollup, CaseSuspect, SuspiciousActivity, TrackingEvent, UserSession
+from .page_classifier import history_category, matches_any, page_category, page_type, url_keywords
+from .presence import get_presence
+from .redis_pool import CircuitBreaker, RedisUnavailable, get_redis, get_redis_service, push_capped
+from .realtime import DeltaPublisher, LiveCounters, case_group
+from .rollups import rebuild_rollups, update_rollups
+from .session_counters import event_deltas, get_session_counters, record_session_event
+from .suspects import iter_suspects, rebuild_suspects, record_suspect_events, top_suspects
+from .views import dashboard_patterns
+
+
+# the visitor sketches live in Redis / a shared cache in production; locmem
+# alone falls back to exact distinct counts (tracker.cardinality)
+@mock.patch('tracker.cardinality._cache_is_shared', return_value=True)
+class DashboardQueryCountTest(TestCase):
+    """
+    The dashboard endpoints must not issue a query per metric, hour or day:
+    their aggregates are compiled by tracker.aggregation.plan_metrics().
+    """
+
+    # /api/tracker/dashboard/<case>/ renders the overview stats and all
+    # eight widgets (it ran ~150 queries before the planner, most of them
+    # one COUNT per hour / severity / priority / risk factor); the rolling
+    # visitor windows read their partial first day exactly
+    OVERVIEW_MAX_QUERIES = 48
+    PATTERNS_MAX_QUERIES = 7
+    # a warm read goes to tracker.analytics' cache: only the case lookup /
+    # auth and serializer queries are left
+    CACHED_OVERVIEW_MAX_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='analyst', email='analyst@example.com', password='x'
+        )
+        cls.case = Case.objects.create(
+            user=cls.user, subdomain='query-count', case_title='Query count',
+            first_name='Jane', last_name='Doe',
+        )
+        now = timezone.now()
+        events = []
+        for i in range(200):
+            events.append(TrackingEvent(
+                case=cls.case,
+                session_identifier=f's{i % 20}',
+                fingerprint_hash=f'fp{i % 40}',
+                event_type='page_view' if i % 3 else 'click',
+                page_url='/timeline' if i % 2 else '/',
+                referrer_url='https://example.com/' if i % 4 == 0 else '',
+                ip_address='10.0.0.1',
+                ip_country='US' if i % 2 else 'CA',
+                ip_region='TX',
+                device_type='mobile' if i % 2 else 'desktop',
+                timestamp=now - timedelta(hours=i % 150),
+                is_suspicious=i % 10 == 0,
+                is_unusual_hour=i % 7 == 0,
+            ))
+        TrackingEvent.objects.bulk_create(events)
+        for i in range(5):
+            SuspiciousActivity.objects.create(
+                case=cls.case, fingerprint_hash=f'fp{i}', activity_type='rapid_visits',
+                severity_level=i + 1, ip_address='10.0.0.1',
+            )
+        rebuild_rollups(now - timedelta(days=8), now + timedelta(hours=1))
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueriesAtMost(self, queries, limit):
+        # the per-widget savepoints are not data queries
+        sql = [
+            q['sql'] for q in queries.captured_queries
+            if not q['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))
+        ]
+        self.assertLessEqual(len(sql), limit, '\n'.join(sql))
+
+    def test_dashboard_overview_query_count(self, _shared):
+        self.assertTrue(CaseHourlyRollup.objects.filter(case=self.case).exists())
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                reverse('tracker:dashboard_overview', args=[self.case.subdomain]),
+                {'refresh': '1'}, secure=True,
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(response.json()['_widget_errors'])
+        self.assertQueriesAtMost(queries, self.OVERVIEW_MAX_QUERIES)
+
+        stats = response.json()['stats']
+        self.assertEqual(stats['total_events'], 200)
+        self.assertEqual(stats['suspicious_users_total'], 5)
+        self.assertEqual(stats['high_risk_users'], 2)
+        self.assertEqual(len(stats['visitor_trend']['daily_counts']), 7)
+        timeline = response.json()['widgets']['activity_timeline']['hourly_breakdown']
+        self.assertEqual(len(timeline), 24)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = client.get(
+                reverse('tracker:dashboard_overview', args=[self.case.subdomain]), secure=True,
+            )
+        self.assertEqual(cached.status_code, 200, cached.content)
+        self.assertEqual(cached.json()['stats']['total_events'], 200)
+        self.assertQueriesAtMost(queries, self.CACHED_OVERVIEW_MAX_QUERIES)
+
+    def test_dashboard_patterns_query_count(self, _shared):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as queries:
+            response = dashboard_patterns(request, str(self.case.id))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertQueriesAtMost(queries, self.PATTERNS_MAX_QUERIES)
+
+        temporal = json.loads(response.content)['patterns']['temporal']
+        self.assertEqual(len(temporal['peak_hours']), 24)
+        self.assertEqual(sum(h['count'] for h in temporal['peak_hours']), 200)
+        self.assertEqual(sum(d['count'] for d in temporal['day_of_week']), 200)
+
+
+CALLS = []
+
+
+def _counting_metric(case, **params):
+    CALLS.append(params)
+    return len(CALLS)
+
+
+class AnalyticsServiceTest(TestCase):
+    """Registry reads through the cache: fresh hits, stale-while-revalidate, errors."""
+
+    def setUp(self):
+        cache.clear()
+        CALLS.clear()
+        self.case = mock.Mock(pk=42)
+        self.service = AnalyticsService({
+            'counter': MetricSpec('tracker.tests._counting_metric', ttl=60, stale=60),
+            'broken': MetricSpec('tracker.tests._no_such_metric', ttl=60),
+        })
+
+    def test_fresh_value_is_computed_once(self):
+        self.assertEqual(self.service.get(self.case, 'counter'), 1)
+        self.assertEqual(self.service.get(self.case, 'counter'), 1)
+        self.assertEqual(self.service.get(self.case, 'counter', days=7), 2)
+        self.assertEqual(CALLS, [{}, {'days': 7}])
+
+    def test_stale_value_is_served_while_refreshed(self):
+        self.service.get(self.case, 'counter')
+        key = _cache_key(42, 'counter', {})
+        entry = cache.get(key)
+        entry['fresh_until'] = time.time() - 1
+        cache.set(key, entry)
+
+        with mock.patch('tracker.tasks.refresh_analytics_metric.delay') as delay:
+            self.assertEqual(self.service.get(self.case, 'counter'), 1)
+            self.assertEqual(self.service.get(self.case, 'counter'), 1)
+        # single flight: the second stale read finds the refresh lock taken
+        delay.assert_called_once()
+        case_id, name, params, token = delay.call_args.args
+        self.assertEqual((case_id, name, params), (42, 'counter', {}))
+        self.assertEqual(cache.get(_lock_key(key)), token)
+
+    def test_refresh_releases_only_its_own_lock(self):
+        key = _cache_key(42, 'counter', {})
+        # the first refresh outlived LOCK_TTL and a second worker took the lock
+        cache.set(_lock_key(key), 'second-worker')
+        with mock.patch('cases.models.Case.objects.get', return_value=self.case):
+            self.service.refresh(42, 'counter', token='first-worker')
+        self.assertEqual(cache.get(_lock_key(key)), 'second-worker')
+
+        with mock.patch('cases.models.Case.objects.get', return_value=self.case):
+            self.service.refresh(42, 'counter', token='second-worker')
+        self.assertIsNone(cache.get(_lock_key(key)))
+
+    def test_fill_keeps_a_lock_taken_after_expiry(self):
+        key = _cache_key(42, 'counter', {})
+
+        def slow_compute(case, name, params=None):
+            # our lock expires mid-compute and another worker claims it
+            cache.set(_lock_key(key), 'other-worker')
+            return 7
+
+        with mock.patch.object(self.service, 'compute', side_effect=slow_compute):
+            self.assertEqual(self.service.get(self.case, 'counter'), 7)
+        self.assertEqual(cache.get(_lock_key(key)), 'other-worker')
+
+    def test_errors_are_collected_per_metric(self):
+        errors = {}
+        values = self.service.get_many(self.case, ['counter', 'broken'], errors=errors)
+        self.assertEqual(values, {'counter': 1})
+        self.assertIn('broken', errors)
+
+
+class SuspectRankingTest(TestCase):
+    """The incrementally maintained suspect table matches a full rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='investigator', email='investigator@example.com', password='x'
+        )
+        cls.case = Case.objects.create(
+            user=cls.user, subdomain='suspects', case_title='Suspects',
+            first_name='Jane', last_name='Doe',
+        )
+
+    def _events(self, now):
+        events = []
+        for i in range(60):
+            events.append(TrackingEvent(
+                case=self.case,
+                session_identifier=f's{i % 6}',
+                fingerprint_hash=f'fp{i % 6}',
+                event_type='honeypot_triggered' if i == 7 else 'page_view',
+                page_url='/',
+                ip_address=f'10.0.0.{i % 4}',
+                ip_country='US',
+                is_vpn=i % 6 == 2,
+                is_tor=i % 12 == 3,
+                is_unusual_hour=i % 5 == 0,
+                timestamp=now - timedelta(minutes=i),
+            ))
+        return TrackingEvent.objects.bulk_create(events)
+
+    def _snapshot(self):
+        return {
+            s.fingerprint_hash: (s.visit_count, s.unique_ips, s.activity_count, s.max_severity,
+                                 s.score, s.risk, s.last_seen, s.latest_ip)
+            for s in CaseSuspect.objects.filter(case=self.case)
+        }
+
+    def test_incremental_updates_match_rebuild(self):
+        now = timezone.now()
+        events = self._events(now)
+        # two ingest batches, newest first, to exercise the ordering rules
+        record_suspect_events(events[:30])
+        record_suspect_events(events[30:])
+        for i in range(3):
+            SuspiciousActivity.objects.create(
+                case=self.case, fingerprint_hash='fp1', activity_type='rapid_visits',
+                severity_level=4, ip_address='10.0.0.1',
+            )
+        incremental = self._snapshot()
+
+        rebuild_suspects(self.case.id)
+        self.assertEqual(incremental, self._snapshot())
+
+        top = CaseSuspect.objects.filter(case=self.case).order_by('-score').first()
+        self.assertEqual(top.fingerprint_hash, 'fp1')
+        self.assertEqual(top.risk, 'critical')
+
+    def test_suspects_endpoint_reads_ranking(self):
+        self._events(timezone.now())
+        rebuild_suspects(self.case.id)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                reverse('tracker:get_suspects', args=[self.case.subdomain]), secure=True,
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertLessEqual(len(queries), 2)
+        suspects = response.json()['suspects']
+        scores = [s['score'] for s in suspects]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertTrue(suspects[0]['honeypot_triggered'])
+
+    def test_honeypot_only_visitor_is_ranked(self):
+        response = self.client.get(
+            reverse('tracker:honeypot_trigger', args=[self.case.subdomain]),
+            {'fp': 'fp-honeypot', 'sid': 's-honeypot'}, secure=True,
+        )
+        self.assertEqual(response.status_code, 404)
+
+        suspect = CaseSuspect.objects.get(case=self.case, fingerprint_hash='fp-honeypot')
+        self.assertEqual((suspect.visit_count, suspect.honeypot_events, suspect.honeypot_activities),
+                         (1, 1, 1))
+        self.assertEqual([s.fingerprint_hash for s in top_suspects(self.case)], ['fp-honeypot'])
+        self.assertEqual([s.fingerprint_hash for s in iter_suspects(self.case)], ['fp-honeypot'])
+
+        incremental = self._snapshot()
+        rebuild_suspects(self.case.id)
+        self.assertEqual(incremental, self._snapshot())
+
+
+class RealtimeFanOutTest(TestCase):
+    """Ingest deltas reach the case group as one coalesced frame."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_frame_feeds_live_counters(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(case_group(7), channel)
+
+        now = timezone.now()
+        publisher = DeltaPublisher(frame_seconds=0)
+        publisher.add_events([
+            TrackingEvent(
+                case_id=7, fingerprint_hash=f'fp{i % 3}', event_type='page_view',
+                page_url='/timeline', is_suspicious=i == 0, is_vpn=i == 1, timestamp=now,
+            )
+            for i in range(10)
+        ])
+        publisher.flush()
+
+        frame = async_to_sync(layer.receive)(channel)
+        self.assertEqual(frame['type'], 'metrics.delta')
+        self.assertEqual(frame['scope'], '7')
+
+        live = LiveCounters(5)
+        live.apply(frame['buckets'])
+        window = live.window(5)
+        self.assertEqual(window['events'], 10)
+        self.assertEqual(window['suspicious'], 1)
+        self.assertEqual(len(window['visitors']), 3)
+        self.assertEqual(len(window['vpn']), 1)
+
+        # a socket connecting later starts from the cached buckets
+        seeded = LiveCounters(5)
+        seeded.seed(7)
+        self.assertEqual(seeded.window(5)['events'], 10)
+
+
+class PresenceTest(TestCase):
+    """Active-now counts come from the presence set, not session rows."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_window_and_trim(self):
+        now = timezone.now()
+        presence = get_presence()
+        presence.touch([
+            TrackingEvent(case_id=3, fingerprint_hash='a', timestamp=now),
+            TrackingEvent(case_id=3, fingerprint_hash='b', timestamp=now - timedelta(minutes=2)),
+            TrackingEvent(case_id=3, fingerprint_hash='c', timestamp=now - timedelta(minutes=30)),
+            TrackingEvent(case_id=4, fingerprint_hash='a', timestamp=now),
+        ])
+        # a later hit moves a visitor forward, an older one never moves it back
+        presence.touch([
+            TrackingEvent(case_id=3, fingerprint_hash='c', timestamp=now),
+            TrackingEvent(case_id=3, fingerprint_hash='a', timestamp=now - timedelta(minutes=40)),
+        ])
+        self.assertEqual(presence.count(3), 3)
+        self.assertEqual(presence.count(3, seconds=60), 2)
+        self.assertEqual(presence.count_many([3, 4, 5]), {3: 3, 4: 1, 5: 0})
+        self.assertEqual(presence.last_seen(3, 'a'), now.timestamp())
+        self.assertIsNone(presence.last_seen(5, 'a'))
+
+
+class SessionCounterTest(TestCase):
+    """Session counters are incremented atomically, never read-modify-written."""
+
+    def setUp(self):
+        self.session = UserSession.objects.create(
+            session_id='counters', fingerprint_hash='fp', ip_address='10.0.0.1',
+        )
+
+    def test_increments_from_stale_instances_are_not_lost(self):
+        stale_a = UserSession.objects.get(pk=self.session.pk)
+        stale_b = UserSession.objects.get(pk=self.session.pk)
+        buffer = get_session_counters()
+        with mock.patch.object(buffer, '_redis', return_value=None):
+            buffer.add(stale_a, event_deltas('form_submit'))
+            buffer.add(stale_b, event_deltas('copy'))
+            buffer.add(stale_a, event_deltas('page_view'))
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.page_views, 3)
+        self.assertEqual(self.session.forms_submitted, 1)
+        self.assertEqual(self.session.copy_events, 1)
+        self.assertEqual(
+            self.session.total_duration,
+            int((self.session.last_activity - self.session.created_at).total_seconds()),
+        )
+
+    def test_last_activity_is_the_event_time(self):
+        created = self.session.created_at
+        events = [TrackingEvent(event_type='page_view', timestamp=created + timedelta(minutes=m)) for m in (30, 10)]
+        with mock.patch.object(get_session_counters(), '_redis', return_value=None):
+            for event in events:         # drained out of order
+                record_session_event(self.session, event)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.last_activity, created + timedelta(minutes=30))
+        self.assertEqual(self.session.page_views, 2)
+
+    def test_buffered_last_activity_keeps_the_newest_event(self):
+        created = self.session.created_at
+        client = _FakeRedis()
+        buffer = get_session_counters()
+        events = [TrackingEvent(event_type='page_view', timestamp=created + timedelta(minutes=m)) for m in (30, 10)]
+        with mock.patch.object(buffer, '_redis', return_value=client):
+            for event in events:         # drained out of order
+                record_session_event(self.session, event)
+            self.assertEqual(buffer.flush(), 1)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.last_activity, created + timedelta(minutes=30))
+        self.assertEqual(self.session.page_views, 2)
+        self.assertEqual(self.session.total_duration, 30 * 60)
+        self.assertFalse(client.zsets.get('session_counters:last_activity'))
+
+    def test_bulk_write_adds_deltas(self):
+        UserSession.objects.filter(pk=self.session.pk).update(page_views=2)
+        seen_at = self.session.created_at + timedelta(seconds=50)
+        updated = get_session_counters()._write({
+            str(self.session.pk): ({'page_views': 3, 'copy_events': 1}, seen_at),
+        })
+
+        self.assertEqual(updated, 1)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.page_views, 5)
+        self.assertEqual(self.session.copy_events, 1)
+        self.assertEqual(self.session.last_activity, seen_at)
+        self.assertEqual(self.session.total_duration, 50)
+        self.assertAlmostEqual(self.session.avg_time_per_page, 10.0)
+
+
+class StreamingExportTest(TestCase):
+    """export_data streams every row (no 1000-row cut) in each format."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='exporter', email='exporter@example.com', password='x'
+        )
+        cls.case = Case.objects.create(
+            user=cls.user, subdomain='export', case_title='Export',
+            first_name='Jane', last_name='Doe',
+        )
+        now = timezone.now()
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(
+                case=cls.case, session_identifier='s', fingerprint_hash='fp',
+                event_type='page_view', page_url=f'/p{i}', ip_address='10.0.0.1',
+                timestamp=now - timedelta(seconds=i),
+            )
+            for i in range(1205)
+        ])
+
+    def _export(self, **body):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('tracker:export_data', args=[self.case.subdomain]),
+            data=json.dumps(body), content_type='application/json', secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_is_complete(self):
+        lines = self._export(type='csv').decode().splitlines()
+        self.assertEqual(lines[0], 'Events')
+        self.assertEqual(lines.index('Sessions') - 3, 1205)   # title, header, blank row
+
+    def test_json_and_gzipped_ndjson(self):
+        document = json.loads(self._export(type='json', include_suspicious=False))
+        self.assertEqual(len(document['events']), 1205)
+        self.assertEqual(document['case']['name'], 'Export')
+        self.assertEqual(document['suspicious_activities'], [])
+
+        import gzip
+        lines = gzip.decompress(self._export(type='ndjson', compress='gzip')).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records[0]['section'], 'case')
+        self.assertEqual(sum(r['section'] == 'events' for r in records), 1205)
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+class ArchiveTest(TestCase):
+    """Cold events move to Parquet and stay readable through the archive."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='archivist', email='archivist@example.com', password='x'
+        )
+        cls.case = Case.objects.create(
+            user=cls.user, subdomain='archive', case_title='Archive',
+            first_name='Jane', last_name='Doe',
+        )
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(TRACKING_ARCHIVE_URI=self.root, TRACKING_ARCHIVE_AFTER_DAYS=30)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        now = timezone.now()
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(
+                case=self.case, session_identifier='s', fingerprint_hash=f'fp{i % 3}',
+                event_type='page_view', page_url=f'/p{i}', ip_address='10.0.0.1',
+                event_data={'i': i}, timestamp=now - timedelta(days=40 + i),
+            )
+            for i in range(45)
+        ] + [
+            TrackingEvent(
+                case=self.case, session_identifier='s', fingerprint_hash='fp0',
+                event_type='page_view', page_url='/recent', ip_address='10.0.0.1',
+                timestamp=now - timedelta(days=1),
+            )
+        ])
+
+    def test_archive_and_read_back(self):
+        evidence = TrackingEvent.objects.get(page_url='/p0')
+        activity = SuspiciousActivity.objects.create(
+            case=self.case, fingerprint_hash='fp0', activity_type='honeypot_triggered',
+            severity_level=4, ip_address='10.0.0.1',
+        )
+        activity.related_events.add(evidence)
+
+        stats = archive_events(chunk_size=10, part_rows=20)
+        self.assertEqual(stats['archived'], 44)
+        self.assertEqual(stats['deleted'], 44)
+        # the recent event and the evidence-linked one stay hot
+        self.assertEqual(set(TrackingEvent.objects.values_list('page_url', flat=True)), {'/recent', '/p0'})
+
+        rows = list(scan_archive(case_id=self.case.id, fingerprint_hash='fp1'))
+        self.assertEqual(len(rows), 15)
+        self.assertEqual(rows[0]['event_data'], {'i': int(rows[0]['page_url'][2:])})
+        self.assertEqual(list(scan_archive(case_id=self.case.id + 1)), [])
+
+        export = ExportRequest(case_id=self.case.id, format='ndjson')
+        lines = b''.join(iter_export(export, self.case)).decode().splitlines()
+        self.assertEqual(sum('"section": "events"' in line for line in lines), 46)
+
+        history = HistoryProvider().get('fp1', self.case.id, hours=24 * 365)
+        self.assertEqual(len(history), 15)
+        timestamps = history.column('timestamp')
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_rerun_after_crash_does_not_archive_twice(self):
+        from . import archive
+
+        # crash after the first part file is closed, before its rows are deleted
+        with mock.patch.object(archive, '_delete_archived', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                archive_events(chunk_size=10, part_rows=20)
+        crashed = len(list(scan_archive(case_id=self.case.id)))
+        self.assertGreater(crashed, 0)
+        self.assertEqual(TrackingEvent.objects.count(), 46)
+
+        # both tiers hold the first part's rows: readers count each once
+        export = ExportRequest(case_id=self.case.id, format='ndjson')
+        lines = b''.join(iter_export(export, self.case)).decode().splitlines()
+        self.assertEqual(sum('"section": "events"' in line for line in lines), 46)
+        self.assertEqual(len(HistoryProvider().get('fp1', self.case.id, hours=24 * 365)), 15)
+
+        stats = archive_events(chunk_size=10, part_rows=20)
+        self.assertEqual((stats['archived'], stats['deleted']), (45 - crashed, 45))
+        ids = [row['id'] for row in scan_archive(case_id=self.case.id, columns=['id'])]
+        self.assertEqual(len(ids), 45)
+        self.assertEqual(len(set(ids)), 45)
+        self.assertEqual(TrackingEvent.objects.count(), 1)
+
+    def test_rebuilds_keep_archived_events(self):
+        now = timezone.now()
+        Case.objects.filter(pk=self.case.pk).update(created_at=now - timedelta(days=120))
+        with override_settings(TRACKING_ARCHIVE_URI=''):
+            rebuild_rollups(now - timedelta(days=100), now)
+            rebuild_suspects(self.case.id)
+        self.assertEqual(CaseHourlyRollup.objects.count(), 46)
+        rollups = dict(CaseHourlyRollup.objects.values_list('hour', 'events'))
+        visits = dict(CaseSuspect.objects.values_list('fingerprint_hash', 'visit_count'))
+
+        archive_events()
+        self.assertEqual(TrackingEvent.objects.count(), 1)
+
+        # archived hours are left alone, the hot range is still rebuilt
+        self.assertEqual(rebuild_rollups(now - timedelta(days=100), now), 1)
+        self.assertEqual(dict(CaseHourlyRollup.objects.values_list('hour', 'events')), rollups)
+
+        rebuild_suspects(self.case.id)
+        self.assertEqual(dict(CaseSuspect.objects.values_list('fingerprint_hash', 'visit_count')), visits)
+
+        cache.clear()
+        counter = get_visitor_cardinality()
+        self.assertEqual(counter.count_all(self.case.id), 3)
+        self.assertEqual(counter.count_between(self.case.id, (now - timedelta(days=50)).date(),
+                                               (now - timedelta(days=40)).date()), 3)
+
+
+class _SleepyDetector:
+    def __init__(self, seconds, triggered=False):
+        self.seconds = seconds
+        self.triggered = triggered
+
+    def analyze(self, event, history):
+        time.sleep(self.seconds)
+        return {'triggered': self.triggered, 'history': len(history)}
+
+
+class _AsyncDetector:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.cancelled = False
+
+    async def analyze_async(self, event, history):
+        import asyncio
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {'triggered': True}
+
+
+def _stub_worker_detectors(config):
+    return {'fast': _SleepyDetector(0, triggered=True), 'medium': _SleepyDetector(1, triggered=True),
+            'slow': _SleepyDetector(5)}
+
+
+class DetectorExecutionEngineTest(TestCase):
+    def test_inline_runs_every_detector_and_records_latency(self):
+        engine = DetectorExecutionEngine(default_budget=0.01)
+        results = engine.run(
+            {'quick': _SleepyDetector(0, triggered=True), 'overrun': _SleepyDetector(0.03)},
+            event=None, history=[{}, {}],
+        )
+        self.assertEqual(results['quick'], {'triggered': True, 'history': 2})
+        # inline work cannot be pre-empted: it completes and is counted as over budget
+        self.assertEqual(results['overrun']['history'], 2)
+        stats = engine.stats()
+        self.assertEqual(stats['quick']['ok'], 1)
+        self.assertEqual(stats['overrun']['over_budget'], 1)
+        self.assertEqual(stats['overrun']['latency']['count'], 1)
+        self.assertEqual(stats['overrun']['latency']['buckets']['0.025'], 0)
+        self.assertEqual(stats['overrun']['latency']['buckets']['+Inf'], 1)
+
+    def test_async_budget_cancels_the_coroutine(self):
+        engine = DetectorExecutionEngine(default_mode='async', budgets={'slow': 0.05})
+        try:
+            slow, fast = _AsyncDetector(5), _AsyncDetector(0)
+            started = time.perf_counter()
+            results = engine.run({'slow': slow, 'fast': fast, 'sync': _SleepyDetector(0)}, None, [])
+            self.assertLess(time.perf_counter() - started, 2)
+            self.assertEqual(results['fast'], {'triggered': True})
+            self.assertIn('budget', results['slow']['error'])
+            self.assertEqual(results['sync']['history'], 0)     # no analyze_async: ran inline
+            time.sleep(0.05)
+            self.assertTrue(slow.cancelled)
+            self.assertEqual(engine.stats()['slow']['timeouts'], 1)
+        finally:
+            engine.close()
+
+    def test_process_timeout_replaces_the_pool(self):
+        engine = DetectorExecutionEngine(
+            default_mode='process', budgets={'slow': 0.5}, process_workers=2,
+            worker_factory='tracker.tests._stub_worker_detectors',
+        )
+        try:
+            detectors = _stub_worker_detectors({})
+            results = engine.run({'fast': detectors['fast'], 'slow': detectors['slow']}, None, [])
+            self.assertEqual(results['fast'], {'triggered': True, 'history': 0})
+            self.assertIn('budget', results['slow']['error'])
+            self.assertIsNone(engine._pool)     # retired, rebuilt on next use
+
+            results = engine.run({'fast': detectors['fast']}, None, [])
+            self.assertTrue(results['fast']['triggered'])
+            self.assertEqual(engine.stats()['fast']['ok'], 2)
+        finally:
+            engine.close()
+
+    def test_process_timeout_spares_other_callers_jobs(self):
+        engine = DetectorExecutionEngine(
+            default_mode='process', budgets={'slow': 0.5}, process_workers=2,
+            worker_factory='tracker.tests._stub_worker_detectors',
+        )
+        try:
+            detectors = _stub_worker_detectors({})
+            other = {}
+            caller = threading.Thread(target=lambda: other.update(
+                engine.run({'medium': detectors['medium']}, None, [])
+            ))
+            caller.start()
+            results = engine.run({'slow': detectors['slow']}, None, [])
+            caller.join()
+            self.assertIn('budget', results['slow']['error'])
+            # the other request's job shared the retired pool and still finished
+            self.assertEqual(other['medium'], {'triggered': True, 'history': 0})
+            self.assertEqual(engine.stats()['medium']['ok'], 1)
+        finally:
+            engine.close()
+
+
+class MetricsRegistryTest(TestCase):
+    def test_fixed_memory_statistics(self):
+        from .detection.base.base_detector import MetricsService
+
+        registry = MetricsRegistry()
+        metrics = MetricsService(registry)
+        for i in range(5000):
+            metrics.record_detection('criminal', score=i % 10, severity=i % 6)
+        metrics.record_alert('suspicious_user', 'high')
+        for i in range(MAX_SERIES + 50):
+            registry.record_detection(f'detector-{i}', 1, 1)
+
+        stats = metrics.get_statistics()
+        self.assertEqual(stats['total_detections'], 5000 + MAX_SERIES + 50)
+        self.assertEqual(stats['total_alerts'], 1)
+        self.assertEqual(stats['high_severity_count'], sum(1 for i in range(5000) if i % 6 >= 4))
+        self.assertGreater(stats['detections_per_minute'], 0)
+        self.assertLessEqual(len(registry._series['tracker_detection_score']), MAX_SERIES)
+        self.assertGreater(registry.counter('tracker_detections_total', detector='other'), 0)
+
+    def test_prometheus_text_merges_processes(self):
+        a, b = MetricsRegistry(), MetricsRegistry()
+        a.record_detection('SimpleDetectionSystem', 7.5, 4, seconds=0.02)
+        b.record_detection('SimpleDetectionSystem', 2.0, 1, seconds=0.2)
+        b.record_alert('suspicious_user', 'medium')
+
+        text = render_prometheus(merge_snapshots([a.snapshot(), b.snapshot()]))
+        self.assertIn('# TYPE tracker_detector_latency_seconds histogram', text)
+        self.assertIn('tracker_detector_latency_seconds_bucket{detector="SimpleDetectionSystem",le="0.025"} 1', text)
+        self.assertIn('tracker_detector_latency_seconds_count{detector="SimpleDetectionSystem"} 2', text)
+        self.assertIn('tracker_detection_score_bucket{detector="SimpleDetectionSystem",le="+Inf"} 2', text)
+        self.assertIn('tracker_alerts_total{type="suspicious_user",priority="medium"} 1', text)
+        self.assertIn('tracker_alerts_per_second{window="60s"} ' + str(1 / 60), text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_requires_token(self):
+        url = reverse('tracker:prometheus_metrics')
+        self.assertEqual(self.client.get(url, secure=True).status_code, 401)
+        self.assertEqual(self.client.get(url, secure=True, HTTP_AUTHORIZATION='Bearer secreT').status_code, 401)
+        self.assertEqual(self.client.get(url, secure=True, HTTP_AUTHORIZATION='Bearer sécret').status_code, 401)
+        response = self.client.get(url, secure=True, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE tracker_detections_total counter', response.content.decode())
+
+
+class DetectorGraphGoldenTest(TestCase):
+    """The indicator graph must score exactly like running all 16 checks."""
+
+    PAGES = ('/', '/timeline', '/evidence', '/victim/photos', '/family', '/location/map',
+             '/admin', '/contact', '/witness/statement', '/about')
+    EVENT_TYPES = ('page_view', 'click', 'copy', 'download', 'search', 'page_refresh', 'form_submit_fail')
+
+    @classmethod
+    def setUpTestData(cls):
+        import random
+
+        user = get_user_model().objects.create_user(username='golden', email='g@example.com', password='x')
+        cls.case = Case.objects.create(
+            user=user, subdomain='golden', case_title='Golden', first_name='Jane', last_name='Doe',
+        )
+        rng = random.Random(23)
+        anchor = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+        cls.visitors = []
+        for v in range(40):
+            fp = f'golden{v}'
+            n = rng.choice((0, 1, 3, 8, 25, 60))
+            pages = ('/', '/about') if v % 4 == 3 else cls.PAGES     # plain readers
+            events = [
+                TrackingEvent(
+                    case=cls.case, fingerprint_hash=fp, session_identifier=f'{fp}-{i % 3}',
+                    event_type=rng.choice(cls.EVENT_TYPES), page_url=rng.choice(pages),
+                    event_data={'query': 'home address'} if i % 7 == 0 else {'text': 'call me@example.com'},
+                    referrer_url=rng.choice(('', 'https://facebook.com/x')),
+                    ip_address=f'10.0.{v}.{i % 4}', ip_country=rng.choice(('US', 'US', 'CA', 'MX')),
+                    ip_city=rng.choice(('Austin', 'Austin', 'Toronto')),
+                    browser=rng.choice(('Chrome', 'Firefox')), os='Linux', device_type='desktop',
+                    is_vpn=rng.random() < 0.2, is_proxy=rng.random() < 0.1, is_tor=False,
+                    timestamp=anchor.replace(hour=rng.randrange(24)) - timedelta(minutes=i),
+                )
+                for i in range(n)
+            ]
+            current = TrackingEvent(
+                case=cls.case, fingerprint_hash=fp, session_identifier=f'{fp}-0',
+                event_type=rng.choice(cls.EVENT_TYPES), page_url=rng.choice(pages),
+                event_data={}, referrer_url=rng.choice(('', 'https://instagram.com/')),
+                ip_address=f'10.0.{v}.9', ip_country='US', ip_city='Austin',
+                browser='Chrome', os='Linux', device_type='desktop',
+                is_vpn=rng.random() < 0.3, is_proxy=rng.random() < 0.2, is_tor=v % 5 == 0,
+                scroll_depth=rng.choice((0, 80)), time_on_page=rng.choice((0, 5, 120)),
+                timestamp=anchor.replace(hour=rng.randrange(24)),
+            )
+            TrackingEvent.objects.bulk_create(events + [current])
+            cls.visitors.append(TrackingEvent.objects.get(pk=current.pk))
+
+    def setUp(self):
+        cache.clear()
+        from .detection.core_detector import EnhancedSuspiciousDetector
+        self.detector = EnhancedSuspiciousDetector()
+
+    def _reference_indicators(self, event):
+        """All 16 checks, as analyze_criminal_behavior ran them before the graph."""
+        d = self.detector
+        history = d.get_extended_user_history(event.fingerprint_hash, event.case_id, HistoryProvider())
+        features = get_visitor_features(event.fingerprint_hash, event.case_id, history)
+        return {
+            'tor_usage': d.criminal_detector.check_tor_usage_criminal(event),
+            'evidence_tampering': d.criminal_detector.check_evidence_tampering(event, history, features),
+            'admin_probing': d.criminal_detector.check_admin_probing(event, history, features),
+            'victim_obsession': d.criminal_detector.check_victim_obsession(event, history, features),
+            'stalking_patterns': d.criminal_detector.check_stalking_patterns(event, history, features),
+            'witness_targeting': d.criminal_detector.check_witness_targeting(event, history),
+            'geographic_evasion': d.evasion_detector.check_geographic_evasion(event, history),
+            'identity_manipulation': d.evasion_detector.check_identity_manipulation(event, history),
+            'timeline_obsession': d.temporal_analyzer.check_timeline_obsession(event, history, features),
+            'advanced_evasion': d.evasion_detector.check_advanced_evasion(event, history),
+            'vpn_usage': d.evasion_detector.check_criminal_vpn_usage(event, history),
+            'device_switching': d.evasion_detector.check_device_manipulation(event, history),
+            'unusual_timing': d.temporal_analyzer.check_criminal_timing(event, history),
+            'rapid_visits': d.behavioral_detector.check_obsessive_visits(event, history, features),
+            'proxy_usage': d.evasion_detector.check_proxy_chains(event, history),
+            'behavioral_anomalies': d.behavioral_detector.check_criminal_behavioral_anomalies(event, history),
+        }
+
+    def test_scores_match_full_evaluation(self):
+        settled_early = 0
+        for event in self.visitors:
+            reference = self._reference_indicators(event)
+            expected = self.detector.calculate_criminal_score(reference)
+
+            full = self.detector.evaluate_indicators(event)
+            self.assertEqual(full.indicators, reference, event.fingerprint_hash)
+            self.assertFalse(full.short_circuited)
+
+            result = self.detector.evaluate_indicators(event, short_circuit=True)
+            self.assertEqual(self.detector.calculate_criminal_score(result.indicators), expected,
+                             event.fingerprint_hash)
+            for name, indicator in result.indicators.items():
+                self.assertEqual(indicator, reference[name])
+            if result.short_circuited:
+                settled_early += 1
+                self.assertEqual(expected, 10.0)
+        self.assertGreaterEqual(settled_early, 8)    # every Tor visitor at least
+
+    def test_pinned_score_skips_history_on_the_request_path(self):
+        d = self.detector
+        for event in self.visitors:
+            if not event.is_tor:
+                continue
+            with mock.patch.object(d, 'get_extended_user_history') as history, \
+                    mock.patch.object(d, '_queue_recording') as queue, \
+                    mock.patch.object(d, 'store_criminal_analysis') as store:
+                result = d.evaluate_indicators(event, short_circuit=True)
+                score = d.analyze_criminal_behavior(event)
+            history.assert_not_called()
+            store.assert_not_called()
+            queue.assert_called_once_with(event)
+            self.assertEqual(list(result.indicators), ['tor_usage'])
+            self.assertEqual(len(result.skipped), 15)
+            self.assertEqual(score, 10.0)
+
+    def test_history_is_loaded_once(self):
+        event = self.visitors[1]
+        with mock.patch.object(self.detector, 'get_extended_user_history',
+                               wraps=self.detector.get_extended_user_history) as history:
+            self.detector.evaluate_indicators(event)
+        history.assert_called_once()
+
+    def test_facade_selection_rules(self):
+        from types import SimpleNamespace
+        from .detection.graph import DETECTOR_SELECTION
+
+        def selected(**fields):
+            event = SimpleNamespace(**{'event_type': 'page_view', 'is_tor': False, 'is_vpn': False,
+                                       'time_on_page': None, **fields})
+            event_type = event.event_type.lower()
+            return [rule.detector for rule in DETECTOR_SELECTION if rule.applies(event, event_type)]
+
+        self.assertEqual(selected(), ['criminal', 'evasion'])
+        self.assertEqual(selected(event_type='Site_Search'), ['criminal', 'evasion', 'content'])
+        self.assertEqual(selected(event_type='mouse_move', is_vpn=True),
+                         ['criminal', 'evasion', 'biometric', 'network'])
+        self.assertEqual(selected(event_type='session_start', time_on_page=60), ['criminal', 'evasion', 'session'])
+        self.assertEqual(selected(time_on_page=61), ['criminal', 'evasion', 'behavioral', 'psychological'])
+
+    def _recorded(self, event):
+        """What analyze_criminal_behavior stores / records / alerts on for `event`."""
+        d = self.detector
+        # a pinned score is recorded by a task: run it in place
+        with mock.patch.object(d, 'store_criminal_analysis') as store, \
+                mock.patch.object(d, 'create_criminal_activity_record') as record, \
+                mock.patch.object(d, 'create_law_enforcement_alert') as alert, \
+                mock.patch.object(d, '_queue_recording', side_effect=d.record_criminal_analysis):
+            score = d.analyze_criminal_behavior(event)
+        indicators = store.call_args.args[2]
+        for call in (record, alert):
+            if call.called:
+                self.assertEqual(call.call_args.args[1], indicators)
+        triggered = sorted(k for k, v in indicators.items() if v.get('triggered'))
+        return score, d._determine_criminal_activity_type(indicators), triggered
+
+    def test_recorded_analysis_matches_full_evaluation(self):
+        for event in self.visitors:
+            reference = self._reference_indicators(event)
+            expected = (
+                self.detector.calculate_criminal_score(reference),
+                self.detector._determine_criminal_activity_type(reference),
+                sorted(k for k, v in reference.items() if v.get('triggered')),
+            )
+            self.assertEqual(self._recorded(event), expected, event.fingerprint_hash)
+
+    def test_tor_visitor_tampering_with_evidence(self):
+        now = timezone.now()
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(
+                case=self.case, fingerprint_hash='tor-tamper', event_type='form_modify',
+                page_url='/evidence', event_data={'dom_manipulation_detected': True},
+                ip_address='10.9.9.9', is_tor=True, timestamp=now - timedelta(minutes=i + 1),
+            )
+            for i in range(7)
+        ])
+        event = TrackingEvent.objects.create(
+            case=self.case, fingerprint_hash='tor-tamper', event_type='form_modify',
+            page_url='/evidence', event_data={'dom_manipulation_detected': True},
+            ip_address='10.9.9.9', is_tor=True, timestamp=now,
+        )
+        score, activity_type, triggered = self._recorded(event)
+        self.assertEqual(score, 10.0)
+        self.assertIn('tor_usage', triggered)
+        self.assertIn('evidence_tampering', triggered)
+        self.assertEqual(activity_type, 'evidence_tampering')
+
+    def test_queued_recording_writes_the_full_record(self):
+        from .tasks import record_criminal_analysis
+
+        event = self.visitors[0]            # Tor: pinned by the first check
+        with mock.patch('tracker.tasks.record_criminal_analysis.delay') as delay:
+            self.assertEqual(self.detector.analyze_criminal_behavior(event), 10.0)
+        delay.assert_called_once_with(str(event.id))
+        self.assertFalse(SuspiciousActivity.objects.filter(fingerprint_hash=event.fingerprint_hash).exists())
+
+        record_criminal_analysis.run(str(event.id))
+        activity = SuspiciousActivity.objects.get(fingerprint_hash=event.fingerprint_hash)
+        reference = self._reference_indicators(event)
+        self.assertEqual(sorted(activity.details['criminal_indicators']),
+                         sorted(k for k, v in reference.items() if v.get('triggered')))
+
+
+class RedisPoolTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_redis_service().reset()
+        self.addCleanup(get_redis_service().reset)
+
+    def test_breaker_opens_probes_and_closes(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        self.assertFalse(breaker.available())
+
+        now[0] = 10.0
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.allow())      # the single half-open probe
+        self.assertFalse(breaker.allow())
+        breaker.failure()                     # probe failed: open again
+        self.assertFalse(breaker.allow())
+
+        now[0] = 20.0
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(breaker.allow())
+
+    @override_settings(REDIS_URL='redis://127.0.0.1:1/0', REDIS_BREAKER_FAILURES=2,
+                       REDIS_BREAKER_RESET=60, REDIS_SOCKET_TIMEOUT=0.2)
+    def test_unreachable_redis_fails_fast_to_cache(self):
+        client = get_redis_service().client()
+        self.assertIs(get_redis(), client)
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                client.get('probe')
+        self.assertIsNone(get_redis())
+        with self.assertRaises(RedisUnavailable):
+            client.get('probe')
+
+        push_capped('log:test', {'n': 1}, maxlen=2)
+        push_capped('log:test', {'n': 2}, maxlen=2)
+        push_capped('log:test', {'n': 3}, maxlen=2)
+        self.assertEqual(cache.get('log:test'), [{'n': 3}, {'n': 2}])
+
+    def test_no_redis_url(self):
+        self.assertIsNone(get_redis())
+        push_capped('log:plain', 'a', ttl=60)
+        self.assertEqual(cache.get('log:plain'), ['a'])
+
+
+class PageClassifierTest(TestCase):
+    """The compiled matcher gives the same answers as the substring chains it replaced."""
+
+    URLS = [
+        '', '/', '/index.html', 'https://janedoe.example.org/photos/', '/Timeline?update=1',
+        '/evidence/unreleased/', '/witness-statements', '/news/photo-gallery', '/personal/family',
+        '/missing-person/profile', '/wp-admin/', '/administrator/login', '/multiple/videos',
+        '/tips/submit', '/where-last_seen/map', '/documents/proof', '/press/releases',
+        '/biography/friends', '/IMAGE/Evidence', '/updates/news', '/report-a-sighting',
+        '/investigation/coordinates', '/dashboard/panel', '/about/details', '/HOME',
+    ]
+
+    @staticmethod
+    def _first(rules, url, default):
+        url = url.lower()
+        for category, keywords in rules:
+            if any(kw in url for kw in keywords):
+                return category
+        return default
+
+    def test_matches_substring_chains(self):
+        for url in self.URLS:
+            lowered = url.lower()
+            self.assertEqual(page_category(url), self._first(PAGE_CATEGORY_RULES, url, 'other'), url)
+            expected_type = self._first(PAGE_TYPE_RULES, url, None)
+            if expected_type is None:
+                expected_type = 'home' if lowered.endswith('/') else 'other'
+            self.assertEqual(page_type(url), expected_type if url else 'unknown', url)
+            for keywords in (VICTIM_PAGE_KEYWORDS, EVIDENCE_PAGE_KEYWORDS, *PAGE_COUNTERS.values()):
+                self.assertEqual(matches_any(url, keywords), any(kw in lowered for kw in keywords), url)
+
+    def test_overlapping_keywords(self):
+        self.assertTrue({'photo', 'photos'} <= url_keywords('/PHOTOS'))
+        self.assertTrue({'person', 'personal'} <= url_keywords('/personal'))
+        self.assertTrue({'admin', '/admin', '/administrator'} <= url_keywords('/administrator'))
+
+    def test_category_stored_and_read_from_history(self):
+        user = get_user_model().objects.create_user(username='pages', email='pages@example.com', password='x')
+        case = Case.objects.create(user=user, subdomain='pages', case_title='Pages',
+                                   first_name='Jane', last_name='Doe')
+        now = timezone.now()
+        for minutes, url in enumerate(['/news/photo-gallery', '/timeline', '/witnesses']):
+            TrackingEvent.objects.create(
+                case=case, fingerprint_hash='fp', event_type='page_view', page_url=url,
+                ip_address='10.0.0.1', user_agent='ua', timestamp=now - timedelta(minutes=minutes),
+            )
+        self.assertEqual(
+            list(TrackingEvent.objects.order_by('-timestamp').values_list('page_category', flat=True)),
+            ['photos', 'timeline', 'witnesses'],
+        )
+        # rows saved before the column existed are classified on read
+        TrackingEvent.objects.filter(page_url='/timeline').update(page_category='')
+        cache.clear()
+        history = HistoryProvider().get('fp', case.id)
+        self.assertEqual(history.column('page_category'), ['photos', '', 'witnesses'])
+        self.assertEqual([history_category(h) for h in history], ['photos', 'timeline', 'witnesses'])
+
+
+class IPReputationTest(TestCase):
+    """Verdicts come only from the curated lists in IP_REPUTATION_DIR."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _write(self, filename, lines):
+        with open(f'{self.directory}/{filename}', 'w', encoding='utf-8') as fh:
+            fh.write('\n'.join(lines) + '\n')
+
+    def test_no_lists_flags_nothing(self):
+        index = IPReputationIndex.load(self.directory)
+        for ip in ('104.244.42.1', '91.198.174.192', '174.16.1.1', '185.159.157.1', '23.129.64.1'):
+            self.assertEqual(
+                index.classify(ip),
+                {'is_tor': False, 'is_vpn': False, 'is_proxy': False, 'vpn_provider': None}, ip,
+            )
+
+    def test_classify_from_lists(self):
+        self._write('tor_exit_nodes.txt', ['# exits', '185.220.101.7', '2001:db8::/32'])
+        self._write('vpn_ranges.txt', [
+            '185.159.156.0/22 ProtonVPN', '185.159.157.0/24 ProtonVPN-Secure',
+            'not-an-ip', 'AS9009 M247',
+        ])
+        self._write('proxies.txt', ['203.0.113.0/24'])
+        index = IPReputationIndex.load(self.directory)
+
+        self.assertEqual(index.classify('185.220.101.7'),
+                         {'is_tor': True, 'is_vpn': False, 'is_proxy': False, 'vpn_provider': None})
+        self.assertFalse(index.classify('185.220.101.8')['is_tor'])
+        self.assertTrue(index.classify('2001:db8::1')['is_tor'])
+        # the narrowest range wins
+        self.assertEqual(index.classify('185.159.157.9')['vpn_provider'], 'ProtonVPN-Secure')
+        self.assertEqual(index.classify('185.159.156.9')['vpn_provider'], 'ProtonVPN')
+        self.assertFalse(index.classify('185.160.0.1')['is_vpn'])
+        self.assertTrue(index.classify('203.0.113.250')['is_proxy'])
+        self.assertEqual(index.vpn_asns, {9009: 'M247'})
+        for value in ('', 'unknown', '999.1.1.1'):
+            self.assertFalse(any(v for v in index.classify(value).values()), value)
+
+
+class UserAgentCacheTest(TestCase):
+    """classify_user_agent parses each distinct UA string once per process."""
+
+    CHROME_MAC = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    IPHONE = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+              '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1')
+
+    def setUp(self):
+        from .user_agent import classify_user_agent
+        classify_user_agent.cache_clear()
+        self.addCleanup(classify_user_agent.cache_clear)
+
+    def test_repeated_user_agent_is_parsed_once(self):
+        import user_agents
+        from .user_agent import classify_user_agent
+        with mock.patch.object(user_agents, 'parse', wraps=user_agents.parse) as parse:
+            first = classify_user_agent(self.CHROME_MAC)
+            for _ in range(5):
+                self.assertIs(classify_user_agent(self.CHROME_MAC), first)
+            phone = classify_user_agent(self.IPHONE)
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual((first.browser, first.os, first.device_type), ('Chrome', 'Mac OS X', 'desktop'))
+        self.assertEqual((phone.os, phone.device_type, phone.is_mobile), ('iOS', 'mobile', True))
+
+    def test_cache_stats_report_hits_and_misses(self):
+        from .user_agent import UNKNOWN_UA, classify_user_agent, user_agent_cache_stats
+        for ua in (self.CHROME_MAC, self.CHROME_MAC, self.IPHONE, self.CHROME_MAC):
+            classify_user_agent(ua)
+        self.assertIs(classify_user_agent(''), UNKNOWN_UA)
+        stats = user_agent_cache_stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses']), (3, 2, 3))
+        self.assertEqual(stats['hit_rate'], 0.4)
+
+    def test_detector_utils_keeps_its_keyword_parser(self):
+        from .detection.utils.detector_utils import DetectorUtils
+        self.assertEqual(DetectorUtils.parse_user_agent(self.CHROME_MAC),
+                         {'browser': 'Chrome', 'os': 'macOS', 'device': 'desktop', 'bot': False})
+
+
+class GeoLookupTest(TestCase):
+    """lookup_geo: LRU, one cache round trip per batch, one backfill per unresolved IP."""
+
+    RESOLVED = {'country': 'US', 'region': 'Texas', 'city': 'Austin', 'lat': 30.2, 'lon': -97.7,
+                'postal': '78701', 'isp': ''}
+
+    def setUp(self):
+        from . import geo
+        cache.clear()
+        geo._lru.clear()
+        self.addCleanup(geo._lru.clear)
+
+    def test_hot_ip_is_served_from_the_lru(self):
+        from . import geo
+        with mock.patch.object(geo, '_lookup_local', return_value=self.RESOLVED) as local:
+            self.assertEqual(geo.lookup_geo('8.8.8.8'), self.RESOLVED)
+            with mock.patch.object(geo, 'cache', wraps=cache) as shared:
+                self.assertEqual(geo.lookup_geo('8.8.8.8'), self.RESOLVED)
+        local.assert_called_once()
+        shared.get_many.assert_not_called()
+        self.assertEqual((geo.geo_stats()['hits'], geo.geo_stats()['misses']), (1, 1))
+
+    def test_many_ips_share_one_cache_read(self):
+        from . import geo
+        cache.set(geo._cache_key('1.1.1.1'), self.RESOLVED)
+        with mock.patch.object(geo, '_lookup_local', return_value=self.RESOLVED) as local, \
+                mock.patch.object(geo, 'cache', wraps=cache) as shared:
+            results = geo.lookup_geo_many(['1.1.1.1', '8.8.8.8', '9.9.9.9', '10.0.0.1', '8.8.8.8', ''])
+        self.assertEqual(set(results), {'1.1.1.1', '8.8.8.8', '9.9.9.9', '10.0.0.1'})
+        self.assertEqual(results['10.0.0.1'], geo.empty_geo())        # private: never looked up
+        shared.get_many.assert_called_once()
+        self.assertEqual(sorted(shared.get_many.call_args.args[0]),
+                         [geo._cache_key(ip) for ip in ('1.1.1.1', '8.8.8.8', '9.9.9.9')])
+        self.assertEqual(sorted(call.args[0] for call in local.call_args_list), ['8.8.8.8', '9.9.9.9'])
+        shared.set_many.assert_called_once()
+        self.assertEqual(cache.get(geo._cache_key('9.9.9.9')), self.RESOLVED)
+
+    def test_unresolved_ip_schedules_one_backfill(self):
+        from . import geo
+        with mock.patch.object(geo, '_lookup_local', return_value=None), \
+                mock.patch('tracker.tasks.backfill_geo.apply_async') as backfill, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(geo.lookup_geo('8.8.4.4'), geo.empty_geo())
+            self.assertEqual(geo.lookup_geo('8.8.4.4'), geo.empty_geo())
+            self.assertEqual(geo.lookup_geo_many(['8.8.4.4'])['8.8.4.4'], geo.empty_geo())
+        self.assertEqual(len(callbacks), 1)
+        backfill.assert_called_once()
+        self.assertEqual(backfill.call_args.kwargs['args'], ['8.8.4.4'])
+
+
+class BatchMLAnalysisTest(TestCase):
+    """batch_analyze_recent_events caches what analyze_tracking_event would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='batchml', email='batchml@example.com', password='x')
+        cls.case = Case.objects.create(user=user, subdomain='batchml', case_title='Batch ML',
+                                       first_name='Jane', last_name='Doe')
+        now = timezone.now()
+        pages = ['/victim/photos', '/evidence', '/timeline', '/news', '/']
+        cls.events = [
+            TrackingEvent.objects.create(
+                case=cls.case, fingerprint_hash=f'fp{i}', event_type='page_view',
+                page_url=pages[i % len(pages)], ip_address='10.0.0.1', user_agent='ua',
+                time_on_page=30 * i, scroll_depth=0.1 * i, event_data={'click_count': i},
+                is_vpn=i % 3 == 0, is_tor=i == 4, timestamp=now - timedelta(minutes=i),
+                suspicious_score=i / 10.0, processed=i != 5,
+            )
+            for i in range(8)
+        ]
+
+    def test_batch_matches_per_event_path(self):
+        from . import tasks
+
+        class _StoredScore:
+            def analyze_event(self, event):
+                return {'criminal_score': event.suspicious_score * 10}
+
+        cache.clear()
+        with mock.patch.object(tasks.generate_alert, 'delay'):
+            tasks.batch_analyze_recent_events.run()
+            batch = {str(e.id): cache.get(f'ml_analysis:{e.id}') for e in self.events}
+            with mock.patch.object(tasks, 'get_detection_system', return_value=_StoredScore()):
+                single = {str(e.id): tasks.analyze_tracking_event.run(str(e.id)) for e in self.events}
+
+        self.assertFalse(TrackingEvent.objects.filter(ml_analyzed=False).exists())
+        for event in self.events:
+            got, expected = batch[str(event.id)], single[str(event.id)]
+            if not event.processed:
+                # no detection score stored at ingest: reported as missing
+                self.assertNotIn('suspicion_score', got)
+                self.assertAlmostEqual(got['combined_risk'], got['ml_risk_score'])
+                continue
+            self.assertEqual(set(got), set(expected))
+            for key in ('ml_risk_score', 'suspicion_score', 'combined_risk'):
+                self.assertAlmostEqual(got[key], expected[key], places=6, msg=key)
+            for key in ('is_anomaly', 'threat_level', 'behavioral_profile', 'risk_factors'):
+                self.assertEqual(got[key], expected[key], key)
+
+
+class _FakeRedis:
+    """The hash / set / sorted-set / list subset of redis-py that the tracker buffers use."""
+
+    def __init__(self):
+        self.hashes, self.zsets, self.lists, self.sets = {}, {}, {}, {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def hgetall(self, key):
+        return {f.encode(): str(v).encode() for f, v in self.hashes.get(key, {}).items()}
+
+    def hexists(self, key, field):
+        return field in self.hashes.get(key, {})
+
+    def hincrby(self, key, field, n):
+        h = self.hashes.setdefault(key, {})
+        h[field] = int(h.get(field, 0)) + n
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def zadd(self, key, mapping, lt=False, gt=False):
+        z = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            old = z.get(member)
+            if old is None or (not lt and not gt) or (lt and score < old) or (gt and score > old):
+                z[member] = score
+
+    def zrange(self, key, start, end, withscores=False):
+        items = sorted(self.zsets.get(key, {}).items(), key=lambda kv: kv[1])
+        return [(m.encode(), s) for m, s in items]
+
+    def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop().encode() for _ in range(min(count, len(members)))]
+
+    def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return [str(v).encode() for v in items[start:None if end == -1 else end + 1]]
+
+    def lpushx(self, key, value):
+        if key in self.lists:
+            self.lists[key].insert(0, value)
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def ltrim(self, key, start, end):
+        if key in self.lists:
+            self.lists[key] = self.lists[key][start:end + 1]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.zsets.pop(key, None)
+            self.lists.pop(key, None)
+
+    def expire(self, key, ttl):
+        pass
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class HistoryWindowTest(TestCase):
+    """The cached history window is read through once, then kept current by record_events."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='history', email='history@example.com', password='x')
+        cls.case = Case.objects.create(user=user, subdomain='history', case_title='History',
+                                       first_name='Jane', last_name='Doe')
+
+    def setUp(self):
+        cache.clear()
+
+    def _event(self, minutes_ago, case=None, fingerprint='fp-history'):
+        return TrackingEvent.objects.create(
+            case=case, fingerprint_hash=fingerprint, event_type='page_view',
+            page_url=f'/p{minutes_ago}', ip_address='10.0.0.1',
+            timestamp=timezone.now() - timedelta(minutes=minutes_ago),
+        )
+
+    def _urls(self, case_id, max_events=200):
+        from .history import HistoryProvider
+        return [row['page_url'] for row in HistoryProvider(max_events=max_events).get('fp-history', case_id)]
+
+    def _assert_read_through_and_push(self, client=None):
+        from . import history
+        with mock.patch.object(history, '_redis_client', return_value=client):
+            self._event(30, self.case)
+            with CaptureQueriesContext(connection) as first:
+                self.assertEqual(self._urls(self.case.id), ['/p30'])
+            self.assertEqual(len(first), 1)
+
+            history.record_events([self._event(5, self.case), self._event(10, self.case)])
+            with self.assertNumQueries(0):
+                self.assertEqual(self._urls(str(self.case.id)), ['/p5', '/p10', '/p30'])
+
+    def test_read_through_then_push(self):
+        self._assert_read_through_and_push()
+
+    def test_read_through_then_push_redis(self):
+        self._assert_read_through_and_push(_FakeRedis())
+
+    def test_push_trims_the_window(self):
+        from . import history
+        for client in (None, _FakeRedis()):
+            cache.clear()
+            TrackingEvent.objects.all().delete()
+            with mock.patch.object(history, '_redis_client', return_value=client), \
+                    mock.patch.object(history, 'HISTORY_MAX_EVENTS', 3):
+                for minutes in (50, 40, 30):
+                    self._event(minutes, self.case)
+                self.assertEqual(self._urls(self.case.id, max_events=3), ['/p30', '/p40', '/p50'])
+                history.record_events([self._event(20, self.case), self._event(10, self.case)])
+                with self.assertNumQueries(0):
+                    self.assertEqual(self._urls(self.case.id, max_events=3), ['/p10', '/p20', '/p30'])
+
+    def test_events_without_a_case_share_one_window(self):
+        from . import history
+        for client in (None, _FakeRedis()):
+            cache.clear()
+            TrackingEvent.objects.all().delete()
+            with mock.patch.object(history, '_redis_client', return_value=client):
+                self._event(30, self.case)
+                self.assertEqual(self._urls(None), [])
+                history.record_events([self._event(10)])
+                with self.assertNumQueries(0):
+                    self.assertEqual(self._urls('unknown'), ['/p10'])
+                    self.assertEqual(self._urls(None), ['/p10'])
+
+    def test_empty_window_is_cached(self):
+        from . import history
+        for client in (None, _FakeRedis()):
+            cache.clear()
+            with mock.patch.object(history, '_redis_client', return_value=client):
+                with self.assertNumQueries(1):
+                    self.assertEqual(self._urls(self.case.id), [])
+                with self.assertNumQueries(0):
+                    self.assertEqual(self._urls(self.case.id), [])
+                history.record_events([self._event(1, self.case)])
+                with self.assertNumQueries(0):
+                    self.assertEqual(self._urls(self.case.id), ['/p1'])
+            TrackingEvent.objects.all().delete()
+
+
+class FeatureStoreTest(TestCase):
+    """Records updated event by event equal VisitorFeatures.from_history."""
+
+    COUNTERS = ('events', 'evidence', 'victim', 'timeline', 'refresh', 'evidence_tamper', 'personal_info')
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        pages = ['/victim/photos', '/evidence', '/timeline', '/news', '/personal/info', '/']
+        types = ['page_view', 'page_refresh', 'form_modify', 'download']
+        # the first events are old enough to leave the 48h window once the clock moves
+        offsets = [timedelta(hours=40 - i) for i in range(12)] + [timedelta(minutes=40 - 3 * i) for i in range(12)]
+        self.events = [
+            TrackingEvent(
+                case_id=1, fingerprint_hash='fp-features', page_url=pages[i % len(pages)],
+                event_type=types[i % len(types)], event_data={'dom_manipulation_detected': i % 5 == 0},
+                ip_address=f'10.1.{i % 9}.1' if i % 4 else '', user_agent=f'agent-{i % 3}',
+                browser='Chrome', os='Linux', device_type='desktop' if i % 6 else 'mobile',
+                timestamp=now - offset,
+            )
+            for i, offset in enumerate(offsets)
+        ]
+
+    @staticmethod
+    def _history(events):
+        fields = ('timestamp', 'page_url', 'event_type', 'event_data', 'ip_address',
+                  'user_agent', 'browser', 'os', 'device_type')
+        ordered = sorted(events, key=lambda e: e.timestamp, reverse=True)
+        return [{f: getattr(e, f) for f in fields} for e in ordered]
+
+    def _assert_same(self, got, expected):
+        for name in self.COUNTERS:
+            self.assertEqual(got.count(name), expected.count(name), name)
+            self.assertEqual(got.count(name, hours=6), expected.count(name, hours=6), name)
+        self.assertEqual(dict(got.count_by_hour_of_day()), dict(expected.count_by_hour_of_day()))
+        self.assertEqual(got.recent(1800), expected.recent(1800))
+        for attr in ('last_seen', 'last_ip', 'last_device', 'last_user_agent',
+                     'distinct_ips', 'distinct_user_agents'):
+            self.assertEqual(getattr(got, attr), getattr(expected, attr), attr)
+
+    def _replay(self):
+        """Seed from the first events, then ingest the rest in shuffled batches."""
+        seed, rest = self.events[:6], self.events[6:]
+        get_visitor_features('fp-features', 1, self._history(seed))
+        rest = rest[1::2] + rest[::2]
+        for i in range(0, len(rest), 5):
+            update_visitor_features(rest[i:i + 5])
+        return get_visitor_features('fp-features', 1, history=lambda: self.fail('record missing'))
+
+    def test_cache_updates_match_history(self):
+        self._assert_same(self._replay(), VisitorFeatures.from_history(self._history(self.events)))
+
+    def test_redis_updates_match_history(self):
+        client = _FakeRedis()
+        with mock.patch.object(feature_store, '_redis_client', return_value=client):
+            got = self._replay()
+        self._assert_same(got, VisitorFeatures.from_history(self._history(self.events)))
+        self.assertTrue(any(f.startswith('h:') and ':ip:' in f for f in client.hashes[feature_store._cache_key('fp-features', 1)]))
+
+    def test_slots_and_sketches_leave_the_window(self):
+        client = _FakeRedis()
+        later = timezone.now() + timedelta(hours=20)
+        with mock.patch.object(feature_store, '_redis_client', return_value=client):
+            self._replay()
+            with mock.patch('django.utils.timezone.now', return_value=later):
+                got = get_visitor_features('fp-features', 1)
+                expected = VisitorFeatures.from_history(self._history(self.events))
+        self._assert_same(got, expected)
+        self.assertLess(got.distinct_ips, VisitorFeatures.from_history(self._history(self.events)).distinct_ips)
+        # the expired hour slots (and their sketch bits) were deleted from the hash
+        oldest_hour = int(later.timestamp() // 3600) - feature_store.HISTORY_WINDOW_HOURS
+        fields = client.hashes[feature_store._cache_key('fp-features', 1)]
+        self.assertFalse([f for f in fields if f.startswith('h:') and int(f.split(':')[1]) < oldest_hour])
+
+    def test_update_skips_visitors_without_a_record(self):
+        client = _FakeRedis()
+        with mock.patch.object(feature_store, '_redis_client', return_value=client):
+            update_visitor_features(self.events)
+        self.assertEqual(client.hashes, {})
+        update_visitor_features(self.events)
+        self.assertIsNone(cache.get(feature_store._cache_key('fp-features', 1)))
+
+
+class _FakeStreamRedis:
+    """Redis stream + consumer group commands used by RedisStreamBuffer."""
+
+    def __init__(self):
+        self.entries, self.pending, self.delivered, self.seq = [], {}, 0, 0
+
+    def xadd(self, stream, fields):
+        self.seq += 1
+        self.entries.append((f'{self.seq}-0'.encode(), {k.encode(): v.encode() for k, v in fields.items()}))
+
+    def xgroup_create(self, stream, group, id='0', mkstream=False):
+        pass
+
+    def xautoclaim(self, stream, group, consumer, min_idle_time, start_id='0-0', count=None):
+        claimed = [(i, f) for i, f in self.entries if i in self.pending][:count]
+        return (b'0-0', claimed, [])
+
+    def xreadgroup(self, group, consumer, streams, count=None):
+        new = self.entries[self.delivered:self.delivered + count]
+        self.delivered += len(new)
+        self.pending.update((i, consumer) for i, _f in new)
+        return [(b'tracker:ingest', new)] if new else []
+
+    def xack(self, stream, group, *ids):
+        for i in ids:
+            self.pending.pop(i, None)
+
+    def xdel(self, stream, *ids):
+        self.entries = [(i, f) for i, f in self.entries if i not in ids]
+        self.delivered -= len(ids)
+
+    def xlen(self, stream):
+        return len(self.entries)
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class WriteBehindBufferTest(TestCase):
+    """Buffered events round-trip, survive a crashed drain and fall back inline."""
+
+    RECORDS = [{'payload': {'eventType': 'page_view', 'n': i}, 'client': {}, 'received_at': ''} for i in range(3)]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def _file_buffer(self):
+        from .ingest_buffer import FileLogBuffer
+        buffer = FileLogBuffer(self.root)
+        buffer.SETTLE_SECONDS = 0
+        return buffer
+
+    def _stream_buffer(self):
+        from .ingest_buffer import RedisStreamBuffer
+        return RedisStreamBuffer(_FakeStreamRedis(), 'tracker:ingest', 1000, 0)
+
+    def test_append_read_ack_round_trip(self):
+        for buffer in (self._file_buffer(), self._stream_buffer()):
+            for record in self.RECORDS:
+                buffer.append(record)
+            records, ack = buffer.read(10)
+            self.assertEqual(records, self.RECORDS, buffer)
+            ack()
+            self.assertEqual(buffer.read(10)[0], [], buffer)
+            self.assertEqual(buffer.size(), 0, buffer)
+
+    def test_unacknowledged_records_are_reclaimed(self):
+        for buffer in (self._file_buffer(), self._stream_buffer()):
+            for record in self.RECORDS:
+                buffer.append(record)
+            buffer.read(10)             # drainer dies before ack()
+            if hasattr(buffer, 'STALE_CLAIM_SECONDS'):
+                buffer.STALE_CLAIM_SECONDS = -1
+            records, ack = buffer.read(10)
+            self.assertEqual(records, self.RECORDS, buffer)
+            ack()
+            self.assertEqual(buffer.read(10)[0], [], buffer)
+
+    def test_pending_records_stay_buffered(self):
+        for buffer in (self._file_buffer(), self._stream_buffer()):
+            for record in self.RECORDS:
+                buffer.append(record)
+            records, ack = buffer.read(10)
+            ack([1])
+            if hasattr(buffer, 'STALE_CLAIM_SECONDS'):
+                buffer.STALE_CLAIM_SECONDS = -1
+            self.assertEqual(buffer.read(10)[0], [self.RECORDS[1]], buffer)
+
+    def test_full_stream_refuses_instead_of_trimming(self):
+        from .ingest_buffer import BufferFull, RedisStreamBuffer
+
+        buffer = RedisStreamBuffer(_FakeStreamRedis(), 'tracker:ingest', 2, 0)
+        buffer.append(self.RECORDS[0])
+        buffer.append(self.RECORDS[1])
+        with self.assertRaises(BufferFull):
+            buffer.append(self.RECORDS[2])
+        records, ack = buffer.read(10)
+        self.assertEqual(records, self.RECORDS[:2])
+        ack()
+        buffer.append(self.RECORDS[2])
+        self.assertEqual(buffer.read(10)[0], [self.RECORDS[2]])
+
+    def test_full_buffer_ingests_inline(self):
+        from . import ingest_buffer
+        from .ingest_buffer import RedisStreamBuffer
+
+        payload = {'eventType': 'page_view', 'sessionId': 's-full', 'fingerprint': 'fp-full',
+                   'url': '/', 'caseId': 'global'}
+        with override_settings(TRACKING_WRITE_BEHIND=True), \
+                mock.patch.object(ingest_buffer, '_buffer', RedisStreamBuffer(_FakeStreamRedis(), 's', 1, 0)), \
+                mock.patch('tracker.views.process_tracked_event', return_value=0.0):
+            ingest_buffer._buffer.append(self.RECORDS[0])
+            response = self.client.post(reverse('tracker:track_event'), json.dumps(payload),
+                                        content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TrackingEvent.objects.get().fingerprint_hash, 'fp-full')
+
+    def test_drain_keeps_records_when_insert_fails(self):
+        from django.db import OperationalError
+        from . import ingest_buffer, tasks
+
+        buffer = self._file_buffer()
+        payload = {'eventType': 'page_view', 'sessionId': 's-down', 'fingerprint': 'fp-down', 'caseId': 'global'}
+        buffer_record = {'payload': payload, 'client': {'ip': '10.0.0.9'}, 'received_at': timezone.now().isoformat()}
+        buffer.append(buffer_record)
+        down = OperationalError('server closed the connection unexpectedly')
+        with mock.patch.object(ingest_buffer, '_buffer', buffer), \
+                mock.patch.object(TrackingEvent.objects, 'bulk_create', side_effect=down), \
+                mock.patch.object(TrackingEvent, 'save', side_effect=down):
+            with self.assertRaises(OperationalError):
+                tasks.drain_tracking_buffer.run()
+        self.assertFalse(TrackingEvent.objects.exists())
+
+        with mock.patch.object(ingest_buffer, '_buffer', buffer), \
+                mock.patch('tracker.tasks.quick_risk_assessment.apply_async'):
+            self.assertEqual(tasks.drain_tracking_buffer.run(), {'drained': 1, 'saved': 1, 'errors': 0})
+        self.assertEqual(TrackingEvent.objects.get().fingerprint_hash, 'fp-down')
+
+    def test_drain_saves_and_processes_buffered_events(self):
+        from . import ingest_buffer, tasks
+        from .views import process_tracked_event
+
+        payload = {'eventType': 'page_view', 'sessionId': 's-buffered', 'fingerprint': 'fp-buffered',
+                   'url': '/timeline', 'caseId': 'global'}
+        with override_settings(TRACKING_WRITE_BEHIND=True), \
+                mock.patch.object(ingest_buffer, '_buffer', self._file_buffer()), \
+                mock.patch('tracker.views.process_tracked_event', wraps=process_tracked_event) as process, \
+                mock.patch('tracker.tasks.quick_risk_assessment.apply_async'):
+            response = self.client.post(reverse('tracker:track_event'), json.dumps(payload),
+                                        content_type='application/json', secure=True)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json(), {'status': 'queued', 'sessionId': 's-buffered'})
+            self.assertFalse(TrackingEvent.objects.exists())
+
+            self.assertEqual(tasks.drain_tracking_buffer.run(), {'drained': 1, 'saved': 1, 'errors': 0})
+        event = TrackingEvent.objects.get()
+        self.assertEqual((event.fingerprint_hash, event.page_url), ('fp-buffered', '/timeline'))
+        self.assertTrue(event.processed)
+        process.assert_called_once()
+
+    def test_queued_event_without_session_gets_its_id_up_front(self):
+        from . import ingest_buffer, tasks
+
+        payload = {'eventType': 'page_view', 'fingerprint': 'fp-new', 'url': '/', 'caseId': 'global'}
+        with override_settings(TRACKING_WRITE_BEHIND=True), \
+                mock.patch.object(ingest_buffer, '_buffer', self._file_buffer()), \
+                mock.patch('tracker.views.process_tracked_event', return_value=0.0), \
+                mock.patch('tracker.tasks.quick_risk_assessment.apply_async'):
+            response = self.client.post(reverse('tracker:track_event'), json.dumps(payload),
+                                        content_type='application/json', secure=True)
+            self.assertEqual(response.status_code, 202)
+            session_id = response.json()['sessionId']
+            self.assertTrue(session_id)
+            tasks.drain_tracking_buffer.run()
+        self.assertEqual(TrackingEvent.objects.get().session.session_id, session_id)
+
+    def test_buffer_failure_ingests_inline(self):
+        payload = {'eventType': 'page_view', 'sessionId': 's-inline', 'fingerprint': 'fp-inline',
+                   'url': '/', 'caseId': 'global'}
+        with override_settings(TRACKING_WRITE_BEHIND=True), \
+                mock.patch('tracker.views.buffer_event', side_effect=OSError('disk full')), \
+                mock.patch('tracker.views.process_tracked_event', return_value=0.25) as process:
+            response = self.client.post(reverse('tracker:track_event'), json.dumps(payload),
+                                        content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['status'], body['suspiciousScore']), ('success', 0.25))
+        self.assertEqual(str(TrackingEvent.objects.get().id), body['eventId'])
+        process.assert_called_once()
+
+
+class IngestBatchTest(TestCase):
+    """ingest_batch resolves cases / sessions in bulk and isolates bad rows."""
+
+    CLIENT = {'ip': '10.0.0.7', 'user_agent': 'Mozilla/5.0 (X11; Linux x86_64) Firefox/120.0'}
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='ingest', email='ingest@example.com', password='x')
+        cls.case = Case.objects.create(user=user, subdomain='ingest-case', case_title='Ingest',
+                                       first_name='Jane', last_name='Doe')
+        cls.existing = UserSession.objects.create(
+            session_id='s-existing', case=cls.case, fingerprint_hash='fp-old', ip_address='10.0.0.1',
+            user_agent='old', last_activity=timezone.now() - timedelta(days=1),
+        )
+
+    def _event(self, **fields):
+        return {'eventType': 'page_view', 'url': '/timeline', 'fingerprint': 'fp-a', **fields}
+
+    def test_cases_and_sessions_are_resolved(self):
+        payload = [
+            self._event(caseId=str(self.case.id), sessionId='s-new'),
+            self._event(caseId='ingest-case', sessionId='s-new', fingerprint='fp-b'),
+            self._event(caseId='no-such-case', sessionId='s-existing'),
+            self._event(caseId='global', sessionId='s-global'),
+            'not an event',
+        ]
+        saved, errors, created = ingest_batch(payload, self.CLIENT)
+
+        self.assertEqual((saved, errors), (4, 1))
+        self.assertEqual([e.case_id for e in created], [self.case.id, self.case.id, None, None])
+        self.assertEqual([e.session_identifier for e in created], ['s-new', 's-new', 's-existing', 's-global'])
+        self.assertEqual(TrackingEvent.objects.count(), 4)
+
+        # the first event of a new session supplies its defaults
+        new = UserSession.objects.get(session_id='s-new')
+        self.assertEqual((new.case_id, new.fingerprint_hash, new.ip_address), (self.case.id, 'fp-a', '10.0.0.7'))
+        self.assertEqual(created[0].session_id, new.pk)
+        self.assertEqual(created[1].session_id, new.pk)
+        # existing sessions keep their data and are marked active
+        existing = UserSession.objects.get(pk=self.existing.pk)
+        self.assertEqual(existing.fingerprint_hash, 'fp-old')
+        self.assertGreater(existing.last_activity, timezone.now() - timedelta(minutes=1))
+
+    def test_bad_row_is_retried_alone(self):
+        payload = [
+            self._event(caseId=str(self.case.id), sessionId='s-1'),
+            self._event(caseId=str(self.case.id), sessionId='s-1', screenWidth=10 ** 20),   # overflows the column
+            self._event(caseId=str(self.case.id), sessionId='s-2', url='/evidence'),
+        ]
+        saved, errors, created = ingest_batch(payload, self.CLIENT)
+
+        self.assertEqual((saved, errors), (2, 1))
+        self.assertEqual(sorted(TrackingEvent.objects.values_list('page_url', flat=True)), ['/evidence', '/timeline'])
+        self.assertEqual({e.pk for e in created}, set(TrackingEvent.objects.values_list('pk', flat=True)))
+
+    def test_drained_events_set_last_activity_from_their_timestamps(self):
+        recent = timezone.now() - timedelta(minutes=5)
+        UserSession.objects.filter(pk=self.existing.pk).update(last_activity=recent)
+        old = timezone.now() - timedelta(hours=3)
+        payload = [self._event(sessionId='s-existing'), self._event(sessionId='s-late'),
+                   self._event(sessionId='s-late')]
+        ingest_batch(payload, self.CLIENT, [old, old - timedelta(minutes=1), old])
+
+        # an old drained event does not move an active session back...
+        self.assertEqual(UserSession.objects.get(pk=self.existing.pk).last_activity, recent)
+        # ...and a session it creates was last active at its newest event
+        self.assertEqual(UserSession.objects.get(session_id='s-late').last_activity, old)
+
+
+    def test_middleware_events_run_the_shared_hooks(self):
+        from django.http import HttpResponse
+        from .middleware import TrackingMiddleware
+
+        middleware = TrackingMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get(f'/case/{self.case.subdomain}/')
+        request.tracking_info = {}
+        request.suspicious_indicators = {'tor_usage': True}
+        event = TrackingEvent(case=self.case, fingerprint_hash='fp-mw', event_type='page_view', page_url='/')
+        with mock.patch.object(middleware, 'create_tracking_event', return_value=event), \
+                mock.patch.object(middleware, 'analyze_suspicious_behavior') as analyze, \
+                mock.patch('tracker.middleware.after_events_saved') as hooks:
+            middleware.process_response(request, HttpResponse())
+        events, process = hooks.call_args.args
+        self.assertEqual(events, [event])
+        process(event)
+        analyze.assert_called_once_with(event, {'tor_usage': True})
+
+
+class _FakeHLLRedis:
+    """PFADD / PFCOUNT on exact sets, plus the string commands cardinality uses."""
+
+    def __init__(self):
+        self.sets, self.values = {}, {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def pfadd(self, key, *values):
+        self.sets.setdefault(key, set()).update(values)
+
+    def pfcount(self, *keys):
+        return len(set().union(*(self.sets.get(key, set()) for key in keys)))
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def expire(self, key, seconds):
+        pass
+
+    def delete(self, *keys):
+        for key in keys:
+            self.sets.pop(key, None)
+            self.values.pop(key, None)
+
+
+class VisitorCardinalityTest(TestCase):
+    """Rolling windows count exactly the visitors inside them, whatever the store."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='hll', email='hll@example.com', password='x')
+        cls.case = Case.objects.create(user=user, subdomain='hll', case_title='HLL',
+                                       first_name='Jane', last_name='Doe')
+        midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        cls.since = midnight - timedelta(days=20) + timedelta(hours=12)
+        cls.until = cls.since + timedelta(days=7)
+        visits = {
+            'before': cls.since - timedelta(hours=1),     # same UTC day as `since`, outside
+            'head': cls.since + timedelta(hours=1),
+            'middle': cls.since + timedelta(days=3),
+            'tail': cls.until - timedelta(hours=1),
+            'after': cls.until + timedelta(hours=1),      # same UTC day as `until`, outside
+        }
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(case=cls.case, fingerprint_hash=fp, page_url='/', ip_address='10.0.0.1', timestamp=ts)
+            for fp, ts in visits.items()
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def _counts(self):
+        counter = get_visitor_cardinality()
+        return (counter.count_window(self.case.id, self.since, self.until),
+                counter.count_since(self.case.id, self.since),
+                counter.count_all(self.case.id))
+
+    def test_exact_without_shared_store(self):
+        self.assertEqual(self._counts(), (3, 4, 5))
+
+    def test_cache_sketches(self):
+        with mock.patch('tracker.cardinality._cache_is_shared', return_value=True):
+            self.assertEqual(self._counts(), (3, 4, 5))
+
+    def test_redis_sketches(self):
+        client = _FakeHLLRedis()
+        with mock.patch.object(get_visitor_cardinality(), '_redis', return_value=client):
+            self.assertEqual(self._counts(), (3, 4, 5))
+        self.assertFalse([key for key in client.sets if ':scratch:' in key])
+
+    def test_first_day_is_cached(self):
+        counter = get_visitor_cardinality()
+        counter.count_all(self.case.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counter.count_all(self.case.id), 5)
+        self.assertFalse([q for q in queries.captured_queries if 'MIN(' in q['sql'].upper()])
+
+
+class RollupMaintenanceTest(TestCase):
+    """Incremental update_rollups runs end up where one rebuild_rollups does."""
+
+    FIELDS = ('case_id', 'hour', 'events', 'page_views', 'engagement_events', 'suspicious_events',
+              'unusual_hour_events', 'suspicious_activities', 'time_on_page_total',
+              'time_on_page_samples', 'visitors', 'referrers')
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='rollups', email='rollups@example.com', password='x')
+        cls.cases = [
+            Case.objects.create(user=user, subdomain=f'rollups-{i}', case_title='Rollups',
+                                first_name='Jane', last_name='Doe')
+            for i in range(2)
+        ]
+        cls.now = timezone.now()
+
+    def _add_events(self, start_hours, count):
+        TrackingEvent.objects.bulk_create([
+            TrackingEvent(
+                case=self.cases[i % 2], session_identifier=f's{i % 7}', fingerprint_hash=f'fp{i % 11}',
+                event_type=('page_view', 'click', 'download')[i % 3], page_url='/timeline',
+                referrer_url='https://example.com/' if i % 4 == 0 else '',
+                ip_address='10.0.0.1', ip_country=('US', 'CA', '')[i % 3], ip_region='TX', device_type=('mobile', 'desktop')[i % 2],
+                time_on_page=i % 50, is_suspicious=i % 9 == 0, is_unusual_hour=i % 5 == 0,
+                timestamp=self.now - timedelta(hours=start_hours * (i / count), minutes=i % 60),
+            )
+            for i in range(count)
+        ])
+
+    def _snapshot(self):
+        rows = CaseHourlyRollup.objects.order_by('case_id', 'hour')
+        return [(row, bytes(sketch)) for row, sketch in zip(rows.values_list(*self.FIELDS),
+                                                             rows.values_list('visitor_sketch', flat=True))]
+
+    def _breakdowns(self):
+        rows = CaseDailyBreakdown.objects.order_by('case_id', 'day', 'dimension', 'value')
+        return [values[:-1] + (bytes(values[-1]),) for values in rows.values_list(
+            'case_id', 'day', 'dimension', 'value', 'visitors', 'visitor_sketch')]
+
+    def _update_until_current(self):
+        for _ in range(10):
+            result = update_rollups(self.now)
+            if result['end'] and result['end'] >= (self.now.replace(minute=0, second=0, microsecond=0)).isoformat():
+                return
+        self.fail('update_rollups did not catch up')
+
+    def test_incremental_updates_match_rebuild(self):
+        self._add_events(start_hours=24 * 9, count=400)     # more than one backfill step
+        self._update_until_current()
+
+        self._add_events(start_hours=1, count=30)           # late events in the open hours
+        SuspiciousActivity.objects.create(case=self.cases[0], fingerprint_hash='fp1',
+                                          activity_type='rapid_visits', severity_level=2,
+                                          ip_address='10.0.0.1')
+        update_rollups(self.now + timedelta(minutes=1))
+        incremental, breakdowns = self._snapshot(), self._breakdowns()
+
+        CaseHourlyRollup.objects.all().delete()
+        CaseDailyBreakdown.objects.all().delete()
+        rebuild_rollups(self.now - timedelta(days=10), self.now + timedelta(hours=1))
+        self.assertEqual(incremental, self._snapshot())
+        self.assertEqual(breakdowns, self._breakdowns())
+        self.assertGreater(len(incremental), 100)
+        self.assertGreater(len(breakdowns), 10)
+
+    def test_breakdowns_count_visitors_not_visitor_hours(self):
+        from .views import get_case_summary
+
+        self._add_events(start_hours=24, count=200)
+        self._update_until_current()
+        summary = get_case_summary(self.cases[0])
+        events = TrackingEvent.objects.filter(case=self.cases[0])
+        for key, field in (('geographic_distribution', 'ip_country'), ('device_breakdown', 'device_type')):
+            expected = {
+                value: events.filter(**{field: value}).values('fingerprint_hash').distinct().count()
+                for value in events.values_list(field, flat=True).distinct()
+            }
+            self.assertEqual({row[field]: row['count'] for row in summary[key]}, expected, key)
+
+
+class HyperLogLogTest(unittest.TestCase):
+    def test_estimate_is_within_the_standard_error(self):
+        for n in (0, 10, 1000, 50_000):
+            sketch = HyperLogLog().update(f'visitor-{i}' for i in range(n))
+            self.assertLessEqual(abs(sketch.count() - n), max(1, 0.07 * n), n)   # 3 sigma at p=11
+        self.assertEqual(HyperLogLog().update(['a', 'a', 'a']).count(), 1)
+
+    def test_merge_is_the_union(self):
+        a = HyperLogLog().update(f'v{i}' for i in range(0, 6000))
+        b = HyperLogLog().update(f'v{i}' for i in range(4000, 10_000))
+        union = HyperLogLog().update(f'v{i}' for i in range(10_000))
+
+        self.assertEqual(HyperLogLog.from_bytes(a.to_bytes()).merge(b).to_bytes(), union.to_bytes())
+        parts = [HyperLogLog().update(f'v{i}' for i in range(k, 10_000, 12)).to_bytes() for k in range(12)]
+        self.assertEqual(merge_sketches(parts).to_bytes(), union.to_bytes())          # numpy path
+        self.assertEqual(merge_sketches(parts[:3] + [b'', None]).to_bytes(),
+                         merge_sketches(parts[:3]).to_bytes())                       # pure-Python path
+        self.assertEqual(merge_sketches([]).count(), 0)
+        self.assertLessEqual(abs(union.count() - 10_000), 700)
+
+
+class MLBatchScoringTest(unittest.TestCase):
+    """analyze_sessions_batch gives the per-session scoring results."""
+
+    def test_batch_matches_per_session_path(self):
+        from .management.commands.bench_ml_batch import synthetic_sessions
+        from .ml_analyzer import CriminalMLAnalyzer
+
+        analyzer = CriminalMLAnalyzer()
+        sessions = synthetic_sessions(150, seed=7)
+        batch = analyzer.analyze_sessions_batch(sessions)
+        self.assertEqual(len(batch), len(sessions))
+        for session, got in zip(sessions, batch):
+            features = analyzer.extract_criminal_features(session)
+            anomalies = analyzer.detect_criminal_anomalies(features)
+            prediction = analyzer.predict_criminal_behavior(features)
+            for key in ('is_anomaly', 'criminal_risk_score', 'threat_level', 'recommended_action'):
+                self.assertEqual(got[key], anomalies[key], key)
+            self.assertAlmostEqual(got['anomaly_score'], anomalies['anomaly_score'])
+            for name, value in anomalies['risk_components'].items():
+                self.assertAlmostEqual(got['risk_components'][name], value, places=9, msg=name)
+            for key in ('criminal_probability', 'behavioral_profile', 'risk_factors'):
+                self.assertEqual(got[key], prediction[key], key)
+
+
+@unittest.skipUnless(importlib.util.find_spec('sklearn'), 'scikit-learn not installed')
+class ModelRegistryTest(TestCase):
+    """Published versions load from the MLModel rows and hot-swap without a shared cache."""
+
+    def setUp(self):
+        import numpy as np
+        from sklearn.ensemble import IsolationForest, RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+        from .ml_analyzer import CRIMINAL_FEATURE_NAMES
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        rng = np.random.default_rng(3)
+        X = rng.random((60, len(CRIMINAL_FEATURE_NAMES)))
+        y = (X[:, 0] > 0.5).astype(int)
+        self.feature_names = list(CRIMINAL_FEATURE_NAMES)
+        self.scaler = StandardScaler().fit(X)
+        self.estimators = {
+            'isolation_forest': IsolationForest(n_estimators=10, random_state=0).fit(self.scaler.transform(X)),
+            'random_forest': RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y),
+        }
+
+    def _publish(self, registry):
+        return registry.publish(self.estimators, self.feature_names, scaler=self.scaler)
+
+    def test_get_loads_the_active_version(self):
+        from .ml_registry import ModelRegistry
+        from .models import MLModel
+
+        version = self._publish(ModelRegistry())
+        bundle = ModelRegistry().get()
+        self.assertTrue(bundle.has_anomaly_model)
+        self.assertIsNotNone(bundle.pattern_classifier)
+        self.assertIsNone(bundle.criminal_classifier)
+        self.assertEqual(bundle.versions, {'anomaly_detection': version, 'pattern_recognition': version})
+        self.assertEqual(bundle.feature_names, self.feature_names)
+        self.assertEqual(
+            set(MLModel.objects.filter(is_active=True).values_list('model_type', 'version')),
+            {('anomaly_detection', version), ('pattern_recognition', version)},
+        )
+
+    def test_publishes_in_the_same_second_get_distinct_versions(self):
+        from .ml_registry import ModelRegistry
+        from .models import MLModel
+
+        frozen = timezone.now()
+        with mock.patch('tracker.ml_registry.timezone.now', return_value=frozen):
+            first, second = self._publish(ModelRegistry()), self._publish(ModelRegistry())
+        self.assertNotEqual(first, second)
+        self.assertEqual(
+            set(MLModel.objects.filter(is_active=True).values_list('version', flat=True)), {second},
+        )
+
+    def test_publish_hot_swaps_other_processes(self):
+        from . import ml_registry
+        from .ml_registry import ModelRegistry
+
+        worker = ModelRegistry()
+        first = self._publish(ModelRegistry())
+        self.assertEqual(set(worker.get().versions.values()), {first})
+
+        # Unchanged versions: the periodic check is one query and no reload
+        with mock.patch.object(ml_registry, 'CHECK_INTERVAL', 0), \
+                mock.patch.object(worker, '_load_active', wraps=worker._load_active) as load:
+            worker.get()
+            load.assert_not_called()
+
+            # A publish from another process is picked up from the MLModel rows
+            second = self._publish(ModelRegistry())
+            self.assertEqual(set(worker.get().versions.values()), {second})
+            load.assert_called_once()
+
+    def test_scoring_never_fits_a_model(self):
+        from sklearn.ensemble import (
+            GradientBoostingClassifier, IsolationForest, RandomForestClassifier,
+        )
+        from sklearn.preprocessing import StandardScaler
+        from .management.commands.bench_ml_batch import synthetic_sessions
+        from .ml_analyzer import CriminalMLAnalyzer
+        from .ml_registry import ModelRegistry
+
+        sessions = synthetic_sessions(5, seed=1)
+        for published in (False, True):
+            if published:
+                self._publish(ModelRegistry())
+            analyzer = CriminalMLAnalyzer()
+            analyzer.registry = ModelRegistry()
+            with mock.patch.object(IsolationForest, 'fit', side_effect=AssertionError('fit')), \
+                    mock.patch.object(RandomForestClassifier, 'fit', side_effect=AssertionError('fit')), \
+                    mock.patch.object(GradientBoostingClassifier, 'fit', side_effect=AssertionError('fit')), \
+                    mock.patch.object(StandardScaler, 'fit', side_effect=AssertionError('fit')):
+                features = analyzer.extract_criminal_features(sessions[0])
+                anomalies = analyzer.detect_criminal_anomalies(features)
+                analyzer.predict_criminal_behavior(features)
+                analyzer.analyze_sessions_batch(sessions)
+            # without a published model the rule-based default stands
+            self.assertEqual(anomalies['anomaly_score'] != -0.1, published)
+
+
+class MLLazyImportTest(unittest.TestCase):
+    """Loading the analyzer must not pull scikit-learn or TensorFlow into a worker."""
+
+    SCRIPT = '''
+import sys
+import django
+django.setup()
+from tracker.ml_analyzer import CriminalMLAnalyzer, get_deep_model, get_ml_analyzer
+analyzer = CriminalMLAnalyzer()
+get_ml_analyzer()
+for name in ('anomaly_detector', 'criminal_classifier', 'pattern_classifier', 'standard_scaler', 'deep_model'):
+    getattr(analyzer, name)
+get_deep_model()
+print('heavy:', *sorted({m.split('.')[0] for m in sys.modules} & {'sklearn', 'tensorflow', 'keras'}))
+'''
+
+    def test_analyzer_leaves_sklearn_and_tensorflow_unimported(self):
+        import os
+        import subprocess
+        import sys
+        from django.conf import settings
+
+        # a fresh interpreter: this test process has usually imported sklearn already
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='test_settings', SECRET_KEY='x')
+        result = subprocess.run(
+            [sys.executable, '-c', self.SCRIPT], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], 'heavy:')
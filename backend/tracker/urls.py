@@ -8,6 +8,7 @@ from .views import (
     track_event,
     track_batch,
     tracking_ping,
+    prometheus_metrics,
     report_suspicious,
 
     # Dashboard views (legacy — realtime/suspicious/patterns/export stay in views.py)
@@ -15,6 +16,7 @@ from .views import (
     dashboard_suspicious_users,
     dashboard_patterns,
     export_data,
+    export_status,
 
     # Individual widget endpoints (still served from views.py)
     visitor_metrics_widget,
@@ -59,6 +61,7 @@ urlpatterns = [
     path('track/batch/', track_batch, name='track_batch'),
     path('track/batch', track_batch, name='track_batch_no_slash'),
     path('ping/', tracking_ping, name='tracking_ping'),
+    path('metrics/', prometheus_metrics, name='prometheus_metrics'),
     path('suspicious/report/', report_suspicious, name='report_suspicious'),
     
     # ============================================
@@ -77,6 +80,7 @@ urlpatterns = [
     path('dashboard/<str:case_slug>/suspicious/', dashboard_suspicious_users, name='dashboard_suspicious_users'),
     path('dashboard/<str:case_slug>/patterns/', dashboard_patterns, name='dashboard_patterns'),
     path('dashboard/<str:case_slug>/export/', export_data, name='export_data'),
+    path('dashboard/<str:case_slug>/export/<str:job_id>/', export_status, name='export_status'),
     
     # Individual widget endpoints
     path('dashboard/<str:case_slug>/widgets/visitor-metrics/', 
@@ -0,0 +1,68 @@
+# backend/tracker/user_agent.py
+"""
+Shared, memoized user-agent classification.
+
+user_agents.parse() is regex-heavy and the same UA strings repeat across
+nearly every request, so every tracker call site (ingest enrichment, the
+tracking middleware, the honeypot endpoint and the detectors) goes through
+classify_user_agent(), which is backed by a bounded LRU keyed by the raw UA
+string and returns a small immutable UAInfo record.
+"""
+
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+UA_CACHE_SIZE = getattr(settings, 'USER_AGENT_CACHE_SIZE', 4096)
+
+UAInfo = namedtuple('UAInfo', [
+    'browser', 'browser_version',
+    'os', 'os_version',
+    'device_type',            # mobile | tablet | desktop
+    'device_brand', 'device_model',
+    'is_bot', 'is_mobile', 'is_tablet',
+])
+
+UNKNOWN_UA = UAInfo('', '', '', '', '', '', '', False, False, False)
+
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def classify_user_agent(user_agent_string):
+    """Parse a raw UA string into a UAInfo record (memoized)."""
+    if not user_agent_string:
+        return UNKNOWN_UA
+    try:
+        from user_agents import parse
+        ua = parse(user_agent_string)
+        return UAInfo(
+            browser=ua.browser.family,
+            browser_version=ua.browser.version_string,
+            os=ua.os.family,
+            os_version=ua.os.version_string,
+            device_type='mobile' if ua.is_mobile else 'tablet' if ua.is_tablet else 'desktop',
+            device_brand=ua.device.brand or '',
+            device_model=ua.device.model or '',
+            is_bot=ua.is_bot,
+            is_mobile=ua.is_mobile,
+            is_tablet=ua.is_tablet,
+        )
+    except Exception as e:
+        logger.debug(f"User agent parse failed: {e}")
+        return UNKNOWN_UA
+
+
+def user_agent_cache_stats():
+    """Hit/miss counters for the UA LRU."""
+    info = classify_user_agent.cache_info()
+    total = info.hits + info.misses
+    return {
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': round(info.hits / total, 4) if total else 0.0,
+    }
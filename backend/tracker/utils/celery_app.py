@@ -18,7 +18,7 @@ from .models import (
     TrackingEvent, UserSession, SuspiciousActivity,
     Alert, Case, DeviceFingerprint
 )
-from ..ml_analyzer import CriminalMLAnalyzer
+from ..ml_analyzer import get_ml_analyzer
 from ..suspicious_detector import EnhancedSuspiciousDetector
 
 logger = logging.getLogger(__name__)
@@ -43,7 +43,7 @@ def analyze_tracking_event(self, event_id: str) -> Dict[str, Any]:
         event = TrackingEvent.objects.get(id=event_id)
         
         # Initialize analyzers
-        ml_analyzer = CriminalMLAnalyzer()
+        ml_analyzer = get_ml_analyzer()
         suspicious_detector = EnhancedSuspiciousDetector()
         
         # Extract features
@@ -127,7 +127,7 @@ def analyze_user_session(self, session_id: str) -> Dict[str, Any]:
         if not events.exists():
             return {'error': 'No events in session'}
         
-        ml_analyzer = CriminalMLAnalyzer()
+        ml_analyzer = get_ml_analyzer()
         
         # Prepare session data
         history = []
@@ -199,7 +199,7 @@ def analyze_case_patterns(self, case_id: str) -> Dict[str, Any]:
             timestamp__gte=timezone.now() - timedelta(days=7)
         ).order_by('-timestamp')[:1000]
         
-        ml_analyzer = CriminalMLAnalyzer()
+        ml_analyzer = get_ml_analyzer()
         suspicious_detector = EnhancedSuspiciousDetector()
         
         # Group events by fingerprint
@@ -9,14 +9,12 @@ from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
 from django.db.models import Count, Avg, F, Q, Sum, Max, Min
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
 from datetime import datetime, timedelta
 import json
 import hashlib
+import hmac
+import time
 import uuid
-from user_agents import parse
-import csv
-from io import StringIO
 from .alerts import check_for_criminal_behavior
 # Import Case model from cases app
 from cases.models import Case
@@ -29,7 +27,24 @@ from .models import (
     DeviceFingerprint, 
     Alert
 )
+from django.conf import settings
 from .apps import get_detection_system
+from .ingest import after_events_saved, ingest_batch, build_tracking_event
+from .ingest_buffer import buffer_event
+from .cardinality import get_visitor_cardinality
+from .presence import active_visitors
+from .session_counters import record_session_event
+from .export import ExportRequest, get_export_job, start_export_job, stream_export
+from .geo import lookup_geo
+from .metrics import get_metrics, record_detection, render_metrics
+from .aggregation import Histogram, Metric, Visitors, plan_metrics
+from .rollups import visitor_breakdown
+from .analytics import get_analytics
+from .ip_reputation import get_ip_reputation
+from .user_agent import classify_user_agent, UNKNOWN_UA
+
+# detection threat level -> 1-5 severity for the detection metrics
+THREAT_SEVERITY = {'MINIMAL': 1, 'LOW': 2, 'MEDIUM': 3, 'HIGH': 4, 'CRITICAL': 5}
 
 # ============================================
 # TRACKING ENDPOINTS
@@ -44,7 +59,25 @@ def track_event(request):
     """
     try:
         data = json.loads(request.body)
-        
+
+        # ── Write-behind mode ────────────────────────────────────────────────
+        # Validate, append to the durable buffer and return immediately; the
+        # drain_tracking_buffer task does the insert + detection in batches.
+        if getattr(settings, 'TRACKING_WRITE_BEHIND', False):
+            error = validate_tracking_payload(data)
+            if error:
+                return JsonResponse({'error': error}, status=400)
+            # The session is created by the drainer; assign its id now so the
+            # tracker can send it with its next events
+            if not data.get('sessionId'):
+                data['sessionId'] = str(uuid.uuid4())
+            try:
+                buffer_event(data, extract_client_info(request), timezone.now())
+                return JsonResponse({'status': 'queued', 'sessionId': str(data['sessionId'])}, status=202)
+            except Exception as e:
+                # Buffer unavailable — fall through to the synchronous path
+                logger.warning(f"track_event: write-behind buffer failed, ingesting inline: {e}")
+
         # Get or create case
         case_id = data.get('caseId', 'global')
         case = None
@@ -74,121 +107,15 @@ def track_event(request):
         # Enrich event data with browser/device info
         enriched_data = enrich_event_data(data, client_info, session)
         
-        # Create tracking event - IMPORTANT: Use data.get() for is_tor/is_vpn
-        event = TrackingEvent.objects.create(
-            case=case,
-            session=session,
-            session_identifier=session.session_id if session else '',
-            fingerprint_hash=data.get('fingerprint', ''),
-            event_type=data.get('eventType', 'page_view'),
-            event_data=data.get('eventData', {}),
-            page_url=data.get('url', ''),
-            page_title=data.get('pageTitle', ''),
-            referrer_url=data.get('referrer', ''),
-            
-            # Network info - CRITICAL: Get is_tor/is_vpn from request data, not enriched_data
-            ip_address=client_info['ip'],
-            ip_country=enriched_data.get('country', ''),
-            ip_region=enriched_data.get('region', ''),
-            ip_city=enriched_data.get('city', ''),
-            ip_latitude=enriched_data.get('lat'),
-            ip_longitude=enriched_data.get('lon'),
-            ip_postal=enriched_data.get('postal', ''),
-            isp=enriched_data.get('isp', ''),
-            is_vpn=data.get('is_vpn', False),  # From request data
-            is_proxy=data.get('is_proxy', False),  # From request data
-            is_tor=data.get('is_tor', False),  # From request data
-            
-            # Device info
-            user_agent=client_info['user_agent'],
-            browser=enriched_data.get('browser', ''),
-            browser_version=enriched_data.get('browser_version', ''),
-            os=enriched_data.get('os', ''),
-            os_version=enriched_data.get('os_version', ''),
-            device_type=enriched_data.get('device_type', ''),
-            
-            # Screen info
-            screen_width=data.get('screenWidth'),
-            screen_height=data.get('screenHeight'),
-            viewport_width=data.get('viewport', {}).get('width') if isinstance(data.get('viewport'), dict) else None,
-            viewport_height=data.get('viewport', {}).get('height') if isinstance(data.get('viewport'), dict) else None,
-            
-            # Time info
-            timestamp=timezone.now(),
-            timezone=data.get('timezone', ''),
-            local_timestamp=parse_local_timestamp(data.get('localTime')),
-            is_unusual_hour=data.get('isUnusualHour', False),
-            
-            # Interaction metrics
-            time_on_page=data.get('timeOnPage'),
-            scroll_depth=data.get('scrollDepth'),
-            clicks_count=data.get('clicksCount', 0),
-        )
-        
+        # Create tracking event - is_tor/is_vpn come from request data,
+        # OR-ed with the server-side IP reputation index
+        event = build_tracking_event(data, client_info, enriched_data, case, session)
+        event.save(force_insert=True)
         logger.debug(f"Event created - is_tor: {event.is_tor}, is_vpn: {event.is_vpn}")
-        
-        # Initialize with defaults
-        suspicious_score = 0.0
-        detection_result = {'criminal_score': 0, 'threat_level': 'MINIMAL'}
-        
-        try:
-            # Get and use detection system
-            detection_system = get_detection_system()
-            print(f"DEBUG: Detection system loaded: {detection_system}")
-            
-            if detection_system:
-                detection_result = detection_system.analyze_event(event)
-                print(f"DEBUG: Detection result: {detection_result}")
-                
-                # Convert criminal_score (0-10) to suspicious_score (0-1)
-                suspicious_score = detection_result.get('criminal_score', 0) / 10.0
-                print(f"DEBUG: Suspicious score: {suspicious_score}")
-        except Exception as e:
-            print(f"ERROR: Detection system failed: {e}")
-            import traceback
-            traceback.print_exc()
-            # Fall back to basic scoring
-            suspicious_score = calculate_basic_suspicious_score(event)
-        
-        # Update event with suspicious score
-        event.suspicious_score = suspicious_score
-        event.is_suspicious = suspicious_score > 0.7
-        event.save()
-        
-                # Update event with suspicious score
-        event.suspicious_score = suspicious_score
-        event.is_suspicious = suspicious_score > 0.7
-        event.save()
 
-        # CHECK FOR CRIMINAL BEHAVIOR AND SEND ALERTS
-        if suspicious_score > 0.3:  # Any suspicious activity
-            alerts_sent = check_for_criminal_behavior(event)
-            if alerts_sent:
-                print(f"⚠️ ALERTS SENT: {alerts_sent}")
-
-                
-        # Update session metrics
-        if session:
-            update_session_metrics(session, event)
-        
-        # Check if we need to create an alert
-        if detection_result.get('threat_level') in ['HIGH', 'CRITICAL'] and case:
-            create_suspicious_alert(event, suspicious_score, detection_result)
-
-        # ── Async ML analysis ────────────────────────────────────────────────
-        # Queue deep ML analysis in the background.
-        # quick_risk_assessment runs in the 'realtime' queue (5-sec timeout).
-        # If risk is ≥5, it automatically chains to analyze_tracking_event.
-        # CELERY_ALWAYS_EAGER=True in dev → runs synchronously (safe fallback).
-        try:
-            from .tasks import quick_risk_assessment
-            quick_risk_assessment.apply_async(
-                args=[str(event.id)],
-                queue='realtime',
-                ignore_result=True,
-            )
-        except Exception as _celery_exc:
-            logger.debug(f"Celery dispatch skipped: {_celery_exc}")
+        scores = []
+        after_events_saved([event], lambda saved: scores.append(process_tracked_event(saved, session)))
+        suspicious_score = scores[0] if scores else 0.0
 
         return JsonResponse({
             'status': 'success',
@@ -198,9 +125,7 @@ def track_event(request):
         })
         
     except Exception as e:
-        print(f"ERROR in track_event: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"track_event: request error: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
 
@@ -223,82 +148,8 @@ def track_batch(request):
 
         client_info = extract_client_info(request)
 
-        saved = 0
-        errors = 0
-
-        for event_data in events:
-            try:
-                # Resolve the case
-                case = None
-                case_id = event_data.get('caseId') or event_data.get('case_id', 'global')
-                if case_id and case_id != 'global':
-                    try:
-                        if str(case_id).isdigit():
-                            case = Case.objects.get(id=int(case_id))
-                        else:
-                            case = Case.objects.get(subdomain=case_id)
-                    except Case.DoesNotExist:
-                        pass
-
-                # Get or create session
-                session = get_or_create_session(
-                    event_data.get('sessionId'),
-                    event_data.get('fingerprint', ''),
-                    client_info,
-                    case,
-                )
-
-                enriched = enrich_event_data(event_data, client_info, session)
-
-                TrackingEvent.objects.create(
-                    case=case,
-                    session=session,
-                    session_identifier=session.session_id if session else '',
-                    fingerprint_hash=event_data.get('fingerprint', ''),
-                    event_type=event_data.get('eventType', 'page_view'),
-                    event_data=event_data.get('eventData', {}),
-                    page_url=event_data.get('url', ''),
-                    page_title=event_data.get('pageTitle', ''),
-                    referrer_url=event_data.get('referrer', ''),
-
-                    ip_address=client_info['ip'],
-                    ip_country=enriched.get('country', ''),
-                    ip_region=enriched.get('region', ''),
-                    ip_city=enriched.get('city', ''),
-                    ip_latitude=enriched.get('lat'),
-                    ip_longitude=enriched.get('lon'),
-                    ip_postal=enriched.get('postal', ''),
-                    isp=enriched.get('isp', ''),
-                    is_vpn=event_data.get('is_vpn', False),
-                    is_proxy=event_data.get('is_proxy', False),
-                    is_tor=event_data.get('is_tor', False),
-
-                    user_agent=client_info['user_agent'],
-                    browser=enriched.get('browser', ''),
-                    browser_version=enriched.get('browser_version', ''),
-                    os=enriched.get('os', ''),
-                    os_version=enriched.get('os_version', ''),
-                    device_type=enriched.get('device_type', ''),
-
-                    screen_width=event_data.get('screenWidth'),
-                    screen_height=event_data.get('screenHeight'),
-                    viewport_width=event_data.get('viewport', {}).get('width') if isinstance(event_data.get('viewport'), dict) else None,
-                    viewport_height=event_data.get('viewport', {}).get('height') if isinstance(event_data.get('viewport'), dict) else None,
-
-                    timestamp=timezone.now(),
-                    timezone=event_data.get('timezone', ''),
-                    local_timestamp=parse_local_timestamp(event_data.get('localTime')),
-                    is_unusual_hour=event_data.get('isUnusualHour', False),
-
-                    time_on_page=event_data.get('timeOnPage'),
-                    scroll_depth=event_data.get('scrollDepth'),
-                    clicks_count=event_data.get('clicksCount', 0),
-                )
-                saved += 1
-
-            except Exception as e:
-                logger.warning(f"track_batch: failed to save event: {e}")
-                errors += 1
+        # Cases, sessions and events are resolved/written in bulk — see ingest.py
+        saved, errors, _ = ingest_batch(events, client_info)
 
         return JsonResponse({
             'status': 'success',
@@ -378,6 +229,9 @@ def last_activity(request):
         # Get case_id from query params if provided
         case_id = request.GET.get('case_id')
         
+        # UserSession.last_activity is written by the session-counter flush
+        # (SESSION_COUNTER_FLUSH_INTERVAL) and can lag the newest event, so
+        # the event timestamp wins below unless the session is newer.
         if case_id:
             # Get last activity for specific case
             last_event = TrackingEvent.objects.filter(
@@ -442,88 +296,25 @@ def dashboard_overview(request, case_slug):
     GET /api/dashboard/{case_slug}/
     """
     try:
-        # Try to find case by slug, subdomain, or ID
-        case = None
-        try:
-            case = Case.objects.get(Q(subdomain=case_slug) | Q(id=case_slug))
-        except Case.DoesNotExist:
+        # Try to find case by subdomain or ID
+        case = _lookup_case(case_slug)
+        if case is None:
             return JsonResponse({'error': 'Case not found'}, status=404)
         
-        # Check cache first
-        cache_key = f'dashboard_overview_{case_slug}'
-        cached_data = cache.get(cache_key)
-        if cached_data and not request.GET.get('refresh'):
-            return JsonResponse(cached_data)
-        
-        now = timezone.now()
-        last_24h = now - timedelta(hours=24)
-        last_7d = now - timedelta(days=7)
-        last_30d = now - timedelta(days=30)
-        
-        # Basic stats
-        stats = {
-            'total_visitors': UserSession.objects.filter(case=case).values('fingerprint_hash').distinct().count(),
-            'total_page_views': TrackingEvent.objects.filter(case=case).count(),
-            'suspicious_users': SuspiciousActivity.objects.filter(case=case).values('fingerprint_hash').distinct().count(),
-            'active_alerts': Alert.objects.filter(case=case, resolved=False).count(),
-            
-            # Time-based stats
-            'visitors_24h': UserSession.objects.filter(
-                case=case, created_at__gte=last_24h
-            ).values('fingerprint_hash').distinct().count(),
-            'visitors_7d': UserSession.objects.filter(
-                case=case, created_at__gte=last_7d
-            ).values('fingerprint_hash').distinct().count(),
-            'visitors_30d': UserSession.objects.filter(
-                case=case, created_at__gte=last_30d
-            ).values('fingerprint_hash').distinct().count(),
-            
-            # Suspicious activity
-            'suspicious_24h': SuspiciousActivity.objects.filter(
-                case=case, created_at__gte=last_24h
-            ).count(),
-            'high_risk_users': SuspiciousActivity.objects.filter(
-                case=case, severity_level__gte=4
-            ).values('fingerprint_hash').distinct().count(),
-        }
-        
-        # Get trends
-        stats['visitor_trend'] = get_visitor_trend(case)
-        stats['suspicious_trend'] = get_suspicious_trend(case)
-        
-        # Get geographic distribution
-        stats['geographic_distribution'] = get_geographic_distribution(case)
-        
-        # Get device breakdown
-        stats['device_breakdown'] = get_device_breakdown(case)
-        
-        # Get top referrers
-        stats['top_referrers'] = get_top_referrers(case)
-        
-        # Get peak hours
-        stats['peak_hours'] = get_peak_hours(case)
+        analytics = get_analytics()
+        if request.GET.get('refresh'):
+            analytics.invalidate(case, 'case_summary')
         
-        # Get recent suspicious activities
-        stats['recent_suspicious'] = get_recent_suspicious(case)
-        
-        # Get alerts
-        stats['alerts'] = get_active_alerts(case)
-        
-        response_data = {
+        return JsonResponse({
             'status': 'success',
-            'stats': stats,
+            'stats': analytics.get(case, 'case_summary'),
             'case': {
                 'id': str(case.id),
                 'subdomain': case.subdomain,
-                'victim_name': case.victim_name,
-                'name': case.name
+                'victim_name': case.get_display_name(),
+                'name': case.case_title,
             }
-        }
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, response_data, 300)
-        
-        return JsonResponse(response_data)
+        })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -564,10 +355,7 @@ def dashboard_realtime(request, case_slug):
             })
         
         # Get current active users
-        active_users = UserSession.objects.filter(
-            case=case,
-            last_activity__gte=timezone.now() - timedelta(minutes=5)
-        ).count()
+        active_users = active_visitors(case)
         
         return JsonResponse({
             'status': 'success',
@@ -703,32 +491,28 @@ def dashboard_patterns(request, case_slug):
     GET /api/dashboard/{case_slug}/patterns/
     """
     try:
-        case = Case.objects.get(Q(subdomain=case_slug) | Q(id=case_slug))
+        case = _lookup_case(case_slug)
+        if case is None:
+            return JsonResponse({'error': 'Case not found'}, status=404)
         
         # Placeholder for ML analysis
         patterns = {'clusters': [], 'suspicious_clusters': []}
         
-        # Analyze temporal patterns
-        temporal_patterns = analyze_temporal_patterns(case)
-        
-        # Analyze navigation patterns
-        navigation_patterns = analyze_navigation_patterns(case)
-        
-        # Analyze interaction patterns
-        interaction_patterns = analyze_interaction_patterns(case)
+        # Temporal, navigation and interaction patterns (cached analytics)
+        analyzed = get_analytics().get_many(
+            case, ('temporal_patterns', 'navigation_patterns', 'interaction_patterns')
+        )
         
         return JsonResponse({
             'status': 'success',
             'patterns': {
                 'behavioral_clusters': patterns,
-                'temporal': temporal_patterns,
-                'navigation': navigation_patterns,
-                'interaction': interaction_patterns
+                'temporal': analyzed['temporal_patterns'],
+                'navigation': analyzed['navigation_patterns'],
+                'interaction': analyzed['interaction_patterns']
             }
         })
         
-    except Case.DoesNotExist:
-        return JsonResponse({'error': 'Case not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -737,38 +521,51 @@ def dashboard_patterns(request, case_slug):
 @require_http_methods(["POST"])
 def export_data(request, case_slug):
     """
-    Export case data
+    Export case data (streamed — see export.py)
     POST /api/dashboard/{case_slug}/export/
+
+    Body: type (csv | ndjson | json), include_suspicious, date_from, date_to,
+    compress ('gzip'), background (true to queue a job; unset = queue when the
+    export exceeds EXPORT_BACKGROUND_ROWS).
     """
     try:
-        case = Case.objects.get(Q(subdomain=case_slug) | Q(id=case_slug))
-        data = json.loads(request.body)
-        
-        export_type = data.get('type', 'csv')  # csv, json, pdf
-        include_suspicious = data.get('include_suspicious', True)
-        date_from = data.get('date_from')
-        date_to = data.get('date_to')
-        
-        # Build export data
-        export_data = build_export_data(case, include_suspicious, date_from, date_to)
-        
-        if export_type == 'json':
-            return JsonResponse(export_data)
-        elif export_type == 'csv':
-            # Convert to CSV format
-            csv_data = convert_to_csv(export_data)
-            response = HttpResponse(csv_data, content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="case_{case_slug}_export.csv"'
-            return response
-        else:
-            return JsonResponse({'error': 'Unsupported export type'}, status=400)
-            
-    except Case.DoesNotExist:
-        return JsonResponse({'error': 'Case not found'}, status=404)
+        case = _lookup_case(case_slug)
+        if case is None:
+            return JsonResponse({'error': 'Case not found'}, status=404)
+        data = json.loads(request.body or b'{}')
+
+        try:
+            export = ExportRequest.from_payload(case, data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        background = data.get('background')
+        if background is None:
+            background = export.estimated_rows() > settings.EXPORT_BACKGROUND_ROWS
+        if background:
+            job = start_export_job(export, case_slug)
+            return JsonResponse({'status': 'queued', 'job': job}, status=202)
+
+        return stream_export(export, case, case_slug)
+
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+@require_http_methods(["GET"])
+def export_status(request, case_slug, job_id):
+    """
+    State of a background export job
+    GET /api/dashboard/{case_slug}/export/{job_id}/
+    """
+    case = _lookup_case(case_slug)
+    job = get_export_job(job_id)
+    if case is None or job is None or str(job.get('case_id')) != str(case.pk):
+        return JsonResponse({'error': 'Export not found'}, status=404)
+    return JsonResponse({'status': 'success', 'job': job})
+
+
 # ============================================
 # WIDGET ENDPOINTS
 # ============================================
@@ -778,20 +575,9 @@ def visitor_metrics_widget(request, case_slug):
     """Get visitor metrics widget data"""
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
+        data = get_analytics().get(case, 'visitor_metrics')
         
-        now = timezone.now()
-        last_24h = now - timedelta(hours=24)
-        last_7d = now - timedelta(days=7)
-        
-        metrics = {
-            'total_visitors': UserSession.objects.filter(case=case).values('fingerprint_hash').distinct().count(),
-            'visitors_24h': UserSession.objects.filter(case=case, created_at__gte=last_24h).values('fingerprint_hash').distinct().count(),
-            'visitors_7d': UserSession.objects.filter(case=case, created_at__gte=last_7d).values('fingerprint_hash').distinct().count(),
-            'page_views': TrackingEvent.objects.filter(case=case).count(),
-            'avg_session_duration': UserSession.objects.filter(case=case).aggregate(avg=Avg('total_duration'))['avg'] or 0,
-        }
-        
-        return JsonResponse({'status': 'success', 'data': metrics})
+        return JsonResponse({'status': 'success', 'data': data})
     except Case.DoesNotExist:
         return JsonResponse({'error': 'Case not found'}, status=404)
 
@@ -801,16 +587,7 @@ def suspicious_activity_widget(request, case_slug):
     """Get suspicious activity widget data"""
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
-        
-        activities = SuspiciousActivity.objects.filter(case=case).order_by('-created_at')[:10]
-        
-        data = [{
-            'id': str(a.id),
-            'type': a.activity_type,
-            'severity': a.severity_level,
-            'timestamp': a.created_at.isoformat(),
-            'fingerprint': a.fingerprint_hash[:8] if a.fingerprint_hash else 'Unknown',
-        } for a in activities]
+        data = get_analytics().get(case, 'suspicious_activity')
         
         return JsonResponse({'status': 'success', 'data': data})
     except Case.DoesNotExist:
@@ -822,12 +599,9 @@ def geographic_map_widget(request, case_slug):
     """Get geographic distribution data"""
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
+        data = get_analytics().get(case, 'geographic_map')
         
-        locations = TrackingEvent.objects.filter(case=case).values('ip_country', 'ip_city').annotate(
-            count=Count('id')
-        ).order_by('-count')[:50]
-        
-        return JsonResponse({'status': 'success', 'data': list(locations)})
+        return JsonResponse({'status': 'success', 'data': data})
     except Case.DoesNotExist:
         return JsonResponse({'error': 'Case not found'}, status=404)
 
@@ -838,19 +612,10 @@ def activity_timeline_widget(request, case_slug):
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
         hours = int(request.GET.get('hours', 24))
+        params = {'hours': hours} if hours != 24 else {}
+        data = get_analytics().get(case, 'activity_timeline', **params)
         
-        since = timezone.now() - timedelta(hours=hours)
-        events = TrackingEvent.objects.filter(case=case, timestamp__gte=since).order_by('-timestamp')[:100]
-        
-        timeline = [{
-            'id': str(e.id),
-            'timestamp': e.timestamp.isoformat(),
-            'type': e.event_type,
-            'page': e.page_url,
-            'suspicious': e.is_suspicious,
-        } for e in events]
-        
-        return JsonResponse({'status': 'success', 'data': timeline})
+        return JsonResponse({'status': 'success', 'data': data})
     except Case.DoesNotExist:
         return JsonResponse({'error': 'Case not found'}, status=404)
 
@@ -860,15 +625,9 @@ def engagement_metrics_widget(request, case_slug):
     """Get engagement metrics data"""
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
+        data = get_analytics().get(case, 'engagement_metrics')
         
-        metrics = {
-            'avg_time_on_page': TrackingEvent.objects.filter(case=case).aggregate(avg=Avg('time_on_page'))['avg'] or 0,
-            'avg_scroll_depth': TrackingEvent.objects.filter(case=case).aggregate(avg=Avg('scroll_depth'))['avg'] or 0,
-            'total_clicks': TrackingEvent.objects.filter(case=case).aggregate(sum=Sum('clicks_count'))['sum'] or 0,
-            'bounce_rate': UserSession.objects.filter(case=case, bounce=True).count() / max(UserSession.objects.filter(case=case).count(), 1) * 100,
-        }
-        
-        return JsonResponse({'status': 'success', 'data': metrics})
+        return JsonResponse({'status': 'success', 'data': data})
     except Case.DoesNotExist:
         return JsonResponse({'error': 'Case not found'}, status=404)
 
@@ -878,17 +637,7 @@ def alerts_panel_widget(request, case_slug):
     """Get alerts panel data"""
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
-        
-        alerts = Alert.objects.filter(case=case, resolved=False).order_by('-priority', '-created_at')[:10]
-        
-        data = [{
-            'id': str(a.id),
-            'type': a.alert_type,
-            'priority': a.priority,
-            'title': a.title,
-            'message': a.message,
-            'timestamp': a.created_at.isoformat(),
-        } for a in alerts]
+        data = get_analytics().get(case, 'alerts_panel')
         
         return JsonResponse({'status': 'success', 'data': data})
     except Case.DoesNotExist:
@@ -922,16 +671,7 @@ def realtime_metrics(request, case_slug):
     """Get real-time metrics"""
     try:
         case = Case.objects.get(Q(subdomain=case_slug))
-        
-        now = timezone.now()
-        last_minute = now - timedelta(minutes=1)
-        last_5_minutes = now - timedelta(minutes=5)
-        
-        metrics = {
-            'active_users': UserSession.objects.filter(case=case, last_activity__gte=last_5_minutes).count(),
-            'events_per_minute': TrackingEvent.objects.filter(case=case, timestamp__gte=last_minute).count(),
-            'suspicious_events': TrackingEvent.objects.filter(case=case, timestamp__gte=last_5_minutes, is_suspicious=True).count(),
-        }
+        metrics = get_analytics().get(case, 'realtime_metrics')
         
         return JsonResponse({'status': 'success', 'data': metrics})
     except Case.DoesNotExist:
@@ -1042,6 +782,25 @@ def admin_flag_user(request, fingerprint):
 # DIAGNOSTIC
 # ============================================
 
+@require_http_methods(["GET"])
+def prometheus_metrics(request):
+    """
+    Detection metrics in Prometheus text format
+    GET /api/tracker/metrics/
+    Authorization: Bearer <METRICS_TOKEN>, or a staff session when no token
+    is configured. Aggregates every worker process when METRICS_AGGREGATE is on.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(supplied, f'Bearer {token}'.encode()):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @csrf_exempt
 def tracking_ping(request):
     """
@@ -1116,14 +875,11 @@ def honeypot_trigger(request, case_slug):
         ip = client_info.get('ip', '0.0.0.0')
         user_agent_str = client_info.get('user_agent', '')
 
-        # Parse browser/OS from user-agent
-        try:
-            ua = parse(user_agent_str)
-            browser = ua.browser.family
-            os_name = ua.os.family
-            device = 'mobile' if ua.is_mobile else 'tablet' if ua.is_tablet else 'desktop'
-        except Exception:
-            browser = os_name = device = ''
+        # Parse browser/OS from user-agent (memoized)
+        ua = classify_user_agent(user_agent_str)
+        browser = ua.browser
+        os_name = ua.os
+        device = ua.device_type
 
         # Fingerprint: prefer passed value, fall back to IP+UA hash
         fingerprint_hash = (
@@ -1160,7 +916,7 @@ def honeypot_trigger(request, case_slug):
         )
 
         if case:
-            TrackingEvent.objects.create(
+            event = TrackingEvent.objects.create(
                 case=case,
                 session_identifier=session_identifier,
                 fingerprint_hash=fingerprint_hash,
@@ -1175,6 +931,8 @@ def honeypot_trigger(request, case_slug):
                 device_type=device,
                 flags={'honeypot': True, 'auto_flagged_leo': True},
             )
+            # history, features, visitor sketches, suspect ranking, presence, live frames
+            after_events_saved([event])
 
         logger.warning(
             f"[HONEYPOT] case={case_slug} fp={fingerprint_hash[:12]} ip={ip} ua={user_agent_str[:80]}"
@@ -1235,148 +993,126 @@ def get_or_create_session(session_id, fingerprint, client_info, case):
             }
         )
         
-        if not created:
-            session.last_activity = timezone.now()
-            session.save()
-        
+        # "active now" comes from tracker.presence: no save just to bump
+        # last_activity (update_session_metrics writes it with the counters)
         return session
     except Exception:
         # If session creation fails, return None
         return None
 
 
-def _is_private_ip(ip_str):
-    """Return True if IP is private/loopback — skip geo lookup for these."""
-    try:
-        from ipaddress import ip_address, ip_network
-        addr = ip_address(ip_str)
-        private_ranges = [
-            ip_network('10.0.0.0/8'),
-            ip_network('172.16.0.0/12'),
-            ip_network('192.168.0.0/16'),
-            ip_network('127.0.0.0/8'),
-            ip_network('::1/128'),
-        ]
-        return any(addr in r for r in private_ranges)
-    except Exception:
-        return False
-
-
-def lookup_geo(ip_str):
-    """
-    Return geo dict with keys: country, region, city, lat, lon, postal, isp.
-    Strategy:
-      1. Check cache (keyed by IP, TTL 24h)
-      2. Try local MaxMind GeoLite2-City database (if GEOIP_PATH is set)
-      3. Fall back to ip-api.com free JSON endpoint
-      4. Return empty strings / None on any failure
-    """
-    if not ip_str or _is_private_ip(ip_str):
-        return {'country': '', 'region': '', 'city': '', 'lat': None, 'lon': None, 'postal': '', 'isp': ''}
-
-    cache_key = f'geo:{ip_str}'
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
-
-    result = {'country': '', 'region': '', 'city': '', 'lat': None, 'lon': None, 'postal': '', 'isp': ''}
-
-    # ── Strategy 1: local MaxMind GeoLite2 ──────────────────────────────────
-    from django.conf import settings as _settings
-    geoip_path = getattr(_settings, 'GEOIP_PATH', None)
-    if geoip_path:
-        try:
-            import geoip2.database
-            import os
-            db_path = os.path.join(geoip_path, 'GeoLite2-City.mmdb')
-            if os.path.exists(db_path):
-                with geoip2.database.Reader(db_path) as reader:
-                    r = reader.city(ip_str)
-                    result = {
-                        'country': r.country.iso_code or '',
-                        'region':  r.subdivisions.most_specific.name or '',
-                        'city':    r.city.name or '',
-                        'lat':     r.location.latitude,
-                        'lon':     r.location.longitude,
-                        'postal':  r.postal.code or '',
-                        'isp':     '',  # GeoLite2-City doesn't include ISP (needs ASN DB)
-                    }
-                cache.set(cache_key, result, 86400)
-                return result
-        except Exception as e:
-            logger.debug(f'GeoLite2 lookup failed for {ip_str}: {e}')
-
-    # ── Strategy 2: ip-api.com free endpoint ────────────────────────────────
-    try:
-        import urllib.request
-        url = f'http://ip-api.com/json/{ip_str}?fields=status,countryCode,regionName,city,lat,lon,zip,isp'
-        req = urllib.request.Request(url, headers={'User-Agent': 'CaseClosure/1.0'})
-        with urllib.request.urlopen(req, timeout=2) as resp:
-            import json as _json
-            geo = _json.loads(resp.read().decode())
-            if geo.get('status') == 'success':
-                result = {
-                    'country': geo.get('countryCode', ''),
-                    'region':  geo.get('regionName', ''),
-                    'city':    geo.get('city', ''),
-                    'lat':     geo.get('lat'),
-                    'lon':     geo.get('lon'),
-                    'postal':  geo.get('zip', ''),
-                    'isp':     geo.get('isp', ''),
-                }
-    except Exception as e:
-        logger.debug(f'ip-api.com lookup failed for {ip_str}: {e}')
-
-    cache.set(cache_key, result, 86400)  # cache 24h
-    return result
-
-
 def enrich_event_data(data, client_info, session):
     """Enrich event data with additional information"""
     enriched = {}
     
-    # Parse user agent
+    # Parse user agent (memoized — see user_agent.py)
     if client_info['user_agent']:
-        try:
-            ua = parse(client_info['user_agent'])
-            enriched['browser'] = ua.browser.family
-            enriched['browser_version'] = ua.browser.version_string
-            enriched['os'] = ua.os.family
-            enriched['os_version'] = ua.os.version_string
-            enriched['device_type'] = 'mobile' if ua.is_mobile else 'tablet' if ua.is_tablet else 'desktop'
-            enriched['device_brand'] = ua.device.brand or ''
-            enriched['device_model'] = ua.device.model or ''
-        except:
-            pass
+        ua = classify_user_agent(client_info['user_agent'])
+        if ua is not UNKNOWN_UA:
+            enriched['browser'] = ua.browser
+            enriched['browser_version'] = ua.browser_version
+            enriched['os'] = ua.os
+            enriched['os_version'] = ua.os_version
+            enriched['device_type'] = ua.device_type
+            enriched['device_brand'] = ua.device_brand
+            enriched['device_model'] = ua.device_model
     
-    # GeoIP lookup - try local MaxMind DB first, then free API fallback
+    # GeoIP lookup - in-process LRU / cache / local MaxMind DB (see geo.py)
     enriched.update(lookup_geo(client_info.get('ip', '')))
 
-    # DON'T override is_vpn, is_proxy, is_tor here - those come from request data
+    # Server-side Tor/VPN/proxy verdict from the IP reputation index. These are
+    # OR-ed with (never override) the flags the client sends in request data.
+    reputation = get_ip_reputation().classify(client_info.get('ip', ''))
+    enriched['is_tor'] = reputation['is_tor']
+    enriched['is_vpn'] = reputation['is_vpn']
+    enriched['is_proxy'] = reputation['is_proxy']
 
     return enriched
 
 
 def update_session_metrics(session, event):
-    """Update session metrics based on new event"""
+    """Count the event against its session (coalesced — see session_counters.py)"""
     if not session:
         return
-        
-    session.page_views += 1
-    session.last_activity = timezone.now()
-    
-    if event.event_type == 'form_submit':
-        session.forms_submitted += 1
-    elif event.event_type == 'copy':
-        session.copy_events += 1
-    
-    # Calculate average time per page
-    if session.page_views > 1:
-        duration = (session.last_activity - session.created_at).total_seconds()
-        session.avg_time_per_page = duration / session.page_views
-        session.total_duration = int(duration)
-    
-    session.save()
+    record_session_event(session, event)
+
+
+def validate_tracking_payload(data):
+    """Cheap shape check for a tracker payload. Returns an error string or None."""
+    if not isinstance(data, dict):
+        return 'Payload must be a JSON object'
+    for key in ('eventType', 'sessionId', 'fingerprint', 'url', 'caseId'):
+        value = data.get(key)
+        if value is not None and not isinstance(value, (str, int)):
+            return f'Invalid {key}'
+    if len(str(data.get('eventType', ''))) > 50:
+        return 'Invalid eventType'
+    return None
+
+
+def process_tracked_event(event, session):
+    """
+    Post-insert pipeline for a newly stored TrackingEvent: detection, score
+    update, alerts, session metrics and the async ML dispatch.
+    Shared by track_event and the write-behind drainer. Returns the 0-1 score.
+    """
+    suspicious_score = 0.0
+    detection_result = {'criminal_score': 0, 'threat_level': 'MINIMAL'}
+
+    try:
+        detection_system = get_detection_system()
+        if detection_system:
+            started = time.perf_counter()
+            detection_result = detection_system.analyze_event(event)
+            record_detection(
+                detection_system.__class__.__name__,
+                detection_result.get('criminal_score', 0),
+                THREAT_SEVERITY.get(detection_result.get('threat_level'), 1),
+                seconds=time.perf_counter() - started,
+            )
+            # Convert criminal_score (0-10) to suspicious_score (0-1)
+            suspicious_score = detection_result.get('criminal_score', 0) / 10.0
+            logger.debug(f"Detection result for {event.id}: {detection_result}")
+    except Exception as e:
+        logger.error(f"Detection system failed: {e}", exc_info=True)
+        # Fall back to basic scoring
+        suspicious_score = calculate_basic_suspicious_score(event)
+
+    # Update event with suspicious score
+    event.suspicious_score = suspicious_score
+    event.is_suspicious = suspicious_score > 0.7
+    event.processed = True      # suspicious_score is the detection score (batch ML reads it)
+    event.save(update_fields=['suspicious_score', 'is_suspicious', 'processed'])
+
+    # CHECK FOR CRIMINAL BEHAVIOR AND SEND ALERTS
+    if suspicious_score > 0.3:  # Any suspicious activity
+        alerts_sent = check_for_criminal_behavior(event)
+        if alerts_sent:
+            logger.warning(f"ALERTS SENT: {alerts_sent}")
+
+    # Update session metrics
+    if session:
+        update_session_metrics(session, event)
+
+    # Check if we need to create an alert
+    if detection_result.get('threat_level') in ['HIGH', 'CRITICAL'] and event.case_id:
+        create_suspicious_alert(event, suspicious_score, detection_result)
+
+    # ── Async ML analysis ────────────────────────────────────────────────────
+    # quick_risk_assessment runs in the 'realtime' queue (5-sec timeout).
+    # If risk is ≥5, it automatically chains to analyze_tracking_event.
+    # CELERY_ALWAYS_EAGER=True in dev → runs synchronously (safe fallback).
+    try:
+        from .tasks import quick_risk_assessment
+        quick_risk_assessment.apply_async(
+            args=[str(event.id)],
+            queue='realtime',
+            ignore_result=True,
+        )
+    except Exception as _celery_exc:
+        logger.debug(f"Celery dispatch skipped: {_celery_exc}")
+
+    return suspicious_score
 
 
 def calculate_basic_suspicious_score(event):
@@ -1407,10 +1143,12 @@ def create_suspicious_alert(event, score, detection_result=None):
     if not event.case:
         return  # Don't create alerts without a case
         
+    priority = 'high' if score > 0.9 else 'medium'
+    get_metrics().record_alert('suspicious_user', priority)
     Alert.objects.create(
         case=event.case,
         alert_type='suspicious_user',
-        priority='high' if score > 0.9 else 'medium',
+        priority=priority,
         title=f"Suspicious Activity Detected - {detection_result.get('threat_level', 'UNKNOWN')} - Score: {score:.2f}",
         message=f"User {event.fingerprint_hash[:16] if event.fingerprint_hash else 'Unknown'} triggered suspicious behavior detection",
         session=event.session,
@@ -1483,68 +1221,133 @@ def parse_local_timestamp(timestamp_str):
         return None
 
 
-def get_visitor_trend(case):
+def _lookup_case(case_slug):
+    """Case by subdomain, falling back to a numeric ID; None when not found."""
+    case = Case.objects.filter(subdomain=case_slug).first()
+    if case is None and str(case_slug).isdigit():
+        case = Case.objects.filter(id=int(case_slug)).first()
+    return case
+
+
+# Metrics behind the overview / pattern helpers, compiled into grouped
+# queries by tracker.aggregation.plan_metrics()
+DASHBOARD_METRICS = {
+    'total_page_views': Metric('rollups', Sum('events')),
+    'suspicious_24h': Metric('rollups', Sum('suspicious_activities'), hours=24),
+    'visitors_24h': Metric('rollups', Visitors(), hours=24),
+    'visitor_trend': Metric('rollups', Visitors(), by='day', days=7),
+    'suspicious_trend': Metric('rollups', Sum('suspicious_activities'), by='day', days=7),
+    'top_referrers': Metric('rollups', Histogram('referrers', limit=11)),
+    'peak_hours': Metric('rollups', Sum('events'), by='hour'),
+    'day_of_week': Metric('rollups', Sum('events'), by='weekday'),
+    'unusual_access_times': Metric('rollups', Sum('unusual_hour_events')),
+    'suspicious_users': Metric('activities', Count('fingerprint_hash', distinct=True)),
+    'high_risk_users': Metric(
+        'activities', Count('fingerprint_hash', distinct=True, filter=Q(severity_level__gte=4))
+    ),
+    'active_alerts': Metric('alerts', Count('id', filter=Q(resolved=False))),
+    'avg_time_on_page': Metric('events', Avg('time_on_page')),
+    'avg_scroll_depth': Metric('events', Avg('scroll_depth')),
+    'avg_clicks': Metric('events', Avg('clicks_count')),
+    'form_submissions': Metric('events', Count('id', filter=Q(event_type='form_submit'))),
+}
+
+OVERVIEW_METRICS = (
+    'total_page_views', 'suspicious_24h', 'visitors_24h', 'visitor_trend',
+    'suspicious_trend', 'top_referrers', 'peak_hours', 'suspicious_users',
+    'high_risk_users', 'active_alerts',
+)
+TEMPORAL_METRICS = ('peak_hours', 'day_of_week', 'unusual_access_times')
+INTERACTION_METRICS = ('avg_time_on_page', 'avg_scroll_depth', 'avg_clicks', 'form_submissions')
+
+
+def _metric(case, metrics, name):
+    """A planned metric, computed on its own when the caller has no plan for it."""
+    if metrics is None or name not in metrics:
+        metrics = plan_metrics(case, {name: DASHBOARD_METRICS[name]})
+    return metrics[name]
+
+
+def get_case_summary(case):
+    """Stats of the legacy dashboard overview"""
+    now = timezone.now()
+    last_7d = now - timedelta(days=7)
+    last_30d = now - timedelta(days=30)
+    
+    # Event counts, trends and referrers: two planned queries over the
+    # rollups (+ one each for activities / alerts); all-time / 7d / 30d
+    # distinct visitors from the per-day HyperLogLog sketches, as are the
+    # visitors per country / device type (CaseDailyBreakdown)
+    metrics = plan_metrics(case, {name: DASHBOARD_METRICS[name] for name in OVERVIEW_METRICS}, now=now)
+    visitor_counts = get_visitor_cardinality()
+    return {
+        'total_visitors': visitor_counts.count_all(case.id),
+        'total_page_views': metrics['total_page_views'],
+        'suspicious_users': metrics['suspicious_users'],
+        'active_alerts': metrics['active_alerts'],
+        
+        # Time-based stats
+        'visitors_24h': metrics['visitors_24h'],
+        'visitors_7d': visitor_counts.count_since(case.id, last_7d),
+        'visitors_30d': visitor_counts.count_since(case.id, last_30d),
+        
+        # Suspicious activity
+        'suspicious_24h': metrics['suspicious_24h'],
+        'high_risk_users': metrics['high_risk_users'],
+        
+        'visitor_trend': get_visitor_trend(case, metrics),
+        'suspicious_trend': get_suspicious_trend(case, metrics),
+        'geographic_distribution': get_geographic_distribution(case, metrics),
+        'device_breakdown': get_device_breakdown(case, metrics),
+        'top_referrers': get_top_referrers(case, metrics),
+        'peak_hours': get_peak_hours(case, metrics),
+        'recent_suspicious': get_recent_suspicious(case),
+        'alerts': get_active_alerts(case),
+    }
+
+
+def get_visitor_trend(case, metrics=None):
     """Get visitor trend data for last 7 days"""
-    trends = []
-    for i in range(7):
-        date = timezone.now().date() - timedelta(days=i)
-        count = UserSession.objects.filter(
-            case=case,
-            created_at__date=date
-        ).values('fingerprint_hash').distinct().count()
-        trends.append({'date': date.isoformat(), 'visitors': count})
-    return list(reversed(trends))
+    return [
+        {'date': day.isoformat(), 'visitors': visitors}
+        for day, visitors in _metric(case, metrics, 'visitor_trend').items()
+    ]
 
 
-def get_suspicious_trend(case):
+def get_suspicious_trend(case, metrics=None):
     """Get suspicious activity trend for last 7 days"""
-    trends = []
-    for i in range(7):
-        date = timezone.now().date() - timedelta(days=i)
-        count = SuspiciousActivity.objects.filter(
-            case=case,
-            created_at__date=date
-        ).count()
-        trends.append({'date': date.isoformat(), 'activities': count})
-    return list(reversed(trends))
+    return [
+        {'date': day.isoformat(), 'activities': activities}
+        for day, activities in _metric(case, metrics, 'suspicious_trend').items()
+    ]
 
 
-def get_geographic_distribution(case):
+def get_geographic_distribution(case, metrics=None):
     """Get geographic distribution of visitors"""
-    distribution = TrackingEvent.objects.filter(case=case).values('ip_country').annotate(
-        count=Count('fingerprint_hash', distinct=True)
-    ).order_by('-count')[:10]
-    return list(distribution)
+    return [
+        {'ip_country': country, 'count': count}
+        for country, count in visitor_breakdown(case, 'country', limit=10)
+    ]
 
 
-def get_device_breakdown(case):
+def get_device_breakdown(case, metrics=None):
     """Get device type breakdown"""
-    breakdown = TrackingEvent.objects.filter(case=case).values('device_type').annotate(
-        count=Count('fingerprint_hash', distinct=True)
-    ).order_by('-count')
-    return list(breakdown)
+    return [
+        {'device_type': device_type, 'count': count}
+        for device_type, count in visitor_breakdown(case, 'device', limit=None)
+    ]
 
 
-def get_top_referrers(case):
+def get_top_referrers(case, metrics=None):
     """Get top referrer sources"""
-    referrers = TrackingEvent.objects.filter(case=case).exclude(
-        referrer_url=''
-    ).values('referrer_url').annotate(
-        count=Count('id')
-    ).order_by('-count')[:10]
-    return list(referrers)
+    top = _metric(case, metrics, 'top_referrers')
+    return [{'referrer_url': url, 'count': count} for url, count in top if url][:10]
 
 
-def get_peak_hours(case):
+def get_peak_hours(case, metrics=None):
     """Get peak activity hours"""
-    hours = []
-    for hour in range(24):
-        count = TrackingEvent.objects.filter(
-            case=case,
-            timestamp__hour=hour
-        ).count()
-        hours.append({'hour': hour, 'count': count})
-    return hours
+    counts = _metric(case, metrics, 'peak_hours')
+    return [{'hour': hour, 'count': counts[hour]} for hour in range(24)]
 
 
 def get_recent_suspicious(case):
@@ -1573,25 +1376,18 @@ def get_active_alerts(case):
 
 def analyze_temporal_patterns(case):
     """Analyze temporal patterns in user behavior"""
+    metrics = plan_metrics(case, {name: DASHBOARD_METRICS[name] for name in TEMPORAL_METRICS})
     patterns = {
-        'peak_hours': get_peak_hours(case),
+        'peak_hours': get_peak_hours(case, metrics),
         'day_of_week': [],
-        'unusual_access_times': 0,
+        'unusual_access_times': metrics['unusual_access_times'],
     }
     
     # Day of week analysis
+    weekdays = metrics['day_of_week']
     for day in range(7):
-        count = TrackingEvent.objects.filter(
-            case=case,
-            timestamp__week_day=day + 1  # Django uses 1=Sunday, 7=Saturday
-        ).count()
-        patterns['day_of_week'].append({'day': day, 'count': count})
-    
-    # Count unusual hour accesses
-    patterns['unusual_access_times'] = TrackingEvent.objects.filter(
-        case=case,
-        is_unusual_hour=True
-    ).count()
+        # Django uses 1=Sunday, 7=Saturday
+        patterns['day_of_week'].append({'day': day, 'count': weekdays[day + 1]})
     
     return patterns
 
@@ -1627,145 +1423,5 @@ def analyze_navigation_patterns(case):
 
 def analyze_interaction_patterns(case):
     """Analyze user interaction patterns"""
-    patterns = {
-        'avg_time_on_page': 0,
-        'avg_scroll_depth': 0,
-        'avg_clicks': 0,
-        'form_submissions': 0,
-    }
-    
-    # Calculate averages
-    aggregates = TrackingEvent.objects.filter(case=case).aggregate(
-        avg_time=Avg('time_on_page'),
-        avg_scroll=Avg('scroll_depth'),
-        avg_clicks=Avg('clicks_count')
-    )
-    
-    patterns['avg_time_on_page'] = aggregates['avg_time'] or 0
-    patterns['avg_scroll_depth'] = aggregates['avg_scroll'] or 0
-    patterns['avg_clicks'] = aggregates['avg_clicks'] or 0
-    
-    # Count form submissions
-    patterns['form_submissions'] = TrackingEvent.objects.filter(
-        case=case,
-        event_type='form_submit'
-    ).count()
-    
-    return patterns
-
-
-def build_export_data(case, include_suspicious, date_from, date_to):
-    """Build data for export"""
-    data = {
-        'case': {
-            'id': str(case.id),
-            'name': case.name,
-            'victim_name': case.victim_name,
-        },
-        'events': [],
-        'sessions': [],
-        'suspicious_activities': [],
-    }
-    
-    # Build query filters
-    filters = {'case': case}
-    if date_from:
-        filters['timestamp__gte'] = date_from
-    if date_to:
-        filters['timestamp__lte'] = date_to
-    
-    # Get events
-    events = TrackingEvent.objects.filter(**filters).order_by('-timestamp')[:1000]
-    data['events'] = [{
-        'id': str(e.id),
-        'timestamp': e.timestamp.isoformat(),
-        'type': e.event_type,
-        'page': e.page_url,
-        'ip': e.ip_address,
-        'suspicious': e.is_suspicious,
-    } for e in events]
-    
-    # Get sessions
-    session_filters = {'case': case}
-    if date_from:
-        session_filters['created_at__gte'] = date_from
-    if date_to:
-        session_filters['created_at__lte'] = date_to
-    
-    sessions = UserSession.objects.filter(**session_filters).order_by('-created_at')[:1000]
-    data['sessions'] = [{
-        'id': str(s.id),
-        'session_id': s.session_id,
-        'created': s.created_at.isoformat(),
-        'duration': s.total_duration,
-        'page_views': s.page_views,
-    } for s in sessions]
-    
-    # Get suspicious activities if requested
-    if include_suspicious:
-        sus_filters = {'case': case}
-        if date_from:
-            sus_filters['created_at__gte'] = date_from
-        if date_to:
-            sus_filters['created_at__lte'] = date_to
-        
-        suspicious = SuspiciousActivity.objects.filter(**sus_filters).order_by('-created_at')[:1000]
-        data['suspicious_activities'] = [{
-            'id': str(a.id),
-            'timestamp': a.created_at.isoformat(),
-            'type': a.activity_type,
-            'severity': a.severity_level,
-            'ip': a.ip_address,
-        } for a in suspicious]
-    
-    return data
-
-
-def convert_to_csv(data):
-    """Convert data to CSV format"""
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write events
-    writer.writerow(['Events'])
-    writer.writerow(['ID', 'Timestamp', 'Type', 'Page', 'IP', 'Suspicious'])
-    for event in data.get('events', []):
-        writer.writerow([
-            event['id'],
-            event['timestamp'],
-            event['type'],
-            event['page'],
-            event['ip'],
-            event['suspicious']
-        ])
-    
-    writer.writerow([])  # Empty row
-    
-    # Write sessions
-    writer.writerow(['Sessions'])
-    writer.writerow(['ID', 'Session ID', 'Created', 'Duration', 'Page Views'])
-    for session in data.get('sessions', []):
-        writer.writerow([
-            session['id'],
-            session['session_id'],
-            session['created'],
-            session['duration'],
-            session['page_views']
-        ])
-    
-    writer.writerow([])  # Empty row
-    
-    # Write suspicious activities
-    if 'suspicious_activities' in data:
-        writer.writerow(['Suspicious Activities'])
-        writer.writerow(['ID', 'Timestamp', 'Type', 'Severity', 'IP'])
-        for activity in data['suspicious_activities']:
-            writer.writerow([
-                activity['id'],
-                activity['timestamp'],
-                activity['type'],
-                activity['severity'],
-                activity['ip']
-            ])
-    
-    return output.getvalue()
\ No newline at end of file
+    metrics = plan_metrics(case, {name: DASHBOARD_METRICS[name] for name in INTERACTION_METRICS})
+    return {name: metrics[name] or 0 for name in INTERACTION_METRICS}